@@ -0,0 +1,16 @@
+# Copyright (c) 2026, Bairun and contributors
+# License: MIT. See license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class BRBOMWhereUsed(Document):
+	"""BOM 展开反查索引行；由 utils.api.material.bom_where_used 维护，勿手工编辑。"""
+
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("BR BOM Where Used", ["item_code", "ancestor_item"], index_name="item_ancestor_index")
+	frappe.db.add_index("BR BOM Where Used", ["root_bom", "item_code"], index_name="root_item_index")
@@ -3,8 +3,14 @@
 
 from frappe.model.document import Document
 
+from bairun_erp.utils.db_indexes import add_hot_lookup_indexes
+
 
 class BRItemProcessSupplier(Document):
 	"""物料工艺/供应商/工位/价格：物料可配置多组工艺、供应商、工位及对应价格。"""
 
 	pass
+
+
+def on_doctype_update():
+	add_hot_lookup_indexes("BR Item Process Supplier")
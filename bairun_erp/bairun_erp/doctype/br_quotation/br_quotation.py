@@ -5,6 +5,8 @@ import frappe
 from frappe.model.document import Document
 from frappe import _
 
+from bairun_erp.utils.db_indexes import add_hot_lookup_indexes
+
 
 class BRQuotation(Document):
 	def after_insert(self):
@@ -20,12 +22,12 @@ class BRQuotation(Document):
 		try:
 			# 检查是否禁用同步
 			if hasattr(self, 'flags') and getattr(self.flags, 'disable_sync', False):
-				print(f"[DEBUG] 同步机制已禁用，跳过同步")
+				_logger().debug("sync to customer quotation disabled: %s", self.name)
 				return
 			
 			# 检查报价单号和客户名称是否存在
 			if not self.quotation_number or not self.customer_name:
-				print(f"[DEBUG] 报价单号或客户名称为空，跳过同步")
+				_logger().debug("sync to customer quotation skipped, missing quotation_number/customer_name: %s", self.name)
 				return
 			
 			# 检查是否已存在相同的报价单号
@@ -35,7 +37,6 @@ class BRQuotation(Document):
 			)
 			
 			if existing_customer_quotation:
-				print(f"[DEBUG] 报价单号 {self.quotation_number} 已存在于客户报价单中，更新产品名称")
 				# 更新现有的客户报价单
 				customer_quotation_doc = frappe.get_doc("BR Customer Quotation", existing_customer_quotation)
 				customer_quotation_doc.product_name = self.product_name
@@ -46,7 +47,7 @@ class BRQuotation(Document):
 				except Exception:
 					pass
 				customer_quotation_doc.save(ignore_permissions=True)
-				print(f"[DEBUG] 成功更新客户报价单 {self.quotation_number} 的产品名称")
+				_logger().debug("customer quotation updated: %s", self.quotation_number)
 				return
 			
 			# 创建新的客户报价单
@@ -66,24 +67,84 @@ class BRQuotation(Document):
 			customer_quotation_doc = frappe.get_doc(customer_quotation_data)
 			
 			customer_quotation_doc.insert(ignore_permissions=True)
-			print(f"[DEBUG] 成功同步报价单 {self.quotation_number} 到客户报价单")
+			_logger().debug("customer quotation created: %s", self.quotation_number)
 			
 		except Exception as e:
-			print(f"[DEBUG] 同步到客户报价单失败: {str(e)}")
 			frappe.log_error(f"同步报价单到客户报价单失败: {str(e)}", "BR Quotation Sync Error")
 
 
-def build_order_clause(order_by, order_direction, valid_fields):
+def _logger():
+	return frappe.logger("bairun_erp.br_quotation")
+
+
+# 版本与明细查询字段
+_VERSION_FIELDS = """
+	name,
+	quotation_number,
+	customer_name,
+	item_code,
+	quotation_date,
+	validity_period,
+	include_tax,
+	tax_rate,
+	profit_rate,
+	show_full_name,
+	uploaded_image,
+	material_config,
+	total_mold_cost,
+	total_cost,
+	total_quotation,
+	total_profit,
+	item_count,
+	version_id,
+	version_name,
+	active_version_id,
+	total_versions,
+	docstatus,
+	creation,
+	modified
+"""
+
+_DETAIL_FIELDS = """
+	name,
+	parent,
+	idx,
+	part_name,
+	full_name,
+	material,
+	process_type,
+	unit_weight,
+	output,
+	cycle,
+	daily_production,
+	mold_cost,
+	daily_processing_fee,
+	blank_processing_fee,
+	raw_material_price,
+	product_material_price,
+	injection_price,
+	cost_total,
+	quotation_total,
+	profit,
+	selected_processes,
+	process_workstations
+"""
+
+
+def build_order_clause(order_by, order_direction, valid_fields, field_expressions=None):
 	"""
 	构建排序子句
 	:param order_by: 排序字段，支持多字段，用逗号分隔
 	:param order_direction: 排序方向，支持多方向，用逗号分隔
 	:param valid_fields: 有效字段列表
+	:param field_expressions: 可选，逻辑字段 -> SQL 表达式（如 version_id 对应子查询）
 	:return: ORDER BY 子句
 	"""
 	if not order_by:
 		return "ORDER BY creation DESC"
 	
+	field_expressions = field_expressions or {}
+	
 	# 分割字段和方向
 	order_fields = [field.strip() for field in str(order_by).split(',')]
 	order_directions = [direction.strip() for direction in str(order_direction).split(',')]
@@ -93,7 +154,7 @@ def build_order_clause(order_by, order_direction, valid_fields):
 	
 	for i, field in enumerate(order_fields):
 		# 验证字段有效性
-		if field not in valid_fields:
+		if field not in valid_fields and field not in field_expressions:
 			continue
 		
 		# 获取对应的排序方向
@@ -107,7 +168,7 @@ def build_order_clause(order_by, order_direction, valid_fields):
 		if direction not in ['ASC', 'DESC']:
 			direction = "DESC"
 		
-		order_items.append(f"{field} {direction}")
+		order_items.append(f"{field_expressions.get(field, field)} {direction}")
 	
 	# 如果没有有效的排序项，使用默认排序
 	if not order_items:
@@ -116,6 +177,23 @@ def build_order_clause(order_by, order_direction, valid_fields):
 	return f"ORDER BY {', '.join(order_items)}"
 
 
+def _empty_list_result(page, page_size):
+	return {
+		'status': 'success',
+		'data': {
+			'customer_quotations': [],
+			'pagination': {
+				'current_page': int(page),
+				'page_size': int(page_size),
+				'total_count': 0,
+				'total_pages': 0,
+				'has_next': False,
+				'has_prev': False
+			}
+		}
+	}
+
+
 @frappe.whitelist()
 def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation", order_direction="desc"):
 	"""
@@ -123,6 +201,9 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 	新的数据层级结构：
 	BR Customer Quotation → BR Quotation → BR Quotation Details
 	
+	版本号过滤与排序在 SQL 中完成；本页所有报价单的版本、明细各一次 IN 查询加载。
+	调试日志走 frappe.logger("bairun_erp.br_quotation") 的 DEBUG 级别，不再逐条打印 SQL 与结果。
+	
 	:param page: 页码，从1开始
 	:param page_size: 每页数量
 	:param filters: 过滤条件
@@ -130,26 +211,23 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 	:param order_direction: 排序方向 (asc/desc)，支持多方向，如 "desc,asc"
 	:return: 包含客户报价单列表和分页信息的字典
 	"""
-	print(f"[DEBUG] get_quotation_list 开始执行")
-	print(f"[DEBUG] 参数: page={page}, page_size={page_size}, filters={filters}, order_by={order_by}, order_direction={order_direction}")
+	_logger().debug(
+		"get_quotation_list: page=%s, page_size=%s, filters=%s, order_by=%s, order_direction=%s",
+		page, page_size, filters, order_by, order_direction
+	)
 	
 	try:
 		# 设置默认过滤条件
 		if not filters:
 			filters = {}
 		
-		print(f"[DEBUG] 过滤条件: {filters}")
-		
 		# 计算偏移量
 		offset = (int(page) - 1) * int(page_size)
-		print(f"[DEBUG] 分页参数: offset={offset}, page_size={page_size}")
 		
 		# 构建查询条件 - 从BR Customer Quotation开始
 		conditions = "WHERE 1=1"
 		params = []
 		
-		print(f"[DEBUG] 开始构建查询条件")
-		
 		# 检查是否需要按版本号过滤
 		version_filter = filters.get('version_id')
 		
@@ -157,112 +235,50 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 		if filters.get('customer_name'):
 			conditions += " AND customer_name LIKE %s"
 			params.append(f"%{filters['customer_name']}%")
-			print(f"[DEBUG] 添加客户名称过滤: {filters['customer_name']}")
 		
 		if filters.get('product_name'):
 			conditions += " AND product_name LIKE %s"
 			params.append(f"%{filters['product_name']}%")
-			print(f"[DEBUG] 添加产品名称过滤: {filters['product_name']}")
 		
 		if filters.get('quotation_number'):
 			conditions += " AND quotation_number LIKE %s"
 			params.append(f"%{filters['quotation_number']}%")
-			print(f"[DEBUG] 添加报价单号过滤: {filters['quotation_number']}")
 		
-		# 如果按版本号过滤，需要特殊处理
+		# 按版本号过滤：只保留存在符合版本号的版本的客户报价单
+		version_condition = ""
 		if version_filter:
-			print(f"[DEBUG] 添加版本号过滤: {version_filter}")
-			
-			# 如果同时指定了报价单号，则在该报价单的版本中过滤
-			if filters.get('quotation_number'):
-				print(f"[DEBUG] 同时指定了报价单号，将在该报价单的版本中过滤")
-				# 检查该报价单是否有指定版本
-				version_check_sql = """
-					SELECT COUNT(*) as count
-					FROM `tabBR Quotation` 
-					WHERE quotation_number = %s AND version_id LIKE %s
-				"""
-				version_check_params = [filters['quotation_number'], f"%{version_filter}%"]
-				print(f"[DEBUG] 版本检查SQL: {version_check_sql}")
-				print(f"[DEBUG] 版本检查参数: {version_check_params}")
-				
-				version_count = frappe.db.sql(version_check_sql, version_check_params, as_dict=True)[0]['count']
-				print(f"[DEBUG] 该报价单中符合版本号的数量: {version_count}")
-				
-				if version_count == 0:
-					# 如果该报价单没有指定版本，返回空结果
-					print(f"[DEBUG] 该报价单没有指定版本，返回空结果")
-					return {
-						'status': 'success',
-						'data': {
-							'customer_quotations': [],
-							'pagination': {
-								'current_page': int(page),
-								'page_size': int(page_size),
-								'total_count': 0,
-								'total_pages': 0,
-								'has_next': False,
-								'has_prev': False
-							}
-						}
-					}
-			else:
-				# 如果没有指定报价单号，查询所有符合版本号条件的报价单号
-				version_sql = """
-					SELECT DISTINCT quotation_number 
-					FROM `tabBR Quotation` 
-					WHERE version_id LIKE %s
-				"""
-				version_params = [f"%{version_filter}%"]
-				print(f"[DEBUG] 版本查询SQL: {version_sql}")
-				print(f"[DEBUG] 版本查询参数: {version_params}")
-				
-				version_results = frappe.db.sql(version_sql, version_params, as_dict=True)
-				quotation_numbers = [row['quotation_number'] for row in version_results]
-				print(f"[DEBUG] 符合版本号的报价单号: {quotation_numbers}")
-				
-				if quotation_numbers:
-					# 构建 IN 查询条件
-					placeholders = ','.join(['%s'] * len(quotation_numbers))
-					conditions += f" AND quotation_number IN ({placeholders})"
-					params.extend(quotation_numbers)
-					print(f"[DEBUG] 添加版本号过滤条件: quotation_number IN ({placeholders})")
-				else:
-					# 如果没有找到符合版本号的报价单，返回空结果
-					print(f"[DEBUG] 没有找到符合版本号的报价单，返回空结果")
-					return {
-						'status': 'success',
-						'data': {
-							'customer_quotations': [],
-							'pagination': {
-								'current_page': int(page),
-								'page_size': int(page_size),
-								'total_count': 0,
-								'total_pages': 0,
-								'has_next': False,
-								'has_prev': False
-							}
-						}
-					}
-		
-		print(f"[DEBUG] 查询条件: {conditions}")
-		print(f"[DEBUG] 查询参数: {params}")
+			version_condition = " AND q.version_id LIKE %s"
+			conditions += f"""
+				AND EXISTS (
+					SELECT 1 FROM `tabBR Quotation` q
+					WHERE q.quotation_number = `tabBR Customer Quotation`.quotation_number
+					{version_condition}
+				)
+			"""
+			params.append(f"%{version_filter}%")
 		
 		# 验证并构建排序条件
 		valid_order_fields = [
 			'name', 'quotation_number', 'customer_name', 'product_name', 'creation', 'modified'
 		]
 		
-		# 检查是否需要按版本号排序
+		# 按版本号排序：取每个报价单（过滤后）最小的版本号，即列表中第一个版本
+		order_params = []
 		if order_by and 'version_id' in str(order_by):
-			print(f"[DEBUG] 检测到版本号排序需求，需要特殊处理")
-			# 对于版本号排序，我们需要在获取版本数据后进行排序
-			# 先使用默认排序获取数据
-			order_clause = "ORDER BY creation DESC"
+			version_sort_expr = f"""IFNULL((
+				SELECT MIN(q.version_id) FROM `tabBR Quotation` q
+				WHERE q.quotation_number = `tabBR Customer Quotation`.quotation_number
+				{version_condition}
+			), '')"""
+			if version_filter:
+				order_params.append(f"%{version_filter}%")
+			order_clause = build_order_clause(
+				order_by, order_direction, valid_order_fields, {'version_id': version_sort_expr}
+			)
 		else:
 			order_clause = build_order_clause(order_by, order_direction, valid_order_fields)
 		
-		print(f"[DEBUG] 排序子句: {order_clause}")
+		_logger().debug("get_quotation_list: conditions=%s, params=%s, order=%s", conditions, params, order_clause)
 		
 		# 查询客户报价单总数
 		count_sql = f"""
@@ -270,24 +286,9 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 			FROM `tabBR Customer Quotation`
 			{conditions}
 		"""
-		print(f"[DEBUG] 总数查询SQL: {count_sql}")
-		print(f"[DEBUG] 总数查询参数: {params}")
-		
 		total_count = frappe.db.sql(count_sql, params, as_dict=True)[0]['total']
-		print(f"[DEBUG] 查询到的客户报价单总数: {total_count}")
-		
-		# 如果没有数据，先检查表是否存在数据
 		if total_count == 0:
-			print(f"[DEBUG] 没有找到客户报价单数据，检查表结构...")
-			check_sql = "SELECT COUNT(*) as total FROM `tabBR Customer Quotation`"
-			all_count = frappe.db.sql(check_sql, as_dict=True)[0]['total']
-			print(f"[DEBUG] 客户报价单表中总记录数: {all_count}")
-			
-			if all_count > 0:
-				print(f"[DEBUG] 表中有数据，但查询条件可能有问题")
-				sample_sql = "SELECT name, quotation_number, customer_name, product_name FROM `tabBR Customer Quotation` LIMIT 5"
-				sample_data = frappe.db.sql(sample_sql, as_dict=True)
-				print(f"[DEBUG] 样本数据: {sample_data}")
+			return _empty_list_result(page, page_size)
 		
 		# 查询客户报价单列表
 		customer_quotation_sql = f"""
@@ -311,76 +312,25 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 			{order_clause}
 			LIMIT %s OFFSET %s
 		"""
-		params.extend([int(page_size), offset])
+		customer_quotations = frappe.db.sql(
+			customer_quotation_sql, params + order_params + [int(page_size), offset], as_dict=True
+		)
 		
-		print(f"[DEBUG] 客户报价单查询SQL: {customer_quotation_sql}")
-		print(f"[DEBUG] 客户报价单查询参数: {params}")
-		
-		customer_quotations = frappe.db.sql(customer_quotation_sql, params, as_dict=True)
-		print(f"[DEBUG] 查询到的客户报价单数量: {len(customer_quotations)}")
-		print(f"[DEBUG] 客户报价单数据: {customer_quotations}")
-		
-		# 获取每个客户报价单的版本信息
-		print(f"[DEBUG] 开始获取版本数据")
-		for i, customer_quotation in enumerate(customer_quotations):
-			print(f"[DEBUG] 处理第 {i+1} 个客户报价单: {customer_quotation.get('quotation_number', 'N/A')}")
-			
-			# 获取该报价单号的所有版本
-			versions = get_quotation_versions(customer_quotation['quotation_number'])
-			
-			# 如果有版本号过滤，只保留符合条件的版本
-			if version_filter:
-				print(f"[DEBUG] 过滤版本，只保留版本号包含 '{version_filter}' 的版本")
-				filtered_versions = []
-				for version in versions:
-					if version_filter.lower() in version.get('version_id', '').lower():
-						filtered_versions.append(version)
-						print(f"[DEBUG] 保留版本: {version.get('version_id', 'N/A')}")
-					else:
-						print(f"[DEBUG] 过滤掉版本: {version.get('version_id', 'N/A')}")
-				
-				versions = filtered_versions
-				print(f"[DEBUG] 过滤后的版本数量: {len(versions)}")
-			
-			customer_quotation['versions'] = versions
-			print(f"[DEBUG] 客户报价单 {customer_quotation.get('quotation_number', 'N/A')} 的版本数量: {len(versions)}")
-		
-		# 如果需要按版本号排序，对客户报价单进行排序
-		if order_by and 'version_id' in str(order_by):
-			print(f"[DEBUG] 执行版本号排序")
-			# 解析排序参数
-			order_fields = [field.strip() for field in str(order_by).split(',')]
-			order_directions = [direction.strip() for direction in str(order_direction).split(',')]
-			
-			# 找到版本号排序的索引和方向
-			version_sort_index = None
-			version_sort_direction = 'desc'
-			
-			for i, field in enumerate(order_fields):
-				if field == 'version_id':
-					version_sort_index = i
-					if i < len(order_directions):
-						version_sort_direction = order_directions[i].lower()
-					break
-			
-			if version_sort_index is not None:
-				# 对客户报价单按版本号排序
-				def sort_by_version_id(item):
-					if not item.get('versions'):
-						return ''
-					# 获取第一个版本的版本号
-					first_version = item['versions'][0] if item['versions'] else {}
-					return first_version.get('version_id', '')
-				
-				reverse = version_sort_direction == 'desc'
-				customer_quotations.sort(key=sort_by_version_id, reverse=reverse)
-				print(f"[DEBUG] 版本号排序完成，方向: {version_sort_direction}")
+		# 本页所有报价单号的版本（含明细）一次加载
+		versions_map = get_quotation_versions_map(
+			[cq['quotation_number'] for cq in customer_quotations], version_filter=version_filter
+		)
+		for customer_quotation in customer_quotations:
+			customer_quotation['versions'] = versions_map.get(customer_quotation['quotation_number'], [])
 		
 		# 计算分页信息
 		total_pages = (total_count + int(page_size) - 1) // int(page_size)
-		print(f"[DEBUG] 分页信息: total_pages={total_pages}")
+		_logger().debug(
+			"get_quotation_list: total_count=%s, page_rows=%s, total_pages=%s",
+			total_count, len(customer_quotations), total_pages
+		)
 		
-		result = {
+		return {
 			'status': 'success',
 			'data': {
 				'customer_quotations': customer_quotations,
@@ -395,11 +345,8 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 			}
 		}
 		
-		print(f"[DEBUG] 返回结果: {result}")
-		return result
-		
 	except Exception as e:
-		print(f"[DEBUG] 发生异常: {str(e)}")
+		_logger().debug("get_quotation_list failed: %s", e)
 		frappe.log_error(f"获取客户报价单列表失败: {str(e)}", "BR Customer Quotation API Error")
 		return {
 			'status': 'error',
@@ -407,117 +354,96 @@ def get_quotation_list(page=1, page_size=20, filters=None, order_by="creation",
 		}
 
 
-def get_quotation_versions(quotation_number):
+def get_quotation_versions_map(quotation_numbers, version_filter=None):
 	"""
-	获取指定报价单号的所有版本
-	:param quotation_number: 报价单号
-	:return: 版本列表
+	批量获取多个报价单号的版本（含明细行），版本与明细各一次 IN 查询
+	:param quotation_numbers: 报价单号列表
+	:param version_filter: 可选，版本号模糊匹配
+	:return: {报价单号: 版本列表}，版本按 version_id、creation DESC 排序
 	"""
-	print(f"[DEBUG] get_quotation_versions 开始执行，报价单号: {quotation_number}")
+	quotation_numbers = list(dict.fromkeys(qn for qn in quotation_numbers or [] if qn))
+	if not quotation_numbers:
+		return {}
 	try:
-		versions_sql = """
-			SELECT 
-				name,
-				quotation_number,
-				customer_name,
-				item_code,
-				quotation_date,
-				validity_period,
-				include_tax,
-				tax_rate,
-				profit_rate,
-				show_full_name,
-				uploaded_image,
-				material_config,
-				total_mold_cost,
-				total_cost,
-				total_quotation,
-				total_profit,
-				item_count,
-				version_id,
-				version_name,
-				active_version_id,
-				total_versions,
-				docstatus,
-				creation,
-				modified
+		conditions = "quotation_number IN %(quotation_numbers)s"
+		values = {'quotation_numbers': tuple(quotation_numbers)}
+		if version_filter:
+			conditions += " AND version_id LIKE %(version_filter)s"
+			values['version_filter'] = f"%{version_filter}%"
+		
+		versions = frappe.db.sql(
+			f"""
+			SELECT {_VERSION_FIELDS}
 			FROM `tabBR Quotation`
-			WHERE quotation_number = %s
+			WHERE {conditions}
 			ORDER BY version_id, creation DESC
-		"""
-		
-		print(f"[DEBUG] 版本查询SQL: {versions_sql}")
-		print(f"[DEBUG] 版本查询参数: {quotation_number}")
-		
-		versions = frappe.db.sql(versions_sql, (quotation_number,), as_dict=True)
-		print(f"[DEBUG] 查询到的版本数量: {len(versions)}")
-		print(f"[DEBUG] 版本数据: {versions}")
+			""",
+			values,
+			as_dict=True
+		)
 		
-		# 获取每个版本的明细行
-		print(f"[DEBUG] 开始获取版本明细行数据")
-		for i, version in enumerate(versions):
-			print(f"[DEBUG] 处理第 {i+1} 个版本: {version.get('name', 'N/A')}")
-			version['details'] = get_quotation_details(version['name'])
-			print(f"[DEBUG] 版本 {version.get('name', 'N/A')} 的明细行数量: {len(version['details'])}")
+		details_map = get_quotation_details_map([v['name'] for v in versions])
+		versions_map = {}
+		for version in versions:
+			version['details'] = details_map.get(version['name'], [])
+			versions_map.setdefault(version['quotation_number'], []).append(version)
 		
-		return versions
+		_logger().debug("get_quotation_versions_map: quotations=%s, versions=%s", len(quotation_numbers), len(versions))
+		return versions_map
 		
 	except Exception as e:
-		print(f"[DEBUG] get_quotation_versions 发生异常: {str(e)}")
+		_logger().debug("get_quotation_versions_map failed: %s", e)
 		frappe.log_error(f"获取报价单版本失败: {str(e)}", "BR Quotation Versions API Error")
-		return []
+		return {}
 
 
-def get_quotation_details(quotation_name):
+def get_quotation_versions(quotation_number):
 	"""
-	获取报价单明细行
-	:param quotation_name: 报价单名称
-	:return: 明细行列表
+	获取指定报价单号的所有版本
+	:param quotation_number: 报价单号
+	:return: 版本列表
+	"""
+	return get_quotation_versions_map([quotation_number]).get(quotation_number, [])
+
+
+def get_quotation_details_map(quotation_names):
+	"""
+	批量获取报价单明细行（一次 IN 查询）
+	:param quotation_names: 报价单名称列表
+	:return: {报价单名称: 明细行列表}，明细按 idx 排序
 	"""
-	print(f"[DEBUG] get_quotation_details 开始执行，报价单名称: {quotation_name}")
+	quotation_names = list(dict.fromkeys(n for n in quotation_names or [] if n))
+	if not quotation_names:
+		return {}
 	try:
-		details_sql = """
-			SELECT 
-				name,
-				parent,
-				idx,
-				part_name,
-				full_name,
-				material,
-				process_type,
-				unit_weight,
-				output,
-				cycle,
-				daily_production,
-				mold_cost,
-				daily_processing_fee,
-				blank_processing_fee,
-				raw_material_price,
-				product_material_price,
-				injection_price,
-				cost_total,
-				quotation_total,
-				profit,
-				selected_processes,
-				process_workstations
+		details = frappe.db.sql(
+			f"""
+			SELECT {_DETAIL_FIELDS}
 			FROM `tabBR Quotation Details`
-			WHERE parent = %s
-			ORDER BY idx
-		"""
-		
-		print(f"[DEBUG] 明细查询SQL: {details_sql}")
-		print(f"[DEBUG] 明细查询参数: {quotation_name}")
-		
-		details = frappe.db.sql(details_sql, (quotation_name,), as_dict=True)
-		print(f"[DEBUG] 查询到的明细行数量: {len(details)}")
-		print(f"[DEBUG] 明细行数据: {details}")
-		
-		return details
+			WHERE parent IN %(parents)s
+			ORDER BY parent, idx
+			""",
+			{'parents': tuple(quotation_names)},
+			as_dict=True
+		)
+		details_map = {}
+		for detail in details:
+			details_map.setdefault(detail['parent'], []).append(detail)
+		return details_map
 		
 	except Exception as e:
-		print(f"[DEBUG] get_quotation_details 发生异常: {str(e)}")
+		_logger().debug("get_quotation_details_map failed: %s", e)
 		frappe.log_error(f"获取报价单明细失败: {str(e)}", "BR Quotation Details API Error")
-		return []
+		return {}
+
+
+def get_quotation_details(quotation_name):
+	"""
+	获取报价单明细行
+	:param quotation_name: 报价单名称
+	:return: 明细行列表
+	"""
+	return get_quotation_details_map([quotation_name]).get(quotation_name, [])
 
 
 @frappe.whitelist()
@@ -594,3 +520,7 @@ def get_quotation_by_quotation_number(quotation_number):
 			'status': 'error',
 			'message': f'根据报价单号获取报价单详情失败: {str(e)}'
 		}
+
+
+def on_doctype_update():
+	add_hot_lookup_indexes("BR Quotation")
@@ -104,6 +104,36 @@ class TestBRQuotation(FrappeTestCase):
 		# 验证排序结果（这里只是验证函数能正常执行）
 		self.assertIn('customer_quotations', result['data'])
 	
+	def test_version_filter_keeps_only_matching_versions(self):
+		"""版本号过滤在 SQL 中完成：返回的每个报价单只包含匹配的版本"""
+		result = get_quotation_list(
+			page=1,
+			page_size=10,
+			filters={"quotation_number": "TEST-00", "version_id": "V1"}
+		)
+		
+		self.assertEqual(result['status'], 'success')
+		quotation_numbers = [q['quotation_number'] for q in result['data']['customer_quotations']]
+		self.assertIn('TEST-001', quotation_numbers)
+		self.assertNotIn('TEST-002', quotation_numbers)
+		for quotation in result['data']['customer_quotations']:
+			self.assertTrue(all('V1' in v['version_id'] for v in quotation['versions']))
+	
+	def test_version_sort_orders_by_first_version(self):
+		"""按版本号升序：以各报价单最小版本号排序"""
+		result = get_quotation_list(
+			page=1,
+			page_size=10,
+			filters={"quotation_number": "TEST-00"},
+			order_by="version_id",
+			order_direction="asc"
+		)
+		
+		self.assertEqual(result['status'], 'success')
+		quotation_numbers = [q['quotation_number'] for q in result['data']['customer_quotations']]
+		self.assertEqual(quotation_numbers, ['TEST-001', 'TEST-002'])
+		self.assertEqual([v['version_id'] for v in result['data']['customer_quotations'][0]['versions']], ['V1', 'V2'])
+	
 	def tearDown(self):
 		"""清理测试数据"""
 		# 删除测试数据
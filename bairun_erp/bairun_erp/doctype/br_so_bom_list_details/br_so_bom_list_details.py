@@ -3,6 +3,12 @@
 
 from frappe.model.document import Document
 
+from bairun_erp.utils.db_indexes import add_hot_lookup_indexes
+
 
 class BRSOBOMListDetails(Document):
 	pass
+
+
+def on_doctype_update():
+	add_hot_lookup_indexes("BR SO BOM List Details")
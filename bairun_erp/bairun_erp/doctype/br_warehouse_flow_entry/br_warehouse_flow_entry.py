@@ -0,0 +1,19 @@
+# Copyright (c) 2026, Bairun and contributors
+# License: MIT. See license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class BRWarehouseFlowEntry(Document):
+	"""毛坯/半成品到库、委外流水行；由 utils.api.stock.warehouse_flow_summary 维护，勿手工编辑。"""
+
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"BR Warehouse Flow Entry",
+		["list_type", "flow_type", "project_no", "item_code", "warehouse"],
+		index_name="flow_key_index",
+	)
@@ -0,0 +1,20 @@
+# Copyright (c) 2026, Bairun and contributors
+# License: MIT. See license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class BRWarehouseFlowSummary(Document):
+	"""毛坯/半成品到库、委外预聚合行；由 utils.api.stock.warehouse_flow_summary 维护，勿手工编辑。"""
+
+	pass
+
+
+def on_doctype_update():
+	# 每个 key 一行：增量重算按此唯一键 INSERT ... ON DUPLICATE KEY UPDATE
+	frappe.db.add_unique(
+		"BR Warehouse Flow Summary",
+		["list_type", "flow_type", "project_no", "item_code", "warehouse"],
+		constraint_name="flow_key_unique",
+	)
@@ -0,0 +1,15 @@
+from __future__ import unicode_literals
+
+from bairun_erp.utils.api.material.bom_tree_cache import invalidate_bom_tree_cache
+
+
+def invalidate_bom_caches(doc, method=None):
+	"""BOM 保存 / 取消 / 删除后清理该 BOM 的展开树缓存。"""
+	invalidate_bom_tree_cache(doc.name)
+
+
+def update_bom_where_used(doc, method=None):
+	"""BOM 提交 / 提交后更新 / 取消后重建展开反查索引（BR BOM Where Used）。"""
+	from bairun_erp.utils.api.material.bom_where_used import update_for_bom
+
+	update_for_bom(doc.name)
@@ -0,0 +1,128 @@
+# Copyright (c) 2026, Bairun and contributors
+# bench 自定义命令：bench --site <site> <command>
+
+from __future__ import unicode_literals
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-warehouse-flow-summary")
+@pass_context
+def rebuild_warehouse_flow_summary(context):
+	"""全量重建毛坯/半成品到库、委外汇总（BR Warehouse Flow Entry / Summary）。"""
+	import frappe
+
+	from bairun_erp.utils.api.stock.warehouse_flow_summary import rebuild_warehouse_flow_summary as rebuild
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		result = rebuild()
+		click.echo("entries: {entries}, summaries: {summaries}".format(**result))
+	finally:
+		frappe.destroy()
+
+
+@click.command("rebuild-po-stocked-qty")
+@pass_context
+def rebuild_po_stocked_qty(context):
+	"""全量重算采购订单行最终入库量及是否入库满（Purchase Order Item.br_stocked_qty / br_fully_stocked）。"""
+	import frappe
+
+	from bairun_erp.utils.api.buying.po_stocked_qty import rebuild_po_stocked_qty as rebuild
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		click.echo("updated rows: {0}".format(rebuild()))
+	finally:
+		frappe.destroy()
+
+
+@click.command("rebuild-pr-item-qi-summary")
+@pass_context
+def rebuild_pr_item_qi_summary(context):
+	"""全量重算采购接收行最新质检汇总（Purchase Receipt Item.br_latest_qi 等）。"""
+	import frappe
+
+	from bairun_erp.utils.api.buying.pr_item_qi_summary import rebuild_pr_item_qi_summary as rebuild
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		click.echo("updated rows: {0}".format(rebuild()))
+	finally:
+		frappe.destroy()
+
+
+@click.command("rebuild-bom-where-used")
+@pass_context
+def rebuild_bom_where_used(context):
+	"""全量重建 BOM 展开反查索引（BR BOM Where Used）。"""
+	import frappe
+
+	from bairun_erp.utils.api.material.bom_where_used import rebuild_bom_where_used as rebuild
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		click.echo("index rows: {0}".format(rebuild()))
+	finally:
+		frappe.destroy()
+
+
+@click.command("outsourcing-stage-timing")
+@click.option("--from-date", default=None, help="起始日期 YYYY-MM-DD，默认截止日前 6 天")
+@click.option("--to-date", default=None, help="截止日期 YYYY-MM-DD，默认今天")
+@click.option("--status", default=None, help="仅统计某状态：Success / Partial / Failed")
+@pass_context
+def outsourcing_stage_timing(context, from_date=None, to_date=None, status=None):
+	"""MES 委外提交分阶段耗时 p50 / p95 / p99（MES Blank Outsourcing Log）。"""
+	import frappe
+
+	from bairun_erp.utils.api.mes.outsourcing_stage_timing import (
+		build_stage_timing_report,
+		format_stage_timing_report,
+	)
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		report = build_stage_timing_report(from_date=from_date, to_date=to_date, status=status)
+		click.echo(format_stage_timing_report(report))
+	finally:
+		frappe.destroy()
+
+
+@click.command("explain-hot-queries")
+@click.option("--all", "show_all", is_flag=True, default=False, help="同时列出已走索引的查询")
+@pass_context
+def explain_hot_queries(context, show_all=False):
+	"""EXPLAIN 白名单接口的代表性查询，报告仍全表扫描的表（见 bairun_erp.utils.db_indexes）。"""
+	import frappe
+
+	from bairun_erp.utils.db_indexes import explain_hot_queries as _explain, format_explain_report
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		click.echo(format_explain_report(_explain(), show_all=show_all))
+	finally:
+		frappe.destroy()
+
+
+commands = [
+	rebuild_warehouse_flow_summary,
+	rebuild_po_stocked_qty,
+	rebuild_pr_item_qi_summary,
+	rebuild_bom_where_used,
+	outsourcing_stage_timing,
+	explain_hot_queries,
+]
@@ -139,7 +139,46 @@ override_doctype_class = {
 doc_events = {
 	"Item": {
 		"validate": "bairun_erp.item_events.ensure_cost_details_for_process_suppliers",
-	}
+	},
+	"BOM": {
+		"on_update": "bairun_erp.bom_events.invalidate_bom_caches",
+		"on_submit": "bairun_erp.bom_events.update_bom_where_used",
+		"on_update_after_submit": [
+			"bairun_erp.bom_events.invalidate_bom_caches",
+			"bairun_erp.bom_events.update_bom_where_used",
+		],
+		"on_cancel": [
+			"bairun_erp.bom_events.invalidate_bom_caches",
+			"bairun_erp.bom_events.update_bom_where_used",
+		],
+		"on_trash": "bairun_erp.bom_events.invalidate_bom_caches",
+	},
+	"Stock Entry": {
+		"on_update": "bairun_erp.stock_entry_events.update_warehouse_flow_summary",
+		# 提交时 Frappe 先触发 on_update 再触发 on_submit，汇总只在 on_update 中维护一次
+		"on_submit": "bairun_erp.stock_entry_events.update_po_stocked_qty",
+		"on_cancel": [
+			"bairun_erp.stock_entry_events.update_warehouse_flow_summary",
+			"bairun_erp.stock_entry_events.update_po_stocked_qty",
+		],
+		"on_trash": "bairun_erp.stock_entry_events.update_warehouse_flow_summary",
+	},
+	"Purchase Order": {
+		"on_update_after_submit": "bairun_erp.purchase_order_events.update_po_fully_stocked",
+	},
+	"Purchase Receipt": {
+		"on_update": "bairun_erp.purchase_receipt_events.update_warehouse_flow_summary",
+		"on_update_after_submit": "bairun_erp.purchase_receipt_events.update_warehouse_flow_summary",
+	},
+	"Quality Inspection": {
+		"on_submit": "bairun_erp.quality_inspection_events.update_pr_item_qi_summary",
+		"on_cancel": "bairun_erp.quality_inspection_events.update_pr_item_qi_summary",
+	},
+	"Warehouse": {
+		"on_update": "bairun_erp.warehouse_events.clear_warehouse_alias_cache",
+		"after_rename": "bairun_erp.warehouse_events.clear_warehouse_alias_cache",
+		"on_trash": "bairun_erp.warehouse_events.clear_warehouse_alias_cache",
+	},
 }
 
 # Scheduled Tasks
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+
+
+def execute():
+	"""Bairun 自定义 DocType 热点查询列补复合索引（单列 search_index 已随 DocType 同步）。"""
+	from bairun_erp.utils.db_indexes import add_hot_lookup_indexes
+
+	add_hot_lookup_indexes()
@@ -0,0 +1,14 @@
+from __future__ import unicode_literals
+
+import frappe
+
+
+def execute():
+	"""BR Warehouse Flow Summary 上线：建唯一键 flow_key_unique，按现有 Stock Entry 全量回填到库/委外流水与汇总（只重建一次）。"""
+	from bairun_erp.bairun_erp.doctype.br_warehouse_flow_summary.br_warehouse_flow_summary import on_doctype_update
+	from bairun_erp.utils.api.stock.warehouse_flow_summary import FLOW_SUMMARY_DOCTYPE, rebuild_warehouse_flow_summary
+
+	# 汇总行可由流水重算：先清空，避免已有的重复行使唯一键创建失败
+	frappe.db.delete(FLOW_SUMMARY_DOCTYPE)
+	on_doctype_update()
+	rebuild_warehouse_flow_summary()
@@ -0,0 +1,16 @@
+from __future__ import unicode_literals
+
+import frappe
+from frappe.modules.utils import sync_customizations
+
+
+def execute():
+	"""Purchase Order Item.br_stocked_qty / br_fully_stocked 上线：补索引并按已提交入库单全量回填（一次 UPDATE 同时写两个字段）。"""
+	from bairun_erp.utils.api.buying.po_stocked_qty import rebuild_po_stocked_qty
+
+	# post_model_sync 补丁先于 custom/*.json 同步执行，先同步以确保字段（及 br_fully_stocked 索引）已存在
+	sync_customizations("bairun_erp")
+	frappe.clear_cache(doctype="Purchase Order Item")
+	# 增量重算按 PR 反查入库明细，需 reference_purchase_receipt 索引
+	frappe.db.add_index("Stock Entry Detail", ["reference_purchase_receipt"])
+	rebuild_po_stocked_qty()
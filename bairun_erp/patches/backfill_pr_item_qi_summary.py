@@ -0,0 +1,16 @@
+from __future__ import unicode_literals
+
+import frappe
+from frappe.modules.utils import sync_customizations
+
+
+def execute():
+	"""Purchase Receipt Item 质检汇总列上线：补索引并按已提交质检单全量回填。"""
+	from bairun_erp.utils.api.buying.pr_item_qi_summary import rebuild_pr_item_qi_summary
+
+	# post_model_sync 补丁先于 custom/*.json 同步执行，先同步以确保字段已存在
+	sync_customizations("bairun_erp")
+	frappe.clear_cache(doctype="Purchase Receipt Item")
+	# 增量重算按 (PR, PR 行) 反查质检单
+	frappe.db.add_index("Quality Inspection", ["reference_name", "child_row_reference"])
+	rebuild_pr_item_qi_summary()
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+
+
+def update_po_fully_stocked(doc, method=None):
+	"""采购订单提交后改数量（Update Items）时重算各行是否已入库满（Purchase Order Item.br_fully_stocked）。"""
+	from bairun_erp.utils.api.buying.po_stocked_qty import update_for_purchase_order
+
+	update_for_purchase_order(doc)
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+
+
+def update_warehouse_flow_summary(doc, method=None):
+	"""采购接收单修改后，销售订单号 / 行库位变化时刷新引用它的毛坯到库流水与汇总（BR Warehouse Flow Summary）。"""
+	from bairun_erp.utils.api.stock.warehouse_flow_summary import update_for_purchase_receipt
+
+	update_for_purchase_receipt(doc)
@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+
+
+def update_pr_item_qi_summary(doc, method=None):
+	"""质检单提交 / 取消后维护采购接收行的最新质检汇总（Purchase Receipt Item.br_latest_qi 等）。"""
+	from bairun_erp.utils.api.buying.pr_item_qi_summary import update_for_quality_inspection
+
+	update_for_quality_inspection(doc)
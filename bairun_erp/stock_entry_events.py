@@ -0,0 +1,16 @@
+from __future__ import unicode_literals
+
+
+def update_warehouse_flow_summary(doc, method=None):
+	"""Stock Entry 保存 / 提交 / 取消 / 删除后增量维护毛坯、半成品到库与委外汇总。"""
+	from bairun_erp.utils.api.stock.warehouse_flow_summary import update_for_stock_entry
+
+	removed = method == "on_trash" or doc.docstatus == 2
+	update_for_stock_entry(doc.name, removed=removed)
+
+
+def update_po_stocked_qty(doc, method=None):
+	"""Material Receipt 入库单提交 / 取消后维护采购订单行最终入库量（Purchase Order Item.br_stocked_qty）。"""
+	from bairun_erp.utils.api.buying.po_stocked_qty import update_for_stock_entry
+
+	update_for_stock_entry(doc)
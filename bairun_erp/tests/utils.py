@@ -0,0 +1,71 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+单元测试共用的 mock 工具：批量 patch、带 name 的 mock 文档、假 meta、BOMTree 节点。
+
+用法:
+	from bairun_erp.tests.utils import patch_attrs, start_patches
+
+	with patch_attrs(mod.frappe, get_all={"return_value": rows}, enqueue=None) as mocks:
+		...
+	mocks["enqueue"].assert_called_once()
+
+	def setUp(self):
+		self.mocks = start_patches(self, mod.frappe, get_all={"return_value": rows})
+"""
+
+from __future__ import unicode_literals
+
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+
+def _patch_kwargs(value):
+	if value is None:
+		return {}
+	if isinstance(value, dict):
+		return value
+	return {"new": value}
+
+
+@contextmanager
+def patch_attrs(target, **attrs):
+	"""
+	对同一对象批量 patch.object，返回 {属性名: mock}。
+	值为 None 用默认 MagicMock；为 dict 时作为 patch 参数（return_value / side_effect 等）；其余值原样替换。
+	"""
+	with ExitStack() as stack:
+		yield {name: stack.enter_context(patch.object(target, name, **_patch_kwargs(value))) for name, value in attrs.items()}
+
+
+def start_patches(testcase, target, **attrs):
+	"""setUp 中使用：参数同 patch_attrs，用例结束时经 addCleanup 自动还原。"""
+	stack = ExitStack()
+	testcase.addCleanup(stack.close)
+	return stack.enter_context(patch_attrs(target, **attrs))
+
+
+def named_mock(name, **attrs):
+	"""带 name 属性的 MagicMock（MagicMock(name=...) 的 name 是 mock 自身的名称，不能直接传）。"""
+	doc = MagicMock(**attrs)
+	doc.name = name
+	return doc
+
+
+def fake_meta(fieldnames):
+	"""只支持 get_field 的假 meta：fieldnames 中的字段视为存在。"""
+	fieldnames = set(fieldnames)
+	return SimpleNamespace(get_field=lambda fieldname: fieldname in fieldnames or None)
+
+
+def bom_tree_leaf(item_code, exploded_qty):
+	"""BOMTree 叶子节点（无子 BOM 的物料）。"""
+	return SimpleNamespace(item_code=item_code, is_bom=False, exploded_qty=exploded_qty, child_items=[])
+
+
+def bom_tree_node(name, item_code, exploded_qty, *children):
+	"""BOMTree 含子 BOM 的节点，children 为其下级节点。"""
+	return SimpleNamespace(
+		name=name, item_code=item_code, is_bom=True, exploded_qty=exploded_qty, child_items=list(children)
+	)
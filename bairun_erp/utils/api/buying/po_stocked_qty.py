@@ -0,0 +1,121 @@
+# Copyright (c) 2026, Bairun and contributors
+# 采购订单行「最终入库数量」汇总：Purchase Order Item.br_stocked_qty，及是否已入库满 br_fully_stocked。
+# 口径与采购未交列表原实时统计一致：已提交且 purpose=Material Receipt 的 Stock Entry 明细 qty，
+# 经 sed.reference_purchase_receipt -> PR 子表 purchase_order_item 归属到 PO 行汇总。
+# Stock Entry on_submit / on_cancel 时仅重算该入库单涉及 PR 关联的 PO 行（见 stock_entry_events）；
+# 采购订单提交后改数量（Update Items）时按新数量重算 br_fully_stocked（见 purchase_order_events）；
+# 全量回填:
+#   bench --site site2.local execute bairun_erp.utils.api.buying.po_stocked_qty.rebuild_po_stocked_qty
+#   或 bench --site site2.local rebuild-po-stocked-qty
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.utils import cint, flt
+
+STOCKED_QTY_FIELD = "br_stocked_qty"
+# 入库量 >= 订单数量；采购未交列表按 br_fully_stocked = 0 过滤（带索引），不再逐行计算 qty - 入库量
+FULLY_STOCKED_FIELD = "br_fully_stocked"
+
+# 按 PO 行汇总最终入库量；{poi_filter} 为可选的 PO 行范围条件
+_STOCKED_SUM_SQL = """
+	SELECT pri.purchase_order_item AS poi_key, SUM(sed.qty) AS sum_stocked
+	FROM `tabStock Entry Detail` sed
+	INNER JOIN `tabStock Entry` se ON se.name = sed.parent
+		AND se.docstatus = 1
+		AND se.purpose = 'Material Receipt'
+	INNER JOIN `tabPurchase Receipt Item` pri ON pri.parent = sed.reference_purchase_receipt
+	WHERE IFNULL(pri.purchase_order_item, '') != '' {poi_filter}
+	GROUP BY pri.purchase_order_item
+"""
+
+
+def has_stocked_qty_field():
+	return bool(frappe.get_meta("Purchase Order Item").get_field(STOCKED_QTY_FIELD))
+
+
+def has_fully_stocked_field():
+	return bool(frappe.get_meta("Purchase Order Item").get_field(FULLY_STOCKED_FIELD))
+
+
+def is_fully_stocked(qty, stocked_qty):
+	return 1 if flt(stocked_qty) >= flt(qty) else 0
+
+
+def _get_po_items_for_purchase_receipts(pr_names):
+	pr_names = list({n for n in pr_names if n})
+	if not pr_names:
+		return []
+	rows = frappe.get_all(
+		"Purchase Receipt Item",
+		filters={"parent": ["in", pr_names], "purchase_order_item": ["is", "set"]},
+		fields=["purchase_order_item"],
+	)
+	return list({r.purchase_order_item for r in rows})
+
+
+def update_stocked_qty_for_po_items(poi_names):
+	"""重算指定 PO 行的 br_stocked_qty 与 br_fully_stocked（一条汇总查询 + 一条订单数量查询 + 逐行回写）。"""
+	poi_names = list({n for n in poi_names if n})
+	if not poi_names or not has_stocked_qty_field():
+		return
+	rows = frappe.db.sql(
+		_STOCKED_SUM_SQL.format(poi_filter="AND pri.purchase_order_item IN %(pois)s"),
+		{"pois": tuple(poi_names)},
+		as_dict=True,
+	)
+	stocked = {r.poi_key: r.sum_stocked or 0 for r in rows}
+	with_flag = has_fully_stocked_field()
+	qty_by_poi = {}
+	if with_flag:
+		qty_by_poi = dict(
+			frappe.get_all(
+				"Purchase Order Item", filters={"name": ["in", poi_names]}, fields=["name", "qty"], as_list=True
+			)
+		)
+	for poi in poi_names:
+		values = {STOCKED_QTY_FIELD: stocked.get(poi, 0)}
+		if with_flag:
+			values[FULLY_STOCKED_FIELD] = is_fully_stocked(qty_by_poi.get(poi), values[STOCKED_QTY_FIELD])
+		frappe.db.set_value("Purchase Order Item", poi, values, update_modified=False)
+
+
+def update_for_stock_entry(doc):
+	"""Material Receipt 入库单提交 / 取消后，重算其 PR 关联的 PO 行入库量。"""
+	if doc.get("purpose") != "Material Receipt":
+		return
+	pr_names = [d.get("reference_purchase_receipt") for d in doc.get("items") or []]
+	update_stocked_qty_for_po_items(_get_po_items_for_purchase_receipts(pr_names))
+
+
+def update_for_purchase_order(doc):
+	"""采购订单提交后改数量（Update Items）：按新数量重算各行 br_fully_stocked，仅回写有变化的行。"""
+	if not has_fully_stocked_field():
+		return
+	for row in doc.get("items") or []:
+		if not row.get("name"):
+			continue
+		flag = is_fully_stocked(row.get("qty"), row.get(STOCKED_QTY_FIELD))
+		if flag != cint(row.get(FULLY_STOCKED_FIELD)):
+			frappe.db.set_value("Purchase Order Item", row.name, FULLY_STOCKED_FIELD, flag, update_modified=False)
+
+
+def rebuild_po_stocked_qty():
+	"""全量回填所有 PO 行的 br_stocked_qty 与 br_fully_stocked（单条 UPDATE ... JOIN）。返回实际变更的行数。"""
+	if not has_stocked_qty_field():
+		return 0
+	set_flag = ""
+	if has_fully_stocked_field():
+		set_flag = ", poi.`{flag}` = IF(IFNULL(stocked_matched.sum_stocked, 0) >= poi.qty, 1, 0)".format(
+			flag=FULLY_STOCKED_FIELD
+		)
+	frappe.db.sql(
+		"""
+		UPDATE `tabPurchase Order Item` poi
+		LEFT JOIN ({stocked}) stocked_matched ON stocked_matched.poi_key = poi.name
+		SET poi.`{field}` = IFNULL(stocked_matched.sum_stocked, 0){set_flag}
+		""".format(stocked=_STOCKED_SUM_SQL.format(poi_filter=""), field=STOCKED_QTY_FIELD, set_flag=set_flag)
+	)
+	count = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+	frappe.db.commit()
+	return count
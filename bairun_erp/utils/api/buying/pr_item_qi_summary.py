@@ -0,0 +1,106 @@
+# Copyright (c) 2026, Bairun and contributors
+# 采购接收行「最新已提交质检」汇总：Purchase Receipt Item.br_latest_qi / br_latest_qi_status /
+# br_latest_qi_creation / br_qi_count。口径与入库质检列表一致：
+# reference_type=Purchase Receipt + reference_name + child_row_reference=PR 子表 name，且 QI docstatus=1，
+# 最新一条按 creation 取。
+# Quality Inspection on_submit / on_cancel 时仅重算该质检单对应的 PR 行（见 quality_inspection_events）；
+# 全量回填:
+#   bench --site site2.local execute bairun_erp.utils.api.buying.pr_item_qi_summary.rebuild_pr_item_qi_summary
+#   或 bench --site site2.local rebuild-pr-item-qi-summary
+
+from __future__ import unicode_literals
+
+import frappe
+
+LATEST_QI_FIELD = "br_latest_qi"
+LATEST_QI_STATUS_FIELD = "br_latest_qi_status"
+LATEST_QI_CREATION_FIELD = "br_latest_qi_creation"
+QI_COUNT_FIELD = "br_qi_count"
+
+
+def has_qi_summary_fields():
+	meta = frappe.get_meta("Purchase Receipt Item")
+	return all(
+		meta.get_field(f)
+		for f in (LATEST_QI_FIELD, LATEST_QI_STATUS_FIELD, LATEST_QI_CREATION_FIELD, QI_COUNT_FIELD)
+	)
+
+
+def update_qi_summary_for_pr_items(pairs):
+	"""重算指定 (purchase_receipt, pr_item_name) 的质检汇总列（一条查询 + 逐行回写）。"""
+	pairs = list(dict.fromkeys((pr, pri) for pr, pri in pairs if pr and pri))
+	if not pairs or not has_qi_summary_fields():
+		return
+	placeholders = ", ".join(["(%s,%s)"] * len(pairs))
+	qis = frappe.db.sql(
+		"""
+		SELECT reference_name, child_row_reference, name, status, creation
+		FROM `tabQuality Inspection`
+		WHERE reference_type = 'Purchase Receipt'
+		AND docstatus = 1
+		AND (reference_name, child_row_reference) IN ({})
+		ORDER BY creation DESC, name ASC
+		""".format(placeholders),
+		[x for t in pairs for x in t],
+		as_dict=True,
+	)
+	latest, counts = {}, {}
+	for q in qis:
+		key = (q.reference_name, q.child_row_reference)
+		latest.setdefault(key, q)
+		counts[key] = counts.get(key, 0) + 1
+
+	for key in pairs:
+		q = latest.get(key)
+		frappe.db.set_value(
+			"Purchase Receipt Item",
+			key[1],
+			{
+				LATEST_QI_FIELD: q.name if q else None,
+				LATEST_QI_STATUS_FIELD: q.status if q else None,
+				LATEST_QI_CREATION_FIELD: q.creation if q else None,
+				QI_COUNT_FIELD: counts.get(key, 0),
+			},
+			update_modified=False,
+		)
+
+
+def update_for_quality_inspection(doc):
+	"""质检单提交 / 取消后，重算其关联 PR 行的质检汇总列。"""
+	if doc.get("reference_type") != "Purchase Receipt":
+		return
+	update_qi_summary_for_pr_items([(doc.get("reference_name"), doc.get("child_row_reference"))])
+
+
+def rebuild_pr_item_qi_summary():
+	"""全量回填所有 PR 行的质检汇总列（单条 UPDATE ... JOIN）。返回实际变更的行数。"""
+	if not has_qi_summary_fields():
+		return 0
+	frappe.db.sql(
+		"""
+		UPDATE `tabPurchase Receipt Item` pri
+		LEFT JOIN (
+			SELECT reference_name, child_row_reference, COUNT(*) AS cnt, MAX(creation) AS max_creation
+			FROM `tabQuality Inspection`
+			WHERE reference_type = 'Purchase Receipt' AND docstatus = 1
+			GROUP BY reference_name, child_row_reference
+		) agg ON agg.reference_name = pri.parent AND agg.child_row_reference = pri.name
+		LEFT JOIN `tabQuality Inspection` qi ON qi.reference_type = 'Purchase Receipt'
+			AND qi.docstatus = 1
+			AND qi.reference_name = pri.parent
+			AND qi.child_row_reference = pri.name
+			AND qi.creation = agg.max_creation
+		SET pri.`{latest}` = qi.name,
+			pri.`{status}` = qi.status,
+			pri.`{creation}` = qi.creation,
+			pri.`{count}` = IFNULL(agg.cnt, 0)
+		""".format(
+			latest=LATEST_QI_FIELD,
+			status=LATEST_QI_STATUS_FIELD,
+			creation=LATEST_QI_CREATION_FIELD,
+			count=QI_COUNT_FIELD,
+		)
+	)
+	count = frappe.db.sql("SELECT ROW_COUNT()")[0][0]
+	frappe.db.commit()
+	return count
@@ -563,6 +563,18 @@ def _do_insert_save_po(order_data):
 	return po
 
 
+def insert_purchase_order(order_data):
+	"""
+	校验并保存、提交一张采购订单（与 save_purchase_order 相同的校验与回写），不 commit / rollback，由调用方控制事务。
+	供在外层事务或 savepoint 内生单的调用方使用（如 MES 批量委外）。
+	返回 (po_doc, None) 或 (None, {"error": ...})。
+	"""
+	order_data, err = _validate_order_data(order_data)
+	if err:
+		return None, err
+	return _do_insert_save_po(order_data), None
+
+
 def _parse_order_data_list(order_data_list, kwargs):
 	"""解析批量接口的 order_data_list：支持 json_data 包装及 order_data_list / orders 键。"""
 	if not order_data_list and kwargs.get("json_data"):
@@ -632,11 +644,9 @@ def save_purchase_order(order_data=None, *args, **kwargs):
 		else:
 			order_data = _parse_order_data(order_data, kwargs)
 
-		order_data, err = _validate_order_data(order_data)
+		po, err = insert_purchase_order(order_data)
 		if err:
 			return err
-
-		po = _do_insert_save_po(order_data)
 		frappe.db.commit()
 
 		doc_as_dict = po.as_dict()
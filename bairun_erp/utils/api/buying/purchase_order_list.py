@@ -12,6 +12,9 @@ from collections import defaultdict
 
 import frappe
 
+from bairun_erp.utils import keyset
+from bairun_erp.utils.api.buying.po_stocked_qty import FULLY_STOCKED_FIELD, STOCKED_QTY_FIELD
+
 
 # 列表返回的字段（主表可直接取的）
 _PO_LIST_FIELDS = [
@@ -36,6 +39,19 @@ _PO_LIST_FIELDS = [
 # 主表可能存在的自定义字段（若不存在则跳过）
 _PO_OPTIONAL_FIELDS = ("customer_order", "custom_purchase_type", "warehouse_slot", "warehouse")
 
+# 游标分页（见 bairun_erp.utils.keyset）：采购订单列表仅支持按非空列单字段排序
+_PO_LIST_CURSOR_SCOPE = "purchase_order_list"
+_PO_LIST_CURSOR_COLUMNS = {"creation": "creation", "modified": "modified", "transaction_date": "transaction_date"}
+
+# 采购未交列表：order_by 逻辑列名 -> SQL 表达式（游标模式），行唯一键为 PO 子表 name
+_UNFULFILLED_CURSOR_SCOPE = "purchase_order_unfulfilled_list"
+_UNFULFILLED_ORDER_COLUMNS = {
+	"creation": "po.creation",
+	"purchase_order": "po.name",
+	"transaction_date": "po.transaction_date",
+	"idx": "item.idx",
+}
+
 
 def _parse_params(kwargs):
 	"""从 kwargs 或 json_data 解析 filters, order_by, limit_start, limit_page_length 及可选 search_*。"""
@@ -47,6 +63,7 @@ def _parse_params(kwargs):
 		"search_customer_order": None,
 		"search_supplier": None,
 		"search_item_name": None,
+		"cursor": None,
 	}
 	jd = kwargs.get("json_data")
 	if jd is None:
@@ -66,6 +83,7 @@ def _parse_params(kwargs):
 	params["search_customer_order"] = jd.get("search_customer_order") or jd.get("search_customer_order_no")
 	params["search_supplier"] = jd.get("search_supplier")
 	params["search_item_name"] = jd.get("search_item_name")
+	params["cursor"] = keyset.read_cursor_param(jd)
 	return params
 
 
@@ -194,8 +212,11 @@ def get_purchase_order_list(**kwargs):
 	  search_customer_order: str（可选），按销售订单号模糊过滤
 	  search_supplier: str（可选），按供应商编码/名称模糊过滤
 	  search_item_name: str（可选），按物料名称模糊过滤（子表汇总后过滤）
+	  cursor: str（可选），传入即为游标分页（首页传 ""），忽略 limit_start；order_by 仅支持 creation / modified /
+	    transaction_date 单字段（+ name 兜底）
 
 	返回: { "message": [ { "header": {...}, "lines": [ {...}, ... ] }, ... ] }，header 为主表字段，lines 为子表明细。
+	  游标模式另返回 next_cursor（无下一页为 null）；按物料/销售订单号在内存过滤时，一页可能少于 limit_page_length。
 	"""
 	params = _parse_params(kwargs)
 	limit_start = int(params["limit_start"])
@@ -225,16 +246,31 @@ def get_purchase_order_list(**kwargs):
 
 	order_by = params["order_by"] or "creation desc"
 
-	po_list = frappe.get_list(
-		"Purchase Order",
-		fields=requested,
+	cursor = params.get("cursor")
+	if cursor is not None:
+		keys = keyset.parse_order_by(order_by, _PO_LIST_CURSOR_COLUMNS, "creation desc", ("name", True))
+		if len(keys) > 2 or keys[-1][0] != "name":
+			frappe.throw(frappe._("Cursor pagination supports a single sort column (creation, modified or transaction_date)"))
+		order_by = keyset.order_sql(keys)
+		filters, limit_start = keyset.get_list_seek(
+			"Purchase Order", filters, or_filters, keys, keyset.decode_cursor(cursor, _PO_LIST_CURSOR_SCOPE, keys)
+		)
+
+	list_kwargs = dict(
 		filters=filters,
 		or_filters=or_filters if or_filters else None,
 		order_by=order_by,
 		limit_start=limit_start,
-		limit_page_length=limit_page_length,
 		ignore_permissions=False,
 	)
+	if cursor is not None:
+		po_list, frappe.response["next_cursor"] = keyset.get_list_page(
+			"Purchase Order", requested, limit_page_length, _PO_LIST_CURSOR_SCOPE, keys, **list_kwargs
+		)
+	else:
+		po_list = frappe.get_list(
+			"Purchase Order", fields=requested, limit_page_length=limit_page_length, **list_kwargs
+		)
 
 	po_names = [r.get("name") for r in po_list if r.get("name")]
 	item_names_by_po, customer_orders_by_po = _get_item_aggregates(po_names)
@@ -360,25 +396,20 @@ def _enrich_unfulfilled_rows_qc_pr(rows):
 		as_dict=True,
 	)
 
-	def _latest_qi_for_line(po, po_item_name, item_code):
-		best = None
-		for rec in qi_rows_for_po:
-			if rec.get("purchase_order") != po:
-				continue
-			poi = (rec.get("purchase_order_item") or "").strip()
-			if poi:
-				if poi != po_item_name:
-					continue
-			else:
-				if rec.get("item_code") != item_code:
-					continue
-			if not best:
-				best = rec
-			else:
-				rc, bc = rec.get("creation"), best.get("creation")
-				if rc and (not bc or rc > bc):
-					best = rec
-		return best.get("qi_name") if best else None
+	# 单次遍历建立索引：(PO, PO 行) 与 (PO, item_code)（仅 purchase_order_item 为空的质检）各自的最新质检，
+	# 每行只做两次字典查找，避免逐行扫描全部质检（原实现为 行数 × 质检数）。
+	latest_qi_by_po_item = {}
+	latest_qi_by_po_itemcode = {}
+	for seq, rec in enumerate(qi_rows_for_po):
+		po = rec.get("purchase_order")
+		poi = (rec.get("purchase_order_item") or "").strip()
+		if poi:
+			index, key = latest_qi_by_po_item, (po, poi)
+		else:
+			index, key = latest_qi_by_po_itemcode, (po, rec.get("item_code"))
+		prev = index.get(key)
+		if not prev or _is_newer_qi(rec, prev[1]):
+			index[key] = (seq, rec)
 
 	for r in rows:
 		qty = _flt(r.get("qty"))
@@ -406,7 +437,26 @@ def _enrich_unfulfilled_rows_qc_pr(rows):
 				break
 
 		r["pending_qc"] = pending_qc
-		r["latest_quality_inspection"] = _latest_qi_for_line(po, po_item_name, item_code)
+		best = _pick_latest_qi(
+			latest_qi_by_po_item.get((po, po_item_name)),
+			latest_qi_by_po_itemcode.get((po, item_code)),
+		)
+		r["latest_quality_inspection"] = best.get("qi_name") if best else None
+
+
+def _is_newer_qi(rec, best):
+	"""rec 排在 best 之后时是否取代之：仅当 rec 有创建时间且严格更新（同时间保留先出现者）。"""
+	rc, bc = rec.get("creation"), best.get("creation")
+	return bool(rc and (not bc or rc > bc))
+
+
+def _pick_latest_qi(*entries):
+	"""合并多个索引命中的 (序号, 质检) 项，按原始出现顺序比较，返回最新一条质检记录。"""
+	best = None
+	for _seq, rec in sorted(e for e in entries if e):
+		if not best or _is_newer_qi(rec, best):
+			best = rec
+	return best
 
 
 @frappe.whitelist()
@@ -414,11 +464,14 @@ def get_purchase_order_unfulfilled_list(**kwargs):
 	"""
 	采购未交列表：返回未交数量 > 0 的采购订单行扁平列表。
 	POST json_data: filters, order_by, limit_start, limit_page_length,
-	  search_customer_order, search_supplier, search_item_name
-	返回: { "message": [ 未交行对象, ... ], "total_count": 总条数 }
+	  search_customer_order, search_supplier, search_item_name,
+	  cursor（可选，传入即为游标分页，首页传 ""；忽略 limit_start）
+	返回: { "message": [ 未交行对象, ... ], "total_count": 总条数 }，游标模式另返回 next_cursor（无下一页为 null）
 
 	未交口径（业务）：以「最终入库」为准——已提交且 purpose=Material Receipt 的 Stock Entry 明细数量
 	（经 PR 行 purchase_order_item 关联到本 PO 行汇总），不满订单数量则仍为未交。
+	该汇总预存于 Purchase Order Item.br_stocked_qty（入库单提交/取消时维护，见 po_stocked_qty），
+	是否入库满预存于 br_fully_stocked（带索引，列表按其过滤）；字段未同步时回退为实时汇总。
 	PO/PR 的 received_qty 仅表示 ERP 收货回写，PR 收讫但未做质检入库时仍计为未交。
 
 	未交行对象除原有字段外包含：
@@ -445,6 +498,10 @@ def get_purchase_order_unfulfilled_list(**kwargs):
 	po_meta = frappe.get_meta("Purchase Order")
 	item_meta = frappe.get_meta("Purchase Order Item")
 	has_po_customer_order = bool(po_meta.get_field("customer_order"))
+	if item_meta.get_field(STOCKED_QTY_FIELD):
+		stocked_expr = "IFNULL(item.`{}`, 0)".format(STOCKED_QTY_FIELD)
+	else:
+		stocked_expr = "COALESCE(stocked_matched.sum_stocked, 0)"
 
 	select_parts = [
 		"po.name as purchase_order",
@@ -457,7 +514,7 @@ def get_purchase_order_unfulfilled_list(**kwargs):
 		"item.item_name as item_name",
 		"item.qty as qty",
 		"IFNULL(item.received_qty, 0) as po_line_received_qty",
-		"COALESCE(stocked_matched.sum_stocked, 0) AS stocked_qty",
+		stocked_expr + " AS stocked_qty",
 		"item.rate as rate",
 		"item.amount as amount",
 		"item.warehouse as warehouse",
@@ -473,9 +530,13 @@ def get_purchase_order_unfulfilled_list(**kwargs):
 		if item_meta.get_field(f):
 			select_parts.append("item.{} as {}".format(f, f))
 
+	if item_meta.get_field(FULLY_STOCKED_FIELD):
+		unfulfilled_cond = "item.`{}` = 0".format(FULLY_STOCKED_FIELD)
+	else:
+		unfulfilled_cond = "(item.qty - {}) > 0".format(stocked_expr)
 	conditions = [
 		"po.status NOT IN ('Cancelled', 'Closed')",
-		"(item.qty - COALESCE(stocked_matched.sum_stocked, 0)) > 0",
+		unfulfilled_cond,
 	]
 	values = []
 
@@ -502,8 +563,21 @@ def get_purchase_order_unfulfilled_list(**kwargs):
 	if "creation" in order_sql.lower():
 		order_sql = order_sql.replace("creation", "po.creation").replace("CREATION", "po.creation")
 
-	# 最终入库量：已提交入库单（Material Receipt）明细 qty，按 PR 子表 purchase_order_item 归属到 PO 行
-	_stock_join_sql = """
+	# 游标模式：按 (排序键, PO 子表 name) 定位下一页，代替 LIMIT offset
+	cursor = params.get("cursor")
+	seek_values = []
+	if cursor is not None:
+		keys = keyset.parse_order_by(
+			order_by, _UNFULFILLED_ORDER_COLUMNS, "creation desc, purchase_order asc, idx asc", ("item.name", False)
+		)
+		seek_sql, seek_values = keyset.seek_condition(
+			keys, keyset.decode_cursor(cursor, _UNFULFILLED_CURSOR_SCOPE, keys)
+		)
+		order_sql = keyset.order_sql(keys)
+		select_parts.append(keyset.key_select_sql(keys))
+
+	# 最终入库量（仅 br_stocked_qty 字段缺失时）：已提交入库单（Material Receipt）明细 qty，按 PR 子表 purchase_order_item 归属到 PO 行
+	_stock_join_sql = "" if item_meta.get_field(STOCKED_QTY_FIELD) else """
 		LEFT JOIN (
 			SELECT pri.purchase_order_item AS poi_key, SUM(sed.qty) AS sum_stocked
 			FROM `tabStock Entry Detail` sed
@@ -540,14 +614,24 @@ def get_purchase_order_unfulfilled_list(**kwargs):
 	except Exception:
 		pass
 
-	data_sql = base_sql + " ORDER BY " + order_sql
-	if use_limit:
+	data_sql = base_sql
+	if cursor is not None:
+		data_sql += " AND " + seek_sql
+	data_sql += " ORDER BY " + order_sql
+	if use_limit and cursor is not None:
+		data_sql += " LIMIT %s"
+		run_values = values + seek_values + [limit_page_length + 1]
+	elif use_limit:
 		data_sql += " LIMIT %s, %s"
 		run_values = values + [limit_start, limit_page_length]
 	else:
-		run_values = values
+		run_values = values + seek_values
 
 	rows = frappe.db.sql(data_sql, run_values, as_dict=True)
+	if cursor is not None:
+		rows, frappe.response["next_cursor"] = keyset.paginate_rows(
+			rows, limit_page_length, _UNFULFILLED_CURSOR_SCOPE, keys
+		)
 	out = []
 	for r in rows:
 		qty = _flt(r.get("qty"))
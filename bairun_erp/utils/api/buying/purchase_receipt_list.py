@@ -10,6 +10,16 @@ import json
 
 import frappe
 
+from bairun_erp.utils import keyset
+
+# 游标分页（见 bairun_erp.utils.keyset）：order_by 逻辑列名 -> SQL 表达式，行唯一键为 PR 子表 name
+_CURSOR_SCOPE = "purchase_receipt_details_list"
+_ORDER_COLUMNS = {
+	"receipt_name": "pr.name",
+	"posting_date": "pr.posting_date",
+	"idx": "item.idx",
+}
+
 
 def _parse_params(kwargs):
 	"""从 kwargs 或 json_data 解析 filters, order_by, limit_start, limit_page_length 及 search_*。"""
@@ -21,6 +31,7 @@ def _parse_params(kwargs):
 		"search_customer_order": None,
 		"search_supplier": None,
 		"search_item_name": None,
+		"cursor": None,
 	}
 	jd = kwargs.get("json_data")
 	if jd is None:
@@ -40,6 +51,7 @@ def _parse_params(kwargs):
 	params["search_customer_order"] = jd.get("search_customer_order")
 	params["search_supplier"] = jd.get("search_supplier")
 	params["search_item_name"] = jd.get("search_item_name")
+	params["cursor"] = keyset.read_cursor_param(jd)
 	return params
 
 
@@ -64,8 +76,9 @@ def get_purchase_receipt_details_list(**kwargs):
 	  search_customer_order: str（可选），销售订单号模糊
 	  search_supplier: str（可选），供应商编码/名称模糊
 	  search_item_name: str（可选），物料名称模糊
+	  cursor: str（可选），传入即为游标分页（首页传 ""），忽略 limit_start
 
-	返回: { "message": [ 明细行对象, ... ], "total_count": 总条数 }
+	返回: { "message": [ 明细行对象, ... ], "total_count": 总条数 }，游标模式另返回 next_cursor（无下一页为 null）
 	"""
 	params = _parse_params(kwargs)
 	order_by = (params.get("order_by") or "posting_date desc, receipt_name asc, idx asc").strip()
@@ -141,6 +154,17 @@ def get_purchase_receipt_details_list(**kwargs):
 		.replace("idx", "item.idx")
 	)
 
+	# 游标模式：按 (排序键, PR 子表 name) 定位下一页，代替 LIMIT offset
+	cursor = params.get("cursor")
+	seek_values = []
+	if cursor is not None:
+		keys = keyset.parse_order_by(
+			order_by, _ORDER_COLUMNS, "posting_date desc, receipt_name asc, idx asc", ("item.name", False)
+		)
+		seek_sql, seek_values = keyset.seek_condition(keys, keyset.decode_cursor(cursor, _CURSOR_SCOPE, keys))
+		order_sql = keyset.order_sql(keys)
+		select_parts.append(keyset.key_select_sql(keys))
+
 	base_sql = """
 		SELECT {}
 		FROM `tabPurchase Receipt` pr
@@ -160,14 +184,22 @@ def get_purchase_receipt_details_list(**kwargs):
 	except Exception:
 		pass
 
-	data_sql = base_sql + " ORDER BY " + order_sql
-	if use_limit:
+	data_sql = base_sql
+	if cursor is not None:
+		data_sql += " AND " + seek_sql
+	data_sql += " ORDER BY " + order_sql
+	if use_limit and cursor is not None:
+		data_sql += " LIMIT %s"
+		run_values = values + seek_values + [limit_page_length + 1]
+	elif use_limit:
 		data_sql += " LIMIT %s, %s"
 		run_values = values + [limit_start, limit_page_length]
 	else:
-		run_values = values
+		run_values = values + seek_values
 
 	rows = frappe.db.sql(data_sql, run_values, as_dict=True)
+	if cursor is not None:
+		rows, frappe.response["next_cursor"] = keyset.paginate_rows(rows, limit_page_length, _CURSOR_SCOPE, keys)
 	out = []
 	for r in rows:
 		order_qty = _flt(r.get("order_qty"))
@@ -14,6 +14,13 @@ from collections import defaultdict
 import frappe
 from frappe.utils import flt, get_datetime_str
 
+from bairun_erp.utils import keyset
+from bairun_erp.utils.api.buying.pr_item_qi_summary import (
+	LATEST_QI_STATUS_FIELD,
+	QI_COUNT_FIELD,
+	has_qi_summary_fields,
+)
+
 _MAX_PAGE = 100
 _DEFAULT_PAGE = 20
 
@@ -25,6 +32,9 @@ _ORDER_BY_MAP = {
 	"creation": "pr.creation",
 }
 
+# 游标分页（见 bairun_erp.utils.keyset）：行唯一键为 PR 子表 name
+_CURSOR_SCOPE = "inbound_qc_list"
+
 
 def _parse_inbound_params(kwargs):
 	params = {
@@ -40,6 +50,7 @@ def _parse_inbound_params(kwargs):
 		"from_posting_date": None,
 		"to_posting_date": None,
 		"qi_status": None,
+		"cursor": None,
 	}
 	jd = kwargs.get("json_data")
 	if jd is None:
@@ -55,6 +66,7 @@ def _parse_inbound_params(kwargs):
 	for k in list(params.keys()):
 		if k in jd and jd.get(k) is not None:
 			params[k] = jd.get(k)
+	params["cursor"] = keyset.read_cursor_param(jd)
 	return params
 
 
@@ -154,36 +166,43 @@ def _batch_qi_summary_for_pairs(pairs):
 	return out
 
 
-def _latest_stock_entry_name(purchase_receipt, item_code):
-	"""与 submit 写入的 reference_purchase_receipt + 行物料一致；多行同料时取最近一张入库单。"""
-	if not purchase_receipt or not item_code:
-		return None
-	r = frappe.db.sql(
+def _batch_latest_stock_entry_for_pairs(pairs):
+	"""
+	pairs: [(purchase_receipt, item_code), ...]
+	返回: (pr, item_code) -> 最近一张已提交 Material Receipt 入库单号。
+	与 submit 写入的 reference_purchase_receipt + 行物料一致；一次查询取整页，按 creation 倒序取每组第一条。
+	"""
+	pairs = list(dict.fromkeys((pr, ic) for pr, ic in pairs if pr and ic))
+	if not pairs:
+		return {}
+	placeholders = ", ".join(["(%s,%s)"] * len(pairs))
+	flat = [x for t in pairs for x in t]
+	rows = frappe.db.sql(
 		"""
-		SELECT se.name
+		SELECT sed.reference_purchase_receipt, sed.item_code, se.name, MAX(se.creation) AS _mc
 		FROM `tabStock Entry` se
 		INNER JOIN `tabStock Entry Detail` sed ON sed.parent = se.name
 		WHERE se.docstatus = 1 AND se.purpose = 'Material Receipt'
-		AND sed.reference_purchase_receipt = %s AND sed.item_code = %s
-		ORDER BY se.creation DESC
-		LIMIT 1
-		""",
-		(purchase_receipt, item_code),
+		AND (sed.reference_purchase_receipt, sed.item_code) IN ({})
+		GROUP BY sed.reference_purchase_receipt, sed.item_code, se.name
+		ORDER BY _mc DESC, se.name DESC
+		""".format(placeholders),
+		flat,
 		as_dict=True,
 	)
-	return r[0]["name"] if r else None
+	out = {}
+	for r in rows:
+		out.setdefault((r.get("reference_purchase_receipt"), r.get("item_code")), r.get("name"))
+	return out
 
 
-def _append_qc_sql_filters(conditions, values, qc_line_status, qi_status):
-	"""
-	qc_line_status: all | pending | done
-	qi_status: Accepted | Rejected | None — 仅对「最新一笔 QI」结论筛选（与需求文档一致）。
-	"""
-	st = (qc_line_status or "all").strip().lower()
-	qs = (qi_status or "").strip()
-	if qs not in ("Accepted", "Rejected"):
-		qs = None
+def _latest_stock_entry_name(purchase_receipt, item_code):
+	"""单个 (PR, 物料) 的最近入库单；列表请用 _batch_latest_stock_entry_for_pairs。"""
+	return _batch_latest_stock_entry_for_pairs([(purchase_receipt, item_code)]).get((purchase_receipt, item_code))
 
+
+def _qc_exists_sql():
+	"""未回填质检汇总列时的回退：按 Quality Inspection 子查询判断（已检 / 待检 / 最新一笔结论）。"""
 	base_exists = """
 EXISTS (
 	SELECT 1 FROM `tabQuality Inspection` qix
@@ -219,6 +238,26 @@ EXISTS (
 	)
 )
 """
+	return base_exists, base_not_exists, latest_status_match
+
+
+def _append_qc_sql_filters(conditions, values, qc_line_status, qi_status):
+	"""
+	qc_line_status: all | pending | done
+	qi_status: Accepted | Rejected | None — 仅对「最新一笔 QI」结论筛选（与需求文档一致）。
+	"""
+	st = (qc_line_status or "all").strip().lower()
+	qs = (qi_status or "").strip()
+	if qs not in ("Accepted", "Rejected"):
+		qs = None
+
+	if has_qi_summary_fields():
+		# PR 行上已预存最新质检状态与质检数（见 pr_item_qi_summary），直接按列筛选
+		base_exists = "pri.`{}` > 0".format(QI_COUNT_FIELD)
+		base_not_exists = "pri.`{}` = 0".format(QI_COUNT_FIELD)
+		latest_status_match = "pri.`{}` = %s".format(LATEST_QI_STATUS_FIELD)
+	else:
+		base_exists, base_not_exists, latest_status_match = _qc_exists_sql()
 
 	if st == "pending":
 		conditions.append(base_not_exists)
@@ -253,8 +292,9 @@ def get_inbound_qc_list(**kwargs):
 	  search_purchase_receipt, search_supplier, search_item, search_purchase_order, search_sales_order,
 	  from_posting_date, to_posting_date (YYYY-MM-DD),
 	  qi_status: Accepted | Rejected（在 qc_line_status 为 all/done 时按「最新 QI」筛选）
+	  cursor: 可选，传入即为游标分页（首页传 ""），忽略 limit_start
 
-	响应: frappe.response.message = { "items": [...], "total_count": N }
+	响应: frappe.response.message = { "items": [...], "total_count": N }，游标模式另含 next_cursor（无下一页为 null）
 	"""
 	params = _parse_inbound_params(kwargs)
 	limit_start = int(params.get("limit_start") or 0)
@@ -350,13 +390,34 @@ def get_inbound_qc_list(**kwargs):
 	count_row = frappe.db.sql(count_sql, values, as_dict=True)
 	total_count = int(count_row[0]["cnt"]) if count_row else 0
 
-	data_sql = "SELECT " + ", ".join(select_parts) + from_sql + where_extra + " ORDER BY " + order_sql
-	data_sql += " LIMIT %s, %s"
-	run_values = list(values) + [limit_start, limit_page_length]
-	rows = frappe.db.sql(data_sql, run_values, as_dict=True)
+	cursor = params.get("cursor")
+	if cursor is None:
+		data_sql = "SELECT " + ", ".join(select_parts) + from_sql + where_extra + " ORDER BY " + order_sql
+		data_sql += " LIMIT %s, %s"
+		run_values = list(values) + [limit_start, limit_page_length]
+		rows = frappe.db.sql(data_sql, run_values, as_dict=True)
+	else:
+		# 游标模式：按 (排序键, PR 子表 name) 定位下一页，代替 LIMIT offset
+		keys = keyset.parse_order_by(
+			params.get("order_by"), _ORDER_BY_MAP, "posting_date desc, purchase_receipt desc, idx asc", ("pri.name", False)
+		)
+		seek_sql, seek_values = keyset.seek_condition(keys, keyset.decode_cursor(cursor, _CURSOR_SCOPE, keys))
+		data_sql = (
+			"SELECT " + ", ".join(select_parts + [keyset.key_select_sql(keys)])
+			+ from_sql + where_extra + " AND " + seek_sql
+			+ " ORDER BY " + keyset.order_sql(keys) + " LIMIT %s"
+		)
+		rows = frappe.db.sql(data_sql, list(values) + seek_values + [limit_page_length + 1], as_dict=True)
+		rows, next_cursor = keyset.paginate_rows(rows, limit_page_length, _CURSOR_SCOPE, keys)
 
 	pairs = [(r.get("purchase_receipt"), r.get("pr_item_name")) for r in rows]
 	summ = _batch_qi_summary_for_pairs(pairs)
+	# 仅有已提交 QI 的行需要入库单号，整页一次查询
+	stock_entry_by_pair = _batch_latest_stock_entry_for_pairs(
+		(r.get("purchase_receipt"), r.get("item_code"))
+		for r in rows
+		if (summ.get((r.get("purchase_receipt"), r.get("pr_item_name"))) or {}).get("latest_qi")
+	)
 
 	items = []
 	for r in rows:
@@ -406,7 +467,7 @@ def get_inbound_qc_list(**kwargs):
 					"qi_defective_handling": (latest.get("custom_defective_handling") or "").strip() or None,
 					"qi_modified": get_datetime_str(latest.get("modified")) if latest.get("modified") else None,
 					"qi_inspector": latest.get("inspected_by"),
-					"stock_entry": _latest_stock_entry_name(r.get("purchase_receipt"), r.get("item_code")),
+					"stock_entry": stock_entry_by_pair.get((r.get("purchase_receipt"), r.get("item_code"))),
 				}
 			)
 		else:
@@ -427,6 +488,8 @@ def get_inbound_qc_list(**kwargs):
 		items.append(item)
 
 	frappe.response["message"] = {"items": items, "total_count": total_count}
+	if cursor is not None:
+		frappe.response["message"]["next_cursor"] = next_cursor
 	return
 
 
@@ -0,0 +1,117 @@
+# Copyright (c) 2026, Bairun and contributors
+# 采购未交列表 _enrich_unfulfilled_rows_qc_pr：最新质检与逐行全表扫描一致、按预分组索引每行查找一次（不依赖数据库数据）。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.buying.test_purchase_order_unfulfilled_enrich
+
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils.api.buying import purchase_order_list
+
+
+def _build_fixture(line_count, qi_count, po_size=10):
+	"""构造 line_count 个 PO 行、qi_count 条已提交质检；约 1/5 质检的 PR 行未填 purchase_order_item（按 item_code 兜底）。"""
+	base = datetime(2026, 1, 1)
+	rows = []
+	for i in range(line_count):
+		rows.append({
+			"purchase_order": "PO-{:05d}".format(i // po_size),
+			"po_item_name": "POI-{:06d}".format(i),
+			"item_code": "ITEM-{:05d}".format(i % (po_size * 3)),
+			"qty": 10,
+			"po_received_qty": i % 12,
+		})
+	pr_items = []
+	qi_rows = []
+	for j in range(qi_count):
+		line = rows[(j * 7) % line_count]
+		poi = "" if j % 5 == 0 else line["po_item_name"]
+		pr_items.append(frappe._dict(
+			purchase_receipt="PR-{:05d}".format(j // 4),
+			pr_item_name="PRI-{:06d}".format(j),
+			purchase_order=line["purchase_order"],
+			purchase_order_item=poi,
+			item_code=line["item_code"],
+			posting_date=base.date(),
+			creation=base,
+		))
+		qi_rows.append(frappe._dict(
+			purchase_order=line["purchase_order"],
+			purchase_order_item=poi,
+			item_code=line["item_code"],
+			qi_name="QI-{:06d}".format(j),
+			# 时间有重复，覆盖「同创建时间取先出现者」的规则
+			creation=base + timedelta(minutes=(j * 37) % 5000),
+		))
+	qis = [
+		frappe._dict(reference_name=p.purchase_receipt, child_row_reference=p.pr_item_name, name=q.qi_name, creation=q.creation)
+		for p, q in zip(pr_items, qi_rows)
+		if int(q.qi_name[3:]) % 3
+	]
+	return rows, pr_items, qis, qi_rows
+
+
+def _fake_sql(pr_items, qis, qi_rows):
+	def _sql(query, *args, **kwargs):
+		if "FROM `tabPurchase Receipt Item` pri" in query:
+			return pr_items
+		if "child_row_reference, name, creation" in query:
+			return qis
+		return qi_rows
+	return _sql
+
+
+def _naive_latest_qi(qi_rows, po, po_item_name, item_code):
+	"""原逐行全表扫描实现，作为对照。"""
+	best = None
+	for rec in qi_rows:
+		if rec.get("purchase_order") != po:
+			continue
+		poi = (rec.get("purchase_order_item") or "").strip()
+		if poi:
+			if poi != po_item_name:
+				continue
+		elif rec.get("item_code") != item_code:
+			continue
+		if not best:
+			best = rec
+		else:
+			rc, bc = rec.get("creation"), best.get("creation")
+			if rc and (not bc or rc > bc):
+				best = rec
+	return best.get("qi_name") if best else None
+
+
+class TestEnrichUnfulfilledRowsQcPr(FrappeTestCase):
+	def _enrich(self, rows, pr_items, qis, qi_rows):
+		with patch.object(purchase_order_list.frappe.db, "sql", side_effect=_fake_sql(pr_items, qis, qi_rows)):
+			purchase_order_list._enrich_unfulfilled_rows_qc_pr(rows)
+
+	def test_latest_qi_matches_full_scan(self):
+		rows, pr_items, qis, qi_rows = _build_fixture(300, 1200)
+		self._enrich(rows, pr_items, qis, qi_rows)
+		for r in rows:
+			self.assertEqual(
+				r["latest_quality_inspection"],
+				_naive_latest_qi(qi_rows, r["purchase_order"], r["po_item_name"], r["item_code"]),
+			)
+			self.assertEqual(r["can_create_pr"], (r["qty"] - r["po_received_qty"]) > 0)
+
+	def test_latest_qi_looked_up_once_per_row_from_grouped_index(self):
+		rows, pr_items, qis, qi_rows = _build_fixture(30, 120)
+		with patch.object(
+			purchase_order_list, "_pick_latest_qi", wraps=purchase_order_list._pick_latest_qi
+		) as pick:
+			self._enrich(rows, pr_items, qis, qi_rows)
+		# 每行只合并 (PO, PO 行) 与 (PO, item_code) 两个索引命中项，不再扫描全部质检
+		self.assertEqual(pick.call_count, len(rows))
+		for call in pick.call_args_list:
+			self.assertEqual(len(call.args), 2)
+			for entry in call.args:
+				self.assertTrue(entry is None or isinstance(entry[1], dict))
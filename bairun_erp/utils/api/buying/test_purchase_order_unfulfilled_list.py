@@ -6,9 +6,13 @@
 
 from __future__ import unicode_literals
 
+from types import SimpleNamespace
+from unittest.mock import patch
+
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from bairun_erp.utils.api.buying import po_stocked_qty
 from bairun_erp.utils.api.buying.purchase_order_list import get_purchase_order_unfulfilled_list
 
 
@@ -101,3 +105,34 @@ class TestPurchaseOrderUnfulfilledList(FrappeTestCase):
 		)
 		self.assertIn("message", frappe.response)
 		self.assertIn("total_count", frappe.response)
+
+
+class TestFullyStockedFlag(FrappeTestCase):
+	"""br_fully_stocked 随入库量与订单数量维护（列表按其过滤）"""
+
+	def test_flag_written_with_stocked_qty(self):
+		sums = [SimpleNamespace(poi_key="POI-1", sum_stocked=10), SimpleNamespace(poi_key="POI-2", sum_stocked=3)]
+		with patch.object(po_stocked_qty, "has_stocked_qty_field", return_value=True), patch.object(
+			po_stocked_qty, "has_fully_stocked_field", return_value=True
+		), patch.object(po_stocked_qty.frappe.db, "sql", return_value=sums), patch.object(
+			po_stocked_qty.frappe, "get_all", return_value=[("POI-1", 10), ("POI-2", 5), ("POI-3", 1)]
+		), patch.object(po_stocked_qty.frappe.db, "set_value") as set_value:
+			po_stocked_qty.update_stocked_qty_for_po_items(["POI-1", "POI-2", "POI-3"])
+		written = {c.args[1]: c.args[2] for c in set_value.call_args_list}
+		self.assertEqual(written["POI-1"], {"br_stocked_qty": 10, "br_fully_stocked": 1})
+		self.assertEqual(written["POI-2"], {"br_stocked_qty": 3, "br_fully_stocked": 0})
+		self.assertEqual(written["POI-3"], {"br_stocked_qty": 0, "br_fully_stocked": 0})
+
+	def test_qty_change_after_submit_updates_changed_rows_only(self):
+		doc = SimpleNamespace(items=[
+			frappe._dict(name="POI-1", qty=12, br_stocked_qty=10, br_fully_stocked=1),
+			frappe._dict(name="POI-2", qty=5, br_stocked_qty=5, br_fully_stocked=1),
+		])
+		doc.get = lambda key, default=None: getattr(doc, key, default)
+		with patch.object(po_stocked_qty, "has_fully_stocked_field", return_value=True), patch.object(
+			po_stocked_qty.frappe.db, "set_value"
+		) as set_value:
+			po_stocked_qty.update_for_purchase_order(doc)
+		set_value.assert_called_once_with(
+			"Purchase Order Item", "POI-1", "br_fully_stocked", 0, update_modified=False
+		)
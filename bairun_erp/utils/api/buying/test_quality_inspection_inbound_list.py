@@ -5,9 +5,16 @@
 
 from __future__ import unicode_literals
 
+from unittest.mock import patch
+
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from bairun_erp.utils.api.buying.pr_item_qi_summary import (
+	LATEST_QI_FIELD,
+	QI_COUNT_FIELD,
+	has_qi_summary_fields,
+)
 from bairun_erp.utils.api.buying.purchase_order_list import get_purchase_order_unfulfilled_list
 from bairun_erp.utils.api.buying.quality_inspection_inbound_list import (
 	get_inbound_qc_line_detail,
@@ -104,6 +111,37 @@ class TestQualityInspectionInboundList(FrappeTestCase):
 			"未交列表 pending_qc 应对应入库质检 pending 列表中的同一 PR 行",
 		)
 
+	def test_list_query_count_independent_of_page_size(self):
+		"""整页的 QI 摘要与入库单号均为批量查询：每页 SQL 次数不随行数增长。"""
+		get_inbound_qc_list(json_data={"qc_line_status": "done", "limit_page_length": 100})
+		page_rows = len(frappe.response["message"]["items"])
+		if page_rows < 2:
+			self.skipTest("已检 PR 行不足，跳过")
+
+		def _count_sql(page_length):
+			with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+				get_inbound_qc_list(json_data={"qc_line_status": "done", "limit_page_length": page_length})
+			self.assertEqual(len(frappe.response["message"]["items"]), page_length)
+			return sql.call_count
+
+		# 1 行与 N 行的 SQL 次数相同
+		self.assertEqual(_count_sql(page_rows), _count_sql(1))
+
+	def test_qi_summary_columns_match_list(self):
+		"""PR 行上预存的最新质检 / 质检数应与列表实时汇总一致。"""
+		if not has_qi_summary_fields():
+			self.skipTest("质检汇总列未同步，跳过")
+		get_inbound_qc_list(json_data={"qc_line_status": "done", "limit_page_length": 20})
+		items = frappe.response["message"]["items"]
+		if not items:
+			self.skipTest("无已检 PR 行，跳过")
+		for row in items:
+			stored = frappe.db.get_value(
+				"Purchase Receipt Item", row["pr_item_name"], [LATEST_QI_FIELD, QI_COUNT_FIELD], as_dict=True
+			)
+			self.assertEqual(stored[QI_COUNT_FIELD], row["quality_inspection_count"])
+			self.assertEqual(stored[LATEST_QI_FIELD], row["quality_inspection"])
+
 	def test_detail_requires_params(self):
 		with self.assertRaises(Exception):
 			get_inbound_qc_line_detail(json_data={})
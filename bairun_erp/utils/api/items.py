@@ -2,10 +2,14 @@
 # Whitelisted for API access
 import frappe
 from frappe import _
+from frappe.utils import cint
 import json
 from erpnext.controllers.item_variant import create_variant
 
 
+def _logger():
+    return frappe.logger("bairun_erp.items")
+
 
 # bench --site site1.local execute rongguan_erp.utils.api.items.get_items_with_attributes --kwargs '{"filters": {"item_group": "成品"}}'
 @frappe.whitelist(allow_guest=False)  # 确保只允许认证用户访问
@@ -43,7 +47,8 @@ def get_items_by_item_group_expanded_by_target_customers(item_group="成品", pa
     - 供给客户：取物料的第一个供给客户（若有），用于展示
 
     每行包含：BOM 编号、物料基础信息 + Item 自定义字段 + customer/customer_name。
-    分页、total_count 均按 BOM 维度计算。
+    分页、total_count 均按 BOM 维度计算，且在 SQL 侧完成（COUNT + LIMIT/OFFSET），
+    创建人姓名、Item 自定义字段、第一个供给客户按当前页批量 join，查询次数与物料组规模无关。
 
     分页参数：
     - page_number: 页码，从 1 开始，默认 1
@@ -51,10 +56,13 @@ def get_items_by_item_group_expanded_by_target_customers(item_group="成品", pa
 
     返回：{ total_count, total_pages, page_number, page_size, data }
     """
-    print("[get_items_by_item_group_expanded] 入口参数: item_group=%r (type=%s), page_number=%r, page_size=%r" % (item_group, type(item_group).__name__, page_number, page_size))
+    _logger().debug(
+        "[get_items_by_item_group_expanded] 入口参数: item_group=%r (type=%s), page_number=%r, page_size=%r",
+        item_group, type(item_group).__name__, page_number, page_size,
+    )
 
     if not item_group:
-        print("[get_items_by_item_group_expanded] 早期返回: 物料组为空")
+        _logger().debug("[get_items_by_item_group_expanded] 早期返回: 物料组为空")
         return {"error": _("物料组不能为空")}
 
     # 规范化 item_group：支持单个字符串或列表
@@ -62,19 +70,19 @@ def get_items_by_item_group_expanded_by_target_customers(item_group="成品", pa
         try:
             parsed = json.loads(item_group)
             item_groups = [parsed] if isinstance(parsed, str) else list(parsed)
-            print("[get_items_by_item_group_expanded] 字符串解析 JSON 后: item_groups=%s" % (item_groups,))
+            _logger().debug("[get_items_by_item_group_expanded] 字符串解析 JSON 后: item_groups=%s", item_groups)
         except (json.JSONDecodeError, TypeError) as e:
             item_groups = [item_group]
-            print("[get_items_by_item_group_expanded] 字符串未解析为 JSON，按单值: item_groups=%s (e=%s)" % (item_groups, e))
+            _logger().debug("[get_items_by_item_group_expanded] 字符串未解析为 JSON，按单值: item_groups=%s (e=%s)", item_groups, e)
     elif isinstance(item_group, (list, tuple)):
         item_groups = [g for g in item_group if g]
-        print("[get_items_by_item_group_expanded] 列表/元组: item_groups=%s" % (item_groups,))
+        _logger().debug("[get_items_by_item_group_expanded] 列表/元组: item_groups=%s", item_groups)
     else:
         item_groups = [str(item_group)]
-        print("[get_items_by_item_group_expanded] 其他类型转字符串: item_groups=%s" % (item_groups,))
+        _logger().debug("[get_items_by_item_group_expanded] 其他类型转字符串: item_groups=%s", item_groups)
 
     if not item_groups:
-        print("[get_items_by_item_group_expanded] 早期返回: 规范化后物料组为空")
+        _logger().debug("[get_items_by_item_group_expanded] 早期返回: 规范化后物料组为空")
         return {"error": _("物料组不能为空")}
 
     page_number = int(page_number) if page_number is not None else 1
@@ -85,98 +93,90 @@ def get_items_by_item_group_expanded_by_target_customers(item_group="成品", pa
         page_size = 50
     if page_size > 500:
         page_size = 500
-    print("[get_items_by_item_group_expanded] 分页参数: page_number=%s, page_size=%s" % (page_number, page_size))
+    _logger().debug("[get_items_by_item_group_expanded] 分页参数: page_number=%s, page_size=%s", page_number, page_size)
+
+    # 以 BOM 为主线：总数与分页均在 SQL 侧完成，每页只取 page_size 条 BOM
+    group_params = {"item_groups": tuple(item_groups)}
+    total_count = frappe.db.sql("""
+        SELECT COUNT(*)
+        FROM `tabBOM` AS bom
+        INNER JOIN `tabItem` AS item ON item.name = bom.item AND item.item_group IN %(item_groups)s
+    """, group_params)[0][0] or 0
+    total_pages = (total_count + page_size - 1) // page_size if page_size else 0
+    start = (page_number - 1) * page_size
 
-    # 以 BOM 为主线：查询指定物料组下所有 BOM，按 BOM 创建时间倒序
-    if len(item_groups) == 1:
-        print("[get_items_by_item_group_expanded] SQL 分支: 单物料组, item_group=%r" % (item_groups[0],))
-        bom_list = frappe.db.sql("""
-            SELECT bom.name AS bom_name, bom.item, bom.creation, bom.owner,
-                   bom.docstatus, bom.modified_by, bom.modified
-            FROM `tabBOM` AS bom
-            INNER JOIN `tabItem` AS item ON item.name = bom.item AND item.item_group = %s
-            ORDER BY bom.creation DESC
-        """, (item_groups[0],), as_dict=True)
-    else:
-        print("[get_items_by_item_group_expanded] SQL 分支: 多物料组 IN, item_groups=%s" % (item_groups,))
+    # 按 BOM 创建时间倒序取当前页，同时 join 物料字段与创建人姓名
+    bom_list = []
+    if start < total_count:
         bom_list = frappe.db.sql("""
             SELECT bom.name AS bom_name, bom.item, bom.creation, bom.owner,
-                   bom.docstatus, bom.modified_by, bom.modified
+                   bom.docstatus, bom.modified_by, bom.modified,
+                   item.item_code, item.item_name, item.item_group, item.stock_uom, item.disabled,
+                   item.custom_diameter_width, item.custom_height,
+                   item.custom_inner_cover_width, item.custom_material,
+                   usr.full_name AS owner_name
             FROM `tabBOM` AS bom
             INNER JOIN `tabItem` AS item ON item.name = bom.item AND item.item_group IN %(item_groups)s
-            ORDER BY bom.creation DESC
-        """, {"item_groups": tuple(item_groups)}, as_dict=True)
-
-    print("[get_items_by_item_group_expanded] BOM 查询结果条数: len(bom_list)=%s" % len(bom_list))
-    if bom_list:
-        print("[get_items_by_item_group_expanded] BOM 前 3 条: %s" % ([{"bom_name": r.get("bom_name"), "item": r.get("item")} for r in bom_list[:3]]))
-
-    result = []
+            LEFT JOIN `tabUser` AS usr ON usr.name = bom.owner
+            ORDER BY bom.creation DESC, bom.name DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        """, dict(group_params, limit=page_size, offset=start), as_dict=True)
+
+    # 本页物料的第一个供给客户（按 idx），一次查询并 join 客户名称
+    first_customer_by_item = {}
+    page_items = list({r.item for r in bom_list if r.get("item")})
+    if page_items:
+        tc_rows = frappe.db.sql("""
+            SELECT tc.parent, tc.customer, cust.customer_name
+            FROM `tabBR Item Target Customer` AS tc
+            LEFT JOIN `tabCustomer` AS cust ON cust.name = tc.customer
+            WHERE tc.parenttype = 'Item' AND tc.parentfield = 'br_target_customers'
+              AND tc.parent IN %(items)s
+            ORDER BY tc.parent, tc.idx
+        """, {"items": tuple(page_items)}, as_dict=True)
+        for tc in tc_rows:
+            first_customer_by_item.setdefault(tc.parent, tc)
+
+    data = []
     for bom_row in bom_list:
         item_name = bom_row.get("item")
         if not item_name:
             continue
 
-        doc = frappe.get_doc("Item", item_name)
-        d = doc.as_dict()
-
-        # 物料基础信息（常用字段）
-        base = {
-            "name": bom_row.get("bom_name"),  # 行主键建议使用 BOM 的 name
-            "item_code": d.get("item_code"),
-            "item_name": d.get("item_name"),
-            "item_group": d.get("item_group"),
-            "stock_uom": d.get("stock_uom"),
-            "disabled": d.get("disabled"),
-        }
-        # Item 自定义字段
-        base["custom_diameter_width"] = d.get("custom_diameter_width")
-        base["custom_height"] = d.get("custom_height")
-        base["custom_inner_cover_width"] = d.get("custom_inner_cover_width")
-        base["custom_material"] = d.get("custom_material")
-
-        # BOM 清单编号：当前 BOM 的 name
-        base["bom_no"] = bom_row.get("bom_name")
-        base["bom_list_no"] = bom_row.get("bom_name")
-
-        # 创建日期、创建人（取自 BOM）
-        base["creation"] = bom_row.get("creation")
-        base["owner"] = bom_row.get("owner")
-        owner_id = bom_row.get("owner")
-        base["owner_name"] = (
-            frappe.get_value("User", owner_id, "full_name") if owner_id else None
-        )
         # 审核人、审核日期（取自当前 BOM，已提交时）
-        base["approved_by"] = None
-        base["approved_on"] = None
-        if bom_row.get("docstatus") == 1:
-            base["approved_by"] = bom_row.get("modified_by")
-            base["approved_on"] = bom_row.get("modified")
-
+        submitted = bom_row.get("docstatus") == 1
         # 取第一个供给客户（若有），用于展示，不按客户展开行
-        target_customers = d.get("br_target_customers") or []
-        customer = None
-        customer_name = None
-        if target_customers:
-            customer = target_customers[0].get("customer")
-            if customer and frappe.db.exists("Customer", customer):
-                customer_name = frappe.get_value("Customer", customer, "customer_name")
-
-        result.append({
-            **base,
-            "customer": customer,
-            "customer_name": customer_name,
-        })
+        tc = first_customer_by_item.get(item_name) or {}
 
-    total_count = len(result)
-    total_pages = (total_count + page_size - 1) // page_size if page_size else 0
-    start = (page_number - 1) * page_size
-    end = start + page_size
-    data = result[start:end]
+        data.append({
+            "name": bom_row.get("bom_name"),  # 行主键建议使用 BOM 的 name
+            "item_code": bom_row.get("item_code"),
+            "item_name": bom_row.get("item_name"),
+            "item_group": bom_row.get("item_group"),
+            "stock_uom": bom_row.get("stock_uom"),
+            "disabled": bom_row.get("disabled"),
+            # Item 自定义字段
+            "custom_diameter_width": bom_row.get("custom_diameter_width"),
+            "custom_height": bom_row.get("custom_height"),
+            "custom_inner_cover_width": bom_row.get("custom_inner_cover_width"),
+            "custom_material": bom_row.get("custom_material"),
+            # BOM 清单编号：当前 BOM 的 name
+            "bom_no": bom_row.get("bom_name"),
+            "bom_list_no": bom_row.get("bom_name"),
+            # 创建日期、创建人（取自 BOM）
+            "creation": bom_row.get("creation"),
+            "owner": bom_row.get("owner"),
+            "owner_name": bom_row.get("owner_name") if bom_row.get("owner") else None,
+            "approved_by": bom_row.get("modified_by") if submitted else None,
+            "approved_on": bom_row.get("modified") if submitted else None,
+            "customer": tc.get("customer"),
+            "customer_name": tc.get("customer_name"),
+        })
 
-    print("[get_items_by_item_group_expanded] 构造结果: total_count=%s, total_pages=%s, start=%s, end=%s, len(data)=%s" % (total_count, total_pages, start, end, len(data)))
-    if data:
-        print("[get_items_by_item_group_expanded] 本页第一条 data 键: %s" % list(data[0].keys()))
+    _logger().debug(
+        "[get_items_by_item_group_expanded] 构造结果: total_count=%s, total_pages=%s, start=%s, len(data)=%s",
+        total_count, total_pages, start, len(data),
+    )
 
     return {
         "total_count": total_count,
@@ -316,78 +316,123 @@ def get_items_attribute_with_value(filters=None, fields=None):
 
     return result
 
+_BOM_ITEM_DEFAULT_FIELDS = ["qty", "uom", "item_code", "item_name"]
+
+
+def _parse_bom_item_fields(bom_item_fields):
+    """
+    解析 BOM Item 字段投影：None 时返回默认字段；[] 表示不返回 bom_items 明细（仅返回数量）。
+    仅保留 BOM Item 上真实存在的列，避免前端传入任意字段。
+    """
+    if bom_item_fields is None:
+        return list(_BOM_ITEM_DEFAULT_FIELDS)
+    if isinstance(bom_item_fields, str):
+        try:
+            bom_item_fields = json.loads(bom_item_fields)
+        except (json.JSONDecodeError, TypeError):
+            bom_item_fields = [f.strip() for f in bom_item_fields.split(",")]
+    valid_columns = set(frappe.get_meta("BOM Item").get_valid_columns())
+    return [f for f in (bom_item_fields or []) if f and f in valid_columns and f != "parent"]
+
+
+def _prefetch_child_rows(doctype, parents, fields):
+    """按 parent IN (...) 一次取出子表行，按 parent 分组返回 {parent: [row, ...]}（行内不含 parent）。"""
+    grouped = {}
+    if not parents or not fields:
+        return grouped
+    rows = frappe.get_all(
+        doctype,
+        filters={"parent": ["in", list(parents)]},
+        fields=["parent"] + list(fields),
+        order_by="parent asc, idx asc",
+    )
+    for row in rows:
+        parent = row.pop("parent")
+        grouped.setdefault(parent, []).append(row)
+    return grouped
+
+
+def _count_child_rows(doctype, parents):
+    """按 parent 分组统计子表行数，一次查询返回 {parent: count}。"""
+    if not parents:
+        return {}
+    rows = frappe.get_all(
+        doctype,
+        filters={"parent": ["in", list(parents)]},
+        fields=["parent", "count(name) as cnt"],
+        group_by="parent",
+    )
+    return {r.parent: r.cnt for r in rows}
+
+
 # bench --site site1.local execute rongguan_erp.utils.api.items.get_items_by_item_group --kwargs '{"item_group_name": "成品"}'
 @frappe.whitelist()
-def get_boms_by_item_group(item_group_name):
+def get_boms_by_item_group(item_group_name, page_number=None, page_size=None, bom_item_fields=None):
     """
     根据指定的 Item Group 获取该分类下的所有物料信息（含 BOM、工序等）
+
+    子表（规格属性、BOM 工序、BOM 明细）按整组（或当前页）批量预取，每张子表一次查询，
+    不再逐物料查询；返回结构与原先一致。
+
+    可选参数：
+    - page_number / page_size: 传入 page_size 时按物料编码分页，仅返回当前页
+    - bom_item_fields: BOM Item 字段投影（列表或逗号分隔字符串），默认 qty/uom/item_code/item_name；
+      传 [] 时不返回 bom_items 明细，仅返回 bom_items_count
     """
     if not item_group_name:
         frappe.throw(_("Item Group 名称不能为空"))
 
+    bom_item_fields = _parse_bom_item_fields(bom_item_fields)
+
+    limit_clause = ""
+    params = {"item_group": item_group_name}
+    if page_size:
+        page_size = max(int(page_size), 1)
+        page_number = max(int(page_number or 1), 1)
+        limit_clause = "LIMIT %(limit)s OFFSET %(offset)s"
+        params.update(limit=page_size, offset=(page_number - 1) * page_size)
+
     # Step 1: 使用 SQL 查询获取指定 Item Group 下且有默认 BOM 的物料
     items = frappe.db.sql("""
-        SELECT item.name, item.item_code, item.item_name, item.stock_uom, 
-               item.variant_of,bom.name as bom_name,bom.is_active,bom.is_default
+        SELECT item.name, item.item_code, item.item_name, item.stock_uom,
+               item.variant_of, bom.name as bom_name, bom.is_active, bom.is_default,
+               bom.docstatus as bom_docstatus
         FROM `tabItem` AS item
         INNER JOIN `tabBOM` AS bom ON bom.item = item.name
-        WHERE item.item_group = %s AND bom.is_active = 1 AND bom.is_default = 1
-    """, (item_group_name,), as_dict=True)
+        WHERE item.item_group = %(item_group)s AND bom.is_active = 1 AND bom.is_default = 1
+        ORDER BY item.name ASC
+        {limit_clause}
+    """.format(limit_clause=limit_clause), params, as_dict=True)
+
+    item_names = [item.name for item in items]
+    bom_names = [item.bom_name for item in items]
+
+    # Step 2: 批量预取子表，每张子表一次查询
+    attrs_by_item = _prefetch_child_rows(
+        "Item Variant Attribute", item_names, ["attribute", "attribute_value"]
+    )
+    operation_count_by_bom = _count_child_rows("BOM Operation", bom_names)
+    if bom_item_fields:
+        bom_items_by_bom = _prefetch_child_rows("BOM Item", bom_names, bom_item_fields)
+        bom_item_count_by_bom = {b: len(rows) for b, rows in bom_items_by_bom.items()}
+    else:
+        bom_items_by_bom = {}
+        bom_item_count_by_bom = _count_child_rows("BOM Item", bom_names)
 
     result = []
 
     for item in items:
-        # 获取规格信息（Item Variant Attributes）并转换为字典
-        attrs = frappe.get_all(
-            "Item Variant Attribute",
-            filters={"parent": item.name},
-            fields=["attribute", "attribute_value"]
-        )
+        # 规格信息（Item Variant Attributes）转换为字典
         specification_dict = {}
-        if attrs:
-            for attr in attrs:
-                specification_dict[attr.attribute] = attr.attribute_value  # 转换为字典格式
-
-        # Step 3: 获取工序数量（通过 Routing）
-        # boms = frappe.get_all(
-        #     "BOM",
-        #     filters={"item": item.name, "is_active": 1, "is_default": 1},
-        #     fields=["routing"]
-        # )        
-       
-        routings = frappe.get_all(
-            "BOM Operation",
-            filters={"parent": item.bom_name},
-            fields=["operation"]
-        )
-        operation_count = len(routings)
-
-        # Step 4: 获取 BOM 信息
-        bom_data = None
-        boms_info = frappe.get_all(
-            "BOM",
-            filters={"item": item.name, "is_active": 1, "is_default": 1},
-            fields=["name", "docstatus"]
-        )
-        if boms_info:
-            bom_no = boms_info[0].name
-            status = "Submitted" if boms_info[0].docstatus == 1 else "Draft"
-        else:
-            bom_no = None  # 或其他默认值
-            status = None  # 或其他默认值
-
-        bom_items = frappe.get_all(
-            "BOM Item",
-            filters={"parent": item.bom_name},
-            fields=["qty", "uom", "item_code", "item_name"]
-        )
+        for attr in attrs_by_item.get(item.name, []):
+            specification_dict[attr.attribute] = attr.attribute_value
 
-        bom_items_count = len(bom_items)
+        bom_items = bom_items_by_bom.get(item.bom_name, [])
 
         # 构建最终的 result 项（将 bom_no 和 status 提升到顶层）
         result_item = {
-            "bom_no": bom_no,  # 直接作为顶层字段
-            "status": status,  # 直接作为顶层字段
+            "bom_no": item.bom_name,  # 直接作为顶层字段
+            "status": "Submitted" if item.bom_docstatus == 1 else "Draft",  # 直接作为顶层字段
             "is_active": item.is_active,
             "is_default": item.is_default,
             "item": {
@@ -396,8 +441,8 @@ def get_boms_by_item_group(item_group_name):
                 "UOM": item.stock_uom
             },
             "bom_items": bom_items,
-            "bom_items_count": bom_items_count,
-            "bom_operation_count": operation_count,
+            "bom_items_count": bom_item_count_by_bom.get(item.bom_name, 0),
+            "bom_operation_count": operation_count_by_bom.get(item.bom_name, 0),
             "specification": specification_dict
         }
 
@@ -1359,272 +1404,88 @@ def save_item_bom_structure(bom_data):
         return {"error": f"Failed to save BOM: {str(e)}"}
 
 @frappe.whitelist()
-def bulk_save_item_boms(boms_data):
+def bulk_save_item_boms(boms_data, run_in_background=0):
     """
-    批量保存物料的 BOM 结构，并支持事务。
+    批量保存物料的 BOM 结构。
+
+    按物料依赖自底向上保存（子装配 BOM 先于父 BOM），物料与 Operation 批量预取/创建，
+    每个 BOM 独立 savepoint：单个失败不影响其余 BOM（见 material.bom_bulk_save）。
+    缺失的物料仅在数据中带 item_group 与 stock_uom（或 uom）时预建，否则该 BOM 按物料不存在失败。
 
     Args:
         boms_data (list/str): 包含多个 BOM 数据的列表或 JSON 字符串。
                                每个 BOM 数据应是 save_item_bom_structure 函数期望的字典格式。
+        run_in_background (int/bool): 为真时放入后台队列执行，立即返回 job_id，
+                               通过 bom_bulk_save.get_bom_save_job_status 查询进度与结果。
 
     Returns:
-        dict: 批量保存的结果，包含成功和失败的 BOM 列表及总体状态。
+        dict: 批量保存的结果，包含成功和失败的 BOM 列表、本次新建的物料编码（created_items）
+              及总体状态（列表按实际保存顺序）。
     """
-    
-    def check_circular_reference(boms_list):
-        """检查批量BOM数据中的循环引用"""
-        print(f"=== 检查循环引用 ===")
-        
-        # 构建物料依赖关系图
-        dependency_graph = {}
-        for bom_data in boms_list:
-            item_code = bom_data.get('item')
-            if item_code and 'items' in bom_data:
-                dependency_graph[item_code] = []
-                for item in bom_data['items']:
-                    if item.get('item_code') and item.get('item_code') != item_code:
-                        dependency_graph[item_code].append(item.get('item_code'))
-        
-        print(f"依赖关系图: {dependency_graph}")
-        
-        # 检查循环引用
-        def has_cycle(node, visited, rec_stack):
-            visited[node] = True
-            rec_stack[node] = True
-            
-            for neighbor in dependency_graph.get(node, []):
-                if neighbor in dependency_graph:  # 只检查在批量数据中的物料
-                    if not visited.get(neighbor, False):
-                        if has_cycle(neighbor, visited, rec_stack):
-                            return True
-                    elif rec_stack.get(neighbor, False):
-                        return True
-            
-            rec_stack[node] = False
-            return False
-        
-        # 检查每个物料是否有循环引用
-        for item_code in dependency_graph:
-            visited = {}
-            rec_stack = {}
-            if has_cycle(item_code, visited, rec_stack):
-                print(f"发现循环引用，涉及物料: {item_code}")
-                return True
-        
-        print(f"未发现循环引用")
-        return False
-    
-    print(f"=== bulk_save_item_boms 开始 ===")
-    print(f"接收到的 boms_data 类型: {type(boms_data)}")
-    print(f"接收到的 boms_data 内容: {boms_data}")
-    
+    from bairun_erp.utils.api.material.bom_bulk_save import enqueue_bom_save_job, save_boms_bottom_up
+
     if not boms_data:
         return {"error": "boms_data is required and cannot be empty"}
 
     # 如果 boms_data 是字符串，尝试解析为 JSON
     if isinstance(boms_data, str):
         try:
-            print(f"=== 解析JSON字符串 ===")
             boms_data = json.loads(boms_data)
-            print(f"解析后的 boms_data 类型: {type(boms_data)}")
-            print(f"解析后的 boms_data 长度: {len(boms_data) if isinstance(boms_data, list) else 'N/A'}")
         except json.JSONDecodeError:
             frappe.throw(_("Invalid JSON format for boms_data"))
 
     if not isinstance(boms_data, list):
         frappe.throw(_("boms_data must be a list of BOM dictionaries"))
 
-    print(f"=== 验证数据格式 ===")
-    print(f"BOM列表长度: {len(boms_data)}")
-    
-    # 检查循环引用
-    if check_circular_reference(boms_data):
-        return {
-            "success": False,
-            "message": "检测到BOM循环引用，请检查BOM结构",
-            "successful_boms": [],
-            "failed_boms": [{"error": "Circular reference detected in BOM structure"}]
-        }
-    
-    successful_boms = []
-    failed_boms = []
-    
-    frappe.db.begin() # 开始数据库事务
+    if cint(run_in_background):
+        return enqueue_bom_save_job("bulk_save_item_boms", boms_data=boms_data)
 
     try:
-        for idx, bom_data in enumerate(boms_data):
-            print(f"\n=== 处理第 {idx+1} 个 BOM ===")
-            print(f"BOM数据: {bom_data}")
-            
-            try:
-                # 验证基本字段
-                print(f"检查 doctype: {bom_data.get('doctype')}")
-                if bom_data.get("doctype") != "BOM":
-                    raise frappe.ValidationError(_("Invalid doctype. Must be 'BOM' for BOM at index {0}").format(idx))
-                
-                item_code = bom_data.get("item")
-                print(f"物料编码: {item_code}")
-                if not item_code:
-                    raise frappe.ValidationError(_("Item code is required for BOM at index {0}").format(idx))
-                
-                print(f"检查物料是否存在: {item_code}")
-                if not frappe.db.exists("Item", item_code):
-                    raise frappe.DoesNotExistError(f"Item {item_code} does not exist for BOM at index {idx}")
-
-                # 清理数据
-                temp_fields = ["__islocal", "__unsaved", "name"]
-                cleaned_bom_data = {k: v for k, v in bom_data.items() if k not in temp_fields}
-                print(f"清理后的BOM数据字段: {list(cleaned_bom_data.keys())}")
-                
-                # 检查BOM Items
-                if "items" in cleaned_bom_data and cleaned_bom_data["items"]:
-                    print(f"BOM Items 数量: {len(cleaned_bom_data['items'])}")
-                    for item_idx, item_data in enumerate(cleaned_bom_data["items"]):
-                        print(f"  检查第 {item_idx+1} 个BOM Item: {item_data.get('item_code')}")
-                        if not item_data.get("item_code"):
-                            raise frappe.ValidationError(_(f"Item code is required for BOM item at index {item_idx} in BOM {idx}"))
-                        if not frappe.db.exists("Item", item_data["item_code"]):
-                            raise frappe.DoesNotExistError(f"Item {item_data['item_code']} does not exist for BOM item at index {item_idx} in BOM {idx}")
-                
-                # 检查BOM Operations
-                if "operations" in cleaned_bom_data and cleaned_bom_data["operations"]:
-                    print(f"BOM Operations 数量: {len(cleaned_bom_data['operations'])}")
-                    for op_idx, operation_data in enumerate(cleaned_bom_data["operations"]):
-                        print(f"  检查第 {op_idx+1} 个BOM Operation: {operation_data.get('operation')}")
-                
-                print(f"创建BOM文档...")
-                bom_doc = frappe.get_doc(cleaned_bom_data)
-                
-                # 处理BOM Items
-                if "items" in cleaned_bom_data and cleaned_bom_data["items"]:
-                    print(f"处理BOM Items...")
-                    bom_doc.items = []
-                    filtered_items = []
-                    
-                    for item_idx, item_data in enumerate(cleaned_bom_data["items"], 1):
-                        cleaned_item_data = {k: v for k, v in item_data.items() 
-                                           if k not in ["__islocal", "__unsaved", "name", "parent"]}
-                        cleaned_item_data["idx"] = item_idx
-                        cleaned_item_data["parentfield"] = "items"
-                        cleaned_item_data["parenttype"] = "BOM"
-                        
-                        # 检查是否为自引用（物料编码与当前BOM的物料编码相同）
-                        if cleaned_item_data.get('item_code') == item_code:
-                            print(f"  跳过自引用的BOM Item: {cleaned_item_data.get('item_code')} (与当前BOM物料 {item_code} 相同)")
-                            continue
-                        
-                        print(f"  添加BOM Item: {cleaned_item_data.get('item_code')}")
-                        filtered_items.append(cleaned_item_data)
-                        bom_doc.append("items", cleaned_item_data)
-                    
-                    print(f"  原始BOM Items数量: {len(cleaned_bom_data['items'])}")
-                    print(f"  过滤后BOM Items数量: {len(filtered_items)}")
-                    
-                    # 如果没有有效的BOM Items，添加一个默认的原材料项
-                    if not filtered_items:
-                        print(f"  警告: 没有有效的BOM Items，可能需要添加默认原材料")
-                
-                # 处理BOM Operations
-                if "operations" in cleaned_bom_data and cleaned_bom_data["operations"]:
-                    print(f"处理BOM Operations...")
-                    bom_doc.operations = []
-                    for op_idx, operation_data in enumerate(cleaned_bom_data["operations"], 1):
-                        cleaned_operation_data = {k: v for k, v in operation_data.items() 
-                                                if k not in ["__islocal", "__unsaved", "name", "parent"]}
-                        cleaned_operation_data["idx"] = op_idx
-                        cleaned_operation_data["parentfield"] = "operations"
-                        cleaned_operation_data["parenttype"] = "BOM"
-                        operation_name = cleaned_operation_data.get("operation", "").strip()
-                        print(f"  添加BOM Operation: {operation_name}")
-                        if operation_name and not frappe.db.exists("Operation", operation_name):
-                            try:
-                                operation_doc = frappe.get_doc({
-                                    "doctype": "Operation",
-                                    "operation": operation_name,
-                                    "workstation": cleaned_operation_data.get("workstation")
-                                })
-                                operation_doc.insert()
-                                print(f"    创建新Operation: {operation_name}")
-                            except Exception as e:
-                                frappe.log_error(f"Error creating Operation {operation_name}: {str(e)}", "Create Operation Error")
-                        bom_doc.append("operations", cleaned_operation_data)
-                
-                # 处理Scrap Items
-                if "scrap_items" in cleaned_bom_data and cleaned_bom_data["scrap_items"]:
-                    print(f"处理Scrap Items...")
-                    bom_doc.scrap_items = []
-                    for scrap_idx, scrap_data in enumerate(cleaned_bom_data["scrap_items"], 1):
-                        cleaned_scrap_data = {k: v for k, v in scrap_data.items() 
-                                            if k not in ["__islocal", "__unsaved", "name", "parent"]}
-                        cleaned_scrap_data["idx"] = scrap_idx
-                        cleaned_scrap_data["parentfield"] = "scrap_items"
-                        cleaned_scrap_data["parenttype"] = "BOM"
-                        bom_doc.append("scrap_items", cleaned_scrap_data)
-                
-                print(f"插入BOM文档...")
-                bom_doc.insert()
-                print(f"BOM文档插入成功，名称: {bom_doc.name}")
-                
-                print(f"提交BOM文档...")
-                bom_doc.submit()
-                print(f"BOM文档提交成功")
-                
-                if bom_doc.is_default:
-                    print(f"设置为默认BOM...")
-                    frappe.db.set_value("Item", item_code, "default_bom", bom_doc.name)
-                    frappe.db.commit()  # 确保默认BOM设置被提交
-                
-                # 如果成功，记录 BOM 名称和物料编码
+        results, has_cycle = save_boms_bottom_up(boms_data)
+        if has_cycle:
+            return {
+                "success": False,
+                "message": "检测到BOM循环引用，请检查BOM结构",
+                "successful_boms": [],
+                "failed_boms": [{"error": "Circular reference detected in BOM structure"}]
+            }
+
+        successful_boms = []
+        failed_boms = []
+        created_items = []
+        for res in results:
+            if res.get("error"):
+                failed_boms.append({
+                    "item_code": res["item_code"],
+                    "error": res["error"],
+                    "error_type": res["error_type"],
+                    "original_data": boms_data[res["index"]],
+                })
+            else:
                 successful_boms.append({
-                    "item_code": item_code,
-                    "bom_name": bom_doc.name,
+                    "item_code": res["item_code"],
+                    "bom_name": res["bom_name"],
                     "message": "BOM created successfully"
                 })
-                print(f"第 {idx+1} 个BOM处理成功: {item_code} -> {bom_doc.name}")
-                
-            except Exception as e:
-                print(f"第 {idx+1} 个BOM处理失败: {str(e)}")
-                print(f"错误类型: {type(e).__name__}")
-                print(f"错误详情: {frappe.get_traceback()}")
-                
-                # 如果单个 BOM 失败，记录错误信息，但允许其他 BOM 继续处理
-                frappe.log_error(f"Error processing BOM at index {idx} for item {bom_data.get('item', 'Unknown')}: {str(e)}", "Bulk BOM Save Error")
-                failed_boms.append({
-                    "item_code": bom_data.get("item", "Unknown"),
-                    "error": str(e),
-                    "error_type": type(e).__name__,
-                    "original_data": bom_data # 可以选择包含原始数据以便调试
-                })
-        
-        # 如果有任何BOM处理失败，则整个批量操作的结果应被视为不成功
-        operation_successful = not failed_boms
+                created_items.extend(c for c in res["created_items"] if c not in created_items)
 
-        print(f"\n=== 批量处理完成 ===")
-        print(f"成功数量: {len(successful_boms)}")
-        print(f"失败数量: {len(failed_boms)}")
-        print(f"操作是否成功: {operation_successful}")
-
-        frappe.db.commit() # 所有 BOM 处理成功，提交事务
+        frappe.db.commit()
         return {
-            "success": operation_successful,
+            "success": not failed_boms,
             "message": f"Bulk BOM save operation completed. {len(successful_boms)} successful, {len(failed_boms)} failed.",
             "successful_boms": successful_boms,
-            "failed_boms": failed_boms
+            "failed_boms": failed_boms,
+            "created_items": created_items,
         }
 
     except Exception as e:
-        print(f"\n=== 批量处理出现严重错误 ===")
-        print(f"错误: {str(e)}")
-        print(f"错误类型: {type(e).__name__}")
-        print(f"错误详情: {frappe.get_traceback()}")
-        
-        frappe.db.rollback() # 任何一个 BOM 失败，回滚整个事务
+        frappe.db.rollback()
         frappe.log_error(f"Critical error during bulk BOM save: {str(e)}", "Bulk BOM Save Transaction Error")
         return {
             "success": False,
             "message": f"Bulk BOM save operation failed due to a critical error. All changes rolled back. Error: {str(e)}",
-            "successful_boms": [], # 事务回滚，所以成功列表为空
-            "failed_boms": boms_data # 或者将所有原始数据放入失败列表，因为它整体回滚了
+            "successful_boms": [],
+            "failed_boms": boms_data
         }
 
 def update_sales_order_item_bom_no(sales_order_no, item_code, bom_no):
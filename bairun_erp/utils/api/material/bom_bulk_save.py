@@ -0,0 +1,339 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+BOM 批量保存流水线：供 items.bulk_save_item_boms 与 bom_item.create_bom_from_canvas_tree 共用。
+
+- 按 BOM 之间的物料依赖拓扑排序（子装配在前），父 BOM 保存时子 BOM 已提交。
+- 批量预取：所有涉及物料与 Operation 各一次查询存在性（原实现逐行 exists）；缺失的 Operation 去重后统一创建，
+  缺失的物料仅在数据中带 item_group 与单位时预建，否则引用它的 BOM 按物料不存在失败。
+- 子装配先提交，父 BOM 保存时按子 BOM 的最终成本计算，无需保存后再回刷成本。
+- 每个 BOM 一个 savepoint：单个失败只回滚自身，不影响其余 BOM。
+- 可通过 frappe.enqueue 在后台执行（避免 gunicorn 超时），进度与结果记录在 Redis，
+  前端用 get_bom_save_job_status 轮询，或监听 realtime 事件 bom_save_job_progress。
+
+bench execute 示例:
+	bench --site site2.local execute bairun_erp.utils.api.material.bom_bulk_save.get_bom_save_job_status --kwargs '{"job_id": "xxxx"}'
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe import _
+
+from bairun_erp.utils import job_state
+
+JOB_CACHE_PREFIX = "bairun_erp:bom_save_job:"
+
+# 后台任务类型 -> 同步执行入口（以 run_in_background=0 调用）
+_JOB_METHODS = {
+	"bulk_save_item_boms": "bairun_erp.utils.api.items.bulk_save_item_boms",
+	"create_bom_from_canvas_tree": "bairun_erp.utils.api.material.bom_item.create_bom_from_canvas_tree",
+}
+
+_TEMP_FIELDS = ("__islocal", "__unsaved", "name")
+_CHILD_TEMP_FIELDS = ("__islocal", "__unsaved", "name", "parent")
+_IN_CHUNK_SIZE = 1000
+
+
+# --- 拓扑排序 ---
+
+
+def order_boms_bottom_up(boms_list):
+	"""
+	按物料依赖对 BOM 列表拓扑排序：某 BOM 的子件若是本批另一 BOM 的成品，则该子 BOM 排在前面。
+	同层保持输入顺序；忽略自引用。返回 (有序下标列表, 是否存在循环引用)。
+	"""
+	entries_by_item = {}
+	for idx, bom_data in enumerate(boms_list):
+		item_code = bom_data.get("item")
+		if item_code:
+			entries_by_item.setdefault(item_code, []).append(idx)
+
+	deps = {idx: set() for idx in range(len(boms_list))}
+	dependents = {idx: set() for idx in range(len(boms_list))}
+	for idx, bom_data in enumerate(boms_list):
+		item_code = bom_data.get("item")
+		for row in bom_data.get("items") or []:
+			child_code = row.get("item_code")
+			if not child_code or child_code == item_code:
+				continue
+			for child_idx in entries_by_item.get(child_code, []):
+				if child_idx != idx:
+					deps[idx].add(child_idx)
+					dependents[child_idx].add(idx)
+
+	ready = sorted(idx for idx, d in deps.items() if not d)
+	ordered = []
+	while ready:
+		idx = ready.pop(0)
+		ordered.append(idx)
+		newly_ready = []
+		for parent_idx in dependents[idx]:
+			deps[parent_idx].discard(idx)
+			if not deps[parent_idx]:
+				newly_ready.append(parent_idx)
+		if newly_ready:
+			ready = sorted(ready + newly_ready)
+	return ordered, len(ordered) != len(boms_list)
+
+
+# --- 批量预取 ---
+
+
+def get_existing_names(doctype, names):
+	"""批量判断存在性：返回已存在的 name 集合（超过 1000 个分批 IN 查询）。"""
+	names = list({n for n in names if n})
+	existing = set()
+	for i in range(0, len(names), _IN_CHUNK_SIZE):
+		existing.update(
+			frappe.get_all(doctype, filters={"name": ["in", names[i:i + _IN_CHUNK_SIZE]]}, pluck="name")
+		)
+	return existing
+
+
+def ensure_operations(boms_list):
+	"""本批所有 BOM 引用的 Operation 一次查询存在性，缺失的去重后创建。返回新建的 Operation 名称列表。"""
+	workstation_by_op = {}
+	for bom_data in boms_list:
+		for op in bom_data.get("operations") or []:
+			name = (op.get("operation") or "").strip()
+			if name and name not in workstation_by_op:
+				workstation_by_op[name] = op.get("workstation")
+	if not workstation_by_op:
+		return []
+
+	existing = get_existing_names("Operation", workstation_by_op.keys())
+	created = []
+	for name, workstation in workstation_by_op.items():
+		if name in existing:
+			continue
+		try:
+			frappe.get_doc({
+				"doctype": "Operation",
+				"operation": name,
+				"workstation": workstation,
+			}).insert()
+			created.append(name)
+		except Exception as e:
+			frappe.log_error(f"Error creating Operation {name}: {str(e)}", "Create Operation Error")
+	return created
+
+
+def ensure_items(boms_list):
+	"""
+	本批所有 BOM 涉及的物料（成品与子件）一次查询存在性；缺失的物料去重后，
+	仅当数据带 item_group 与单位（stock_uom / uom）时创建（物料名称取 item_name，缺省为编码）。
+	返回 (已存在或新建成功的物料集合, 新建的物料编码列表)；未创建的物料不在集合中，引用它的 BOM 按物料不存在失败。
+	"""
+	specs = {}
+	for bom_data in boms_list:
+		for spec in [bom_data] + list(bom_data.get("items") or []):
+			code = spec.get("item") if spec is bom_data else spec.get("item_code")
+			if code and code not in specs:
+				specs[code] = spec
+
+	existing = get_existing_names("Item", specs.keys())
+	created = []
+	for code, spec in specs.items():
+		if code in existing:
+			continue
+		item_group = (spec.get("item_group") or "").strip()
+		stock_uom = (spec.get("stock_uom") or spec.get("uom") or "").strip()
+		if not item_group or not stock_uom:
+			continue
+		frappe.db.savepoint("bom_bulk_save_item")
+		try:
+			doc = frappe.get_doc({
+				"doctype": "Item",
+				"item_code": code,
+				"item_name": (spec.get("item_name") or "").strip() or code,
+				"item_group": item_group,
+				"stock_uom": stock_uom,
+				"is_stock_item": 1,
+			}).insert(ignore_permissions=True)
+			existing.add(doc.name)
+			created.append(doc.name)
+		except Exception as e:
+			frappe.db.rollback(save_point="bom_bulk_save_item")
+			frappe.log_error(f"Error creating Item {code}: {str(e)}", "Create Item Error")
+	return existing, created
+
+
+# --- 单个 BOM 组装与保存 ---
+
+
+def _clean_child_rows(rows, parentfield, skip_item_code=None):
+	out = []
+	for row in rows or []:
+		cleaned = {k: v for k, v in row.items() if k not in _CHILD_TEMP_FIELDS}
+		if skip_item_code and cleaned.get("item_code") == skip_item_code:
+			continue
+		cleaned["idx"] = len(out) + 1
+		cleaned["parentfield"] = parentfield
+		cleaned["parenttype"] = "BOM"
+		out.append(cleaned)
+	return out
+
+
+def _build_bom_doc(bom_data, existing_items):
+	"""校验并构建 BOM 文档（未插入）。物料存在性使用预取的 existing_items；自引用子件跳过。"""
+	if bom_data.get("doctype") != "BOM":
+		raise frappe.ValidationError(_("Invalid doctype. Must be 'BOM'"))
+	item_code = bom_data.get("item")
+	if not item_code:
+		raise frappe.ValidationError(_("Item code is required"))
+	if item_code not in existing_items:
+		raise frappe.DoesNotExistError(f"Item {item_code} does not exist")
+	for item_idx, row in enumerate(bom_data.get("items") or [], 1):
+		if not row.get("item_code"):
+			raise frappe.ValidationError(_(f"Item code is required for BOM item at index {item_idx}"))
+		if row["item_code"] not in existing_items:
+			raise frappe.DoesNotExistError(f"Item {row['item_code']} does not exist for BOM item at index {item_idx}")
+
+	cleaned = {k: v for k, v in bom_data.items() if k not in _TEMP_FIELDS}
+	for parentfield in ("items", "operations", "scrap_items"):
+		if cleaned.get(parentfield):
+			cleaned[parentfield] = _clean_child_rows(
+				cleaned[parentfield],
+				parentfield,
+				skip_item_code=item_code if parentfield == "items" else None,
+			)
+	return frappe.get_doc(cleaned)
+
+
+def save_boms_bottom_up(boms_list):
+	"""
+	批量保存（插入并提交）BOM：拓扑排序、预建缺失物料与 Operation、逐个 savepoint。
+	返回 (results, has_cycle)；存在循环引用时不保存任何 BOM，results 为空。
+	results 按实际保存顺序，每项含 index（输入下标）、item_code，成功时 bom_name / doc / created_items
+	（本 BOM 引用的物料中本次新建的编码），失败时 error / error_type。
+	若当前在后台任务中（frappe.flags.bom_save_job_id），每保存一个 BOM 更新一次进度。
+	"""
+	ordered, has_cycle = order_boms_bottom_up(boms_list)
+	if has_cycle:
+		return [], True
+
+	ensure_operations(boms_list)
+	existing_items, created = ensure_items(boms_list)
+	created = set(created)
+
+	results = []
+	total = len(ordered)
+	for done, idx in enumerate(ordered, 1):
+		bom_data = boms_list[idx]
+		item_code = bom_data.get("item")
+		frappe.db.savepoint("bom_bulk_save")
+		try:
+			bom_doc = _build_bom_doc(bom_data, existing_items)
+			bom_doc.insert()
+			bom_doc.submit()
+			if bom_doc.is_default:
+				frappe.db.set_value("Item", item_code, "default_bom", bom_doc.name)
+			codes = [item_code] + [row.get("item_code") for row in bom_data.get("items") or []]
+			results.append({
+				"index": idx,
+				"item_code": item_code,
+				"bom_name": bom_doc.name,
+				"doc": bom_doc,
+				"created_items": [c for c in dict.fromkeys(codes) if c in created],
+			})
+		except Exception as e:
+			frappe.db.rollback(save_point="bom_bulk_save")
+			frappe.log_error(
+				f"Error processing BOM at index {idx} for item {item_code or 'Unknown'}: {str(e)}",
+				"Bulk BOM Save Error",
+			)
+			results.append({
+				"index": idx,
+				"item_code": item_code or "Unknown",
+				"error": str(e),
+				"error_type": type(e).__name__,
+			})
+		_report_progress(done, total)
+	return results, False
+
+
+# --- 后台任务 ---
+
+
+def _job_key(job_id):
+	return JOB_CACHE_PREFIX + job_id
+
+
+def _report_progress(done, total):
+	job_id = frappe.flags.get("bom_save_job_id")
+	if not job_id:
+		return
+	job = job_state.update_state(_job_key(job_id), done=done, total=total)
+	frappe.publish_realtime(
+		"bom_save_job_progress",
+		{"job_id": job_id, "done": done, "total": total},
+		user=job.get("owner"),
+	)
+
+
+def enqueue_bom_save_job(kind, **payload):
+	"""把批量保存放入 long 队列，立即返回 job_id；进度与结果见 get_bom_save_job_status。"""
+	if kind not in _JOB_METHODS:
+		frappe.throw(_("Unknown BOM save job: {0}").format(kind))
+	job_id = frappe.generate_hash(length=12)
+	job_state.update_state(
+		_job_key(job_id),
+		job_id=job_id,
+		kind=kind,
+		status="queued",
+		owner=frappe.session.user,
+		done=0,
+		total=0,
+		result=None,
+		error=None,
+	)
+	frappe.enqueue(
+		"bairun_erp.utils.api.material.bom_bulk_save.run_bom_save_job",
+		queue="long",
+		timeout=3600,
+		enqueue_after_commit=True,
+		bom_job_id=job_id,
+		kind=kind,
+		payload=payload,
+	)
+	return {"success": True, "job_id": job_id, "status": "queued"}
+
+
+def run_bom_save_job(bom_job_id, kind, payload):
+	"""后台任务入口：以同步方式调用对应接口，结果写回任务状态。"""
+	frappe.flags.bom_save_job_id = bom_job_id
+	job_state.update_state(_job_key(bom_job_id), status="running")
+	try:
+		result = frappe.get_attr(_JOB_METHODS[kind])(**(payload or {}))
+		frappe.db.commit()
+		job_state.update_state(_job_key(bom_job_id), status="finished", result=result)
+	except Exception as e:
+		frappe.db.rollback()
+		frappe.log_error(title="BOM save job {0} failed".format(bom_job_id), message=frappe.get_traceback())
+		job_state.update_state(_job_key(bom_job_id), status="failed", error=str(e))
+	finally:
+		frappe.flags.bom_save_job_id = None
+
+
+@frappe.whitelist()
+def get_bom_save_job_status(job_id=None):
+	"""
+	查询批量 BOM 保存任务状态。
+	返回: { job_id, kind, status(queued/running/finished/failed/not_found), done, total, progress(0-100), result, error }
+	"""
+	job_id = (job_id or "").strip()
+	job = job_state.get_state(_job_key(job_id)) if job_id else None
+	if not job:
+		return {"job_id": job_id, "status": "not_found"}
+	job_state.check_owner(job)
+	return {
+		"job_id": job_id,
+		"kind": job.get("kind"),
+		"status": job.get("status"),
+		"done": job.get("done") or 0,
+		"total": job.get("total") or 0,
+		"progress": job_state.progress(job),
+		"result": job.get("result"),
+		"error": job.get("error"),
+	}
@@ -0,0 +1,199 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+画布 BOM 增量更新：把画布树与库内 BOM 结构（bom_query._build_bom_tree）逐节点比对，只改动有变化的部分。
+
+- 结构：每个节点的「行内容」= (物料编码, bom_qty, 仓库, 供应商)，子树哈希 = 行内容 + 子节点哈希（Merkle）。
+  子节点哈希一致的装配整棵跳过；直接子行有变化的装配需要改写 BOM，新出现的子装配新建 BOM。
+  已提交 BOM 不能改子件行，改写即生成新版本，因此其上级直到根都要生成新版本（行 bom_no 指向新版本）；
+  与变化无关的分支保持原 BOM 不动。
+- 物料：节点的 item_name / 仓库 / item_attrs 哈希与上次应用时（Redis，按成品物料记录）相同、且 Item 之后未被修改的，
+  不再 get_doc / apply_item_attrs / save；新物料与有变化的节点才走 bom_item 第一步。
+
+入口见 bom_item.update_bom_from_canvas_tree（update_mode=incremental）。
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import json
+
+import frappe
+from frappe.utils import flt
+
+ITEM_HASH_CACHE_PREFIX = "bairun_erp:canvas_item_hash:"
+ITEM_HASH_TTL_SEC = 30 * 24 * 60 * 60
+
+
+def _digest(value):
+	raw = json.dumps(value, sort_keys=True, default=str, ensure_ascii=False)
+	return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def node_item_code(node):
+	return (node.get("item_code") or "").strip() or (node.get("item_name") or "").strip()
+
+
+def node_warehouse(node):
+	"""画布节点填写的仓库（节点 warehouse 优先，其次 item_attrs.warehouse），未解析。"""
+	return (node.get("warehouse") or (node.get("item_attrs") or {}).get("warehouse") or "").strip()
+
+
+def row_content(node, warehouse_of):
+	"""节点作为上级 BOM 一行时的内容；warehouse_of(node) 返回系统仓库名（画布树与库内树取法不同）。"""
+	return [
+		node_item_code(node),
+		round(flt(node.get("bom_qty")), 6),
+		warehouse_of(node) or "",
+		(node.get("supplier") or "").strip(),
+	]
+
+
+def subtree_hashes(node, warehouse_of, acc=None):
+	"""
+	自底向上计算 {id(节点): (子树哈希, 子行哈希)}。
+	子行哈希只看直接子节点的子树哈希，用于判断整棵子树是否可跳过。
+	"""
+	if acc is None:
+		acc = {}
+	child_hashes = []
+	for child in node.get("children") or []:
+		subtree_hashes(child, warehouse_of, acc)
+		child_hashes.append(acc[id(child)][0])
+	children_hash = _digest(child_hashes)
+	acc[id(node)] = (_digest([row_content(node, warehouse_of), children_hash]), children_hash)
+	return acc
+
+
+def _match_children(incoming, stored):
+	"""画布子节点与库内子节点配对：先按 id（BOM Item name），再按物料编码；返回 [(画布节点, 库内节点或 None)]。"""
+	stored = list(stored or [])
+	by_id = {s.get("id"): s for s in stored if s.get("id")}
+	used = set()
+	pairs = []
+	for child in incoming or []:
+		match = by_id.get(child.get("id"))
+		if match is not None and id(match) in used:
+			match = None
+		if match is None:
+			code = node_item_code(child)
+			match = next((s for s in stored if id(s) not in used and node_item_code(s) == code), None)
+		if match is not None:
+			used.add(id(match))
+		pairs.append((child, match))
+	return pairs
+
+
+def stored_bom_no_map(stored_tree):
+	"""库内树中各子装配节点（id 为 BOM Item name）对应的子 BOM：{BOM Item name: bom_no}，一次查询。"""
+	row_names = []
+	stack = list((stored_tree or {}).get("children") or [])
+	while stack:
+		node = stack.pop()
+		if node.get("children"):
+			row_names.append(node.get("id"))
+			stack.extend(node["children"])
+	row_names = [n for n in row_names if n]
+	if not row_names:
+		return {}
+	return {
+		r.name: r.bom_no
+		for r in frappe.get_all("BOM Item", filters={"name": ["in", row_names]}, fields=["name", "bom_no"])
+		if r.bom_no
+	}
+
+
+def plan_bom_changes(incoming, stored, bom_name, bom_no_map, incoming_wh, stored_wh):
+	"""
+	比对画布树与库内树，返回需要写入的 BOM（自底向上）：[{ "node", "bom_name", "stored", "child_boms" }]，
+	bom_name 为 None 表示新子装配需新建 BOM；child_boms 为未变化子装配沿用的子 BOM：{物料编码: bom_no}。
+	子装配需写入时其上级也在计划内（上级行要指向子装配的新 BOM）。另返回跳过（未变化）的节点数。
+	incoming_wh / stored_wh：两棵树各自的 warehouse_of。
+	"""
+	in_hashes = subtree_hashes(incoming, incoming_wh)
+	st_hashes = subtree_hashes(stored, stored_wh) if stored else {}
+	plan = []
+	skipped = [0]
+
+	def _count(node):
+		return 1 + sum(_count(c) for c in node.get("children") or [])
+
+	def _walk(in_node, st_node, name):
+		"""返回该节点是否需要写入。"""
+		if st_node is not None and in_hashes[id(in_node)][1] == st_hashes[id(st_node)][1]:
+			skipped[0] += _count(in_node) - 1
+			return False
+		pairs = _match_children(in_node.get("children"), st_node.get("children") if st_node else None)
+		changed = st_node is None or [row_content(c, incoming_wh) for c in in_node.get("children") or []] != [
+			row_content(c, stored_wh) for c in st_node.get("children") or []
+		]
+		child_boms = {}
+		for child, match in pairs:
+			if not child.get("children"):
+				continue
+			sub_bom = bom_no_map.get(match.get("id")) if match is not None and match.get("children") else None
+			if _walk(child, match if sub_bom else None, sub_bom):
+				changed = True
+			else:
+				child_boms[node_item_code(child)] = sub_bom
+		if changed:
+			plan.append({"node": in_node, "bom_name": name, "stored": st_node, "child_boms": child_boms})
+		return changed
+
+	_walk(incoming, stored, bom_name)
+	return plan, skipped[0]
+
+
+# --- 物料：上次应用的节点哈希 ---
+
+
+def item_content_hash(node):
+	return _digest([
+		node_item_code(node),
+		(node.get("item_name") or "").strip(),
+		node_warehouse(node),
+		node.get("item_attrs") or {},
+	])
+
+
+def _item_hash_key(root_item):
+	return ITEM_HASH_CACHE_PREFIX + root_item
+
+
+def nodes_needing_item_write(root_item, nodes, existing_items):
+	"""
+	需要走第一步（创建 / 写物料属性）的节点：物料不存在，或带 item_attrs / 仓库且与上次应用的哈希不同，
+	或 Item 在上次应用后被其他途径修改过。root_item 为画布根节点物料（BOM 每次改写都换版本，不按 BOM 名记录）。
+	"""
+	applied = frappe.cache().get_value(_item_hash_key(root_item)) or {}
+	codes = [node_item_code(n) for n in nodes]
+	known = list({c for c in codes if c in applied})
+	modified = {}
+	if known:
+		modified = {
+			r.name: str(r.modified)
+			for r in frappe.get_all("Item", filters={"name": ["in", known]}, fields=["name", "modified"])
+		}
+
+	out = []
+	for node, code in zip(nodes, codes):
+		if not code or code not in existing_items:
+			out.append(node)
+			continue
+		if not (node.get("item_attrs") or node_warehouse(node)):
+			continue
+		last = applied.get(code)
+		if not last or last[0] != item_content_hash(node) or last[1] != modified.get(code):
+			out.append(node)
+	return out
+
+
+def record_applied_item_hashes(root_item, nodes):
+	"""记录本次画布各节点的物料哈希与 Item 当前 modified，供下次比对。"""
+	codes = {node_item_code(n): n for n in nodes if node_item_code(n)}
+	if not codes:
+		return
+	applied = frappe.cache().get_value(_item_hash_key(root_item)) or {}
+	for r in frappe.get_all("Item", filters={"name": ["in", list(codes)]}, fields=["name", "modified"]):
+		applied[r.name] = [item_content_hash(codes[r.name]), str(r.modified)]
+	frappe.cache().set_value(_item_hash_key(root_item), applied, expires_in_sec=ITEM_HASH_TTL_SEC)
@@ -9,8 +9,15 @@ from __future__ import unicode_literals
 
 import json
 import frappe
+from frappe.utils import cint
 
-from bairun_erp.utils.api.items import save_item_bom_structure
+from bairun_erp.utils.api.material import bom_canvas_diff
+from bairun_erp.utils.api.material.bom_bulk_save import (
+	enqueue_bom_save_job,
+	get_existing_names,
+	save_boms_bottom_up,
+)
+from bairun_erp.utils.api.material.bom_query import _build_bom_tree
 from bairun_erp.utils.api.material.item import _get_default_leaf_name
 from bairun_erp.utils.api.material.item_attrs_apply import (
 	apply_item_attrs,
@@ -135,10 +142,11 @@ def _create_item_from_node(node):
 	return doc.name
 
 
-def _ensure_or_validate_item(node):
+def _ensure_or_validate_item(node, existing_items=None):
 	"""
 	创建或验证单个节点对应的 Item，并在存在 item_attrs 时写入物料属性。
 	先查后建：若物料已存在则直接复用，不执行 INSERT，避免 1062 主键重复错误。
+	existing_items：预取的已存在物料集合（整棵树一次查询），新建成功的物料会加入其中。
 	返回: { node_id, item_code, item_name, status, error? }
 	"""
 	node_id = node.get("id") or ""
@@ -155,7 +163,10 @@ def _ensure_or_validate_item(node):
 		}
 
 	# 先查：物料已存在则直接复用，不创建（避免 1062 主键重复）
-	existed = frappe.db.exists("Item", item_code)
+	if existing_items is not None:
+		existed = item_code in existing_items
+	else:
+		existed = frappe.db.exists("Item", item_code)
 	if existed:
 		status = "existed"
 		res_code = item_code
@@ -164,6 +175,8 @@ def _ensure_or_validate_item(node):
 		try:
 			res_code = _create_item_from_node(node)
 			status = "created"
+			if existing_items is not None:
+				existing_items.add(res_code)
 		except Exception as e:
 			return {
 				"node_id": node_id,
@@ -212,9 +225,13 @@ def _run_step1_ensure_items(tree):
 	node_map = {}
 	items_result = []
 	step1_complete = True
+	existing_items = get_existing_names(
+		"Item",
+		[(n.get("item_code") or "").strip() or (n.get("item_name") or "").strip() for n in nodes],
+	)
 
 	for node in nodes:
-		res = _ensure_or_validate_item(node)
+		res = _ensure_or_validate_item(node, existing_items)
 		items_result.append(res)
 		if res["status"] == "failed":
 			step1_complete = False
@@ -428,7 +445,7 @@ def _update_bom_items_replace(bom_doc, new_items):
 def _run_step2_create_boms(tree, node_map):
 	"""
 	第二步：自底向上为有 children 的节点创建 BOM。
-	单个失败不中断，全部结果返回。
+	所有 BOM 数据先组装好，再交给 bom_bulk_save 按依赖拓扑排序批量保存；单个失败不中断，全部结果返回。
 	返回: (boms: list, step2_complete: bool)
 	"""
 	nodes = _collect_nodes_depth_first(tree)
@@ -437,28 +454,12 @@ def _run_step2_create_boms(tree, node_map):
 	boms_result = []
 	step2_complete = True
 
+	boms_data = []
 	for node in bom_nodes:
 		node_id = node.get("id") or ""
-		parent_info = node_map.get(node_id, {})
-		parent_item_code = parent_info.get("item_code", "")
+		parent_item_code = node_map.get(node_id, {}).get("item_code", "")
 		try:
-			bom_data = _build_bom_data_for_node(node, node_map, company)
-			res = save_item_bom_structure(bom_data)
-			if res.get("error"):
-				boms_result.append({
-					"parent_item_code": parent_item_code,
-					"bom_no": None,
-					"status": "failed",
-					"error": res.get("error", ""),
-				})
-				step2_complete = False
-			else:
-				bom_no = res.get("bom_name") or res.get("name")
-				boms_result.append({
-					"parent_item_code": parent_item_code,
-					"bom_no": bom_no,
-					"status": "success",
-				})
+			boms_data.append(_build_bom_data_for_node(node, node_map, company))
 		except Exception as e:
 			boms_result.append({
 				"parent_item_code": parent_item_code,
@@ -467,19 +468,214 @@ def _run_step2_create_boms(tree, node_map):
 				"error": str(e),
 			})
 			step2_complete = False
+
+	results, has_cycle = save_boms_bottom_up(boms_data)
+	if has_cycle:
+		boms_result.append({
+			"parent_item_code": (boms_data[-1].get("item") if boms_data else "") or "",
+			"bom_no": None,
+			"status": "failed",
+			"error": "Circular reference detected in BOM structure",
+		})
+		return boms_result, False
+
+	for res in results:
+		if res.get("error"):
+			boms_result.append({
+				"parent_item_code": res["item_code"],
+				"bom_no": None,
+				"status": "failed",
+				"error": res["error"],
+			})
+			step2_complete = False
 			frappe.log_error(
 				title="create_bom_from_canvas_tree BOM failed",
-				message="parent_item={0}, error={1}".format(parent_item_code, str(e)),
+				message="parent_item={0}, error={1}".format(res["item_code"], res["error"]),
 			)
+		else:
+			boms_result.append({
+				"parent_item_code": res["item_code"],
+				"bom_no": res["bom_name"],
+				"status": "success",
+			})
 
+	frappe.db.commit()
 	return boms_result, step2_complete
 
 
+# --- 增量更新（update_mode=incremental）---
+
+
+def _incremental_bom_rows(node, company, child_boms):
+	"""
+	按画布节点的直接子节点生成 BOM 行（校验同 merge/replace）；child_boms 为子装配行指向的 BOM：{item_code: bom_name}。
+	返回 (rows, failed_items)。
+	"""
+	items, failed_items = _build_target_bom_items_from_tree(node, company)
+	rows = []
+	for item in items:
+		row = {k: item.get(k) for k in ("item_code", "qty", "uom", "source_warehouse", "supplier")}
+		if child_boms.get(item["item_code"]):
+			row["bom_no"] = child_boms[item["item_code"]]
+		rows.append(row)
+	return rows, failed_items
+
+
+def _save_draft_bom_incremental(bom_doc, rows):
+	"""草稿 BOM 原地按画布全量替换子件行（行 bom_no 见 rows）。返回 (created, removed)。"""
+	_updated, created, removed = _update_bom_items_replace(bom_doc, rows)
+	for row, data in zip(bom_doc.items, rows):
+		if data.get("bom_no"):
+			row.bom_no = data["bom_no"]
+	bom_doc.save(ignore_permissions=True)
+	return created, removed
+
+
+def _bom_version_data(bom_doc, rows):
+	"""
+	已提交 BOM 不能改子件行：以原 BOM 为模板（表头、工序、废料）组装新版本数据，子件行换成 rows，
+	交给 save_boms_bottom_up 插入并提交，设为物料默认 BOM（与全量新建一致）。
+	"""
+	data = frappe.copy_doc(bom_doc).as_dict()
+	data.pop("exploded_items", None)
+	data.update({"docstatus": 0, "is_active": 1, "is_default": 1, "items": rows})
+	return data
+
+
+def _update_bom_incremental(bom_doc, tree):
+	"""
+	update_mode=incremental：画布整棵树与库内 BOM 树（_build_bom_tree）比对，见 bom_canvas_diff。
+	- 第一步只处理新物料与 item_attrs / 仓库有变化的节点
+	- 第二步自底向上只写子件有变化的 BOM 及其上级：已提交 BOM 生成新版本并提交，上级行 bom_no 指向新版本；
+	  草稿 BOM 原地更新；新子装配新建 BOM
+	调用方已建立 savepoint update_bom_from_canvas_tree；失败时回滚到该点，返回与 merge/replace 相同结构。
+	根 BOM 换版本时 data.bom_name 为新版本，previous_bom_name 为入参 BOM。
+	"""
+	bom_name = bom_doc.name
+	root_item = bom_doc.item
+	company = bom_doc.company or _get_default_company()
+
+	def incoming_wh(node):
+		wh = bom_canvas_diff.node_warehouse(node)
+		return (resolve_warehouse_name(wh, company) or wh) if wh else ""
+
+	def stored_wh(node):
+		return (node.get("warehouse") or "").strip()
+
+	def _failed(message, failed_items):
+		frappe.db.rollback(save_point="update_bom_from_canvas_tree")
+		return {
+			"success": False,
+			"message": message,
+			"data": {
+				"bom_name": bom_name,
+				"updated_items_count": 0,
+				"created_items_count": 0,
+				"removed_items_count": 0,
+				"failed_items": failed_items,
+			},
+		}
+
+	# 第一步：物料
+	nodes = _collect_nodes_depth_first(tree)
+	existing_items = get_existing_names("Item", [bom_canvas_diff.node_item_code(n) for n in nodes])
+	item_nodes = bom_canvas_diff.nodes_needing_item_write(root_item, nodes, existing_items)
+	changed_items = []
+	failed_items = []
+	for node in item_nodes:
+		res = _ensure_or_validate_item(node, existing_items)
+		if res["status"] == "failed":
+			failed_items.append({"node_id": res["node_id"], "item_code": res["item_code"], "error": res.get("error")})
+			continue
+		# Naming Series 时新物料编码由系列生成，回写到节点供第二步使用
+		node["item_code"] = res["item_code"]
+		changed_items.append(res["item_code"])
+	if failed_items:
+		return _failed("存在非法节点，请修正后重试", failed_items)
+
+	# 第二步：BOM
+	for node in nodes:
+		node["item_code"] = bom_canvas_diff.node_item_code(node)
+	stored = _build_bom_tree(bom_name)
+	plan, skipped_nodes = bom_canvas_diff.plan_bom_changes(
+		tree, stored, bom_name, bom_canvas_diff.stored_bom_no_map(stored), incoming_wh, stored_wh
+	)
+	# 先整体校验再写入；行在子 BOM 建好后再组装（需回填 bom_no）
+	for entry in plan:
+		failed_items.extend(_build_target_bom_items_from_tree(entry["node"], company)[1])
+	if failed_items:
+		return _failed("存在非法节点，请修正后重试", failed_items)
+
+	new_boms = {}
+	versions = {}
+	created_count = removed_count = 0
+	currency = frappe.get_cached_value("Company", company, "default_currency") or "USD"
+	for entry in plan:
+		node = entry["node"]
+		item_code = bom_canvas_diff.node_item_code(node)
+		rows = _incremental_bom_rows(node, company, dict(entry["child_boms"], **new_boms))[0]
+		rows = [{k: v for k, v in row.items() if v is not None} for row in rows]
+		if entry["bom_name"]:
+			doc = bom_doc if entry["bom_name"] == bom_name else frappe.get_doc("BOM", entry["bom_name"])
+			frappe.has_permission("BOM", doc=doc, ptype="write", throw=True)
+			removed_count += len(doc.items or [])
+			if doc.docstatus == 0:
+				created_count += _save_draft_bom_incremental(doc, rows)[0]
+				versions[doc.name] = doc.name
+				continue
+			bom_data = _bom_version_data(doc, rows)
+		else:
+			bom_data = {
+				"doctype": "BOM",
+				"item": item_code,
+				"company": company,
+				"quantity": 1,
+				"currency": currency,
+				"items": rows,
+			}
+		results, _has_cycle = save_boms_bottom_up([bom_data])
+		if not results or results[0].get("error"):
+			frappe.throw((results[0].get("error") if results else None) or "BOM create failed: {0}".format(item_code))
+		new_boms[item_code] = results[0]["bom_name"]
+		created_count += len(rows)
+		if entry["bom_name"]:
+			versions[entry["bom_name"]] = results[0]["bom_name"]
+
+	root_bom = versions.get(bom_name, bom_name)
+	if versions or new_boms or changed_items:
+		(bom_doc if root_bom == bom_name else frappe.get_doc("BOM", root_bom)).add_comment(
+			"Edit",
+			"Canvas BOM update by {0}: mode=incremental, from={1}, boms={2}, new_boms={3}, items={4}, skipped_nodes={5}".format(
+				frappe.session.user, bom_name, len(versions), len(new_boms), len(changed_items), skipped_nodes
+			),
+		)
+		frappe.db.commit()
+	bom_canvas_diff.record_applied_item_hashes(root_item, nodes)
+
+	return {
+		"success": True,
+		"message": "更新成功" if (versions or new_boms or changed_items) else "无变化",
+		"data": {
+			"bom_name": root_bom,
+			"previous_bom_name": bom_name,
+			"updated_items_count": 0,
+			"created_items_count": created_count,
+			"removed_items_count": removed_count,
+			"failed_items": [],
+			"changed_boms": list(versions),
+			"bom_versions": versions,
+			"created_boms": [name for name in new_boms.values() if name not in versions.values()],
+			"changed_items": changed_items,
+			"skipped_nodes": skipped_nodes,
+		},
+	}
+
+
 # --- 主入口 ---
 
 
 @frappe.whitelist()
-def create_bom_from_canvas_tree(tree_data):
+def create_bom_from_canvas_tree(tree_data, run_in_background=0):
 	"""
 	从画布 JSON 树创建完整 BOM 体系。
 
@@ -489,6 +685,8 @@ def create_bom_from_canvas_tree(tree_data):
 
 	参数:
 		tree_data: 画布 JSON 树（dict 或 JSON 字符串）
+		run_in_background: 为真时放入后台队列执行，立即返回 { success, job_id, status }；
+			进度与结果通过 bom_bulk_save.get_bom_save_job_status 查询（大画布避免请求超时）
 
 	返回:
 		{
@@ -502,6 +700,8 @@ def create_bom_from_canvas_tree(tree_data):
 		bench --site site2.local execute bairun_erp.utils.api.material.bom_item.create_bom_from_canvas_tree --kwargs '{"tree_data": "<JSON>"}'
 	"""
 	tree = _parse_tree(tree_data)
+	if cint(run_in_background):
+		return enqueue_bom_save_job("create_bom_from_canvas_tree", tree_data=tree)
 	items_result, step1_complete, node_map = _run_step1_ensure_items(tree)
 
 	boms_result = []
@@ -525,8 +725,12 @@ def update_bom_from_canvas_tree(**kwargs):
 	{
 	  "bom_name": "BOM-XXX",
 	  "tree_data": "{...}",
-	  "update_mode": "merge|replace"
+	  "update_mode": "merge|replace|incremental"
 	}
+	merge / replace 只更新 bom_name 的直接子件行，不回写 Item。
+	incremental 处理整棵画布树：与库内 BOM 结构比对，只对新物料及 item_attrs / 仓库有变化的节点写 Item，
+	只改写子件有变化的 BOM 及其上级（已提交 BOM 生成新版本）；返回 data 另含 previous_bom_name、changed_boms、
+	bom_versions（原 BOM -> 新版本）、created_boms、changed_items、skipped_nodes。
 	"""
 	jd = _parse_kwargs_json_data(kwargs)
 	bom_name = (_pick(jd, "bom_name", "bomName") or "").strip()
@@ -535,10 +739,10 @@ def update_bom_from_canvas_tree(**kwargs):
 
 	if not bom_name:
 		return {"success": False, "message": "bom_name 不能为空", "data": {"bom_name": "", "failed_items": []}}
-	if update_mode not in ("merge", "replace"):
+	if update_mode not in ("merge", "replace", "incremental"):
 		return {
 			"success": False,
-			"message": "update_mode 仅支持 merge 或 replace",
+			"message": "update_mode 仅支持 merge、replace 或 incremental",
 			"data": {"bom_name": bom_name, "failed_items": []},
 		}
 	if not frappe.db.exists("BOM", bom_name):
@@ -548,11 +752,15 @@ def update_bom_from_canvas_tree(**kwargs):
 			"data": {"bom_name": bom_name, "failed_items": []},
 		}
 
+	frappe.db.savepoint("update_bom_from_canvas_tree")
 	try:
 		tree = _parse_tree(tree_data)
 		bom_doc = frappe.get_doc("BOM", bom_name)
 		frappe.has_permission("BOM", doc=bom_doc, ptype="write", throw=True)
 
+		if update_mode == "incremental":
+			return _update_bom_incremental(bom_doc, tree)
+
 		company = bom_doc.company or _get_default_company()
 		new_items, failed_items = _build_target_bom_items_from_tree(tree, company)
 		if failed_items:
@@ -568,7 +776,6 @@ def update_bom_from_canvas_tree(**kwargs):
 				},
 			}
 
-		frappe.db.savepoint("update_bom_from_canvas_tree")
 		if update_mode == "replace":
 			updated_count, created_count, removed_count = _update_bom_items_replace(bom_doc, new_items)
 		else:
@@ -596,6 +803,7 @@ def update_bom_from_canvas_tree(**kwargs):
 			},
 		}
 	except frappe.PermissionError:
+		frappe.db.rollback(save_point="update_bom_from_canvas_tree")
 		return {
 			"success": False,
 			"message": "BOM不存在或无权限更新",
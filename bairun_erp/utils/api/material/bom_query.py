@@ -13,8 +13,17 @@ bench execute 示例:
 
 from __future__ import unicode_literals
 
+import copy
+
 import frappe
 
+from bairun_erp.utils import lookup_cache
+from bairun_erp.utils.api.material.bom_tree_cache import (
+    get_cached_bom_trees,
+    merge_signature,
+    new_signature,
+    set_cached_bom_trees,
+)
 from bairun_erp.utils.api.material.item_attrs_apply import item_default_wh_to_canvas_display
 from bairun_erp.utils.api.material.item_properties_update import _get_default_company
 
@@ -36,9 +45,8 @@ _ATTR_TO_FIELD = {
 }
 
 
-def _get_item_extra_fields(item_code):
-    """获取 Item 的扩展字段（height、diameter、inner_cover_width、material）"""
-    result = {}
+def _item_extra_fieldnames():
+    """_get_item_extra_fields 需要读取的 Item 字段（description + 各扩展字段首个存在的候选）。"""
     meta = frappe.get_meta("Item")
     fields_to_get = ["description"]
     for _out, candidates in _ITEM_EXTRA_FIELDS:
@@ -46,7 +54,17 @@ def _get_item_extra_fields(item_code):
             if meta.get_field(f):
                 fields_to_get.append(f)
                 break
-    item_values = frappe.db.get_value("Item", item_code, fields_to_get, as_dict=True) or {}
+    return fields_to_get
+
+
+def _get_item_extra_fields(item_code):
+    """
+    获取 Item 的扩展字段（height、diameter、inner_cover_width、material）。
+    读 lookup_cache：多个物料时调用方先 lookup_cache.bulk_get("Item", codes, _item_extra_fieldnames()) 一次预取。
+    """
+    result = {}
+    meta = frappe.get_meta("Item")
+    item_values = lookup_cache.bulk_get("Item", [item_code], _item_extra_fieldnames()).get(item_code) or {}
 
     for out_key, candidates in _ITEM_EXTRA_FIELDS:
         val = ""
@@ -73,12 +91,8 @@ def _get_item_variant_attrs(item_codes):
         fields=["parent", "attribute", "attribute_value"],
     )
     # 可能 attribute 存的是 Item Attribute 的 name，需要取 attribute_name
-    attr_names = {}
-    for r in rows:
-        attr = r.get("attribute")
-        if attr and attr not in attr_names:
-            an = frappe.db.get_value("Item Attribute", attr, "attribute_name") or attr
-            attr_names[attr] = an
+    attrs = lookup_cache.bulk_get("Item Attribute", [r.get("attribute") for r in rows], ["attribute_name"])
+    attr_names = {name: row.get("attribute_name") or name for name, row in attrs.items()}
 
     out = {}
     for r in rows:
@@ -225,7 +239,17 @@ def _get_item_tree_fields(item_codes):
             "supplier": (r.get("default_supplier") or "").strip(),
             "description": (r.get("description") or "").strip() if r.get("description") else "",
         }
-    # 若 Item 无 default_supplier，尝试从 Item Supplier 取第一个
+    # 若 Item 无 default_supplier，从 Item Supplier 取第一个（本层缺供应商的物料一次 IN 查询）
+    no_supplier = [ic for ic, d in result.items() if not d["supplier"]]
+    if no_supplier:
+        for r in frappe.get_all(
+            "Item Supplier",
+            filters={"parent": ["in", no_supplier], "parenttype": "Item"},
+            fields=["parent", "supplier"],
+            order_by="parent asc, idx asc",
+        ):
+            if r.get("supplier") and not result[r.parent]["supplier"]:
+                result[r.parent]["supplier"] = r.supplier
     for ic in item_codes:
         if ic not in result:
             result[ic] = {
@@ -236,15 +260,6 @@ def _get_item_tree_fields(item_codes):
                 "supplier": "",
                 "description": "",
             }
-        elif not result[ic]["supplier"] and frappe.db.exists("Item Supplier", {"parent": ic}):
-            first = frappe.db.get_value(
-                "Item Supplier",
-                {"parent": ic},
-                "supplier",
-                order_by="idx asc",
-            )
-            if first:
-                result[ic]["supplier"] = first
     return result
 
 
@@ -285,53 +300,83 @@ def _bom_item_to_tree_node(bi, bom_doc, item_details, parent_bom_qty=1):
     return node
 
 
+# BOM Item 行在建树时用到的字段（与 _bom_item_to_tree_node 一致）
+_BOM_ITEM_TREE_FIELDS = [
+    "name", "parent", "idx", "item_code", "item_name", "bom_no",
+    "qty", "stock_qty", "operation", "source_warehouse", "description",
+]
+
+
 def _build_bom_tree(bom_name, item_details_cache=None):
     """
-    递归构建 BOM 树。返回根节点 dict，或 None 若 BOM 不存在。
+    构建 BOM 树。返回根节点 dict，或 None 若 BOM 不存在。
+    按层（广度优先）批量展开，已缓存且未修改的子装配直接复用（见 _build_bom_tree_level_order）。
     """
-    if not frappe.db.exists("BOM", bom_name):
-        return None
-    bom_doc = frappe.get_doc("BOM", bom_name)
-    root_item_code = bom_doc.item or ""
-    if not root_item_code:
-        return None
+    tree, _signature = _build_bom_tree_level_order(bom_name, item_details_cache)
+    return tree
 
-    if item_details_cache is None:
-        item_details_cache = {}
-    # 收集本层及子 BOM 涉及的 item_code
-    codes_to_fetch = [root_item_code]
-    for bi in (bom_doc.items or []):
-        if bi.item_code:
-            codes_to_fetch.append(bi.item_code)
-        if bi.bom_no:
-            sub_bom = frappe.get_cached_doc("BOM", bi.bom_no)
-            if sub_bom and sub_bom.item:
-                codes_to_fetch.append(sub_bom.item)
-    for ic in codes_to_fetch:
-        if ic and ic not in item_details_cache:
-            item_details_cache[ic] = {}
-    # 批量补全 item_details
-    missing = [c for c in codes_to_fetch if c and not item_details_cache.get(c)]
+
+def _load_bom_level(frontier, item_details_cache):
+    """
+    加载一层 BOM：BOM 表头、该层全部 BOM Item、新出现物料的 item 字段与工艺-供应商行，各一次批量查询。
+    返回 (headers, bom_items_by_parent)。
+    """
+    headers = {
+        r.name: r
+        for r in frappe.get_all(
+            "BOM",
+            filters={"name": ["in", frontier]},
+            fields=["name", "item", "item_name", "quantity", "modified"],
+        )
+    }
+    bom_items_by_parent = {}
+    if headers:
+        rows = frappe.get_all(
+            "BOM Item",
+            filters={"parent": ["in", list(headers.keys())], "parenttype": "BOM"},
+            fields=_BOM_ITEM_TREE_FIELDS,
+            order_by="parent asc, idx asc",
+        )
+        for r in rows:
+            bom_items_by_parent.setdefault(r.parent, []).append(r)
+
+    # BOM 可能没有 item_name，从 Item 批量补
+    missing_names = [h.item for h in headers.values() if h.item and not (h.item_name or "").strip()]
+    if missing_names:
+        name_map = {
+            r.name: r.item_name
+            for r in frappe.get_all(
+                "Item", filters={"name": ["in", list(set(missing_names))]}, fields=["name", "item_name"]
+            )
+        }
+        for h in headers.values():
+            if h.item and not (h.item_name or "").strip():
+                h.item_name = name_map.get(h.item) or h.item
+
+    codes = set()
+    for h in headers.values():
+        if h.item:
+            codes.add(h.item)
+    for rows in bom_items_by_parent.values():
+        codes.update(r.item_code for r in rows if r.item_code)
+    missing = [c for c in codes if not item_details_cache.get(c)]
     if missing:
         fetched = _get_item_tree_fields(missing)
-        for k, v in fetched.items():
-            item_details_cache[k] = v
+        item_details_cache.update(fetched)
         _attach_process_supplier_rows(item_details_cache, list(fetched.keys()))
+    return headers, bom_items_by_parent
 
-    details = item_details_cache.get(root_item_code, {})
-    parent_qty = float(bom_doc.quantity or 1)
 
+def _bom_header_to_root_node(header, details):
+    """BOM 表头转树节点（不含子节点），字段与原递归实现一致。"""
     root = {
         "id": "root",
-        "item_code": root_item_code,
-        "item_name": (bom_doc.item_name or details.get("item_name") or "").strip(),
+        "item_code": header.item,
+        "item_name": (header.item_name or details.get("item_name") or "").strip() or header.item,
         "bom_qty": 1,
         "children": [],
         "item_group": (details.get("item_group") or "").strip(),
     }
-    # 从 Item 取 item_name（BOM 可能没有 item_name 字段）
-    if not root["item_name"]:
-        root["item_name"] = frappe.db.get_value("Item", root_item_code, "item_name") or root_item_code
     if details.get("stock_uom"):
         root["stock_uom"] = details["stock_uom"]
     wh_link = (details.get("default_warehouse_link") or "").strip()
@@ -344,10 +389,80 @@ def _build_bom_tree(bom_name, item_details_cache=None):
     root_process = _resolve_bom_item_process(None, details)
     if root_process:
         root["process"] = root_process
+    return root
+
 
-    for bi in bom_doc.items or []:
-        if bi.bom_no:
-            sub_tree = _build_bom_tree(bi.bom_no, item_details_cache)
+def _build_bom_tree_level_order(bom_name, item_details_cache=None, use_cache=True):
+    """
+    广度优先构建 BOM 树：每层对整个 frontier 一次取 BOM 表头、一次取 tabBOM Item、
+    一次取新物料字段与工艺-供应商行；6 层 400 节点约 6×3~5 条查询，而非逐个子 BOM 递归查询。
+
+    use_cache=True 时，每层先批量读取 bom_tree_cache，命中（子树 BOM / Item 均未修改）的子装配不再展开；
+    新展开的每个 BOM 子树会写回缓存，供后续打开复用。
+
+    返回 (tree, signature)；BOM 不存在时 tree 为 None。
+    """
+    if item_details_cache is None:
+        item_details_cache = {}
+
+    headers = {}
+    bom_items_by_parent = {}
+    cached = {}
+    seen = set()
+    frontier = [bom_name] if bom_name else []
+    while frontier:
+        frontier = [b for b in dict.fromkeys(frontier) if b and b not in seen]
+        seen.update(frontier)
+        if use_cache and frontier:
+            hits = get_cached_bom_trees(frontier)
+            cached.update(hits)
+            frontier = [b for b in frontier if b not in hits]
+        if not frontier:
+            break
+        level_headers, level_items = _load_bom_level(frontier, item_details_cache)
+        headers.update(level_headers)
+        bom_items_by_parent.update(level_items)
+        frontier = [
+            r.bom_no
+            for rows in level_items.values()
+            for r in rows
+            if r.bom_no and r.bom_no not in seen
+        ]
+
+    built = {}
+    fresh = {}
+
+    def _subtree(name, path):
+        """返回 (tree, signature)；同一 BOM 只组装一次，每次引用返回深拷贝。"""
+        if name in path:
+            # 环形引用：按叶子处理
+            return None, None
+        if name in built:
+            tree, signature = built[name]
+            return (copy.deepcopy(tree) if tree else None), signature
+        if name in cached:
+            built[name] = cached[name]
+            return copy.deepcopy(cached[name][0]), cached[name][1]
+
+        header = headers.get(name)
+        if not header or not header.item:
+            built[name] = (None, None)
+            return None, None
+
+        signature = new_signature()
+        signature["boms"][name] = str(header.modified)
+        signature["items"].add(header.item)
+        details = item_details_cache.get(header.item, {})
+        root = _bom_header_to_root_node(header, details)
+        parent_qty = float(header.quantity or 1)
+
+        for bi in bom_items_by_parent.get(name, []):
+            if bi.item_code:
+                signature["items"].add(bi.item_code)
+            sub_tree = None
+            if bi.bom_no:
+                sub_tree, sub_signature = _subtree(bi.bom_no, path | {name})
+                merge_signature(signature, sub_signature)
             if sub_tree:
                 sub_tree["id"] = bi.name
                 sub_tree["bom_qty"] = round(
@@ -355,13 +470,18 @@ def _build_bom_tree(bom_name, item_details_cache=None):
                 )
                 root["children"].append(sub_tree)
             else:
-                fallback = _bom_item_to_tree_node(bi, bom_doc, item_details_cache, parent_qty)
-                root["children"].append(fallback)
-        else:
-            child = _bom_item_to_tree_node(bi, bom_doc, item_details_cache, parent_qty)
-            root["children"].append(child)
+                root["children"].append(
+                    _bom_item_to_tree_node(bi, header, item_details_cache, parent_qty)
+                )
 
-    return root
+        built[name] = (root, signature)
+        fresh[name] = (root, signature)
+        return copy.deepcopy(root), signature
+
+    tree, signature = _subtree(bom_name, frozenset()) if bom_name else (None, None)
+    if use_cache and fresh:
+        set_cached_bom_trees(fresh)
+    return tree, signature or new_signature()
 
 
 @frappe.whitelist()
@@ -443,6 +563,7 @@ def get_bom_items_for_contract(bom_name=None):
             }
 
         item_codes = [bi.item_code for bi in bom_items if bi.item_code]
+        lookup_cache.bulk_get("Item", item_codes, _item_extra_fieldnames())
         item_extras = {}
         for ic in item_codes:
             item_extras[ic] = _get_item_extra_fields(ic)
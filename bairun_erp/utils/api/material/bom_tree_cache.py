@@ -0,0 +1,124 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+BOM 展开树缓存（Redis）：按 BOM name 缓存 bom_query._build_bom_tree 的整棵子树。
+
+每条缓存记录整棵子树涉及的 BOM 与 Item 的 modified，读取时一次性比对（两条查询）：
+任一子 BOM 或物料被修改即视为失效并重建，未变化的子装配直接复用，无需重新递归。
+BOM on_update / on_cancel 等事件（见 hooks.py -> bom_events）会主动删除对应缓存。
+"""
+
+from __future__ import unicode_literals
+
+import copy
+
+import frappe
+
+CACHE_KEY_PREFIX = "bairun_erp:bom_tree:"
+CACHE_TTL_SEC = 24 * 60 * 60
+
+
+def _cache_key(bom_name):
+	return CACHE_KEY_PREFIX + bom_name
+
+
+def _get_modified_map(doctype, names):
+	"""批量取 {name: modified(str)}，一次查询。"""
+	if not names:
+		return {}
+	rows = frappe.get_all(
+		doctype,
+		filters={"name": ["in", list(names)]},
+		fields=["name", "modified"],
+	)
+	return {r.name: str(r.modified) for r in rows}
+
+
+def new_signature():
+	"""构建子树时用于收集涉及的 BOM / Item；boms 直接记录 modified，items 在写缓存时批量补齐。"""
+	return {"boms": {}, "items": set()}
+
+
+def merge_signature(target, source):
+	"""把子 BOM 的签名并入父 BOM 的签名。"""
+	if not source:
+		return
+	target["boms"].update(source.get("boms") or {})
+	target["items"].update(source.get("items") or ())
+
+
+def get_cached_bom_trees(bom_names):
+	"""
+	批量读取缓存：返回 {bom_name: (tree, signature)}，仅包含命中且子树内 BOM / Item 均未修改的项。
+	无论命中多少条，modified 校验合计只需两条查询；tree 为深拷贝可直接修改。
+	"""
+	entries = {}
+	for name in bom_names or []:
+		if not name or name in entries:
+			continue
+		entry = frappe.cache().get_value(_cache_key(name))
+		if entry and isinstance(entry, dict) and name in (entry.get("boms") or {}):
+			entries[name] = entry
+	if not entries:
+		return {}
+
+	all_boms = set()
+	all_items = set()
+	for entry in entries.values():
+		all_boms.update(entry["boms"].keys())
+		all_items.update((entry.get("items") or {}).keys())
+	current_boms = _get_modified_map("BOM", all_boms)
+	current_items = _get_modified_map("Item", all_items)
+
+	out = {}
+	for name, entry in entries.items():
+		boms = entry["boms"]
+		items = entry.get("items") or {}
+		if any(current_boms.get(b) != m for b, m in boms.items()):
+			continue
+		if any(current_items.get(i) != m for i, m in items.items()):
+			continue
+		signature = {"boms": dict(boms), "items": set(items.keys())}
+		out[name] = (copy.deepcopy(entry.get("tree")), signature)
+	return out
+
+
+def get_cached_bom_tree(bom_name):
+	"""单个 BOM 的缓存读取：命中返回 (tree, signature)，否则返回 None。"""
+	return get_cached_bom_trees([bom_name]).get(bom_name)
+
+
+def set_cached_bom_trees(trees):
+	"""
+	批量写入缓存：trees 为 {bom_name: (tree, signature)}。
+	所有条目涉及的 Item modified 一次查询补齐；tree 会被深拷贝，调用方后续修改不影响缓存内容。
+	"""
+	trees = {k: v for k, v in (trees or {}).items() if k and v and v[0] and v[1]}
+	if not trees:
+		return
+	all_items = set()
+	for _tree, signature in trees.values():
+		all_items.update(signature.get("items") or ())
+	item_modified = _get_modified_map("Item", all_items)
+
+	for name, (tree, signature) in trees.items():
+		entry = {
+			"tree": copy.deepcopy(tree),
+			"boms": dict(signature.get("boms") or {}),
+			"items": {i: item_modified[i] for i in (signature.get("items") or ()) if i in item_modified},
+		}
+		frappe.cache().set_value(_cache_key(name), entry, expires_in_sec=CACHE_TTL_SEC)
+
+
+def set_cached_bom_tree(bom_name, tree, signature):
+	"""单个 BOM 的缓存写入。"""
+	set_cached_bom_trees({bom_name: (tree, signature)})
+
+
+def invalidate_bom_tree_cache(bom_names):
+	"""删除指定 BOM 的缓存；引用它的上级 BOM 缓存会在读取时因 modified 不一致而失效。"""
+	if isinstance(bom_names, str):
+		bom_names = [bom_names]
+	for name in bom_names or []:
+		if name:
+			frappe.cache().delete_value(_cache_key(name))
@@ -0,0 +1,192 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+BOM 展开反查索引（BR BOM Where Used）：物料 → 上级装配，及节点相对根 BOM 的累计展开数量。
+
+- 每个已提交根 BOM 按 ERPNext BOMTree 前序展开，每个节点 × 路径上每个上级装配各一行（根节点一行，ancestor 为空）。
+- 「某物料是否位于某装配之下」「某物料每单位根物料用量」均变为按 (item_code, ancestor_item) / (root_bom, item_code) 的索引查询，
+  无需每次重建 BOMTree。
+- BOM 提交 / 提交后更新 / 取消时（见 bom_events）重建该 BOM 及以其为子 BOM 的根 BOM 的索引行；
+  查询不写库：尚未建索引的根 BOM 在内存展开，其中已提交的放入后台任务补建索引。
+- 无法展开的根 BOM 记入 Redis（FAILED_ROOT_TTL_SEC），期间查询不再重试；该 BOM 提交 / 更新时清除标记。
+
+全量重建:
+	bench --site site2.local execute bairun_erp.utils.api.material.bom_where_used.rebuild_bom_where_used
+	或 bench --site site2.local rebuild-bom-where-used
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+from erpnext.manufacturing.doctype.bom.bom import BOMTree
+from frappe.utils import flt, now
+
+INDEX_DOCTYPE = "BR BOM Where Used"
+FAILED_ROOT_CACHE_PREFIX = "bairun_erp:bom_where_used_failed:"
+FAILED_ROOT_TTL_SEC = 60 * 60
+
+_INDEX_FIELDS = (
+	"name", "creation", "modified", "owner", "modified_by",
+	"root_bom", "root_item", "item_code", "ancestor_item", "depth", "node_idx", "node_bom", "exploded_qty",
+)
+_BULK_CHUNK = 1000
+
+
+# --- 展开 ---
+
+
+def _failed_root_key(bom_name):
+	return FAILED_ROOT_CACHE_PREFIX + bom_name
+
+
+def _explode_rows(bom_name):
+	"""按 BOMTree 前序展开根 BOM，返回索引行（dict 列表）；BOM 无法展开时记录失败并返回 []。"""
+	try:
+		tree = BOMTree(bom_name)
+	except Exception:
+		frappe.cache().set_value(_failed_root_key(bom_name), 1, expires_in_sec=FAILED_ROOT_TTL_SEC)
+		return []
+	root_item = tree.item_code
+	rows = []
+	node_idx = 0
+	# (节点, 从根到父节点的物料路径)
+	stack = [(tree, [])]
+	while stack:
+		node, ancestors = stack.pop()
+		base = {
+			"root_bom": bom_name,
+			"root_item": root_item,
+			"item_code": node.item_code,
+			"node_idx": node_idx,
+			"node_bom": node.name if node.is_bom else None,
+			"exploded_qty": flt(node.exploded_qty),
+		}
+		if not ancestors:
+			rows.append(dict(base, ancestor_item=None, depth=0))
+		for depth, ancestor in enumerate(reversed(ancestors), 1):
+			rows.append(dict(base, ancestor_item=ancestor, depth=depth))
+		node_idx += 1
+		if node.is_bom:
+			path = ancestors + [node.item_code]
+			for child in reversed(node.child_items or []):
+				stack.append((child, path))
+	return rows
+
+
+def _bulk_insert(rows):
+	ts = now()
+	user = frappe.session.user
+	values = []
+	for row in rows:
+		row = dict(row, name=frappe.generate_hash(length=12), creation=ts, modified=ts, owner=user, modified_by=user)
+		values.append(tuple(row.get(f) for f in _INDEX_FIELDS))
+	for i in range(0, len(values), _BULK_CHUNK):
+		frappe.db.bulk_insert(INDEX_DOCTYPE, _INDEX_FIELDS, values[i:i + _BULK_CHUNK])
+
+
+# --- 维护 ---
+
+
+def rebuild_for_boms(bom_names):
+	"""重建指定根 BOM 的索引行：先删除，再为其中已提交的 BOM 重新展开写入。"""
+	bom_names = list({n for n in bom_names or [] if n})
+	if not bom_names:
+		return
+	for name in bom_names:
+		frappe.cache().delete_value(_failed_root_key(name))
+	frappe.db.delete(INDEX_DOCTYPE, {"root_bom": ["in", bom_names]})
+	submitted = frappe.get_all("BOM", filters={"name": ["in", bom_names], "docstatus": 1}, pluck="name")
+	rows = []
+	for name in submitted:
+		rows.extend(_explode_rows(name))
+	_bulk_insert(rows)
+
+
+def update_for_bom(bom_name):
+	"""BOM 提交 / 提交后更新 / 取消后：重建其自身及以其为子 BOM 的根 BOM 的索引。"""
+	if not bom_name:
+		return
+	dependents = frappe.get_all(INDEX_DOCTYPE, filters={"node_bom": bom_name}, pluck="root_bom", distinct=True)
+	rebuild_for_boms({bom_name, *dependents})
+
+
+def rebuild_bom_where_used():
+	"""全量重建所有已提交 BOM 的索引。返回写入的行数。"""
+	frappe.db.delete(INDEX_DOCTYPE)
+	count = 0
+	for name in frappe.get_all("BOM", filters={"docstatus": 1}, pluck="name", order_by="name asc"):
+		rows = _explode_rows(name)
+		_bulk_insert(rows)
+		count += len(rows)
+	frappe.db.commit()
+	return count
+
+
+# --- 查询 ---
+
+
+def _enqueue_rebuild(bom_names):
+	"""已提交但尚未建索引的根 BOM 放入后台补建；同一批根 BOM 去重入队。"""
+	bom_names = sorted(bom_names)
+	frappe.enqueue(
+		"bairun_erp.utils.api.material.bom_where_used.rebuild_for_boms",
+		queue="short",
+		job_id="bom_where_used::" + frappe.generate_hash(",".join(bom_names), 10),
+		deduplicate=True,
+		bom_names=bom_names,
+	)
+
+
+def _rows_for_item(root_boms, item_code):
+	"""
+	返回各根 BOM 展开中 item_code 节点的索引行（含每个上级装配）。不写库：
+	尚未建索引的根 BOM 在内存展开（已提交的另放入后台补建），近期展开失败的根 BOM 跳过。
+	"""
+	root_boms = list(dict.fromkeys(b for b in root_boms or [] if b))
+	if not root_boms or not item_code:
+		return []
+	indexed = set(
+		frappe.get_all(
+			INDEX_DOCTYPE,
+			filters={"root_bom": ["in", root_boms], "depth": 0},
+			pluck="root_bom",
+		)
+	)
+	missing = [
+		b for b in root_boms
+		if b not in indexed and not frappe.cache().get_value(_failed_root_key(b), expires=True)
+	]
+	in_memory = []
+	exploded = []
+	for name in missing:
+		rows = _explode_rows(name)
+		if rows:
+			exploded.append(name)
+			in_memory.extend(r for r in rows if r["item_code"] == item_code)
+	if exploded:
+		submitted = frappe.get_all("BOM", filters={"name": ["in", exploded], "docstatus": 1}, pluck="name")
+		if submitted:
+			_enqueue_rebuild(submitted)
+	rows = frappe.get_all(
+		INDEX_DOCTYPE,
+		filters={"root_bom": ["in", root_boms], "item_code": item_code},
+		fields=["root_bom", "ancestor_item", "depth", "node_idx", "exploded_qty"],
+		order_by="node_idx asc",
+	)
+	return list(rows) + [frappe._dict(r) for r in in_memory]
+
+
+def get_ancestors_within_boms(item_code, ancestor_candidates, root_boms):
+	"""在给定根 BOM 的展开中，item_code 位于其下方的候选上级装配集合。"""
+	candidates = set(ancestor_candidates or [])
+	if not candidates:
+		return set()
+	return {r.ancestor_item for r in _rows_for_item(root_boms, item_code) if r.ancestor_item in candidates}
+
+
+def get_exploded_qty_map(root_boms, item_code):
+	"""{root_bom: 每单位根物料所需 item_code 数量}；同一根 BOM 中多次出现时取前序展开的第一个节点。"""
+	out = {}
+	for r in sorted(_rows_for_item(root_boms, item_code), key=lambda r: r.node_idx):
+		out.setdefault(r.root_bom, flt(r.exploded_qty))
+	return out
@@ -7,6 +7,8 @@ from __future__ import unicode_literals
 
 import frappe
 
+from bairun_erp.utils import lookup_cache
+
 # Item 主表可从 item_attrs / payload 写入的字段
 ITEM_ATTRS_MAIN_FIELDS = (
 	"br_packing_qty",
@@ -67,77 +69,129 @@ def apply_item_attrs(item_doc, item_attrs):
 				item_doc.append(child_field, row)
 
 
-def resolve_warehouse_name(warehouse_input, company):
-	"""
-	解析仓库名称。ERPNext 仓库 name 通常带公司后缀（如 半成品 - B），
-	前端可能传「半成品仓库」「半成品」等。优先精确匹配，否则按 name 或 warehouse_name 匹配。
-	返回实际 Warehouse name 或 None。
-	"""
-	if not warehouse_input or not isinstance(warehouse_input, str) or not warehouse_input.strip():
-		return None
-	wh = warehouse_input.strip()
-	candidates = []
-	abbr = frappe.get_cached_value("Company", company, "abbr") or ""
+# 每公司仓库别名表（Redis + 请求级），Warehouse 增删改 / 重命名时清除（见 warehouse_events）
+WAREHOUSE_ALIAS_CACHE_PREFIX = "bairun_erp:warehouse_alias:"
+WAREHOUSE_ALIAS_CACHE_TTL_SEC = 60 * 60
+
 
-	for stem in _WAREHOUSE_UI_TO_NAME_STEMS.get(wh, ()):
+def _warehouse_name_candidates(wh, abbr):
+	"""按优先级返回可能的 Warehouse name：映射词干、原值、去「仓库」后缀，各自再拼「 - 公司缩写」。"""
+	stems = list(_WAREHOUSE_UI_TO_NAME_STEMS.get(wh, ()))
+	stems.append(wh)
+	if wh.endswith("仓库") and len(wh) > 2:
+		stems.append(wh[:-2])
+	candidates = []
+	for stem in stems:
 		candidates.append(stem)
 		if abbr:
 			candidates.append("{0} - {1}".format(stem, abbr))
+	return candidates
 
-	candidates.append(wh)
-	if abbr:
-		candidates.append("{0} - {1}".format(wh, abbr))
-	if wh.endswith("仓库") and len(wh) > 2:
-		candidates.append(wh[:-2])
-		if abbr:
-			candidates.append("{0} - {1}".format(wh[:-2], abbr))
 
-	seen = set()
-	for c in candidates:
-		if not c or c in seen:
-			continue
-		seen.add(c)
-		if not frappe.db.exists("Warehouse", c):
-			continue
-		row = frappe.db.get_value(
-			"Warehouse",
-			c,
-			["company", "disabled", "is_group"],
-			as_dict=True,
-		)
-		if (
-			row
-			and row.company == company
-			and not row.get("is_group")
-			and not row.get("disabled")
-		):
+def _resolve_in_alias_map(wh, alias_map):
+	"""在别名表内解析：先按 name 候选，再按 warehouse_name（原值、去「仓库」后缀、映射词干）。"""
+	leaf_names = alias_map["leaf_names"]
+	for c in _warehouse_name_candidates(wh, alias_map["abbr"]):
+		if c in leaf_names:
 			return c
-	found = frappe.db.get_value(
-		"Warehouse",
-		{"warehouse_name": wh, "company": company, "is_group": 0, "disabled": 0},
-		"name",
-	)
-	if found:
-		return found
+	by_warehouse_name = alias_map["by_warehouse_name"]
+	display_names = [wh]
 	if wh.endswith("仓库") and len(wh) > 2:
-		found = frappe.db.get_value(
-			"Warehouse",
-			{"warehouse_name": wh[:-2], "company": company, "is_group": 0, "disabled": 0},
-			"name",
-		)
-		if found:
-			return found
-	for stem in _WAREHOUSE_UI_TO_NAME_STEMS.get(wh, ()):
-		found = frappe.db.get_value(
-			"Warehouse",
-			{"warehouse_name": stem, "company": company, "is_group": 0, "disabled": 0},
-			"name",
-		)
-		if found:
-			return found
+		display_names.append(wh[:-2])
+	display_names.extend(_WAREHOUSE_UI_TO_NAME_STEMS.get(wh, ()))
+	for dn in display_names:
+		if dn in by_warehouse_name:
+			return by_warehouse_name[dn]
 	return None
 
 
+def _build_warehouse_alias_map(company):
+	"""
+	一次查询该公司全部仓库，构建双向别名表：
+	- leaf_names: 可用（非组、未停用）仓库 name
+	- by_warehouse_name: warehouse_name -> name（可用仓库，按 modified 倒序取第一条）
+	- display_names: name -> warehouse_name（全部仓库）
+	- ui_to_name / name_to_ui: 画布展示名 <-> 仓库 name
+	"""
+	rows = frappe.get_all(
+		"Warehouse",
+		filters={"company": company},
+		fields=["name", "warehouse_name", "is_group", "disabled"],
+		order_by="modified desc",
+	)
+	alias_map = {
+		"abbr": frappe.get_cached_value("Company", company, "abbr") or "",
+		"leaf_names": set(),
+		"by_warehouse_name": {},
+		"display_names": {},
+	}
+	for r in rows:
+		alias_map["display_names"][r.name] = r.warehouse_name
+		if r.is_group or r.disabled:
+			continue
+		alias_map["leaf_names"].add(r.name)
+		if r.warehouse_name:
+			alias_map["by_warehouse_name"].setdefault(r.warehouse_name, r.name)
+
+	ui_to_name = {}
+	name_to_ui = {}
+	for ui_label in _WAREHOUSE_UI_TO_NAME_STEMS:
+		name = _resolve_in_alias_map(ui_label, alias_map)
+		if name:
+			ui_to_name[ui_label] = name
+			name_to_ui.setdefault(name, ui_label)
+	alias_map["ui_to_name"] = ui_to_name
+	alias_map["name_to_ui"] = name_to_ui
+	return alias_map
+
+
+def get_warehouse_alias_map(company):
+	"""取公司仓库别名表：请求级 -> Redis -> 重建。"""
+	store = getattr(frappe.local, "bairun_warehouse_alias", None)
+	if store is None:
+		store = frappe.local.bairun_warehouse_alias = {}
+	if company in store:
+		return store[company]
+	key = WAREHOUSE_ALIAS_CACHE_PREFIX + company
+	alias_map = frappe.cache().get_value(key)
+	if not isinstance(alias_map, dict):
+		alias_map = _build_warehouse_alias_map(company)
+		frappe.cache().set_value(key, alias_map, expires_in_sec=WAREHOUSE_ALIAS_CACHE_TTL_SEC)
+	store[company] = alias_map
+	return alias_map
+
+
+def clear_warehouse_alias_cache(company=None):
+	"""Warehouse 变更后清除别名表；company 为空时清除全部公司。"""
+	if company:
+		frappe.cache().delete_value(WAREHOUSE_ALIAS_CACHE_PREFIX + company)
+	else:
+		frappe.cache().delete_keys(WAREHOUSE_ALIAS_CACHE_PREFIX)
+	store = getattr(frappe.local, "bairun_warehouse_alias", None)
+	if store:
+		if company:
+			store.pop(company, None)
+		else:
+			store.clear()
+
+
+def resolve_warehouse_name(warehouse_input, company):
+	"""
+	解析仓库名称。ERPNext 仓库 name 通常带公司后缀（如 半成品 - B），
+	前端可能传「半成品仓库」「半成品」等。优先精确匹配，否则按 name 或 warehouse_name 匹配。
+	返回实际 Warehouse name 或 None。查表见 get_warehouse_alias_map。
+	"""
+	if not warehouse_input or not isinstance(warehouse_input, str) or not warehouse_input.strip():
+		return None
+	if not company:
+		return None
+	wh = warehouse_input.strip()
+	alias_map = get_warehouse_alias_map(company)
+	if wh in alias_map["ui_to_name"]:
+		return alias_map["ui_to_name"][wh]
+	return _resolve_in_alias_map(wh, alias_map)
+
+
 def item_default_wh_to_canvas_display(internal_wh_name, company):
 	"""
 	将 Item Default 中的 default_warehouse（Warehouse Link name）转为 BOM 画布下拉的展示名。
@@ -148,10 +202,14 @@ def item_default_wh_to_canvas_display(internal_wh_name, company):
 	if not company:
 		return internal_wh_name.strip()
 	wh = internal_wh_name.strip()
-	for ui_label in _WAREHOUSE_UI_TO_NAME_STEMS:
-		if resolve_warehouse_name(ui_label, company) == wh:
-			return ui_label
-	dn = frappe.db.get_value("Warehouse", wh, "warehouse_name")
+	alias_map = get_warehouse_alias_map(company)
+	ui_label = alias_map["name_to_ui"].get(wh)
+	if ui_label:
+		return ui_label
+	if wh in alias_map["display_names"]:
+		dn = alias_map["display_names"][wh]
+	else:
+		dn = lookup_cache.get_value("Warehouse", wh, "warehouse_name")
 	return (dn or wh).strip()
 
 
@@ -13,9 +13,14 @@
 from __future__ import unicode_literals
 
 import frappe
-from frappe.utils import getdate
+from frappe.utils import cint, getdate
 
-from bairun_erp.utils.api.material.item import _ensure_supplier_items, _validate_suppliers_exist
+from bairun_erp.utils import lookup_cache
+from bairun_erp.utils.api.material.item import _parse_suppliers, _validate_suppliers_exist
+from bairun_erp.utils.api.material.item_supplier_bulk import enqueue_supplier_price_job, replace_item_suppliers
+
+# 按物料组应用供应商价格：规格数超过该值且未显式指定 run_in_background 时自动放入后台
+SUPPLIER_PRICE_BACKGROUND_THRESHOLD = 200
 
 # 前端分类 key -> 物料组 name（与 PACKAGING_CATEGORIES 一致）
 PACKAGING_CATEGORY_MAP = {
@@ -270,10 +275,12 @@ def get_supplier_price_history(
 	supplier_id = (supplier_id or "").strip()
 	if not supplier_id:
 		frappe.throw("请传入 supplier_id")
-	if not frappe.db.exists("Supplier", supplier_id):
+	# 存在性与名称一次查询
+	supplier = lookup_cache.bulk_get("Supplier", [supplier_id], ["supplier_name"]).get(supplier_id)
+	if not supplier:
 		frappe.throw("供应商不存在", title="供应商无效")
 
-	supplier_name = frappe.db.get_value("Supplier", supplier_id, "supplier_name") or supplier_id
+	supplier_name = supplier.supplier_name or supplier_id
 
 	conditions = ["supplier = %(supplier_id)s", "parenttype = 'Item'", "parentfield = 'supplier_items'"]
 	params = {"supplier_id": supplier_id}
@@ -314,18 +321,23 @@ def apply_supplier_prices_by_item_group(
 	item_group=None,
 	category=None,
 	suppliers=None,
+	run_in_background=None,
 ):
 	"""
 	按物料组批量应用供应商价格：将该物料组下所有包材 Item 的供应商明细统一为入参 suppliers 配置。
 	用于包材价格页「供应商价格审核」按钮：页顶配置的供应商+单价+开票一次性应用到该组下全部规格。
+	整组按批改写 tabItem Supplier（见 item_supplier_bulk），同一事务内完成，任一失败整体回滚。
 
 	参数:
 		item_group: 物料组名称，如「纸箱」「泡沫垫板」。与 category 二选一。
 		category: 分类 key，如 box、foam-pad。与 item_group 二选一，会映射为物料组。
 		suppliers: 供应商配置列表（建议最多 3 条，与页顶槽位一致）。每项含 supplier（必填）、custom_price、custom_isinvoice、supplier_part_no。
+		run_in_background: 为真时放入后台队列执行；未传时规格数超过 SUPPLIER_PRICE_BACKGROUND_THRESHOLD 自动放入后台。
 
 	返回:
 		{"success": true, "message": "...", "updated_count": N, "item_group": "..."}
+		后台执行时: {"success": true, "message": "...", "updated_count": 0, "item_group": "...", "job_id": "...", "status": "queued"}，
+		用 item_supplier_bulk.get_supplier_price_job_status 轮询
 
 	bench execute 示例:
 		bench --site site2.local execute bairun_erp.utils.api.material.item_packaging.apply_supplier_prices_by_item_group --kwargs '{"item_group": "纸箱", "suppliers": [{"supplier": "SUP-001", "custom_price": 2.23, "custom_isinvoice": 1}, {"supplier": "SUP-0011", "custom_price": 1.88, "custom_isinvoice": 0}]}'
@@ -373,21 +385,33 @@ def apply_supplier_prices_by_item_group(
 			"item_group": group_name,
 		}
 
-	updated_count = 0
-	for item_code in item_names:
-		try:
-			doc = frappe.get_doc("Item", item_code)
-			doc.supplier_items = []
-			_ensure_supplier_items(doc, suppliers)
-			updated_count += 1
-		except Exception as e:
-			frappe.log_error(title=f"apply_supplier_prices_by_item_group {item_code}", message=str(e))
-			return {
-				"success": False,
-				"message": f"更新物料 {item_code} 时失败：{e}",
-				"updated_count": updated_count,
-				"item_group": group_name,
-			}
+	suppliers = _parse_suppliers(suppliers)
+	if run_in_background is None:
+		run_in_background = len(item_names) > SUPPLIER_PRICE_BACKGROUND_THRESHOLD
+	if cint(run_in_background):
+		job_id = enqueue_supplier_price_job(group_name, item_names, suppliers)
+		return {
+			"success": True,
+			"message": f"物料组「{group_name}」下 {len(item_names)} 个规格已放入后台更新",
+			"updated_count": 0,
+			"item_group": group_name,
+			"job_id": job_id,
+			"status": "queued",
+		}
+
+	savepoint = "apply_supplier_prices"
+	frappe.db.savepoint(savepoint)
+	try:
+		updated_count = replace_item_suppliers(item_names, suppliers)
+	except Exception as e:
+		frappe.db.rollback(save_point=savepoint)
+		frappe.log_error(title=f"apply_supplier_prices_by_item_group {group_name}", message=frappe.get_traceback())
+		return {
+			"success": False,
+			"message": f"更新物料组「{group_name}」供应商价格失败，已全部回滚：{e}",
+			"updated_count": 0,
+			"item_group": group_name,
+		}
 
 	return {
 		"success": True,
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import frappe
 
+from bairun_erp.utils import lookup_cache
 from bairun_erp.utils.api.material.item import (
 	_ensure_supplier_items,
 	_get_default_leaf_name,
@@ -36,6 +37,8 @@ def _build_service_item_response(doc, include_supplier_name=False):
 	若 Item 有纸箱长宽高字段（br_carton_length/width/height，单位厘米），则一并返回，并返回体积 br_volume_m3（立方米，= 长*宽*高/1e6）。
 	"""
 	supplier_items = []
+	if include_supplier_name:
+		lookup_cache.bulk_get("Supplier", [row.supplier for row in doc.get("supplier_items") or []], ["supplier_name"])
 	for row in (doc.get("supplier_items") or []):
 		entry = {
 			"supplier": row.supplier,
@@ -44,7 +47,7 @@ def _build_service_item_response(doc, include_supplier_name=False):
 			"custom_isinvoice": getattr(row, "custom_isinvoice", None),
 		}
 		if include_supplier_name and row.supplier:
-			supplier_name = frappe.db.get_value("Supplier", row.supplier, "supplier_name")
+			supplier_name = lookup_cache.get_value("Supplier", row.supplier, "supplier_name")
 			entry["supplier_name"] = supplier_name or row.supplier
 		supplier_items.append(entry)
 
@@ -0,0 +1,192 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+Item 供应商明细（tabItem Supplier，Item.supplier_items）批量改写：供 item_packaging.apply_supplier_prices_by_item_group 使用。
+
+- 不逐个 get_doc + save（每个 Item 都走完整 validate 链），而是按批 DELETE 旧行 + bulk_insert 新行，
+  并回写 Item.modified / modified_by、清文档缓存；BOM 展开等按 Item.modified 校验的缓存随之失效。
+- 整组在同一事务内完成：任一批失败整体回滚，不会停在半途。
+- 行内容与 item._ensure_supplier_items 一致（跳过空 / 不存在的供应商，按 Item Supplier 实际字段取列）；
+  不产生 Version 记录，不触发 Item 的 doc_events（供应商明细与 item_events 的工艺成本行无关）。
+- 可通过 frappe.enqueue 在后台执行，进度与结果记录在 Redis，前端用 get_supplier_price_job_status 轮询，
+  或监听 realtime 事件 supplier_price_job_progress。
+
+bench execute 示例:
+	bench --site site2.local execute bairun_erp.utils.api.material.item_supplier_bulk.get_supplier_price_job_status --kwargs '{"job_id": "xxxx"}'
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.utils import now
+
+from bairun_erp.utils import job_state, lookup_cache
+from bairun_erp.utils.api.material.item import _parse_suppliers
+
+JOB_CACHE_PREFIX = "bairun_erp:supplier_price_job:"
+
+CHILD_DOCTYPE = "Item Supplier"
+_CHUNK_SIZE = 500
+_BASE_FIELDS = (
+	"name", "creation", "modified", "owner", "modified_by", "docstatus",
+	"parent", "parentfield", "parenttype", "idx",
+)
+
+
+def _supplier_entries(suppliers):
+	"""
+	将 suppliers 配置转为 (列名元组, 行 dict 列表)；与 _ensure_supplier_items 相同的取舍规则，
+	供应商存在性一次查询。
+	"""
+	parsed = _parse_suppliers(suppliers)
+	codes = [(row.get("supplier") or "").strip() for row in parsed]
+	wanted = [c for c in codes if c]
+	existing = set(frappe.get_all("Supplier", filters={"name": ["in", wanted]}, pluck="name")) if wanted else set()
+
+	meta = frappe.get_meta(CHILD_DOCTYPE)
+	columns = ["supplier", "supplier_part_no"]
+	for fieldname in ("custom_price", "custom_isinvoice", "custom_pricing_factor"):
+		if meta.get_field(fieldname):
+			columns.append(fieldname)
+
+	entries = []
+	for row, supplier in zip(parsed, codes):
+		if supplier not in existing:
+			continue
+		entry = {"supplier": supplier, "supplier_part_no": row.get("supplier_part_no")}
+		if "custom_price" in columns:
+			entry["custom_price"] = float(row.get("custom_price") or 0)
+		if "custom_isinvoice" in columns:
+			entry["custom_isinvoice"] = 1 if row.get("custom_isinvoice") else 0
+		if "custom_pricing_factor" in columns:
+			val = row.get("custom_pricing_factor")
+			entry["custom_pricing_factor"] = float(val) if val is not None and val != "" else 1.0
+		entries.append(entry)
+	return tuple(columns), entries
+
+
+def replace_item_suppliers(item_names, suppliers, progress=None):
+	"""
+	将 item_names 中每个 Item 的供应商明细统一改写为 suppliers 配置（不提交事务，由调用方提交 / 回滚）。
+	progress(done, total) 每批回调一次。返回更新的 Item 数。
+	"""
+	item_names = list(dict.fromkeys(n for n in item_names or [] if n))
+	total = len(item_names)
+	if not total:
+		return 0
+	columns, entries = _supplier_entries(suppliers)
+	fields = _BASE_FIELDS + columns
+	ts = now()
+	user = frappe.session.user
+
+	done = 0
+	for i in range(0, total, _CHUNK_SIZE):
+		chunk = item_names[i:i + _CHUNK_SIZE]
+		frappe.db.delete(
+			CHILD_DOCTYPE,
+			{"parenttype": "Item", "parentfield": "supplier_items", "parent": ["in", chunk]},
+		)
+		values = []
+		for item_code in chunk:
+			for idx, entry in enumerate(entries, 1):
+				base = (frappe.generate_hash(length=10), ts, ts, user, user, 0, item_code, "supplier_items", "Item", idx)
+				values.append(base + tuple(entry.get(c) for c in columns))
+		if values:
+			frappe.db.bulk_insert(CHILD_DOCTYPE, fields, values)
+		frappe.db.sql(
+			"UPDATE `tabItem` SET modified = %s, modified_by = %s WHERE name IN %s",
+			(ts, user, tuple(chunk)),
+		)
+		for item_code in chunk:
+			frappe.clear_document_cache("Item", item_code)
+		done += len(chunk)
+		if progress:
+			progress(done, total)
+	lookup_cache.clear("Item")
+	return done
+
+
+# --- 后台任务 ---
+
+
+def _job_key(job_id):
+	return JOB_CACHE_PREFIX + job_id
+
+
+def enqueue_supplier_price_job(item_group, item_names, suppliers):
+	"""把整组改写放入 long 队列，立即返回 job_id；进度与结果见 get_supplier_price_job_status。"""
+	job_id = frappe.generate_hash(length=12)
+	job_state.update_state(
+		_job_key(job_id),
+		job_id=job_id,
+		item_group=item_group,
+		status="queued",
+		owner=frappe.session.user,
+		done=0,
+		total=len(item_names),
+		result=None,
+		error=None,
+	)
+	frappe.enqueue(
+		"bairun_erp.utils.api.material.item_supplier_bulk.run_supplier_price_job",
+		queue="long",
+		timeout=3600,
+		enqueue_after_commit=True,
+		price_job_id=job_id,
+		item_group=item_group,
+		item_names=item_names,
+		suppliers=suppliers,
+	)
+	return job_id
+
+
+def run_supplier_price_job(price_job_id, item_group, item_names, suppliers):
+	"""后台任务入口：整组一个事务，失败整体回滚；结果写回任务状态。"""
+	job = job_state.update_state(_job_key(price_job_id), status="running")
+
+	def _progress(done, total):
+		job_state.update_state(_job_key(price_job_id), done=done, total=total)
+		frappe.publish_realtime(
+			"supplier_price_job_progress",
+			{"job_id": price_job_id, "done": done, "total": total},
+			user=job.get("owner"),
+		)
+
+	try:
+		updated_count = replace_item_suppliers(item_names, suppliers, progress=_progress)
+		frappe.db.commit()
+		job_state.update_state(
+			_job_key(price_job_id),
+			status="finished",
+			result={"updated_count": updated_count, "item_group": item_group},
+		)
+	except Exception as e:
+		frappe.db.rollback()
+		frappe.log_error(
+			title="Supplier price job {0} failed".format(price_job_id),
+			message=frappe.get_traceback(),
+		)
+		job_state.update_state(_job_key(price_job_id), status="failed", done=0, error=str(e))
+
+
+@frappe.whitelist()
+def get_supplier_price_job_status(job_id=None):
+	"""
+	查询按物料组批量应用供应商价格任务状态。
+	返回: { job_id, item_group, status(queued/running/finished/failed/not_found), done, total, progress(0-100), result, error }
+	"""
+	job_id = (job_id or "").strip()
+	job = job_state.get_state(_job_key(job_id)) if job_id else None
+	if not job:
+		return {"job_id": job_id, "status": "not_found"}
+	job_state.check_owner(job)
+	return {
+		"job_id": job_id,
+		"item_group": job.get("item_group"),
+		"status": job.get("status"),
+		"done": job.get("done") or 0,
+		"total": job.get("total") or 0,
+		"progress": job_state.progress(job),
+		"result": job.get("result"),
+		"error": job.get("error"),
+	}
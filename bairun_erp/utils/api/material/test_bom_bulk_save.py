@@ -0,0 +1,132 @@
+# Copyright (c) 2026, Bairun and contributors
+# 批量保存 BOM：子 BOM 先于父 BOM 保存、缺失物料仅在带物料组与单位时一次性预建。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.material.test_bom_bulk_save
+
+from __future__ import unicode_literals
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.tests.utils import named_mock, patch_attrs
+from bairun_erp.utils.api.material import bom_bulk_save
+from bairun_erp.utils.api.material.bom_bulk_save import order_boms_bottom_up
+
+
+def _bom(item, *children):
+	return {"doctype": "BOM", "item": item, "items": [{"item_code": c, "qty": 1} for c in children]}
+
+
+class TestBomBulkSaveOrder(FrappeTestCase):
+	def test_children_saved_before_parents(self):
+		boms = [
+			_bom("成品A", "组件B", "原料X"),
+			_bom("组件B", "半成品C"),
+			_bom("半成品C", "原料Y"),
+			_bom("成品D", "原料Z"),
+		]
+		ordered, has_cycle = order_boms_bottom_up(boms)
+		self.assertFalse(has_cycle)
+		self.assertEqual(sorted(ordered), [0, 1, 2, 3])
+		pos = {idx: n for n, idx in enumerate(ordered)}
+		self.assertLess(pos[2], pos[1])
+		self.assertLess(pos[1], pos[0])
+
+	def test_self_reference_ignored(self):
+		ordered, has_cycle = order_boms_bottom_up([_bom("成品A", "成品A", "原料X")])
+		self.assertFalse(has_cycle)
+		self.assertEqual(ordered, [0])
+
+	def test_cycle_detected(self):
+		_ordered, has_cycle = order_boms_bottom_up([_bom("A", "B"), _bom("B", "A")])
+		self.assertTrue(has_cycle)
+
+
+def _inserted(doc_dict):
+	doc = MagicMock()
+	doc.insert.return_value = named_mock(doc_dict["item_code"])
+	return doc
+
+
+def _row(item_code, **extra):
+	return dict({"item_code": item_code, "qty": 1}, **extra)
+
+
+class TestBomBulkSavePrefetch(FrappeTestCase):
+	def test_only_items_with_group_and_uom_created(self):
+		boms = [
+			{"doctype": "BOM", "item": "成品A", "items": [_row("原料X", item_group="原材料", uom="Kg"), _row("原料Y")]},
+			_bom("组件B", "原料X"),
+			{"doctype": "BOM", "item": "成品C", "items": [_row("原料Z", item_group="原材料")]},
+		]
+		with patch.object(
+			bom_bulk_save, "get_existing_names", return_value={"成品A", "组件B", "成品C"}
+		) as existing, patch.object(bom_bulk_save.frappe, "get_doc", side_effect=_inserted) as get_doc:
+			items, created = bom_bulk_save.ensure_items(boms)
+		self.assertEqual(existing.call_count, 1)
+		self.assertEqual(created, ["原料X"])
+		self.assertEqual(
+			[(c.args[0]["item_code"], c.args[0]["item_group"], c.args[0]["stock_uom"]) for c in get_doc.call_args_list],
+			[("原料X", "原材料", "Kg")],
+		)
+		self.assertEqual(items, {"成品A", "组件B", "成品C", "原料X"})
+
+	def test_unknown_item_fails_only_its_bom_and_created_items_reported(self):
+		boms = [_bom("成品A", "组件B"), _bom("组件B", "原料X"), _bom("成品D", "原料错")]
+		saved = []
+
+		def _build(bom_data, existing):
+			if "原料错" in [r["item_code"] for r in bom_data["items"]]:
+				raise frappe.DoesNotExistError("Item 原料错 does not exist")
+			doc = named_mock("BOM-" + bom_data["item"], is_default=0)
+			doc.submit.side_effect = lambda: saved.append(doc.name)
+			return doc
+
+		with patch_attrs(
+			bom_bulk_save,
+			ensure_operations=None,
+			ensure_items={"return_value": ({"成品A", "组件B", "成品D", "原料X"}, ["原料X"])},
+			_build_bom_doc={"side_effect": _build},
+		), patch.object(bom_bulk_save.frappe, "db"):
+			results, has_cycle = bom_bulk_save.save_boms_bottom_up(boms)
+		self.assertFalse(has_cycle)
+		self.assertEqual(saved, ["BOM-组件B", "BOM-成品A"])
+		by_item = {res["item_code"]: res for res in results}
+		self.assertEqual(by_item["成品D"]["error_type"], "DoesNotExistError")
+		self.assertEqual(by_item["组件B"]["created_items"], ["原料X"])
+		self.assertEqual(by_item["成品A"]["created_items"], [])
+
+
+class TestEnsureItemsDatabase(FrappeTestCase):
+	CODES = ("_TEST-BULK-BOM-NEW", "_TEST-BULK-BOM-TYPO")
+
+	def setUp(self):
+		self.item_group = frappe.db.get_value("Item Group", {"is_group": 0}, "name")
+		if not self.item_group or not frappe.db.exists("UOM", "Nos"):
+			self.skipTest("no leaf Item Group or UOM Nos")
+		self._delete_items()
+
+	def tearDown(self):
+		self._delete_items()
+
+	def _delete_items(self):
+		for code in self.CODES:
+			if frappe.db.exists("Item", code):
+				frappe.delete_doc("Item", code, force=1, ignore_permissions=True)
+
+	def test_creates_only_items_with_group_and_uom(self):
+		boms = [{
+			"doctype": "BOM",
+			"item": self.CODES[0],
+			"item_group": self.item_group,
+			"stock_uom": "Nos",
+			"items": [_row(self.CODES[1])],
+		}]
+		items, created = bom_bulk_save.ensure_items(boms)
+		self.assertEqual(created, [self.CODES[0]])
+		self.assertEqual(frappe.db.get_value("Item", self.CODES[0], "item_group"), self.item_group)
+		self.assertFalse(frappe.db.exists("Item", self.CODES[1]))
+		self.assertNotIn(self.CODES[1], items)
@@ -0,0 +1,217 @@
+# Copyright (c) 2026, Bairun and contributors
+# BOM 画布增量保存：只重写有变更的 BOM、物料按内容哈希跳过写入、已提交 BOM 逐级升版。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.material.test_bom_canvas_diff
+
+from __future__ import unicode_literals
+
+import copy
+from unittest.mock import MagicMock
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.tests.utils import named_mock, patch_attrs
+from bairun_erp.utils.api.material import bom_canvas_diff as diff
+from bairun_erp.utils.api.material import bom_item
+
+
+def _node(node_id, code, qty=1, *children, **extra):
+	node = {"id": node_id, "item_code": code, "item_name": code, "bom_qty": qty, "children": list(children)}
+	node.update(extra)
+	return node
+
+
+def _wh(node):
+	return (node.get("warehouse") or "").strip()
+
+
+def _stored_tree():
+	"""成品 -> [组件A(子 BOM-A) -> [原料X, 半成品B(子 BOM-B) -> [原料Y, 原料Z]], 原料W]，共 300 个叶子挂在原料层。"""
+	leaves = [_node("row-L{}".format(i), "原料L{}".format(i), 2) for i in range(290)]
+	sub_b = _node("row-B", "半成品B", 1, _node("row-Y", "原料Y", 3), _node("row-Z", "原料Z", 4))
+	sub_a = _node("row-A", "组件A", 1, _node("row-X", "原料X", 1), sub_b, *leaves)
+	return _node("root", "成品", 1, sub_a, _node("row-W", "原料W", 5))
+
+
+BOM_NO_MAP = {"row-A": "BOM-A", "row-B": "BOM-B"}
+
+
+class TestPlanBomChanges(FrappeTestCase):
+	def _plan(self, incoming, stored=None):
+		stored = stored or _stored_tree()
+		return diff.plan_bom_changes(incoming, stored, "BOM-ROOT", BOM_NO_MAP, _wh, _wh)
+
+	def test_unchanged_tree_touches_nothing(self):
+		plan, skipped = self._plan(_stored_tree())
+		self.assertEqual(plan, [])
+		self.assertEqual(skipped, 296)
+
+	def test_one_leaf_edit_touches_only_its_bom(self):
+		incoming = _stored_tree()
+		incoming["children"][0]["children"][1]["children"][0]["bom_qty"] = 30
+		plan, _skipped = self._plan(incoming)
+		# 已提交 BOM 改写即换版本：路径上的上级直到根都要重写
+		self.assertEqual([p["bom_name"] for p in plan], ["BOM-B", "BOM-A", "BOM-ROOT"])
+		self.assertEqual([p["child_boms"] for p in plan], [{}, {}, {}])
+
+	def test_new_subassembly_creates_bom_and_rewrites_parent(self):
+		incoming = _stored_tree()
+		incoming["children"][1]["children"] = [_node("new-1", "原料N", 2)]
+		plan, _skipped = self._plan(incoming)
+		self.assertEqual([(p["bom_name"], p["node"]["item_code"]) for p in plan], [(None, "原料W"), ("BOM-ROOT", "成品")])
+		self.assertEqual(plan[1]["child_boms"], {"组件A": "BOM-A"})
+
+	def test_children_matched_by_item_code_when_ids_missing(self):
+		incoming = copy.deepcopy(_stored_tree())
+		for child in incoming["children"]:
+			child["id"] = ""
+		plan, _skipped = self._plan(incoming)
+		self.assertEqual(plan, [])
+
+	def test_row_warehouse_change_rewrites_parent(self):
+		incoming = _stored_tree()
+		incoming["children"][1]["warehouse"] = "原材料 - B"
+		plan, _skipped = self._plan(incoming)
+		self.assertEqual([p["bom_name"] for p in plan], ["BOM-ROOT"])
+
+
+class TestNodesNeedingItemWrite(FrappeTestCase):
+	def test_only_new_or_changed_item_nodes(self):
+		same = _node("1", "I-SAME", item_attrs={"color": "红"})
+		edited = _node("2", "I-EDIT", item_attrs={"color": "蓝"})
+		touched = _node("3", "I-TOUCHED", item_attrs={"color": "绿"})
+		plain = _node("4", "I-PLAIN")
+		new = _node("5", "I-NEW")
+		applied = {
+			"I-SAME": [diff.item_content_hash(same), "2026-01-01"],
+			"I-EDIT": [diff.item_content_hash(_node("2", "I-EDIT", item_attrs={"color": "红"})), "2026-01-01"],
+			"I-TOUCHED": [diff.item_content_hash(touched), "2026-01-01"],
+		}
+		cache = MagicMock()
+		cache.get_value.return_value = applied
+		modified = [
+			frappe._dict(name="I-SAME", modified="2026-01-01"),
+			frappe._dict(name="I-EDIT", modified="2026-01-01"),
+			frappe._dict(name="I-TOUCHED", modified="2026-02-01"),
+		]
+		with patch_attrs(diff.frappe, cache={"return_value": cache}, get_all={"return_value": modified}):
+			out = diff.nodes_needing_item_write(
+				"BOM-ROOT", [same, edited, touched, plain, new], {"I-SAME", "I-EDIT", "I-TOUCHED", "I-PLAIN"}
+			)
+		self.assertEqual([n["item_code"] for n in out], ["I-EDIT", "I-TOUCHED", "I-NEW"])
+
+
+def _submitted_bom(name, item, rows=2):
+	return named_mock(name, docstatus=1, item=item, company="C", items=[MagicMock()] * rows)
+
+
+class TestIncrementalSubmittedBoms(FrappeTestCase):
+	def _run(self, incoming):
+		docs = {
+			"BOM-ROOT": _submitted_bom("BOM-ROOT", "成品"),
+			"BOM-A": _submitted_bom("BOM-A", "组件A", 292),
+			"BOM-B": _submitted_bom("BOM-B", "半成品B"),
+		}
+		saved = []
+
+		def save_boms(boms):
+			saved.append(boms[0])
+			return [{"index": 0, "item_code": boms[0]["item"], "bom_name": boms[0]["item"] + "-v2"}], False
+
+		def target_rows(node, company):
+			return [
+				{"item_code": c["item_code"], "qty": c["bom_qty"], "uom": "Nos", "source_warehouse": None, "supplier": None}
+				for c in node.get("children") or []
+			], []
+
+		def copy_doc(doc):
+			copied = MagicMock()
+			copied.as_dict.return_value = {"doctype": "BOM", "item": doc.item, "docstatus": 1, "exploded_items": [{}]}
+			return copied
+
+		with patch_attrs(
+			diff,
+			nodes_needing_item_write={"return_value": []},
+			record_applied_item_hashes=None,
+			stored_bom_no_map={"return_value": BOM_NO_MAP},
+		), patch_attrs(
+			bom_item,
+			get_existing_names={"return_value": set()},
+			_build_bom_tree={"return_value": _stored_tree()},
+			_build_target_bom_items_from_tree={"side_effect": target_rows},
+			save_boms_bottom_up={"side_effect": save_boms},
+		), patch_attrs(
+			bom_item.frappe,
+			get_doc={"side_effect": lambda _dt, name: docs.get(name) or _submitted_bom(name, "")},
+			copy_doc={"side_effect": copy_doc},
+			has_permission={"return_value": True},
+			get_cached_value={"return_value": "CNY"},
+			db=None,
+		):
+			res = bom_item._update_bom_incremental(docs["BOM-ROOT"], incoming)
+		for doc in docs.values():
+			doc.save.assert_not_called()
+		return res, saved
+
+	def test_leaf_edit_versions_every_ancestor(self):
+		incoming = _stored_tree()
+		incoming["children"][0]["children"][1]["children"][0]["bom_qty"] = 30
+		res, saved = self._run(incoming)
+
+		self.assertEqual([b["item"] for b in saved], ["半成品B", "组件A", "成品"])
+		for data in saved:
+			self.assertEqual(data["docstatus"], 0)
+			self.assertNotIn("exploded_items", data)
+		bom_no = {r["item_code"]: r.get("bom_no") for r in saved[1]["items"]}
+		self.assertEqual(bom_no["半成品B"], "半成品B-v2")
+		self.assertEqual(saved[2]["items"][0]["bom_no"], "组件A-v2")
+		self.assertEqual(res["data"]["bom_name"], "成品-v2")
+		self.assertEqual(res["data"]["bom_versions"], {"BOM-B": "半成品B-v2", "BOM-A": "组件A-v2", "BOM-ROOT": "成品-v2"})
+
+	def test_new_subassembly_keeps_unchanged_sibling_bom(self):
+		incoming = _stored_tree()
+		incoming["children"][1]["children"] = [_node("new-1", "原料N", 2)]
+		res, saved = self._run(incoming)
+
+		self.assertEqual([b["item"] for b in saved], ["原料W", "成品"])
+		bom_no = {r["item_code"]: r.get("bom_no") for r in saved[1]["items"]}
+		self.assertEqual(bom_no, {"组件A": "BOM-A", "原料W": "原料W-v2"})
+		self.assertEqual(res["data"]["created_boms"], ["原料W-v2"])
+
+
+class TestItemHashesDatabase(FrappeTestCase):
+	ROOT = "_TEST-CANVAS-DIFF-ROOT"
+	ITEM = "_TEST-CANVAS-DIFF-ITEM"
+
+	def setUp(self):
+		item_group = frappe.db.get_value("Item Group", {"is_group": 0}, "name")
+		if not item_group or not frappe.db.exists("UOM", "Nos"):
+			self.skipTest("need a leaf Item Group and UOM Nos")
+		self._cleanup()
+		frappe.get_doc({
+			"doctype": "Item",
+			"item_code": self.ITEM,
+			"item_name": self.ITEM,
+			"item_group": item_group,
+			"stock_uom": "Nos",
+		}).insert(ignore_permissions=True)
+
+	def tearDown(self):
+		self._cleanup()
+
+	def _cleanup(self):
+		frappe.cache().delete_value(diff._item_hash_key(self.ROOT))
+		if frappe.db.exists("Item", self.ITEM):
+			frappe.delete_doc("Item", self.ITEM, force=1, ignore_permissions=True)
+
+	def test_item_modified_elsewhere_is_written_again(self):
+		node = _node("1", self.ITEM, item_attrs={"color": "红"})
+		self.assertEqual(diff.nodes_needing_item_write(self.ROOT, [node], {self.ITEM}), [node])
+
+		diff.record_applied_item_hashes(self.ROOT, [node])
+		self.assertEqual(diff.nodes_needing_item_write(self.ROOT, [node], {self.ITEM}), [])
+
+		frappe.db.set_value("Item", self.ITEM, "description", "changed outside the canvas")
+		self.assertEqual(diff.nodes_needing_item_write(self.ROOT, [node], {self.ITEM}), [node])
@@ -0,0 +1,129 @@
+# Copyright (c) 2026, Bairun and contributors
+# BOM 展开反查索引：前序展开覆盖各上级装配、查询不写库、展开失败的根 BOM 不重复展开。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.material.test_bom_where_used
+
+from __future__ import unicode_literals
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.tests.utils import bom_tree_leaf as _leaf
+from bairun_erp.tests.utils import bom_tree_node as _bom
+from bairun_erp.tests.utils import patch_attrs
+from bairun_erp.utils.api.material import bom_where_used
+
+
+class TestBomWhereUsedExplode(FrappeTestCase):
+	def setUp(self):
+		# 成品A(BOM-A) -> 电镀件B(BOM-B, ×2) -> 毛坯C(×3)；成品A 另直接含 毛坯C(×1)
+		self.tree = _bom(
+			"BOM-A",
+			"成品A",
+			1,
+			_bom("BOM-B", "电镀件B", 2, _leaf("毛坯C", 6)),
+			_leaf("毛坯C", 1),
+		)
+
+	def _rows(self):
+		with patch.object(bom_where_used, "BOMTree", return_value=self.tree):
+			return bom_where_used._explode_rows("BOM-A")
+
+	def test_rows_cover_every_ancestor(self):
+		rows = self._rows()
+		pairs = {(r["item_code"], r["ancestor_item"], r["depth"]) for r in rows}
+		self.assertEqual(
+			pairs,
+			{
+				("成品A", None, 0),
+				("电镀件B", "成品A", 1),
+				("毛坯C", "电镀件B", 1),
+				("毛坯C", "成品A", 2),
+				("毛坯C", "成品A", 1),
+			},
+		)
+		self.assertTrue(all(r["root_bom"] == "BOM-A" and r["root_item"] == "成品A" for r in rows))
+
+	def test_preorder_index_and_exploded_qty(self):
+		nodes = {}
+		for r in self._rows():
+			nodes.setdefault(r["node_idx"], (r["item_code"], r["exploded_qty"], r["node_bom"]))
+		self.assertEqual(
+			[nodes[i] for i in sorted(nodes)],
+			[("成品A", 1, "BOM-A"), ("电镀件B", 2, "BOM-B"), ("毛坯C", 6, None), ("毛坯C", 1, None)],
+		)
+
+
+class TestRowsForItemReadOnly(FrappeTestCase):
+	ROOTS = ["_TEST-BOM-OK", "_TEST-BOM-BROKEN"]
+
+	def setUp(self):
+		self._clear_failed()
+		self.tree = _bom("_TEST-BOM-OK", "成品A", 1, _leaf("毛坯C", 3))
+
+	def tearDown(self):
+		self._clear_failed()
+
+	def _clear_failed(self):
+		for name in self.ROOTS:
+			frappe.cache().delete_value(bom_where_used._failed_root_key(name))
+
+	def _bom_tree(self, name):
+		if name == "_TEST-BOM-OK":
+			return self.tree
+		raise frappe.ValidationError(name)
+
+	def _get_all(self, doctype, filters=None, **kwargs):
+		if doctype == "BOM":
+			return [n for n in filters["name"][1] if n == "_TEST-BOM-OK"]
+		return []
+
+	def _query(self):
+		with patch.object(bom_where_used, "BOMTree", side_effect=self._bom_tree) as tree, patch_attrs(
+			bom_where_used.frappe, get_all={"side_effect": self._get_all}, enqueue=None, db=None
+		) as mocks:
+			rows = bom_where_used._rows_for_item(self.ROOTS, "毛坯C")
+		mocks["db"].delete.assert_not_called()
+		mocks["db"].bulk_insert.assert_not_called()
+		return rows, tree, mocks["enqueue"]
+
+	def test_unindexed_roots_exploded_in_memory_and_enqueued(self):
+		rows, _tree, enqueue = self._query()
+		self.assertEqual([(r.root_bom, r.ancestor_item) for r in rows], [("_TEST-BOM-OK", "成品A")])
+		enqueue.assert_called_once()
+		self.assertEqual(enqueue.call_args.kwargs["bom_names"], ["_TEST-BOM-OK"])
+		self.assertTrue(enqueue.call_args.kwargs["deduplicate"])
+
+	def test_failed_root_not_exploded_again(self):
+		self._query()
+		_rows, tree, _enqueue = self._query()
+		self.assertEqual([c.args[0] for c in tree.call_args_list], ["_TEST-BOM-OK"])
+
+
+class TestBomWhereUsedIndexQuery(FrappeTestCase):
+	"""索引行真实写入数据库后按索引查询（BOMTree 仍用内存树，不依赖 BOM 测试数据）。"""
+
+	ROOT = "_TEST-BOM-WU-ROOT"
+
+	def setUp(self):
+		tree = _bom(self.ROOT, "_TEST-成品A", 1, _bom("_TEST-BOM-WU-B", "_TEST-电镀件B", 2, _leaf("_TEST-毛坯C", 6)))
+		with patch.object(bom_where_used, "BOMTree", return_value=tree):
+			rows = bom_where_used._explode_rows(self.ROOT)
+		frappe.db.delete(bom_where_used.INDEX_DOCTYPE, {"root_bom": self.ROOT})
+		bom_where_used._bulk_insert(rows)
+
+	def tearDown(self):
+		frappe.db.delete(bom_where_used.INDEX_DOCTYPE, {"root_bom": self.ROOT})
+
+	def test_queries_read_index_rows(self):
+		with patch.object(bom_where_used, "BOMTree") as tree:
+			ancestors = bom_where_used.get_ancestors_within_boms(
+				"_TEST-毛坯C", {"_TEST-成品A", "_TEST-电镀件B", "_TEST-其他"}, [self.ROOT]
+			)
+			qty = bom_where_used.get_exploded_qty_map([self.ROOT], "_TEST-毛坯C")
+		tree.assert_not_called()
+		self.assertEqual(ancestors, {"_TEST-成品A", "_TEST-电镀件B"})
+		self.assertEqual(qty, {self.ROOT: 6})
@@ -0,0 +1,98 @@
+# Copyright (c) 2026, Bairun and contributors
+# 批量替换物料供应商：分块删除 / 批量插入、只写存在的自定义字段、进度回调。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.material.test_item_supplier_bulk
+
+from __future__ import unicode_literals
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.tests.utils import fake_meta, patch_attrs
+from bairun_erp.utils.api.material import item_supplier_bulk as bulk
+
+_SUPPLIER_FIELDS = {"custom_price", "custom_isinvoice"}
+
+
+class TestReplaceItemSuppliers(FrappeTestCase):
+	def _run(self, item_names, suppliers):
+		progress = []
+		with patch_attrs(
+			bulk.frappe,
+			get_all={"return_value": ["SUP-1", "SUP-2"]},
+			get_meta={"return_value": fake_meta(_SUPPLIER_FIELDS)},
+			clear_document_cache=None,
+		) as frappe_mocks, patch_attrs(bulk.frappe.db, delete=None, bulk_insert=None, sql=None) as db, patch.object(
+			bulk, "_CHUNK_SIZE", 2
+		):
+			count = bulk.replace_item_suppliers(item_names, suppliers, progress=lambda d, t: progress.append((d, t)))
+		delete, insert, sql = db["delete"], db["bulk_insert"], db["sql"]
+		clear = frappe_mocks["clear_document_cache"]
+		return count, progress, delete, insert, sql, clear
+
+	def test_rows_written_per_item_in_chunks(self):
+		suppliers = [
+			{"supplier": "SUP-1", "custom_price": 2.23, "custom_isinvoice": 1},
+			{"supplier": "SUP-404", "custom_price": 9},
+			{"supplier": "SUP-2", "custom_price": "1.88"},
+		]
+		count, progress, delete, insert, sql, clear = self._run(["I1", "I2", "I3", "I1"], suppliers)
+
+		self.assertEqual(count, 3)
+		self.assertEqual(progress, [(2, 3), (3, 3)])
+		self.assertEqual(delete.call_count, 2)
+		self.assertEqual(sql.call_count, 2)
+		self.assertEqual(clear.call_count, 3)
+
+		fields = insert.call_args_list[0].args[1]
+		rows = [dict(zip(fields, v)) for c in insert.call_args_list for v in c.args[2]]
+		self.assertEqual(len(rows), 6)
+		self.assertNotIn("custom_pricing_factor", fields)
+		i1 = sorted((r for r in rows if r["parent"] == "I1"), key=lambda r: r["idx"])
+		self.assertEqual(
+			[(r["idx"], r["supplier"], r["custom_price"], r["custom_isinvoice"]) for r in i1],
+			[(1, "SUP-1", 2.23, 1), (2, "SUP-2", 1.88, 0)],
+		)
+		self.assertTrue(all(r["parentfield"] == "supplier_items" and r["parenttype"] == "Item" for r in rows))
+
+	def test_empty_supplier_list_clears_rows(self):
+		count, _progress, delete, insert, _sql, _clear = self._run(["I1"], [])
+		self.assertEqual(count, 1)
+		delete.assert_called_once()
+		insert.assert_not_called()
+
+
+class TestReplaceItemSuppliersDatabase(FrappeTestCase):
+	ITEM = "_TEST-ITEM-SUPPLIER-BULK"
+
+	def setUp(self):
+		self.supplier = frappe.db.get_value("Supplier", {}, "name")
+		item_group = frappe.db.get_value("Item Group", {"is_group": 0}, "name")
+		if not self.supplier or not item_group or not frappe.db.exists("UOM", "Nos"):
+			self.skipTest("need a Supplier, a leaf Item Group and UOM Nos")
+		self._delete_item()
+		frappe.get_doc({
+			"doctype": "Item",
+			"item_code": self.ITEM,
+			"item_name": self.ITEM,
+			"item_group": item_group,
+			"stock_uom": "Nos",
+		}).insert(ignore_permissions=True)
+
+	def tearDown(self):
+		self._delete_item()
+
+	def _delete_item(self):
+		if frappe.db.exists("Item", self.ITEM):
+			frappe.delete_doc("Item", self.ITEM, force=1, ignore_permissions=True)
+
+	def test_rows_replaced_on_item(self):
+		bulk.replace_item_suppliers([self.ITEM], [{"supplier": self.supplier}, {"supplier": "_TEST-不存在"}])
+		rows = frappe.get_doc("Item", self.ITEM).get("supplier_items")
+		self.assertEqual([(r.idx, r.supplier) for r in rows], [(1, self.supplier)])
+
+		bulk.replace_item_suppliers([self.ITEM], [])
+		self.assertEqual(frappe.get_doc("Item", self.ITEM).get("supplier_items"), [])
@@ -0,0 +1,81 @@
+# Copyright (c) 2026, Bairun and contributors
+# 仓库别名：画布标签与仓库名互相转换、每个公司只查询一次仓库。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.material.test_warehouse_alias
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.tests.utils import start_patches
+from bairun_erp.utils.api.material import item_attrs_apply
+
+COMPANY = "_Test Alias Co"
+
+
+def _wh(name, warehouse_name, is_group=0, disabled=0):
+	return frappe._dict(name=name, warehouse_name=warehouse_name, is_group=is_group, disabled=disabled)
+
+
+WAREHOUSES = [
+	_wh("半成品 - B", "半成品"),
+	_wh("成品 - B", "成品"),
+	_wh("原材料 - B", "原材料"),
+	_wh("毛坯 - B", "毛坯", disabled=1),
+	_wh("库存仓-1", "库存仓"),
+	_wh("全部仓库 - B", "全部仓库", is_group=1),
+]
+
+
+class TestWarehouseAliasMap(FrappeTestCase):
+	def setUp(self):
+		item_attrs_apply.clear_warehouse_alias_cache(COMPANY)
+		mocks = start_patches(
+			self,
+			item_attrs_apply.frappe,
+			get_all={"return_value": WAREHOUSES},
+			get_cached_value={"return_value": "B"},
+		)
+		self.get_all = mocks["get_all"]
+		self.addCleanup(item_attrs_apply.clear_warehouse_alias_cache, COMPANY)
+
+	def test_resolve_ui_labels_and_raw_names(self):
+		resolve = item_attrs_apply.resolve_warehouse_name
+		self.assertEqual(resolve("半成品仓库", COMPANY), "半成品 - B")
+		self.assertEqual(resolve("原材料仓库", COMPANY), "原材料 - B")
+		self.assertEqual(resolve("成品", COMPANY), "成品 - B")
+		self.assertEqual(resolve("成品 - B", COMPANY), "成品 - B")
+		# 按 warehouse_name 兜底
+		self.assertEqual(resolve("库存仓库", COMPANY), "库存仓-1")
+		# 停用 / 组仓库不可解析
+		self.assertIsNone(resolve("毛坯仓库", COMPANY))
+		self.assertIsNone(resolve("全部仓库", COMPANY))
+		self.assertIsNone(resolve("不存在", COMPANY))
+
+	def test_canvas_display_is_inverse_of_resolve(self):
+		display = item_attrs_apply.item_default_wh_to_canvas_display
+		self.assertEqual(display("半成品 - B", COMPANY), "半成品仓库")
+		self.assertEqual(display("库存仓-1", COMPANY), "库存仓库")
+		self.assertEqual(display("毛坯 - B", COMPANY), "毛坯")
+
+	def test_single_warehouse_query_per_company(self):
+		for _i in range(50):
+			item_attrs_apply.resolve_warehouse_name("半成品仓库", COMPANY)
+			item_attrs_apply.item_default_wh_to_canvas_display("成品 - B", COMPANY)
+		self.assertEqual(self.get_all.call_count, 1)
+
+
+class TestWarehouseAliasDatabase(FrappeTestCase):
+	def test_real_warehouse_round_trip(self):
+		wh = frappe.db.get_value("Warehouse", {"is_group": 0, "disabled": 0}, ["name", "company"], as_dict=True)
+		if not wh:
+			self.skipTest("no enabled leaf Warehouse")
+		item_attrs_apply.clear_warehouse_alias_cache(wh.company)
+		self.addCleanup(item_attrs_apply.clear_warehouse_alias_cache, wh.company)
+		self.assertEqual(item_attrs_apply.resolve_warehouse_name(wh.name, wh.company), wh.name)
+		label = item_attrs_apply.item_default_wh_to_canvas_display(wh.name, wh.company)
+		self.assertTrue(label)
+		resolved = item_attrs_apply.resolve_warehouse_name(label, wh.company)
+		self.assertEqual(frappe.db.get_value("Warehouse", resolved, "company"), wh.company)
@@ -9,6 +9,10 @@
 # 半成品→成品入口（默认成品仓、PO 服务项「半成品委外」）:
 #   bairun_erp.utils.api.mes.blank_outsourcing_submit.submit_semi_finished_outsourcing
 #   bench --site site2.local execute bairun_erp.utils.api.mes.blank_outsourcing_submit.submit_semi_finished_outsourcing --kwargs '{"json_data": {...}}'
+#
+# 批量入口（MES 终端交班时一次提交多笔，结果按 idempotency_key 返回，可后台执行）:
+#   bairun_erp.utils.api.mes.blank_outsourcing_submit.submit_outsourcing_batch
+#   bairun_erp.utils.api.mes.blank_outsourcing_submit.get_outsourcing_batch_status
 
 from __future__ import unicode_literals
 
@@ -16,11 +20,17 @@ import json
 import time
 
 import frappe
-from erpnext.manufacturing.doctype.bom.bom import BOMTree
 from frappe import _
 from frappe.utils import cstr, flt, getdate
 
-from bairun_erp.utils.api.buying.purchase_order_add import _resolve_warehouse, save_purchase_order
+from bairun_erp.utils import job_state, lookup_cache
+from bairun_erp.utils.api.buying.purchase_order_add import (
+	_resolve_warehouse,
+	insert_purchase_order,
+	save_purchase_order,
+)
+from bairun_erp.utils.api.material.bom_where_used import get_ancestors_within_boms, get_exploded_qty_map
+from bairun_erp.utils.api.mes.outsourcing_stage_timing import StageTimer
 from bairun_erp.utils.api.stock.blank_list import FINISHED_WAREHOUSE, SEMI_FINISHED_WAREHOUSE
 
 LOG_DOCTYPE = "MES Blank Outsourcing Log"
@@ -32,12 +42,52 @@ ERR_SE_FAILED = "STOCK_ENTRY_FAILED"
 ERR_RECEIPT_FAILED = "RECEIPT_STOCK_ENTRY_FAILED"
 ERR_PO_FAILED = "PURCHASE_ORDER_FAILED"
 ERR_IDEMPOTENCY = "IDEMPOTENCY_CONFLICT"
+ERR_BATCH_JOB = "BATCH_JOB_FAILED"
 
 PO_DEFAULT_SERVICE_ITEM_NAME = "毛坯委外"
 PO_DEFAULT_SERVICE_ITEM_NAME_SEMI = "半成品委外"
 
 CUSTOM_BUSINESS_TYPE_SEMI_DEFAULT = "半成品转成品"
 
+# 批量提交
+KIND_BLANK = "blank"
+KIND_SEMI_FINISHED = "semi_finished"
+BATCH_BACKGROUND_THRESHOLD = 20
+BATCH_CACHE_PREFIX = "bairun_erp:mes_outsourcing_batch:"
+_BATCH_FLAG = "mes_outsourcing_batch"
+_BATCH_SAVEPOINT = "mes_outsourcing_job"
+
+
+def _in_batch():
+	return bool(frappe.flags.get(_BATCH_FLAG))
+
+
+def _commit():
+	"""批量模式下每笔作业由 _run_batch_job 统一提交 / 回滚到 savepoint，步骤内不单独提交。"""
+	if not _in_batch():
+		frappe.db.commit()
+
+
+def _rollback():
+	if not _in_batch():
+		frappe.db.rollback()
+
+
+def _exists(doctype, name):
+	"""存在性判断走请求级主数据缓存（批量提交时各作业共用）。"""
+	return bool(name) and bool(lookup_cache.bulk_get(doctype, [name], ["name"]))
+
+
+def _resolve_warehouse_cached(warehouse, company):
+	"""_resolve_warehouse 的请求级缓存：同一请求内相同 (仓库, 公司) 只解析一次。"""
+	store = getattr(frappe.local, "mes_outsourcing_warehouse_cache", None)
+	if store is None:
+		store = frappe.local.mes_outsourcing_warehouse_cache = {}
+	key = (warehouse, company)
+	if key not in store:
+		store[key] = _resolve_warehouse(warehouse, company)
+	return store[key]
+
 
 def _parse_body(kwargs):
 	jd = kwargs.get("json_data")
@@ -178,7 +228,7 @@ def _check_idempotency(key, force_retry):
 	if force_retry:
 		for r in frappe.get_all(LOG_DOCTYPE, filters={"idempotency_key": key}, pluck="name"):
 			frappe.delete_doc(LOG_DOCTYPE, r, force=True, ignore_permissions=True)
-		frappe.db.commit()
+		_commit()
 		return None
 	return {
 		"success": False,
@@ -208,16 +258,19 @@ def _finalize_log(
 	err_msg=None,
 	t0=None,
 	summary=None,
+	timer=None,
 ):
 	if not log_name or not frappe.db.exists(LOG_DOCTYPE, log_name):
 		return
 	duration_ms = None
 	if t0 is not None:
 		duration_ms = int((time.time() - t0) * 1000)
+	values = timer.as_log_fields() if timer else {}
 	frappe.db.set_value(
 		LOG_DOCTYPE,
 		log_name,
 		{
+			**values,
 			"status": status,
 			"material_request_name": mr or "",
 			"stock_entry_name": se or "",
@@ -231,7 +284,7 @@ def _finalize_log(
 		},
 		update_modified=True,
 	)
-	frappe.db.commit()
+	_commit()
 
 
 def _create_processing_log(idempotency_key, summary):
@@ -244,7 +297,7 @@ def _create_processing_log(idempotency_key, summary):
 		}
 	)
 	doc.insert(ignore_permissions=True)
-	frappe.db.commit()
+	_commit()
 	return doc.name
 
 
@@ -263,19 +316,19 @@ def _validate_params(p, default_mr_target_warehouse=None):
 	company = (p.get("company") or "").strip() or frappe.defaults.get_user_default("Company")
 	if not company:
 		company = frappe.db.get_single_value("Global Defaults", "default_company")
-	if not company or not frappe.db.exists("Company", company):
+	if not company or not _exists("Company", company):
 		return None, {ERR_VALIDATION: _("company 无效或未配置")}
 	raw_wh = (p.get("from_warehouse") or p.get("set_from_warehouse") or "").strip()
 	if not raw_wh:
 		return None, {ERR_VALIDATION: _("from_warehouse 或 set_from_warehouse 必填")}
-	wh = _resolve_warehouse(raw_wh, company)
-	if not wh or not frappe.db.exists("Warehouse", wh):
+	wh = _resolve_warehouse_cached(raw_wh, company)
+	if not wh or not _exists("Warehouse", wh):
 		return None, {ERR_VALIDATION: _("仓库 '{0}' 无法解析为有效仓库").format(raw_wh)}
 	skip_po = bool(p.get("skip_purchase_order"))
 	supplier = (p.get("supplier") or p.get("outsourcing_supplier") or "").strip()
 	if not skip_po and not supplier:
 		return None, {ERR_VALIDATION: _("supplier 必填（或设置 skip_purchase_order=true）")}
-	if supplier and not frappe.db.exists("Supplier", supplier):
+	if supplier and not _exists("Supplier", supplier):
 		return None, {ERR_VALIDATION: _("供应商 '{0}' 不存在").format(supplier)}
 	po_items = p.get("po_items") or []
 	if not skip_po:
@@ -293,14 +346,14 @@ def _validate_params(p, default_mr_target_warehouse=None):
 	sales_order = (p.get("sales_order") or p.get("custom_sales_order_no") or "").strip()
 	if not sales_order:
 		return None, {ERR_VALIDATION: _("sales_order 或 custom_sales_order_no 必填（回库步骤需按 SO/BOM 推导）")}
-	if sales_order and not frappe.db.exists("Sales Order", sales_order):
+	if sales_order and not _exists("Sales Order", sales_order):
 		return None, {ERR_VALIDATION: _("销售订单 '{0}' 不存在").format(sales_order)}
 	if default_mr_target_warehouse is None:
 		default_mr_target_warehouse = SEMI_FINISHED_WAREHOUSE
 	tw = (p.get("target_warehouse") or p.get("to_warehouse") or "").strip()
 	if not tw:
-		if frappe.db.exists("Warehouse", default_mr_target_warehouse):
-			wc = frappe.db.get_value("Warehouse", default_mr_target_warehouse, "company")
+		if _exists("Warehouse", default_mr_target_warehouse):
+			wc = lookup_cache.get_value("Warehouse", default_mr_target_warehouse, "company")
 			if wc == company:
 				tw = default_mr_target_warehouse
 	if not tw:
@@ -309,7 +362,7 @@ def _validate_params(p, default_mr_target_warehouse=None):
 				"请传 target_warehouse（MR 目标仓，须与发料仓不同）；或未配置时确保存在与公司一致的标准仓「{0}」"
 			).format(default_mr_target_warehouse)
 		}
-	tw_resolved = _resolve_warehouse(tw, company)
+	tw_resolved = _resolve_warehouse_cached(tw, company)
 	if not tw_resolved or tw_resolved == wh:
 		return None, {
 			ERR_VALIDATION: _("target_warehouse 无效或与发料仓相同，请指定另一有效仓库"),
@@ -335,9 +388,9 @@ def _validate_params(p, default_mr_target_warehouse=None):
 
 def _mr_item_row(company, warehouse, row, schedule_default, target_wh):
 	item_code = row["item_code"]
-	stock_uom = row.get("uom") or row.get("stock_uom") or frappe.db.get_value("Item", item_code, "stock_uom")
+	stock_uom = row.get("uom") or row.get("stock_uom") or lookup_cache.get_value("Item", item_code, "stock_uom")
 	sd = row.get("schedule_date") or schedule_default
-	src = _resolve_warehouse((row.get("from_warehouse") or warehouse), company) or warehouse
+	src = _resolve_warehouse_cached((row.get("from_warehouse") or warehouse), company) or warehouse
 	line = {
 		"doctype": "Material Request Item",
 		"item_code": item_code,
@@ -347,7 +400,7 @@ def _mr_item_row(company, warehouse, row, schedule_default, target_wh):
 	}
 	tw = (row.get("to_warehouse") or row.get("target_warehouse") or target_wh or "").strip()
 	if tw:
-		line["warehouse"] = _resolve_warehouse(tw, company) or tw
+		line["warehouse"] = _resolve_warehouse_cached(tw, company) or tw
 	elif target_wh:
 		line["warehouse"] = target_wh
 	if stock_uom:
@@ -399,11 +452,11 @@ def _apply_stock_entry_outsourcing_fields(se, ctx):
 	meta = frappe.get_meta("Stock Entry")
 	so = (ctx.get("sales_order") or "").strip()
 	if so and meta.has_field("custom_customer_order"):
-		if frappe.db.exists("Sales Order", so):
+		if _exists("Sales Order", so):
 			se.custom_customer_order = so
 	supp = (ctx.get("supplier") or "").strip()
 	if supp and meta.has_field("custom_outsourcing_supplier"):
-		if frappe.db.exists("Supplier", supp):
+		if _exists("Supplier", supp):
 			se.custom_outsourcing_supplier = supp
 
 
@@ -568,38 +621,6 @@ def _pick_bom_name_for_item(item_code, bom_no):
 	return row[0]["name"] if row else None
 
 
-def _walk_bom_tree_nodes(node):
-	yield node
-	for ch in node.child_items or []:
-		for n in _walk_bom_tree_nodes(ch):
-			yield n
-
-
-def _find_bom_tree_node(root, item_code):
-	for n in _walk_bom_tree_nodes(root):
-		if n.item_code == item_code:
-			return n
-	return None
-
-
-def _subtree_contains_item_code(bom_node, item_code):
-	if not bom_node.is_bom:
-		return bom_node.item_code == item_code
-	for ch in bom_node.child_items or []:
-		if not ch.is_bom and ch.item_code == item_code:
-			return True
-		if ch.is_bom and _subtree_contains_item_code(ch, item_code):
-			return True
-	return False
-
-
-def _so_bom_supports_blank_under_parent(tree_root, parent_item, blank_item):
-	node = _find_bom_tree_node(tree_root, parent_item)
-	if not node or not node.is_bom:
-		return False
-	return _subtree_contains_item_code(node, blank_item)
-
-
 def _direct_parent_assemblies_for_blank(blank_item_code, company):
 	values = [blank_item_code]
 	q = """
@@ -616,36 +637,30 @@ def _direct_parent_assemblies_for_blank(blank_item_code, company):
 	return [r.parent_item for r in rows if r.parent_item]
 
 
-def _filter_parents_by_sales_order(blank_item, parent_candidates, sales_order):
+def _sales_order_root_boms(sales_order):
+	"""销售订单各行解析出的根 BOM（按行序去重）。"""
 	so_items = frappe.get_all(
 		"Sales Order Item",
 		filters={"parent": sales_order},
 		fields=["item_code", "bom_no"],
 		order_by="idx asc",
 	)
-	matched = []
-	for p in parent_candidates:
-		for sr in so_items:
-			ic = (sr.get("item_code") or "").strip()
-			if not ic:
-				continue
-			bom_name = _pick_bom_name_for_item(ic, sr.get("bom_no"))
-			if not bom_name:
-				continue
-			try:
-				tree = BOMTree(bom_name)
-			except Exception:
-				continue
-			if _so_bom_supports_blank_under_parent(tree, p, blank_item):
-				matched.append(p)
-				break
-	seen = set()
-	out = []
-	for x in matched:
-		if x not in seen:
-			seen.add(x)
-			out.append(x)
-	return out
+	boms = []
+	for sr in so_items:
+		ic = (sr.get("item_code") or "").strip()
+		if not ic:
+			continue
+		bom_name = _pick_bom_name_for_item(ic, sr.get("bom_no"))
+		if bom_name:
+			boms.append(bom_name)
+	return list(dict.fromkeys(boms))
+
+
+def _filter_parents_by_sales_order(blank_item, parent_candidates, sales_order):
+	"""候选父项中，在该销售订单任一行 BOM 展开里位于毛坯上级的那些（查 BR BOM Where Used 索引）。"""
+	root_boms = _sales_order_root_boms(sales_order)
+	matched = get_ancestors_within_boms(blank_item, parent_candidates, root_boms)
+	return [p for p in dict.fromkeys(parent_candidates) if p in matched]
 
 
 def _resolve_receipt_item_from_issued_blanks_and_so(ctx):
@@ -693,21 +708,11 @@ def _resolve_receipt_item_from_issued_blanks_and_so(ctx):
 	return resolved, None
 
 
-def _exploded_qty_per_unit_root(bom_name, target_item_code):
-	try:
-		tree = BOMTree(bom_name)
-	except Exception:
-		return 0.0
-	for node in _walk_bom_tree_nodes(tree):
-		if node.item_code == target_item_code:
-			return flt(node.exploded_qty)
-	return 0.0
-
-
 def _compute_receipt_qty_from_sales_order_bom(ctx, receipt_item_code):
 	"""
 	按销售订单 + 多级 BOM 计算应回半成品数量（不受已发毛坯数量限制）：
-	SO 行即为半成品则直接累计；否则用该行 BOM 展开取半成品相对根物料的 exploded 倍数 × 行数量。
+	SO 行即为半成品则直接累计；否则用该行 BOM 展开取半成品相对根物料的 exploded 倍数 × 行数量
+	（倍数取自 BR BOM Where Used 索引，见 bom_where_used）。
 	"""
 	so = (ctx.get("sales_order") or "").strip()
 	if not so:
@@ -722,8 +727,18 @@ def _compute_receipt_qty_from_sales_order_bom(ctx, receipt_item_code):
 	if not so_items:
 		return 0, _("销售订单 {0} 无明细，无法计算应回数量").format(so)
 
-	qty_total = 0.0
+	row_boms = []
 	for r in so_items:
+		R = (r.get("item_code") or "").strip()
+		bom_name = None
+		if R and R != receipt_item_code:
+			bom_name = _pick_bom_name_for_item(R, r.get("bom_no"))
+		row_boms.append(bom_name)
+	# 各根 BOM 中半成品的展开倍数：一次索引查询
+	factor_by_bom = get_exploded_qty_map([b for b in row_boms if b], receipt_item_code)
+
+	qty_total = 0.0
+	for r, bom_name in zip(so_items, row_boms):
 		R = (r.get("item_code") or "").strip()
 		if not R:
 			continue
@@ -731,10 +746,7 @@ def _compute_receipt_qty_from_sales_order_bom(ctx, receipt_item_code):
 		if R == receipt_item_code:
 			qty_total += row_qty
 			continue
-		bom_name = _pick_bom_name_for_item(R, r.get("bom_no"))
-		if not bom_name:
-			continue
-		f = _exploded_qty_per_unit_root(bom_name, receipt_item_code)
+		f = factor_by_bom.get(bom_name) if bom_name else 0
 		if f:
 			qty_total += row_qty * f
 
@@ -747,7 +759,7 @@ def _compute_receipt_qty_from_sales_order_bom(ctx, receipt_item_code):
 
 def _build_receipt_stock_entry_doc(ctx, receipt_item_code, receipt_qty):
 	target_wh = (ctx.get("target_warehouse") or "").strip() or SEMI_FINISHED_WAREHOUSE
-	stock_uom = frappe.db.get_value("Item", receipt_item_code, "stock_uom")
+	stock_uom = lookup_cache.get_value("Item", receipt_item_code, "stock_uom")
 	se = frappe.new_doc("Stock Entry")
 	se.company = ctx["company"]
 	se.posting_date = ctx["transaction_date"]
@@ -783,10 +795,10 @@ def _run_receipt_step(ctx, mr_doc, se_issue_doc):
 			return None, cstr(qty_err)
 		doc = _build_receipt_stock_entry_doc(ctx, receipt_item_code, receipt_qty)
 		doc.insert()
-		frappe.db.commit()
+		_commit()
 		return doc, None
 	except Exception as e:
-		frappe.db.rollback()
+		_rollback()
 		return None, cstr(e)
 
 
@@ -847,7 +859,7 @@ def _create_operation_log(idem, summary):
 	try:
 		return _create_processing_log(idem, summary)
 	except frappe.UniqueValidationError:
-		frappe.db.rollback()
+		_rollback()
 		return _make_fail_response(
 			ERR_IDEMPOTENCY,
 			_("幂等键正在处理或已存在，请稍后重试或更换 idempotency_key"),
@@ -856,7 +868,7 @@ def _create_operation_log(idem, summary):
 
 
 def _finalize_fail_and_response(
-	log_name, summary, t0, code, msg, mr=None, se=None, receipt_se=None, po=None, po_semi=None
+	log_name, summary, t0, code, msg, mr=None, se=None, receipt_se=None, po=None, po_semi=None, timer=None
 ):
 	if log_name:
 		st = "Partial" if (mr or se or receipt_se or po or po_semi) else "Failed"
@@ -872,13 +884,14 @@ def _finalize_fail_and_response(
 			err_msg=msg,
 			t0=t0,
 			summary=summary,
+			timer=timer,
 		)
 	return _make_fail_response(
 		code, msg, operation_id=log_name, mr=mr, se=se, receipt_se=receipt_se, po=po, po_semi=po_semi
 	)
 
 
-def _finalize_success_and_response(log_name, summary, t0, mr, se, receipt_se, po, po_semi=None):
+def _finalize_success_and_response(log_name, summary, t0, mr, se, receipt_se, po, po_semi=None, timer=None):
 	if log_name:
 		_finalize_log(
 			log_name,
@@ -890,6 +903,7 @@ def _finalize_success_and_response(log_name, summary, t0, mr, se, receipt_se, po
 			po_semi=po_semi,
 			t0=t0,
 			summary=summary,
+			timer=timer,
 		)
 	return _make_success_response(log_name, mr, se, receipt_se, po, po_semi)
 
@@ -907,23 +921,33 @@ def _check_submit_permissions(skip_po):
 def _run_mr_step(ctx):
 	try:
 		mr_doc = _create_material_request(ctx, ctx)
-		frappe.db.commit()
+		_commit()
 		return mr_doc, None
 	except Exception as e:
-		frappe.db.rollback()
+		_rollback()
 		return None, cstr(e)
 
 
 def _run_se_step(ctx, mr_doc):
 	try:
 		se_doc = _create_stock_entry(ctx, mr_doc)
-		frappe.db.commit()
+		_commit()
 		return se_doc, None
 	except Exception as e:
-		frappe.db.rollback()
+		_rollback()
 		return None, cstr(e)
 
 
+def _save_purchase_order(po_data):
+	"""批量模式下不经 save_purchase_order（其内部 commit / rollback 会破坏作业 savepoint），直接校验并保存。"""
+	if not _in_batch():
+		return save_purchase_order(order_data=po_data)
+	po, err = insert_purchase_order(po_data)
+	if err:
+		return err
+	return {"data": {"name": po.name}}
+
+
 def _run_po_step(params_in, ctx, receipt_doc=None, *, blank_single_processing_po=False):
 	"""
 	半成品→成品委外：归一到服务物料的一张 PO（po_items）。
@@ -936,20 +960,20 @@ def _run_po_step(params_in, ctx, receipt_doc=None, *, blank_single_processing_po
 			if not receipt_doc:
 				return None, None, _("缺少回库草稿，无法生成采购单")
 			po_data = _build_blank_single_subcontract_po_order_data(ctx, receipt_doc, params_in)
-			po_result = save_purchase_order(order_data=po_data)
+			po_result = _save_purchase_order(po_data)
 			if po_result.get("error"):
 				return None, None, cstr(po_result["error"])
 			po_name = (po_result.get("data") or {}).get("name")
 			return po_name, None, None
 		normalized_po_items = _normalize_po_items_to_service(params_in, ctx, ctx["po_items"])
 		po_data = _build_po_order_data(ctx, ctx, normalized_po_items)
-		po_result = save_purchase_order(order_data=po_data)
+		po_result = _save_purchase_order(po_data)
 		if po_result.get("error"):
 			return None, None, cstr(po_result["error"])
 		po_name = (po_result.get("data") or {}).get("name")
 		return po_name, None, None
 	except Exception as e:
-		frappe.db.rollback()
+		_rollback()
 		return None, None, cstr(e)
 
 
@@ -965,9 +989,12 @@ def _apply_semi_finished_outsourcing_defaults(params_in):
 
 
 def _execute_outsourcing_submit(
-	params_in, *, default_mr_target_warehouse=None, blank_single_processing_po=False
+	params_in, *, default_mr_target_warehouse=None, blank_single_processing_po=False, timer=None
 ):
-	"""共用编排：幂等 → 校验 → MR → 发料 SE → 回库草稿 SE → PO（可选）。"""
+	"""
+	共用编排：幂等 → 校验 → MR → 发料 SE → 回库草稿 SE → PO（可选）。各阶段耗时与 SQL 次数记入日志。
+	timer：可传入 StageTimer，供调用方在回滚后补记日志时沿用各阶段耗时。
+	"""
 	if default_mr_target_warehouse is None:
 		default_mr_target_warehouse = SEMI_FINISHED_WAREHOUSE
 	summary = _summary(params_in)
@@ -996,29 +1023,38 @@ def _execute_outsourcing_submit(
 			log_name, summary, t0, permission_err["error_code"], permission_err["message"]
 		)
 
-	mr_doc, mr_err = _run_mr_step(ctx)
+	timer = timer or StageTimer()
+	with timer.stage("mr"):
+		mr_doc, mr_err = _run_mr_step(ctx)
 	if mr_err:
-		return _finalize_fail_and_response(log_name, summary, t0, ERR_MR_FAILED, mr_err)
+		return _finalize_fail_and_response(log_name, summary, t0, ERR_MR_FAILED, mr_err, timer=timer)
 	mr_name = mr_doc.name
 
-	se_doc, se_err = _run_se_step(ctx, mr_doc)
+	with timer.stage("se"):
+		se_doc, se_err = _run_se_step(ctx, mr_doc)
 	if se_err:
-		return _finalize_fail_and_response(log_name, summary, t0, ERR_SE_FAILED, se_err, mr=mr_name)
+		return _finalize_fail_and_response(
+			log_name, summary, t0, ERR_SE_FAILED, se_err, mr=mr_name, timer=timer
+		)
 	se_name = se_doc.name
 
-	receipt_doc, receipt_err = _run_receipt_step(ctx, mr_doc, se_doc)
+	with timer.stage("receipt"):
+		receipt_doc, receipt_err = _run_receipt_step(ctx, mr_doc, se_doc)
 	if receipt_err:
 		return _finalize_fail_and_response(
-			log_name, summary, t0, ERR_RECEIPT_FAILED, receipt_err, mr=mr_name, se=se_name
+			log_name, summary, t0, ERR_RECEIPT_FAILED, receipt_err, mr=mr_name, se=se_name, timer=timer
 		)
 	receipt_name = receipt_doc.name
 
 	if ctx["skip_po"]:
-		return _finalize_success_and_response(log_name, summary, t0, mr_name, se_name, receipt_name, None)
+		return _finalize_success_and_response(
+			log_name, summary, t0, mr_name, se_name, receipt_name, None, timer=timer
+		)
 
-	po_name, po_semi_name, po_err = _run_po_step(
-		params_in, ctx, receipt_doc, blank_single_processing_po=blank_single_processing_po
-	)
+	with timer.stage("po"):
+		po_name, po_semi_name, po_err = _run_po_step(
+			params_in, ctx, receipt_doc, blank_single_processing_po=blank_single_processing_po
+		)
 	if po_err:
 		return _finalize_fail_and_response(
 			log_name,
@@ -1031,9 +1067,10 @@ def _execute_outsourcing_submit(
 			receipt_se=receipt_name,
 			po=po_name,
 			po_semi=po_semi_name,
+			timer=timer,
 		)
 	return _finalize_success_and_response(
-		log_name, summary, t0, mr_name, se_name, receipt_name, po_name, po_semi_name
+		log_name, summary, t0, mr_name, se_name, receipt_name, po_name, po_semi_name, timer=timer
 	)
 
 
@@ -1076,3 +1113,266 @@ def submit_semi_finished_outsourcing(**kwargs):
 	params_in = dict(_parse_body(kwargs))
 	_apply_semi_finished_outsourcing_defaults(params_in)
 	return _execute_outsourcing_submit(params_in, default_mr_target_warehouse=FINISHED_WAREHOUSE)
+
+
+# --- 批量提交 ---
+
+
+def _batch_job_params(job, default_kind):
+	"""单笔作业入参：按 kind（blank / semi_finished）补全半成品委外默认值。返回 (kind, params_in)。"""
+	params_in = dict(_parse_body(job) if isinstance(job, dict) else {})
+	kind = (params_in.pop("kind", None) or default_kind or KIND_BLANK).strip()
+	if kind == KIND_SEMI_FINISHED:
+		_apply_semi_finished_outsourcing_defaults(params_in)
+	return kind, params_in
+
+
+def _submit_options(kind):
+	if kind == KIND_SEMI_FINISHED:
+		return {"default_mr_target_warehouse": FINISHED_WAREHOUSE}
+	return {"default_mr_target_warehouse": SEMI_FINISHED_WAREHOUSE, "blank_single_processing_po": True}
+
+
+def _prefetch_batch_master_data(params_list):
+	"""整批涉及的供应商、销售订单、物料一次 IN 查询装入请求级缓存，供各作业校验与建单共用。"""
+	suppliers, sales_orders, item_codes = set(), set(), set()
+	for p in params_list:
+		suppliers.add((p.get("supplier") or p.get("outsourcing_supplier") or "").strip())
+		sales_orders.add((p.get("sales_order") or p.get("custom_sales_order_no") or "").strip())
+		for row in p.get("items") or []:
+			if isinstance(row, dict):
+				item_codes.add((row.get("item_code") or "").strip())
+	lookup_cache.bulk_get("Supplier", suppliers, ["name"])
+	lookup_cache.bulk_get("Sales Order", sales_orders, ["name"])
+	lookup_cache.bulk_get("Item", item_codes, ["stock_uom"])
+
+
+def _validate_batch(jobs, default_kind):
+	"""
+	整批预校验：每笔须含唯一的 idempotency_key，kind 合法，且通过与单笔接口相同的参数校验（已成功的键跳过校验、直接重放）。
+	返回 (可执行作业 [(key, kind, params_in)], 未通过作业的结果 {key: 失败响应})。
+	"""
+	prepared, results = [], {}
+	parsed, seen = [], set()
+	for i, job in enumerate(jobs):
+		kind, params_in = _batch_job_params(job, default_kind)
+		key = (params_in.get("idempotency_key") or "").strip()
+		if not key:
+			results["#{0}".format(i)] = _make_fail_response(
+				ERR_VALIDATION, _("jobs[{0}].idempotency_key 必填").format(i)
+			)
+			continue
+		if key in seen:
+			# 重复的键整组拒绝，避免同一笔被执行两次
+			results[key] = _make_fail_response(ERR_VALIDATION, _("idempotency_key 在本批中重复：{0}").format(key))
+			parsed = [x for x in parsed if x[0] != key]
+			continue
+		seen.add(key)
+		if kind not in (KIND_BLANK, KIND_SEMI_FINISHED):
+			results[key] = _make_fail_response(ERR_VALIDATION, _("kind 无效：{0}").format(kind))
+			continue
+		parsed.append((key, kind, params_in))
+
+	# 已成功的幂等键直接重放，不再校验
+	replayable = set(
+		frappe.get_all(
+			LOG_DOCTYPE,
+			filters={"idempotency_key": ["in", [k for k, _kind, _p in parsed] or [""]], "status": "Success"},
+			pluck="idempotency_key",
+		)
+	)
+	_prefetch_batch_master_data([p for key, _kind, p in parsed if key not in replayable])
+	for key, kind, params_in in parsed:
+		if key in replayable:
+			prepared.append((key, kind, params_in))
+			continue
+		_ctx, err = _validate_and_build_ctx(
+			params_in, default_mr_target_warehouse=_submit_options(kind)["default_mr_target_warehouse"]
+		)
+		if err:
+			results[key] = err
+		else:
+			prepared.append((key, kind, params_in))
+	return prepared, results
+
+
+def _record_batch_failure_log(idem, summary, result, t0, timer=None):
+	"""作业回滚后补记失败日志（回滚前写入的 Processing 日志已随 savepoint 撤销），保留各阶段耗时。"""
+	try:
+		log_name = _create_processing_log(idem, summary)
+	except frappe.UniqueValidationError:
+		return None
+	_finalize_log(
+		log_name,
+		"Failed",
+		err_code=result.get("error_code"),
+		err_msg=result.get("message"),
+		t0=t0,
+		summary=summary,
+		timer=timer,
+	)
+	return log_name
+
+
+def _rollback_batch_job():
+	"""
+	回滚单笔作业到 savepoint。死锁 / 锁等待超时时数据库已回滚整个事务，savepoint 不复存在：
+	改为整体回滚（此前各笔均已提交，不受影响）并重建 savepoint。
+	回滚 savepoint 不会清除已登记的提交回调（如 enqueue_after_commit），一并丢弃，避免下一笔提交时误执行。
+	"""
+	try:
+		frappe.db.rollback(save_point=_BATCH_SAVEPOINT)
+	except Exception:
+		frappe.db.rollback()
+		frappe.db.savepoint(_BATCH_SAVEPOINT)
+	for callbacks in ("before_commit", "after_commit"):
+		manager = getattr(frappe.db, callbacks, None)
+		if manager is not None:
+			manager.reset()
+
+
+def _run_batch_job(kind, params_in):
+	"""
+	单笔作业：savepoint 内执行完整编排，成功则提交；失败回滚到 savepoint（不留半成品单据），
+	补记失败日志后提交。返回与单笔接口相同结构的响应，失败时附 rolled_back=True。
+	"""
+	t0 = time.time()
+	timer = StageTimer()
+	frappe.db.savepoint(_BATCH_SAVEPOINT)
+	try:
+		result = _execute_outsourcing_submit(params_in, timer=timer, **_submit_options(kind))
+	except Exception as e:
+		frappe.log_error(title="MES outsourcing batch job failed", message=frappe.get_traceback())
+		result = _make_fail_response(ERR_BATCH_JOB, cstr(e))
+
+	if result.get("success"):
+		frappe.db.commit()
+		return result
+
+	_rollback_batch_job()
+	logged = bool(result.get("operation_id"))
+	result = _make_fail_response(result.get("error_code"), result.get("message"))
+	result["rolled_back"] = True
+	if logged:
+		result["operation_id"] = _record_batch_failure_log(
+			(params_in.get("idempotency_key") or "").strip(), _summary(params_in), result, t0, timer=timer
+		)
+	frappe.db.commit()
+	return result
+
+
+def _run_batch(prepared):
+	"""依次执行预校验通过的作业，返回 {idempotency_key: 响应}。"""
+	results = {}
+	frappe.flags[_BATCH_FLAG] = True
+	try:
+		for key, kind, params_in in prepared:
+			results[key] = _run_batch_job(kind, params_in)
+	finally:
+		frappe.flags[_BATCH_FLAG] = False
+	return results
+
+
+def _batch_response(results, **extra):
+	succeeded = sum(1 for r in results.values() if r.get("success"))
+	out = {
+		"success": succeeded == len(results),
+		"total": len(results),
+		"succeeded": succeeded,
+		"failed": len(results) - succeeded,
+		"results": results,
+	}
+	out.update(extra)
+	return out
+
+
+def _batch_key(batch_id):
+	return BATCH_CACHE_PREFIX + batch_id
+
+
+def run_outsourcing_batch_job(batch_id, prepared, results):
+	"""后台任务入口：执行作业并把结果写回批次状态。"""
+	job_state.update_state(_batch_key(batch_id), status="running")
+	try:
+		results = dict(results or {})
+		results.update(_run_batch([tuple(x) for x in prepared]))
+		job_state.update_state(
+			_batch_key(batch_id), status="finished", result=_batch_response(results, batch_id=batch_id)
+		)
+	except Exception as e:
+		frappe.db.rollback()
+		frappe.log_error(title="MES outsourcing batch {0} failed".format(batch_id), message=frappe.get_traceback())
+		job_state.update_state(_batch_key(batch_id), status="failed", error=cstr(e))
+
+
+@frappe.whitelist(allow_guest=False, methods=["POST"])
+def submit_outsourcing_batch(**kwargs):
+	"""
+	批量委外编排：一次提交多笔毛坯 / 半成品委外，每笔与 submit_blank_outsourcing / submit_semi_finished_outsourcing 同流程。
+
+	json_data:
+	- jobs: 作业数组，每项字段同单笔接口，且 idempotency_key 必填（本批内唯一）；可带 kind 覆盖批次默认
+	- kind: blank（默认）| semi_finished
+	- run_in_background: 可选；未传时作业数超过 BATCH_BACKGROUND_THRESHOLD 自动放入后台
+
+	整批先预校验（主数据一次预取、各作业共用），再逐笔在独立 savepoint 中执行：
+	成功即提交；失败回滚该笔全部单据并记失败日志，不影响其它作业。
+
+	返回（同步）: { success, total, succeeded, failed, results: { idempotency_key: 单笔响应 } }
+	返回（后台）: { success, batch_id, status: "queued", results: 预校验未通过的作业 }，用 get_outsourcing_batch_status 轮询
+	"""
+	body = _parse_body(kwargs)
+	jobs = body.get("jobs")
+	if not jobs or not isinstance(jobs, list):
+		return _make_fail_response(ERR_VALIDATION, _("jobs 须为非空数组"))
+	default_kind = (body.get("kind") or KIND_BLANK).strip()
+
+	prepared, results = _validate_batch(jobs, default_kind)
+	run_in_background = body.get("run_in_background")
+	if run_in_background is None:
+		run_in_background = len(prepared) > BATCH_BACKGROUND_THRESHOLD
+
+	if prepared and run_in_background:
+		batch_id = frappe.generate_hash(length=12)
+		job_state.update_state(
+			_batch_key(batch_id),
+			batch_id=batch_id,
+			status="queued",
+			owner=frappe.session.user,
+			total=len(jobs),
+			result=None,
+			error=None,
+		)
+		frappe.enqueue(
+			"bairun_erp.utils.api.mes.blank_outsourcing_submit.run_outsourcing_batch_job",
+			queue="long",
+			timeout=3600,
+			enqueue_after_commit=True,
+			batch_id=batch_id,
+			prepared=prepared,
+			results=results,
+		)
+		return {"success": True, "batch_id": batch_id, "status": "queued", "results": results}
+
+	results.update(_run_batch(prepared))
+	return _batch_response(results)
+
+
+@frappe.whitelist()
+def get_outsourcing_batch_status(batch_id=None):
+	"""
+	查询后台批量委外状态。
+	返回: { batch_id, status(queued/running/finished/failed/not_found), total, result, error }
+	"""
+	batch_id = (batch_id or "").strip()
+	batch = job_state.get_state(_batch_key(batch_id)) if batch_id else None
+	if not batch:
+		return {"batch_id": batch_id, "status": "not_found"}
+	job_state.check_owner(batch)
+	return {
+		"batch_id": batch_id,
+		"status": batch.get("status"),
+		"total": batch.get("total"),
+		"result": batch.get("result"),
+		"error": batch.get("error"),
+	}
@@ -0,0 +1,163 @@
+# Copyright (c) 2026, Bairun and contributors
+# 委外编排分阶段耗时：_execute_outsourcing_submit 记录 MR / 发料 SE / 回库 SE / PO 各阶段耗时与 SQL 次数，
+# 写入 MES Blank Outsourcing Log；按日期区间汇总 p50 / p95 / p99。
+#
+# 报表:
+#   bairun_erp.utils.api.mes.outsourcing_stage_timing.get_outsourcing_stage_timing_report
+#   bench --site site2.local outsourcing-stage-timing --from-date 2026-10-01 --to-date 2026-10-18
+
+from __future__ import unicode_literals
+
+import math
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import add_days, cint, getdate, nowdate
+
+LOG_DOCTYPE = "MES Blank Outsourcing Log"
+
+# 阶段代码 -> 展示名；日志字段为 {stage}_duration_ms / {stage}_query_count
+STAGES = (
+	("mr", "Material Request"),
+	("se", "Stock Entry (Issue)"),
+	("receipt", "Receipt Stock Entry"),
+	("po", "Purchase Order"),
+)
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer(object):
+	"""
+	按阶段累计耗时（毫秒）与 SQL 语句数。语句数取 MariaDB 会话计数器 Questions 的差值，
+	不替换 frappe.db.sql：阶段抛异常、嵌套阶段或其他代码重绑 db.sql 都不影响计数。
+	"""
+
+	def __init__(self):
+		self.durations = {}
+		self.query_counts = {}
+		# 本计时器读取计数器的次数（读取语句本身也计入 Questions，需扣除）
+		self._probes = 0
+
+	def _session_questions(self):
+		self._probes += 1
+		return cint(frappe.db.sql("SHOW SESSION STATUS LIKE 'Questions'")[0][1])
+
+	@contextmanager
+	def stage(self, name):
+		start = self._session_questions()
+		probes = self._probes
+		t0 = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.durations[name] = self.durations.get(name, 0) + int((time.perf_counter() - t0) * 1000)
+			# 扣除期间的计数器读取（本次结束读取及嵌套阶段的读取）；断线重连后计数器归零时记 0
+			count = self._session_questions() - start - (self._probes - probes)
+			self.query_counts[name] = self.query_counts.get(name, 0) + max(count, 0)
+
+	def as_log_fields(self):
+		"""未执行的阶段写 0。"""
+		out = {}
+		for stage, _label in STAGES:
+			out["{}_duration_ms".format(stage)] = self.durations.get(stage, 0)
+			out["{}_query_count".format(stage)] = self.query_counts.get(stage, 0)
+		return out
+
+
+def percentile(sorted_values, pct):
+	"""最近秩百分位数；sorted_values 须已升序。"""
+	if not sorted_values:
+		return None
+	rank = max(1, int(math.ceil(pct / 100.0 * len(sorted_values))))
+	return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _distribution(values):
+	values = sorted(values)
+	out = {"count": len(values)}
+	for pct in PERCENTILES:
+		out["p{}".format(pct)] = percentile(values, pct)
+	out["max"] = values[-1] if values else None
+	out["avg"] = round(sum(values) / float(len(values)), 1) if values else None
+	return out
+
+
+def build_stage_timing_report(from_date=None, to_date=None, status=None):
+	"""
+	汇总 [from_date, to_date] 内（按 creation）日志的各阶段耗时分布；默认最近 7 天。
+	只统计实际执行过的阶段（SQL 次数 > 0）。
+	"""
+	to_date = getdate(to_date or nowdate())
+	from_date = getdate(from_date or add_days(to_date, -6))
+	fields = ["duration_ms"]
+	for stage, _label in STAGES:
+		fields += ["{}_duration_ms".format(stage), "{}_query_count".format(stage)]
+	filters = [
+		["creation", ">=", from_date],
+		["creation", "<", add_days(to_date, 1)],
+		["status", "!=", "Processing"],
+	]
+	if status:
+		filters.append(["status", "=", status])
+	rows = frappe.get_all(LOG_DOCTYPE, filters=filters, fields=fields)
+
+	stages = []
+	for stage, label in STAGES:
+		ran = [r for r in rows if (r.get("{}_query_count".format(stage)) or 0) > 0]
+		stages.append({
+			"stage": stage,
+			"label": label,
+			"duration_ms": _distribution([r.get("{}_duration_ms".format(stage)) or 0 for r in ran]),
+			"query_count": _distribution([r.get("{}_query_count".format(stage)) or 0 for r in ran]),
+		})
+	return {
+		"from_date": str(from_date),
+		"to_date": str(to_date),
+		"status": status or None,
+		"total": {"duration_ms": _distribution([r.get("duration_ms") or 0 for r in rows])},
+		"stages": stages,
+	}
+
+
+@frappe.whitelist()
+def get_outsourcing_stage_timing_report(from_date=None, to_date=None, status=None):
+	"""
+	委外提交分阶段耗时报表。
+	参数: from_date / to_date（YYYY-MM-DD，默认最近 7 天），status（可选：Success / Partial / Failed）
+	返回: { from_date, to_date, status, total: {duration_ms: 分布}, stages: [{stage, label, duration_ms: 分布, query_count: 分布}] }
+	分布: { count, p50, p95, p99, max, avg }
+	"""
+	frappe.only_for("System Manager")
+	return build_stage_timing_report(from_date=from_date, to_date=to_date, status=status)
+
+
+def format_stage_timing_report(report):
+	"""文本表格（bench 命令输出）。"""
+	lines = [
+		"MES outsourcing stage timing {from_date} ~ {to_date}{status}".format(
+			from_date=report["from_date"],
+			to_date=report["to_date"],
+			status=" [{}]".format(report["status"]) if report.get("status") else "",
+		),
+		"{:<22}{:>7}{:>9}{:>9}{:>9}{:>9}{:>8}{:>8}".format("stage", "count", "p50 ms", "p95 ms", "p99 ms", "max ms", "q p50", "q p95"),
+	]
+
+	def _fmt(v):
+		return "-" if v is None else str(v)
+
+	for s in report["stages"]:
+		d, q = s["duration_ms"], s["query_count"]
+		lines.append(
+			"{:<22}{:>7}{:>9}{:>9}{:>9}{:>9}{:>8}{:>8}".format(
+				s["label"], d["count"], _fmt(d["p50"]), _fmt(d["p95"]), _fmt(d["p99"]), _fmt(d["max"]),
+				_fmt(q["p50"]), _fmt(q["p95"]),
+			)
+		)
+	t = report["total"]["duration_ms"]
+	lines.append(
+		"{:<22}{:>7}{:>9}{:>9}{:>9}{:>9}".format(
+			"total", t["count"], _fmt(t["p50"]), _fmt(t["p95"]), _fmt(t["p99"]), _fmt(t["max"])
+		)
+	)
+	return "\n".join(lines)
@@ -6,6 +6,8 @@
 
 from __future__ import unicode_literals
 
+from unittest.mock import MagicMock, call, patch
+
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
@@ -14,7 +16,9 @@ from bairun_erp.utils.api.mes.blank_outsourcing_submit import (
 	LOG_DOCTYPE,
 	PO_DEFAULT_SERVICE_ITEM_NAME_SEMI,
 	_apply_semi_finished_outsourcing_defaults,
+	_rollback_batch_job,
 	submit_blank_outsourcing,
+	submit_outsourcing_batch,
 	submit_semi_finished_outsourcing,
 )
 
@@ -139,3 +143,60 @@ class TestBlankOutsourcingSubmit(FrappeTestCase):
 
 		frappe.delete_doc(LOG_DOCTYPE, log.name, force=True, ignore_permissions=True)
 		frappe.db.commit()
+
+	def test_batch_requires_jobs(self):
+		out = submit_outsourcing_batch(json_data={"jobs": []})
+		self.assertFalse(out.get("success"))
+		self.assertEqual(out.get("error_code"), "VALIDATION_ERROR")
+
+	def test_batch_rejects_missing_and_duplicate_keys(self):
+		key = "test-batch-dup-{}".format(frappe.generate_hash(length=8))
+		out = submit_outsourcing_batch(
+			json_data={
+				"jobs": [
+					{"items": [{"item_code": "ANY", "qty": 1}]},
+					{"idempotency_key": key, "items": []},
+					{"idempotency_key": key, "items": []},
+				],
+				"run_in_background": False,
+			}
+		)
+		self.assertFalse(out.get("success"))
+		self.assertEqual(out["results"]["#0"]["error_code"], "VALIDATION_ERROR")
+		self.assertEqual(out["results"][key]["error_code"], "VALIDATION_ERROR")
+		self.assertEqual(out.get("total"), 2)
+
+	def test_batch_replays_success_keyed_by_idempotency_key(self):
+		key = "test-batch-idem-{}".format(frappe.generate_hash(length=8))
+		frappe.get_doc(
+			{
+				"doctype": LOG_DOCTYPE,
+				"idempotency_key": key,
+				"status": "Success",
+				"material_request_name": "MAT-MR-TEST-BATCH",
+				"stock_entry_name": "MAT-STE-TEST-BATCH",
+			}
+		).insert(ignore_permissions=True)
+		frappe.db.commit()
+
+		out = submit_outsourcing_batch(
+			json_data={"jobs": [{"idempotency_key": key, "items": []}], "run_in_background": False}
+		)
+		self.assertTrue(out.get("success"))
+		self.assertTrue(out["results"][key]["replayed"])
+		self.assertEqual(out["results"][key]["material_request_name"], "MAT-MR-TEST-BATCH")
+
+	def test_batch_rollback_survives_lost_savepoint(self):
+		# 死锁后事务已被数据库回滚，savepoint 不存在：退为整体回滚并重建 savepoint，丢弃已登记的提交回调
+		def _rollback(save_point=None):
+			if save_point:
+				raise Exception("SAVEPOINT mes_outsourcing_job does not exist")
+
+		db = MagicMock()
+		db.rollback.side_effect = _rollback
+		with patch.object(frappe.local, "db", db):
+			_rollback_batch_job()
+		self.assertEqual(db.rollback.call_args_list, [call(save_point="mes_outsourcing_job"), call()])
+		db.savepoint.assert_called_once_with("mes_outsourcing_job")
+		db.after_commit.reset.assert_called_once_with()
+		db.before_commit.reset.assert_called_once_with()
@@ -0,0 +1,61 @@
+# Copyright (c) 2026, Bairun and contributors
+# 外协下单分阶段计时：百分位与分布统计、StageTimer 按会话计数器统计 SQL 次数（嵌套、异常）。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.mes.test_outsourcing_stage_timing
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils.api.mes import outsourcing_stage_timing as timing
+
+
+class TestOutsourcingStageTiming(FrappeTestCase):
+	def test_percentile_nearest_rank(self):
+		values = list(range(1, 101))
+		self.assertEqual(timing.percentile(values, 50), 50)
+		self.assertEqual(timing.percentile(values, 95), 95)
+		self.assertEqual(timing.percentile(values, 99), 99)
+		self.assertEqual(timing.percentile([7], 99), 7)
+		self.assertIsNone(timing.percentile([], 50))
+
+	def test_distribution_empty_and_unsorted(self):
+		self.assertEqual(
+			timing._distribution([]),
+			{"count": 0, "p50": None, "p95": None, "p99": None, "max": None, "avg": None},
+		)
+		d = timing._distribution([30, 10, 20])
+		self.assertEqual((d["count"], d["p50"], d["max"], d["avg"]), (3, 20, 30, 20.0))
+
+	def test_stage_timer_counts_queries_without_patching_sql(self):
+		original_sql = frappe.db.sql
+		timer = timing.StageTimer()
+		with timer.stage("mr"):
+			frappe.db.sql("select 1")
+			frappe.db.sql("select 2")
+		with timer.stage("mr"):
+			frappe.db.sql("select 3")
+		self.assertEqual(frappe.db.sql, original_sql)
+
+		fields = timer.as_log_fields()
+		self.assertEqual(fields["mr_query_count"], 3)
+		self.assertEqual(fields["po_query_count"], 0)
+		self.assertEqual(fields["po_duration_ms"], 0)
+		self.assertEqual(
+			set(fields),
+			{"{}_{}".format(s, f) for s, _label in timing.STAGES for f in ("duration_ms", "query_count")},
+		)
+
+	def test_stage_timer_nested_and_failing_stages(self):
+		timer = timing.StageTimer()
+		with self.assertRaises(ZeroDivisionError):
+			with timer.stage("po"):
+				frappe.db.sql("select 1")
+				with timer.stage("se"):
+					frappe.db.sql("select 2")
+					frappe.db.sql("select 3")
+				1 / 0
+		frappe.db.sql("select 4")
+		self.assertEqual(timer.query_counts, {"se": 2, "po": 3})
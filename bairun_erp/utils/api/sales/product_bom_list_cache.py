@@ -0,0 +1,53 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+get_product_bom_list 结果缓存（Redis）：按 (sales_order, Sales Order.modified, item_code) 缓存整份 data。
+
+- 销售订单任何修改都会改变 modified，旧 key 自然不再命中（随 TTL 过期）。
+- 每条缓存记录展开时涉及的 BOM 与 Item 的 modified，读取时两条查询比对，任一 BOM / 物料被修改即视为失效。
+- 库存数（inventoryQty）与估价随 Bin 变化，不在校验范围内，靠较短 TTL 控制滞后；表头状态读取时实时计算。
+"""
+
+from __future__ import unicode_literals
+
+import copy
+
+import frappe
+
+from bairun_erp.utils.api.material.bom_tree_cache import _get_modified_map
+
+CACHE_KEY_PREFIX = "bairun_erp:product_bom_list:"
+CACHE_TTL_SEC = 10 * 60
+
+
+def _cache_key(sales_order, so_modified, item_code):
+	return "{}{}:{}:{}".format(CACHE_KEY_PREFIX, sales_order, so_modified, item_code or "*")
+
+
+def get_cached_product_bom_list(sales_order, so_modified, item_code=None):
+	"""命中且涉及的 BOM / Item 均未修改时返回缓存条目（深拷贝，含 data / finished_codes / header_status），否则 None。"""
+	entry = frappe.cache().get_value(_cache_key(sales_order, so_modified, item_code))
+	if not entry or not isinstance(entry, dict) or "data" not in entry:
+		return None
+	boms = entry.get("boms") or {}
+	items = entry.get("items") or {}
+	if boms and _get_modified_map("BOM", boms.keys()) != boms:
+		return None
+	if items and _get_modified_map("Item", items.keys()) != items:
+		return None
+	return copy.deepcopy(entry)
+
+
+def set_cached_product_bom_list(sales_order, so_modified, item_code, entry, bom_modified, item_codes):
+	"""
+	写入缓存。entry 为 {data, finished_codes, header_status}；
+	bom_modified 为展开时记录的 {bom: modified}，item_codes 为涉及的物料（写入时一次查询补齐 modified）。
+	"""
+	entry = dict(entry)
+	entry["boms"] = dict(bom_modified or {})
+	entry["items"] = _get_modified_map("Item", {c for c in item_codes or () if c})
+	frappe.cache().set_value(
+		_cache_key(sales_order, so_modified, item_code),
+		copy.deepcopy(entry),
+		expires_in_sec=CACHE_TTL_SEC,
+	)
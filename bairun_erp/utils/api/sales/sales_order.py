@@ -291,12 +291,13 @@ def save_sales_order(order_data=None, *args, **kwargs):
             so.insert(ignore_permissions=True)
             so.save(ignore_permissions=True)
 
-        # 保存成功后同步产品物料清单到 BR SO BOM List / BR SO BOM List Details
+        # 保存成功后在后台同步产品物料清单到 BR SO BOM List / BR SO BOM List Details（按订单去重，见 get_bom_list_sync_status）
+        bom_list_sync_status = None
         try:
             from bairun_erp.utils.api.sales.sales_order_bom_sync import (
-                sync_bom_list_for_sales_order,
+                enqueue_bom_list_sync,
             )
-            sync_bom_list_for_sales_order(so)
+            bom_list_sync_status = (enqueue_bom_list_sync(so.name) or {}).get("status")
         except Exception:
             frappe.log_error(
                 title="BOM sync after save_sales_order",
@@ -312,6 +313,7 @@ def save_sales_order(order_data=None, *args, **kwargs):
                 "message": _("销售订单保存成功"),
                 "production_order_name": None,
                 "rg_pattern_name": None,
+                "bom_list_sync_status": bom_list_sync_status,
             }
         }
     except frappe.ValidationError as e:
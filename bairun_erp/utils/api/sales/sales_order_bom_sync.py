@@ -1,11 +1,26 @@
 # Copyright (c) 2026, Bairun and contributors
 # 销售合同保存后，将产品物料清单同步写入 BR SO BOM List / BR SO BOM List Details。
 # 仅通过标准 Frappe API 写入，不修改两 DocType 结构。
+#
+# 同步在 long 队列后台执行（enqueue_bom_list_sync），按销售订单去重：
+# - 已排队未执行：再次保存直接合并到该次执行；
+# - 执行中：标记 rerun，本次结束后重新入队，按最新订单再同步一轮（标记与结束检查在同一把状态锁内）；
+# - 同一订单各成品共用一次物料字段查询；子装配展开复用 BOM 子树缓存。
+# 前端轮询 get_bom_list_sync_status。
+#
+# bench execute 示例:
+#   bench --site site2.local execute bairun_erp.utils.api.sales.sales_order_bom_sync.get_bom_list_sync_status --kwargs '{"sales_order": "SAL-ORD-2026-00003"}'
 
 from __future__ import unicode_literals
 
 import frappe
-from frappe.utils import flt
+from frappe.utils import flt, now_datetime, time_diff_in_seconds
+
+from bairun_erp.utils import job_state
+
+SYNC_CACHE_PREFIX = "bairun_erp:so_bom_sync:"
+SYNC_TTL_SEC = 24 * 60 * 60
+SYNC_JOB_TIMEOUT = 30 * 60
 
 
 def _get_customer_code_and_name(customer_link):
@@ -141,31 +156,33 @@ def _save_bom_list_doc(doc_dict):
 
 def sync_bom_list_for_sales_order(so_doc):
     """
-    销售合同保存后调用：按 SO 每行成品调用 get_product_bom_list，并写入 BR SO BOM List + Details。
-    单行失败仅打日志，不抛异常，不改变保存接口返回。
+    按 SO 每个成品（去重）生成产品物料清单，并写入 BR SO BOM List + Details；各成品共用物料字段查询。
+    单个成品失败仅打日志，不抛异常。返回 {"synced": [item_code...], "failed": [item_code...]}。
     """
+    out = {"synced": [], "failed": []}
     if not so_doc or not getattr(so_doc, "items", None):
-        return
-    from bairun_erp.utils.api.sales.sales_order_query_bom_details import get_product_bom_list
+        return out
+    from bairun_erp.utils.api.sales.sales_order_query_bom_details import (
+        _new_explode_shared,
+        _product_bom_data_for_so_items,
+    )
 
-    for so_item in so_doc.items:
-        item_code = (getattr(so_item, "item_code", None) or "").strip()
-        if not item_code:
-            continue
+    so_items = list(so_doc.items)
+    item_codes = [(getattr(si, "item_code", None) or "").strip() for si in so_items]
+    shared = _new_explode_shared()
+    for item_code in dict.fromkeys(c for c in item_codes if c):
         try:
-            result = get_product_bom_list(
-                sales_order_name=so_doc.name,
-                item_code=item_code,
-            )
-            if not result or not result.get("success") or not result.get("data"):
+            rows = [si for si, code in zip(so_items, item_codes) if code == item_code]
+            data = _product_bom_data_for_so_items(so_doc, rows, item_code, shared)
+            if not data:
                 frappe.log_error(
                     message="get_product_bom_list failed or empty for {} / {}".format(
                         so_doc.name, item_code
                     ),
                     title="BOM sync get_product_bom_list",
                 )
+                out["failed"].append(item_code)
                 continue
-            data = result["data"]
             header = data.get("header") or {}
             items = data.get("items") or []
             carton_items = data.get("cartonItems") or []
@@ -174,9 +191,155 @@ def sync_bom_list_for_sales_order(so_doc):
             doc_dict = _build_bom_list_doc(
                 so_doc, header, item_code, items, carton_items, packaging_items
             )
-            _save_bom_list_doc(doc_dict)
+            if _save_bom_list_doc(doc_dict):
+                out["synced"].append(item_code)
+            else:
+                out["failed"].append(item_code)
         except Exception:
             frappe.log_error(
                 message=frappe.get_traceback(),
                 title="BOM sync BR SO BOM List",
             )
+            out["failed"].append(item_code)
+    return out
+
+
+# --- 后台同步 ---
+
+
+def _sync_key(sales_order):
+    return SYNC_CACHE_PREFIX + sales_order
+
+
+def _get_sync(sales_order):
+    return job_state.get_state(_sync_key(sales_order))
+
+
+def _update_sync(sales_order, **values):
+    return job_state.update_state(_sync_key(sales_order), ttl=SYNC_TTL_SEC, sales_order=sales_order, **values)
+
+
+def _is_stale(state, since_field):
+    since = state.get(since_field)
+    return not since or time_diff_in_seconds(now_datetime(), since) > SYNC_JOB_TIMEOUT
+
+
+def _enqueue_sync_job(sales_order, runs=0):
+    # 重跑时原任务仍在执行（RQ 状态 started），同一 job_id 去重会丢弃本次入队，故按轮次区分 job_id
+    job_id = "so_bom_sync::{}".format(sales_order)
+    frappe.enqueue(
+        "bairun_erp.utils.api.sales.sales_order_bom_sync.run_bom_list_sync_job",
+        queue="long",
+        timeout=SYNC_JOB_TIMEOUT,
+        enqueue_after_commit=not runs,
+        job_id="{}::{}".format(job_id, runs) if runs else job_id,
+        deduplicate=not runs,
+        sales_order=sales_order,
+        runs=runs,
+    )
+
+
+def enqueue_bom_list_sync(sales_order):
+    """
+    销售合同保存后调用：把 BR SO BOM List 同步放入 long 队列（提交事务后入队），立即返回当前状态。
+    已排队的同步直接合并；执行中的同步标记 rerun，结束后再跑一轮。超时未结束的状态视为失效，重新入队。
+    判断与写入在同一把状态锁内完成，与任务结束时的 rerun 检查互斥。
+    """
+    sales_order = (sales_order or "").strip()
+    if not sales_order:
+        return None
+
+    def _request(state):
+        status = state.get("status")
+        if status == "queued" and not _is_stale(state, "requested_at"):
+            return False
+        state["requested_by"] = frappe.session.user
+        if status == "running" and not _is_stale(state, "started_at"):
+            state["rerun"] = True
+            return "rerun"
+        state.update(
+            sales_order=sales_order,
+            status="queued",
+            requested_at=str(now_datetime()),
+            rerun=False,
+            error=None,
+        )
+        return "enqueue"
+
+    state, action = job_state.transition_state(_sync_key(sales_order), _request, ttl=SYNC_TTL_SEC)
+    if action == "enqueue":
+        _enqueue_sync_job(sales_order)
+    return state
+
+
+def _finish_sync(sales_order, runs, **values):
+    """
+    一轮同步结束：锁内检查 rerun。执行期间有新的保存请求则清除标记、置为 queued 并重新入队，
+    否则写入最终状态（values）。
+    """
+
+    def _finish(state):
+        if state.get("rerun"):
+            state.update(status="queued", requested_at=str(now_datetime()), rerun=False, runs=runs)
+            return "rerun"
+        state.update(values, runs=runs, finished_at=str(now_datetime()))
+        return "done"
+
+    _state, action = job_state.transition_state(_sync_key(sales_order), _finish, ttl=SYNC_TTL_SEC)
+    if action == "rerun":
+        _enqueue_sync_job(sales_order, runs)
+
+
+def run_bom_list_sync_job(sales_order, runs=0):
+    """后台任务入口：同步一轮，结果写回同步状态；执行期间有新的保存请求（rerun）时重新入队再跑一轮。"""
+    runs += 1
+    _update_sync(sales_order, status="running", started_at=str(now_datetime()), rerun=False)
+    try:
+        if not frappe.db.exists("Sales Order", sales_order):
+            _finish_sync(sales_order, runs, status="failed", error="销售订单不存在: {}".format(sales_order))
+            return
+        result = sync_bom_list_for_sales_order(frappe.get_doc("Sales Order", sales_order))
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(
+            title="BOM sync job {} failed".format(sales_order),
+            message=frappe.get_traceback(),
+        )
+        _finish_sync(sales_order, runs, status="failed", error=str(e))
+        return
+    _finish_sync(
+        sales_order,
+        runs,
+        status="finished",
+        synced=result.get("synced"),
+        failed=result.get("failed"),
+        error=None,
+    )
+
+
+@frappe.whitelist()
+def get_bom_list_sync_status(sales_order=None):
+    """
+    查询销售订单 BR SO BOM List 后台同步状态。
+    返回: { sales_order, status(queued/running/finished/failed/not_found), requested_at, started_at, finished_at,
+            rerun, synced: [成品], failed: [成品], error }
+    """
+    sales_order = (sales_order or "").strip()
+    if not sales_order:
+        return {"sales_order": sales_order, "status": "not_found"}
+    frappe.has_permission("Sales Order", doc=sales_order, throw=True)
+    state = _get_sync(sales_order)
+    if not state:
+        return {"sales_order": sales_order, "status": "not_found"}
+    return {
+        "sales_order": sales_order,
+        "status": state.get("status"),
+        "requested_at": state.get("requested_at"),
+        "started_at": state.get("started_at"),
+        "finished_at": state.get("finished_at"),
+        "rerun": bool(state.get("rerun")),
+        "synced": state.get("synced") or [],
+        "failed": state.get("failed") or [],
+        "error": state.get("error"),
+    }
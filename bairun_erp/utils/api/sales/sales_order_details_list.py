@@ -14,6 +14,8 @@ import json
 import frappe
 from frappe.utils import flt
 
+from bairun_erp.utils.list_count import count_list
+
 
 # 主表列表所需字段（标准 + 可选自定义）
 _SO_DETAILS_LIST_FIELDS = [
@@ -194,16 +196,8 @@ def get_sales_order_details_list(**kwargs):
         ignore_permissions=False,
     )
 
-    # 使用相同筛选条件取总数（仅取 name，limit_page_length=0 表示不限制条数）
-    total_list = frappe.get_list(
-        "Sales Order",
-        fields=["name"],
-        filters=filters,
-        or_filters=or_filters if or_filters else None,
-        limit_page_length=0,
-        ignore_permissions=False,
-    )
-    total = len(total_list)
+    # 使用相同筛选条件与权限条件取总数（一条 COUNT，不取回全部 name）
+    total = count_list("Sales Order", filters=filters, or_filters=or_filters)
 
     so_names = [r.get("name") for r in so_list if r.get("name")]
     item_names_by_so, delivered_qty_by_so, total_qty_by_so = _get_item_aggregates(so_names)
@@ -3,7 +3,8 @@
 """
 产品物料清单 API：基于销售订单明细行，展开完整 BOM 层级结构。
 
-- get_product_bom_list: 获取单条产品物料清单详情（header + 扁平 items，含 level、bomCode）；数据源为 BOM + Item 实时展开
+- get_product_bom_list: 获取单条产品物料清单详情（header + 扁平 items，含 level、bomCode）；数据源为 BOM + Item 展开，
+  结果按 (销售订单, modified, item_code) 缓存，BOM / 物料修改后自动重建（见 product_bom_list_cache）
 - get_product_bom_list_new: 与上者返回结构相同，数据源为已同步的 BR SO BOM List + BR SO BOM List Details
 - list_bom_material_report: BOM 物料清单报表列表（数据源：BR SO BOM List 主表，一行 = 一订单 + 一成品）
 
@@ -24,10 +25,16 @@ from frappe.utils import cint, flt, getdate
 
 from bairun_erp.utils.api.material.bom_query import (
     _attach_process_supplier_rows,
-    _build_bom_tree,
+    _build_bom_tree_level_order,
     _get_item_tree_fields,
     get_item_process_supplier_row_for_resolved_process,
 )
+from bairun_erp.utils import keyset, lookup_cache
+from bairun_erp.utils.list_count import count_list
+from bairun_erp.utils.api.sales.product_bom_list_cache import (
+    get_cached_product_bom_list,
+    set_cached_product_bom_list,
+)
 
 
 def _get_bom_for_item(item_code, so_item_bom_no=None):
@@ -95,17 +102,23 @@ def _flatten_bom_tree_with_root(node, level, parent_bom_code, flat, path_ratio,
 
 
 def _get_warehouse_name(warehouse_code):
-    """获取仓库名称，无则返回空"""
+    """获取仓库名称，无则返回空（请求级 + Redis 短 TTL 缓存，见 lookup_cache）"""
     if not warehouse_code:
         return ""
-    return frappe.db.get_value("Warehouse", warehouse_code, "warehouse_name") or ""
+    return lookup_cache.get_value("Warehouse", warehouse_code, "warehouse_name", use_redis=True) or ""
 
 
 def _get_supplier_name(supplier_code):
-    """获取供应商名称"""
+    """获取供应商名称（请求级 + Redis 短 TTL 缓存，见 lookup_cache）"""
     if not supplier_code:
         return ""
-    return frappe.db.get_value("Supplier", supplier_code, "supplier_name") or ""
+    return lookup_cache.get_value("Supplier", supplier_code, "supplier_name", use_redis=True) or ""
+
+
+def _prefetch_warehouse_and_supplier_names(warehouses, suppliers):
+    """批量预取仓库 / 供应商名称，之后逐行 _get_warehouse_name / _get_supplier_name 直接命中缓存。"""
+    lookup_cache.bulk_get("Warehouse", warehouses, ["warehouse_name"], use_redis=True)
+    lookup_cache.bulk_get("Supplier", suppliers, ["supplier_name"], use_redis=True)
 
 
 def _get_item_group_parent_map(item_group_names):
@@ -139,6 +152,77 @@ def _get_bin_actual_qty(item_code, warehouse):
     return flt(val) if val is not None else None
 
 
+def _load_bin_maps(item_codes):
+    """
+    批量取 Bin（一次查询）。返回:
+      - actual_qty_map: (item_code, warehouse) -> actual_qty
+      - valuation_rate_map: item_code -> 最近修改的 Bin.valuation_rate（与原逐行 get_all("Bin", limit=1) 口径一致）
+    """
+    actual_qty_map = {}
+    valuation_rate_map = {}
+    item_codes = list({c for c in item_codes if c})
+    if not item_codes:
+        return actual_qty_map, valuation_rate_map
+    rows = frappe.db.sql(
+        """
+        SELECT item_code, warehouse, actual_qty, valuation_rate
+        FROM `tabBin`
+        WHERE item_code IN %(item_codes)s
+        ORDER BY modified DESC
+        """,
+        {"item_codes": tuple(item_codes)},
+        as_dict=True,
+    )
+    for r in rows:
+        actual_qty_map[(r.item_code, r.warehouse)] = r.actual_qty
+        valuation_rate_map.setdefault(r.item_code, r.valuation_rate)
+    return actual_qty_map, valuation_rate_map
+
+
+def _get_bom_item_rate_map(bom_item_ids):
+    """批量取 BOM Item.rate：name -> rate（不存在的 id 不出现）。"""
+    bom_item_ids = list({i for i in bom_item_ids if i})
+    if not bom_item_ids:
+        return {}
+    rows = frappe.get_all(
+        "BOM Item",
+        filters={"name": ["in", bom_item_ids]},
+        fields=["name", "rate"],
+    )
+    return {r.name: r.rate for r in rows}
+
+
+def _get_item_warehouse_stock_map(item_codes, company):
+    """
+    批量版 _get_item_warehouse_stock_for_company：Item Default、仓库名称、Bin 各一次查询。
+    返回: item_code -> (warehouse, warehouse_name, inventory_qty)；无默认仓的物料不出现。
+    """
+    company = (company or "").strip()
+    item_codes = list({(c or "").strip() for c in item_codes if (c or "").strip()})
+    if not item_codes or not company:
+        return {}
+    rows = frappe.get_all(
+        "Item Default",
+        filters={"parent": ["in", item_codes], "parenttype": "Item", "company": company},
+        fields=["parent", "default_warehouse"],
+        order_by="parent asc, idx asc",
+    )
+    default_wh = {}
+    for r in rows:
+        wh = (r.default_warehouse or "").strip()
+        if wh and r.parent not in default_wh:
+            default_wh[r.parent] = wh
+    if not default_wh:
+        return {}
+    lookup_cache.bulk_get("Warehouse", default_wh.values(), ["warehouse_name"], use_redis=True)
+    actual_qty_map, _valuation = _load_bin_maps(default_wh.keys())
+    out = {}
+    for ic, wh in default_wh.items():
+        qty = actual_qty_map.get((ic, wh))
+        out[ic] = (wh, _get_warehouse_name(wh) or "", flt(qty) if qty is not None else None)
+    return out
+
+
 def _get_item_default_warehouse(item_code, company):
     """
     从 Item Default 子表获取物料的默认仓库（按公司）。
@@ -154,13 +238,16 @@ def _get_item_default_warehouse(item_code, company):
     return (val or "").strip()
 
 
-def _get_item_warehouse_stock_for_company(item_code, company):
+def _get_item_warehouse_stock_for_company(item_code, company, stock_map=None):
     """
     按 Item Default（公司维度）取物料默认仓，并补仓库名称与 Bin 库存。
     用于纸箱/包材等未走 BOM 展开的行，与 _build_items 中仓库口径一致。
+    stock_map：_get_item_warehouse_stock_map 的预取结果，传入时不再逐条查询。
     """
     item_code = (item_code or "").strip()
     company = (company or "").strip()
+    if stock_map is not None:
+        return stock_map.get(item_code) or ("", "", None)
     if not item_code or not company or not frappe.db.exists("Item", item_code):
         return "", "", None
     wh = _get_item_default_warehouse(item_code, company)
@@ -179,8 +266,10 @@ def _resolve_packaging_row_item_code_for_warehouse(br_packaging_item, br_packagi
     """
     pitem = (br_packaging_item or "").strip()
     pmodel = (br_packaging_model or "").strip()
-    for candidate in (pmodel, pitem):
-        if candidate and frappe.db.exists("Item", candidate):
+    candidates = [c for c in (pmodel, pitem) if c]
+    existing = lookup_cache.bulk_get("Item", candidates, ["item_name"])
+    for candidate in candidates:
+        if candidate in existing:
             return candidate
     return ""
 
@@ -296,6 +385,23 @@ def _build_items(flat_nodes, item_details_cache, finished_product_wh=None):
             item_group_names.append(ig)
     item_group_parent_cache = _get_item_group_parent_map(item_group_names)
 
+    # 仓库 / 供应商名称一次预取（含工艺-供应商子表中的供应商一）
+    warehouses, suppliers = [], []
+    for entry in flat_nodes:
+        node = entry.get("node") or {}
+        details = item_details_cache.get(node.get("item_code") or "", {})
+        warehouses.append((node.get("warehouse") or "").strip() or (details.get("default_warehouse_link") or "").strip())
+        suppliers.append((node.get("supplier") or "").strip() or details.get("supplier", ""))
+        for ps in details.get("process_supplier_rows") or []:
+            suppliers.append((ps.get("br_supplier_one") or "").strip())
+    _prefetch_warehouse_and_supplier_names(warehouses, suppliers)
+
+    # BOM Item.rate、Bin 库存 / 估价一次预取，避免逐行查询
+    bom_item_rate_map = _get_bom_item_rate_map([(e.get("node") or {}).get("id") for e in flat_nodes])
+    bin_qty_map, bin_valuation_map = _load_bin_maps(
+        [(e.get("node") or {}).get("item_code") for e in flat_nodes]
+    )
+
     items = []
     for row_no, entry in enumerate(flat_nodes, start=1):
         node = entry["node"]
@@ -320,17 +426,11 @@ def _build_items(flat_nodes, item_details_cache, finished_product_wh=None):
         # estimatedCost: BOM Item.rate 或 Bin.valuation_rate
         estimated_cost = None
         bom_item_id = node.get("id")
-        if bom_item_id and frappe.db.exists("BOM Item", bom_item_id):
-            estimated_cost = flt(frappe.db.get_value("BOM Item", bom_item_id, "rate"))
+        if bom_item_id and bom_item_id in bom_item_rate_map:
+            estimated_cost = flt(bom_item_rate_map[bom_item_id])
         if estimated_cost is None and item_code:
-            bin_rows = frappe.get_all(
-                "Bin",
-                filters={"item_code": item_code},
-                fields=["valuation_rate"],
-                limit=1,
-            )
-            if bin_rows and bin_rows[0].get("valuation_rate"):
-                estimated_cost = flt(bin_rows[0].valuation_rate)
+            if bin_valuation_map.get(item_code):
+                estimated_cost = flt(bin_valuation_map[item_code])
 
         # 结构行：BOM rate / 库存估价仍为空或 0 时，用 Item 子表「工艺-供应商」与 process 对齐的一行补供应商一、价格一
         matched_ps = get_item_process_supplier_row_for_resolved_process(details, process)
@@ -352,7 +452,9 @@ def _build_items(flat_nodes, item_details_cache, finished_product_wh=None):
             loss_factor = 1 + flt(loss_ratio or 0)
             order_cost = round(flt(order_qty) * path_ratio * flt(estimated_cost) * loss_factor, 2)
 
-        inventory_qty = _get_bin_actual_qty(item_code, warehouse) if warehouse else None
+        inventory_qty = None
+        if warehouse and bin_qty_map.get((item_code, warehouse)) is not None:
+            inventory_qty = flt(bin_qty_map[(item_code, warehouse)])
 
         # items 第一行（BOM 根节点/成品）：用 header 同源的成品仓库与库存补全
         if row_no == 1 and finished_product_wh:
@@ -427,29 +529,86 @@ def _get_leaf_finished_products(flat_nodes, item_details_cache):
     return result
 
 
-def _fetch_item_carton_and_packaging(item_code):
+def _fetch_item_carton_and_packaging_map(item_codes):
     """
-    从 Item 获取纸箱、包材相关数据。
-    返回: (br_carton_spec, br_packing_qty, br_volume, br_supplier, br_price, br_packaging_details)
+    批量从 Item 获取纸箱、包材相关数据（Item 一次查询 + 包材子表一次查询）。
+    返回: item_code -> (br_carton_spec, br_packing_qty, br_volume, br_supplier, br_price, br_packaging_details)
     """
+    item_codes = list({c for c in item_codes if c})
+    if not item_codes:
+        return {}
     meta = frappe.get_meta("Item")
     fields = ["name"]
     for f in ("br_carton_spec", "br_packing_qty", "br_volume", "br_supplier", "br_price"):
         if meta.get_field(f):
             fields.append(f)
-    row = frappe.db.get_value("Item", item_code, fields, as_dict=True) or {}
-    carton_spec = (row.get("br_carton_spec") or "").strip()
-    packing_qty = flt(row.get("br_packing_qty") or 0)
-    volume = (row.get("br_volume") or "").strip()
-    supplier = (row.get("br_supplier") or "").strip()
-    price = flt(row.get("br_price") or 0)
+    rows = frappe.get_all("Item", filters={"name": ["in", item_codes]}, fields=fields)
+
+    details_by_item = {}
+    if meta.get_field("br_packaging_details"):
+        for d in frappe.get_all(
+            "BR Item Packaging Detail",
+            filters={"parent": ["in", item_codes], "parenttype": "Item", "parentfield": "br_packaging_details"},
+            fields=["parent", "br_packaging_item", "br_packaging_model", "br_packaging_ratio",
+                    "br_supplier_one", "br_price_one"],
+            order_by="parent asc, idx asc",
+        ):
+            details_by_item.setdefault(d.parent, []).append(d)
 
-    details = []
-    if frappe.db.exists("Item", item_code):
-        doc = frappe.get_cached_doc("Item", item_code)
-        details = list(getattr(doc, "br_packaging_details", []) or [])
+    out = {}
+    for row in rows:
+        out[row.name] = (
+            (row.get("br_carton_spec") or "").strip(),
+            flt(row.get("br_packing_qty") or 0),
+            (row.get("br_volume") or "").strip(),
+            (row.get("br_supplier") or "").strip(),
+            flt(row.get("br_price") or 0),
+            details_by_item.get(row.name, []),
+        )
+    return out
+
+
+def _fetch_item_carton_and_packaging(item_code):
+    """
+    从 Item 获取纸箱、包材相关数据。
+    返回: (br_carton_spec, br_packing_qty, br_volume, br_supplier, br_price, br_packaging_details)
+    """
+    return _fetch_item_carton_and_packaging_map([item_code]).get(item_code) or ("", 0, "", "", 0, [])
 
-    return carton_spec, packing_qty, volume, supplier, price, details
+
+def _get_finished_products_from_components(component_item_codes):
+    """
+    批量版 _get_finished_product_from_component：一次查询 BOM Item + BOM + 根物料 item_group。
+    每个组件最多看最近修改的 10 条 BOM Item，返回第一个根物料为成品的 BOM 根物料。
+    返回: component_item_code -> 成品 item_code（无则不出现）
+    """
+    codes = list({(c or "").strip() for c in component_item_codes if (c or "").strip()})
+    if not codes:
+        return {}
+    rows = frappe.db.sql(
+        """
+        SELECT bi.item_code AS component, bom.name AS bom, bom.item AS root_item, it.item_group
+        FROM `tabBOM Item` bi
+        LEFT JOIN `tabBOM` bom ON bom.name = bi.parent
+        LEFT JOIN `tabItem` it ON it.name = bom.item
+        WHERE bi.item_code IN %(codes)s
+        ORDER BY bi.item_code, bi.modified DESC
+        """,
+        {"codes": tuple(codes)},
+        as_dict=True,
+    )
+    seen = {}
+    out = {}
+    for r in rows:
+        comp = r.component
+        seen[comp] = seen.get(comp, 0) + 1
+        if comp in out or seen[comp] > 10:
+            continue
+        if not r.bom or not r.root_item:
+            continue
+        if (r.item_group or "").strip() == "成品":
+            out[comp] = r.root_item
+    return out
 
 
 def _get_finished_product_from_component(component_item_code):
@@ -457,25 +616,10 @@ def _get_finished_product_from_component(component_item_code):
     SO 行是组件时：查找以该组件为子件的 BOM，返回 BOM 根物料的 成品（即父级成品）。
     若组件属于某 成品的 BOM，返回该 成品 item_code；否则返回 None。
     """
-    if not (component_item_code or "").strip():
+    component_item_code = (component_item_code or "").strip()
+    if not component_item_code:
         return None
-    bom_names = frappe.get_all(
-        "BOM Item",
-        filters={"item_code": component_item_code},
-        fields=["parent"],
-        limit_page_length=10,
-    )
-    for r in bom_names:
-        bom_name = r.get("parent")
-        if not bom_name or not frappe.db.exists("BOM", bom_name):
-            continue
-        root_item = frappe.db.get_value("BOM", bom_name, "item")
-        if not root_item:
-            continue
-        ig = (frappe.db.get_value("Item", root_item, "item_group") or "").strip()
-        if ig == "成品":
-            return root_item
-    return None
+    return _get_finished_products_from_components([component_item_code]).get(component_item_code)
 
 
 def _build_carton_and_packaging_from_leaf_finished(flat_nodes, item_details_cache, so_items, company=None):
@@ -486,6 +630,32 @@ def _build_carton_and_packaging_from_leaf_finished(flat_nodes, item_details_cach
     """
     company = (company or "").strip()
     leaf_finished = _get_leaf_finished_products(flat_nodes, item_details_cache)
+
+    # 纸箱/包材所需主数据整体预取：成品 Item 字段与包材子表、组件所属成品、纸箱 Item、默认仓与库存
+    leaf_codes = [(entry.get("node") or {}).get("item_code") or "" for entry, _ in leaf_finished]
+    component_finished = _get_finished_products_from_components(
+        [so_item.get("item_code") for so_item in (so_items or [])]
+    )
+    carton_map = _fetch_item_carton_and_packaging_map(leaf_codes + list(component_finished.values()))
+    carton_specs = [v[0] for v in carton_map.values() if v[0]]
+    lookup_cache.bulk_get("Item", carton_specs, ["item_name", "item_group"])
+    pack_codes = []
+    supplier_codes = []
+    for _spec, _pq, _vol, supplier, _price, pack_details in carton_map.values():
+        supplier_codes.append(supplier)
+        for pd in pack_details:
+            pack_codes.extend([(pd.br_packaging_model or "").strip(), (pd.br_packaging_item or "").strip()])
+            supplier_codes.append((pd.br_supplier_one or "").strip())
+    lookup_cache.bulk_get("Item", pack_codes, ["item_name"])
+    _prefetch_warehouse_and_supplier_names([], supplier_codes)
+    stock_map = _get_item_warehouse_stock_map(
+        carton_specs + [
+            _resolve_packaging_row_item_code_for_warehouse(pd.br_packaging_item, pd.br_packaging_model)
+            for v in carton_map.values() for pd in v[5]
+        ],
+        company,
+    )
+
     carton_items = []
     packaging_items = []
     added_finished = set()  # 已处理的 成品，避免重复
@@ -500,18 +670,21 @@ def _build_carton_and_packaging_from_leaf_finished(flat_nodes, item_details_cach
         item_code = node.get("item_code") or ""
 
         added_finished.add(item_code)
-        carton_spec, packing_qty, volume, supplier, price, pack_details = _fetch_item_carton_and_packaging(item_code)
+        carton_spec, packing_qty, volume, supplier, price, pack_details = (
+            carton_map.get(item_code) or ("", 0, "", "", 0, [])
+        )
 
         # 纸箱：br_carton_spec 链接到包材 Item（纸箱）
-        if carton_spec and frappe.db.exists("Item", carton_spec):
+        carton = lookup_cache.bulk_get("Item", [carton_spec], ["item_name", "item_group"]).get(carton_spec)
+        if carton_spec and carton:
             carton_qty = round(order_qty * path_ratio / (packing_qty or 1), 4) if packing_qty else order_qty * path_ratio
             # ratioQty：直接传成品 Item 的装箱数，前端自行换算
-            carton_name = frappe.db.get_value("Item", carton_spec, "item_name") or carton_spec
-            carton_ig = (frappe.db.get_value("Item", carton_spec, "item_group") or "").strip() or "纸箱"
+            carton_name = carton.item_name or carton_spec
+            carton_ig = (carton.item_group or "").strip() or "纸箱"
             if carton_ig not in ig_parent_cache:
                 ig_parent_cache.update(_get_item_group_parent_map([carton_ig]))
             carton_ig_parent = ig_parent_cache.get(carton_ig, "")
-            c_wh, c_wh_name, c_inv = _get_item_warehouse_stock_for_company(carton_spec, company)
+            c_wh, c_wh_name, c_inv = _get_item_warehouse_stock_for_company(carton_spec, company, stock_map=stock_map)
             carton_items.append({
                 "id": "",
                 "rowNo": len(carton_items) + 1,
@@ -555,7 +728,7 @@ def _build_carton_and_packaging_from_leaf_finished(flat_nodes, item_details_cach
             pname = pitem + (" " + pmodel if pmodel else "")
             need_qty = (order_qty * path_ratio / RATIO_BASE) * pratio if pratio else 0
             pack_ic = _resolve_packaging_row_item_code_for_warehouse(pitem, pmodel)
-            p_wh, p_wh_name, p_inv = _get_item_warehouse_stock_for_company(pack_ic, company)
+            p_wh, p_wh_name, p_inv = _get_item_warehouse_stock_for_company(pack_ic, company, stock_map=stock_map)
             packaging_items.append({
                 "id": "",
                 "rowNo": len(packaging_items) + 1,
@@ -589,21 +762,24 @@ def _build_carton_and_packaging_from_leaf_finished(flat_nodes, item_details_cach
         comp_code = (so_item.get("item_code") or "").strip()
         if not comp_code:
             continue
-        finished_code = _get_finished_product_from_component(comp_code)
+        finished_code = component_finished.get(comp_code)
         if not finished_code or finished_code in added_finished:
             continue
         added_finished.add(finished_code)
         order_qty = flt(so_item.get("qty") or so_item.get("stock_qty") or 0)
         bom_code = "A" + str(row_idx + 1)
-        carton_spec, packing_qty, volume, supplier, price, pack_details = _fetch_item_carton_and_packaging(finished_code)
+        carton_spec, packing_qty, volume, supplier, price, pack_details = (
+            carton_map.get(finished_code) or ("", 0, "", "", 0, [])
+        )
 
-        if carton_spec and frappe.db.exists("Item", carton_spec):
-            carton_name = frappe.db.get_value("Item", carton_spec, "item_name") or carton_spec
-            carton_ig = (frappe.db.get_value("Item", carton_spec, "item_group") or "").strip() or "纸箱"
+        carton = lookup_cache.bulk_get("Item", [carton_spec], ["item_name", "item_group"]).get(carton_spec)
+        if carton_spec and carton:
+            carton_name = carton.item_name or carton_spec
+            carton_ig = (carton.item_group or "").strip() or "纸箱"
             if carton_ig not in ig_parent_cache:
                 ig_parent_cache.update(_get_item_group_parent_map([carton_ig]))
             carton_ig_parent = ig_parent_cache.get(carton_ig, "")
-            c2_wh, c2_wh_name, c2_inv = _get_item_warehouse_stock_for_company(carton_spec, company)
+            c2_wh, c2_wh_name, c2_inv = _get_item_warehouse_stock_for_company(carton_spec, company, stock_map=stock_map)
             carton_items.append({
                 "id": "", "rowNo": len(carton_items) + 1, "itemCode": carton_spec, "level": 1,
                 "bomCode": bom_code + "-C", "itemName": carton_name, "ratioQty": flt(packing_qty) if packing_qty else 1.0,
@@ -626,7 +802,7 @@ def _build_carton_and_packaging_from_leaf_finished(flat_nodes, item_details_cach
             pname = pitem + (" " + pmodel if pmodel else "")
             need_qty = (order_qty / RATIO_BASE) * pratio if pratio else 0
             pack_ic2 = _resolve_packaging_row_item_code_for_warehouse(pitem, pmodel)
-            p2_wh, p2_wh_name, p2_inv = _get_item_warehouse_stock_for_company(pack_ic2, company)
+            p2_wh, p2_wh_name, p2_inv = _get_item_warehouse_stock_for_company(pack_ic2, company, stock_map=stock_map)
             packaging_items.append({
                 "id": "", "rowNo": len(packaging_items) + 1, "itemCode": pitem or pname, "level": 1,
                 "bomCode": bom_code + "-P" + str(idx + 1), "itemName": pname or pitem, "ratioQty": pratio,
@@ -728,6 +904,10 @@ _BOM_REPORT_ORDER_COLS = frozenset(
     }
 )
 
+# 游标分页（见 bairun_erp.utils.keyset）仅支持非空列排序，name 兜底
+_BOM_REPORT_CURSOR_SCOPE = "bom_material_report"
+_BOM_REPORT_CURSOR_COLS = {"creation": "creation", "modified": "modified"}
+
 
 def _sanitize_bom_report_order_by(order_by_raw):
     """
@@ -816,9 +996,11 @@ def list_bom_material_report(**kwargs):
         bom_status (str): 可选，与 bomStatus 展示一致时可传「未审核」「已审核」，或与库内 status 一致
         item_code (str): 可选，存货编码模糊匹配
         order_by (str): 可选，默认 creation desc；仅允许主表字段（creation、modified、delivery_date 等），见实现内白名单
+        cursor (str): 可选，传入即为游标分页（首页传 ""），忽略 page_number；order_by 仅限 creation、modified、name
 
     返回:
         success=True: { "data": { "page_number", "page_size", "total_count", "total_pages", "items": [...] } }
+            游标模式 data 另含 next_cursor（无下一页为 null）
         success=False: { "message": "..." }
 
     权限: 遵循 Frappe 对 DocType **BR SO BOM List** 的读权限（需能 read 该 DocType）。
@@ -855,6 +1037,16 @@ def list_bom_material_report(**kwargs):
     item_code = (jd.get("item_code") or "").strip()
     order_by = _sanitize_bom_report_order_by(jd.get("order_by"))
 
+    cursor = keyset.read_cursor_param(jd)
+    if cursor is not None:
+        if order_by.split()[0] not in ("creation", "modified", "name"):
+            return {"success": False, "message": "游标分页仅支持按 creation、modified 或 name 排序"}
+        keys = keyset.parse_order_by(order_by, _BOM_REPORT_CURSOR_COLS, "creation desc", ("name", True))
+        try:
+            cursor_values = keyset.decode_cursor(cursor, _BOM_REPORT_CURSOR_SCOPE, keys)
+        except frappe.ValidationError:
+            return {"success": False, "message": "cursor 无效或已过期，请重新加载列表"}
+
     date_from_dt = "{} 00:00:00".format(df.strftime("%Y-%m-%d"))
     date_to_dt = "{} 23:59:59".format(dt.strftime("%Y-%m-%d"))
 
@@ -899,25 +1091,36 @@ def list_bom_material_report(**kwargs):
         return {"success": False, "message": "无权限访问 BOM 物料清单报表"}
 
     try:
-        total_list = frappe.get_list(
-            "BR SO BOM List",
-            filters=filters,
-            fields=["name"],
-            limit_page_length=0,
-            ignore_permissions=False,
-        )
-        total_count = len(total_list)
+        total_count = count_list("BR SO BOM List", filters=filters)
 
         limit_start = (page_number - 1) * page_size
-        rows = frappe.get_list(
-            "BR SO BOM List",
-            filters=filters,
-            fields=fields,
-            order_by=order_by,
-            limit_start=limit_start,
-            limit_page_length=page_size,
-            ignore_permissions=False,
-        )
+        page_filters = filters
+        if cursor is not None:
+            page_filters, limit_start = keyset.get_list_seek(
+                "BR SO BOM List", filters, None, keys, cursor_values
+            )
+        if cursor is not None:
+            rows, next_cursor = keyset.get_list_page(
+                "BR SO BOM List",
+                fields,
+                page_size,
+                _BOM_REPORT_CURSOR_SCOPE,
+                keys,
+                filters=page_filters,
+                order_by=order_by,
+                limit_start=limit_start,
+                ignore_permissions=False,
+            )
+        else:
+            rows = frappe.get_list(
+                "BR SO BOM List",
+                filters=page_filters,
+                fields=fields,
+                order_by=order_by,
+                limit_start=limit_start,
+                limit_page_length=page_size,
+                ignore_permissions=False,
+            )
 
         items = []
         for i, row in enumerate(rows):
@@ -925,17 +1128,16 @@ def list_bom_material_report(**kwargs):
 
         total_pages = int(math.ceil(float(total_count) / page_size)) if page_size else 0
 
-        return {
-            "success": True,
-            "message": None,
-            "data": {
-                "page_number": page_number,
-                "page_size": page_size,
-                "total_count": total_count,
-                "total_pages": total_pages,
-                "items": items,
-            },
+        data = {
+            "page_number": page_number,
+            "page_size": page_size,
+            "total_count": total_count,
+            "total_pages": total_pages,
+            "items": items,
         }
+        if cursor is not None:
+            data["next_cursor"] = next_cursor
+        return {"success": True, "message": None, "data": data}
     except Exception as e:
         frappe.log_error(
             title="list_bom_material_report",
@@ -944,6 +1146,130 @@ def list_bom_material_report(**kwargs):
         return {"success": False, "message": str(e)}
 
 
+def _new_explode_shared():
+    """
+    同一销售订单多个成品展开共用的状态：每个物料字段只取一次。
+    BOM 展开不在此记忆：成品已去重，各成品根 BOM 不同；共用的子装配由 _build_bom_tree_level_order 的子树缓存复用。
+    """
+    return {"item_details": {}, "fetched_items": set()}
+
+
+def _shared_item_details(item_codes, shared):
+    details = shared["item_details"]
+    missing = [c for c in dict.fromkeys(item_codes) if c not in shared["fetched_items"]]
+    if missing:
+        fetched = _get_item_tree_fields(missing)
+        if fetched:
+            _attach_process_supplier_rows(fetched, list(fetched.keys()))
+            details.update(fetched)
+        shared["fetched_items"].update(missing)
+    return {c: details[c] for c in item_codes if c in details}
+
+
+def _product_bom_data_for_so_items(so_doc, so_items, item_code=None, shared=None):
+    """
+    展开 so_items（SO Detail 行，已按 item_code 过滤）的产品物料清单，返回 get_product_bom_list 的 data。
+    先读结果缓存；未命中则展开并写回缓存。shared 见 _new_explode_shared，缺省为本次调用独用。
+    """
+    sales_order_name = so_doc.name
+    if shared is None:
+        shared = _new_explode_shared()
+
+    cached = get_cached_product_bom_list(sales_order_name, so_doc.modified, item_code)
+    if cached:
+        data = cached["data"]
+        data["header"]["status"] = _resolve_br_so_bom_header_status(
+            sales_order_name,
+            cached.get("finished_codes") or [],
+            cached.get("header_status"),
+        )
+        return data
+
+    # 处理 SO Detail 行（全部或仅 item_code 指定的一行）
+
+    flat = []
+    bom_modified = {}
+    signature_items = set()
+    for row_idx, so_item in enumerate(so_items):
+        target_item_code = (so_item.item_code or "").strip()
+        if not target_item_code:
+            continue
+
+        root_bom_code = "A" + str(row_idx + 1)
+
+        signature_items.add(target_item_code)
+        bom_name = _get_bom_for_item(target_item_code, getattr(so_item, "bom_no", None))
+        if bom_name:
+            tree, tree_signature = _build_bom_tree_level_order(bom_name)
+            bom_modified.update(tree_signature.get("boms") or {})
+            signature_items.update(tree_signature.get("items") or ())
+            if tree:
+                # 含根节点：配件 -> 组件 -> 半成品
+                _flatten_bom_tree_with_root(
+                    tree, level=1, parent_bom_code=root_bom_code, flat=flat,
+                    path_ratio=1.0, so_item=so_item, include_root=True,
+                )
+                continue
+
+        # 无 BOM：仅输出该物料本身
+        root_node = _so_item_to_root_node(so_item)
+        flat.append({
+            "node": root_node,
+            "level": 1,
+            "bom_code": root_bom_code,
+            "path_ratio": 1.0,
+            "so_item": so_item,
+        })
+
+    item_codes = _collect_item_codes_from_flat(flat)
+    item_details_cache = _shared_item_details(item_codes, shared) if item_codes else {}
+    # 成品（首行）的仓库与库存，补全 items 第一行，与 header 保持一致
+    first_so_item = so_items[0] if so_items else None
+    finished_product_wh = _get_finished_product_warehouse_and_stock(so_doc, first_so_item)
+    items = _build_items(flat, item_details_cache, finished_product_wh=finished_product_wh)
+    carton_items, packaging_items = _build_carton_and_packaging_from_leaf_finished(
+        flat, item_details_cache, so_items, company=getattr(so_doc, "company", None) or ""
+    )
+
+    total_cost = sum(flt(r.get("orderCost") or 0) for r in items)
+    total_qty = sum(flt(si.get("qty") or si.get("stock_qty") or 0) for si in so_items)
+    unit_estimated_cost = round(total_cost / total_qty, 4) if total_qty else None
+
+    finished_codes = [(getattr(si, "item_code", None) or "").strip() for si in so_items]
+
+    header = _build_header(so_doc, so_items)
+    header_status = header.get("status")
+    header["status"] = _resolve_br_so_bom_header_status(
+        sales_order_name,
+        finished_codes,
+        header_status,
+    )
+    header["unitEstimatedCost"] = unit_estimated_cost
+
+    sales_price = flt(header.get("salesPrice") or 0)
+    if sales_price and unit_estimated_cost is not None:
+        header["grossMargin"] = round((sales_price - unit_estimated_cost) / sales_price, 4)
+
+    data = {
+        "header": header,
+        "items": items,
+        "cartonItems": carton_items,
+        "packagingItems": packaging_items,
+    }
+    # 纸箱/包材取自成品 Item 字段：组件所属成品（不在 BOM 树内）也纳入失效校验
+    signature_items.update(r.get("itemCode") for r in carton_items)
+    signature_items.update(_get_finished_products_from_components(finished_codes).values())
+    set_cached_product_bom_list(
+        sales_order_name,
+        so_doc.modified,
+        item_code,
+        {"data": data, "finished_codes": finished_codes, "header_status": header_status},
+        bom_modified,
+        signature_items,
+    )
+    return data
+
+
 @frappe.whitelist()
 def get_product_bom_list(sales_order_name=None, item_code=None):
     """
@@ -995,76 +1321,8 @@ def get_product_bom_list(sales_order_name=None, item_code=None):
                     "message": "销售订单中未找到指定成品行: {}".format(item_code),
                 }
 
-        # 处理 SO Detail 行（全部或仅 item_code 指定的一行）
-
-        flat = []
-        for row_idx, so_item in enumerate(so_items):
-            target_item_code = (so_item.item_code or "").strip()
-            if not target_item_code:
-                continue
-
-            root_bom_code = "A" + str(row_idx + 1)
-
-            bom_name = _get_bom_for_item(target_item_code, getattr(so_item, "bom_no", None))
-            if bom_name:
-                tree = _build_bom_tree(bom_name)
-                if tree:
-                    # 含根节点：配件 -> 组件 -> 半成品
-                    _flatten_bom_tree_with_root(
-                        tree, level=1, parent_bom_code=root_bom_code, flat=flat,
-                        path_ratio=1.0, so_item=so_item, include_root=True,
-                    )
-                    continue
-
-            # 无 BOM：仅输出该物料本身
-            root_node = _so_item_to_root_node(so_item)
-            flat.append({
-                "node": root_node,
-                "level": 1,
-                "bom_code": root_bom_code,
-                "path_ratio": 1.0,
-                "so_item": so_item,
-            })
-
-        item_codes = _collect_item_codes_from_flat(flat)
-        item_details_cache = _get_item_tree_fields(item_codes) if item_codes else {}
-        if item_details_cache:
-            _attach_process_supplier_rows(item_details_cache, list(item_details_cache.keys()))
-        # 成品（首行）的仓库与库存，补全 items 第一行，与 header 保持一致
-        first_so_item = so_items[0] if so_items else None
-        finished_product_wh = _get_finished_product_warehouse_and_stock(so_doc, first_so_item)
-        items = _build_items(flat, item_details_cache, finished_product_wh=finished_product_wh)
-        carton_items, packaging_items = _build_carton_and_packaging_from_leaf_finished(
-            flat, item_details_cache, so_items, company=getattr(so_doc, "company", None) or ""
-        )
-
-        total_cost = sum(flt(r.get("orderCost") or 0) for r in items)
-        total_qty = sum(flt(si.get("qty") or si.get("stock_qty") or 0) for si in so_items)
-        unit_estimated_cost = round(total_cost / total_qty, 4) if total_qty else None
-
-        finished_codes = [(getattr(si, "item_code", None) or "").strip() for si in so_items]
-
-        header = _build_header(so_doc, so_items)
-        header["status"] = _resolve_br_so_bom_header_status(
-            sales_order_name,
-            finished_codes,
-            header.get("status"),
-        )
-        header["unitEstimatedCost"] = unit_estimated_cost
-
-        sales_price = flt(header.get("salesPrice") or 0)
-        if sales_price and unit_estimated_cost is not None:
-            header["grossMargin"] = round((sales_price - unit_estimated_cost) / sales_price, 4)
-
-        return {
-            "success": True,
-            "data": {
-                "header": header,
-                "items": items,
-                "cartonItems": carton_items,
-                "packagingItems": packaging_items,
-            },
-        }
+        data = _product_bom_data_for_so_items(so_doc, so_items, item_code)
+        return {"success": True, "data": data}
 
     except frappe.PermissionError:
         return {"success": False, "message": "销售订单不存在或无权访问"}
@@ -1278,7 +1536,7 @@ def get_product_bom_list_new(sales_order_name=None, item_code=None):
         if missing:
             return {
                 "success": False,
-                "message": "以下成品尚未同步 BR SO BOM List（请保存销售订单触发同步后再试）: {}".format(
+                "message": "以下成品尚未同步 BR SO BOM List（请保存销售订单触发后台同步，完成后再试）: {}".format(
                     ", ".join(missing)
                 ),
             }
@@ -1289,6 +1547,11 @@ def get_product_bom_list_new(sales_order_name=None, item_code=None):
             if ig:
                 ig_names.append(ig)
         ig_parent_cache = _get_item_group_parent_map(ig_names)
+        all_rows = item_rows + carton_rows + pack_rows
+        _prefetch_warehouse_and_supplier_names(
+            [(getattr(r, "warehouse_code", None) or "").strip() for r in all_rows if not getattr(r, "warehouse_name", None)],
+            [(getattr(r, "supplier_code", None) or "").strip() for r in all_rows if not getattr(r, "supplier_name", None)],
+        )
 
         items = [
             _detail_row_to_product_bom_api_row(r, i + 1, ig_parent_cache)
@@ -0,0 +1,81 @@
+# Copyright (c) 2026, Bairun and contributors
+# BR SO BOM List 后台同步：按销售订单去重入队、执行中保存则结束后重新入队、各成品共用物料字段查询。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.api.sales.test_sales_order_bom_sync
+
+from __future__ import unicode_literals
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils.api.sales import sales_order_bom_sync as bom_sync
+from bairun_erp.utils.api.sales import sales_order_query_bom_details as bom_api
+
+SO_NAME = "_TEST-SO-BOM-SYNC"
+
+
+class TestEnqueueBomListSync(FrappeTestCase):
+    def setUp(self):
+        frappe.cache().delete_value(bom_sync._sync_key(SO_NAME))
+
+    def tearDown(self):
+        frappe.cache().delete_value(bom_sync._sync_key(SO_NAME))
+
+    def test_rapid_saves_collapse_into_one_job(self):
+        with patch.object(bom_sync.frappe, "enqueue") as enqueue:
+            for _i in range(5):
+                state = bom_sync.enqueue_bom_list_sync(SO_NAME)
+        self.assertEqual(enqueue.call_count, 1)
+        self.assertEqual(state["status"], "queued")
+        self.assertEqual(enqueue.call_args.kwargs["sales_order"], SO_NAME)
+
+    def test_save_while_running_marks_rerun(self):
+        bom_sync._update_sync(SO_NAME, status="running", started_at=str(frappe.utils.now_datetime()))
+        with patch.object(bom_sync.frappe, "enqueue") as enqueue:
+            state = bom_sync.enqueue_bom_list_sync(SO_NAME)
+        enqueue.assert_not_called()
+        self.assertTrue(state["rerun"])
+
+    def test_save_during_run_requeues_job(self):
+        calls = []
+
+        def _sync(so_doc):
+            calls.append(so_doc)
+            if len(calls) == 1:
+                # 模拟执行期间的一次保存
+                bom_sync.enqueue_bom_list_sync(SO_NAME)
+            return {"synced": ["FG-1"], "failed": []}
+
+        with patch.object(bom_sync.frappe.db, "exists", return_value=True), patch.object(
+            bom_sync.frappe, "get_doc", return_value=SimpleNamespace(name=SO_NAME)
+        ), patch.object(bom_sync, "sync_bom_list_for_sales_order", side_effect=_sync), patch.object(
+            bom_sync.frappe, "enqueue"
+        ) as enqueue:
+            bom_sync.run_bom_list_sync_job(SO_NAME)
+            state = bom_sync._get_sync(SO_NAME)
+            self.assertEqual((state["status"], state["rerun"]), ("queued", False))
+            self.assertEqual(enqueue.call_count, 1)
+            rerun_kwargs = enqueue.call_args.kwargs
+            self.assertEqual((rerun_kwargs["runs"], rerun_kwargs["job_id"]), (1, "so_bom_sync::{}::1".format(SO_NAME)))
+            self.assertFalse(rerun_kwargs["deduplicate"])
+
+            bom_sync.run_bom_list_sync_job(SO_NAME, runs=rerun_kwargs["runs"])
+        state = bom_sync._get_sync(SO_NAME)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(enqueue.call_count, 1)
+        self.assertEqual((state["status"], state["runs"], state["synced"]), ("finished", 2, ["FG-1"]))
+
+
+class TestSharedItemDetails(FrappeTestCase):
+    def test_item_fields_fetched_once_per_order(self):
+        shared = bom_api._new_explode_shared()
+        with patch.object(bom_api, "_get_item_tree_fields", return_value={"A": {}}) as fields, patch.object(
+            bom_api, "_attach_process_supplier_rows"
+        ):
+            for _i in range(30):
+                bom_api._shared_item_details(["A", "B"], shared)
+        self.assertEqual(fields.call_count, 1)
@@ -10,6 +10,9 @@ import json
 import frappe
 from frappe.utils import getdate
 
+from bairun_erp.utils import keyset
+from bairun_erp.utils.query_utils import escape_like
+
 FINISHED_WAREHOUSE = "成品 - B"
 RAW_MATERIAL_WAREHOUSE = "原材料仓 - B"
 INVENTORY_WAREHOUSE = "库存仓 - B"
@@ -38,6 +41,7 @@ def _parse_params_inventory(kwargs):
 		"status": None,
 		"list_type": LIST_TYPE_FINISHED,
 		"include_reservation_details": False,
+		"cursor": None,
 	}
 	jd = kwargs.get("json_data")
 	if jd is None:
@@ -56,6 +60,7 @@ def _parse_params_inventory(kwargs):
 	params["search_project_no"] = jd.get("search_project_no")
 	params["status"] = (jd.get("status") or "").strip().lower() or None
 	params["include_reservation_details"] = bool(jd.get("include_reservation_details"))
+	params["cursor"] = keyset.read_cursor_param(jd)
 	lt = (jd.get("list_type") or "").strip().lower()
 	if lt == LIST_TYPE_RAW_MATERIAL:
 		params["list_type"] = LIST_TYPE_RAW_MATERIAL
@@ -102,149 +107,178 @@ def _sanitize_order_by(order_by):
 	return ", ".join(parts)
 
 
-# ---------- 成品 ----------
+# item_full_name：物料名称存在且与编码不同时为「编码 - 名称」，否则为编码；{code} 为物料编码列
+_ITEM_FULL_NAME_SQL = """CASE WHEN IFNULL(i.item_name, '') != '' AND i.item_name != {code}
+		THEN CONCAT({code}, ' - ', i.item_name) ELSE {code} END"""
 
-def _get_finished_in_stock_rows(warehouse=FINISHED_WAREHOUSE):
-	"""已入库：Bin 中 actual_qty > 0，按 (item_code, warehouse) 聚合；projectNo 从入该仓的 SE custom_customer_order 尝试带出。"""
-	bin_rows = frappe.db.sql("""
-		SELECT b.item_code, b.warehouse, b.actual_qty, b.reserved_qty
-		FROM `tabBin` b
-		WHERE b.warehouse = %s AND (b.actual_qty IS NULL OR b.actual_qty > 0)
-	""", (warehouse,), as_dict=True)
-	se_meta = frappe.get_meta("Stock Entry")
-	has_customer_order = bool(se_meta.get_field("custom_customer_order"))
-	project_by_item = {}
-	if has_customer_order:
-		se_rows = frappe.db.sql("""
-			SELECT sed.item_code, se.custom_customer_order AS project_no
-			FROM `tabStock Entry Detail` sed
-			INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
-			WHERE sed.t_warehouse = %s
-			ORDER BY se.posting_date DESC
-		""", (warehouse,), as_dict=True)
-		for r in se_rows:
-			if r.get("item_code") and r.get("project_no") and r["item_code"] not in project_by_item:
-				project_by_item[r["item_code"]] = r["project_no"]
-
-	out = []
-	for r in bin_rows:
-		qty = _flt(r.get("actual_qty"))
-		if qty <= 0:
-			continue
-		item_code = r.get("item_code") or ""
-		wh = r.get("warehouse") or warehouse
-		project_no = project_by_item.get(item_code, "") or ""
-		out.append({
-			"key": (project_no, item_code, wh),
-			"actual_qty": qty,
-			"reserved_qty": _flt(r.get("reserved_qty")),
-		})
-	return out
+
+def _run_paged_list_query(
+	inner_sql, values, order_by, limit_start, limit_page_length, search=None, cursor=None, scope=None
+):
+	"""
+	列表查询统一在 SQL 侧完成筛选、排序、分页：inner_sql 为派生表，需包含 _ORDER_COLUMNS 中的列及唯一列 row_key；
+	search 按 project_no 模糊匹配（不区分大小写，取决于库排序规则）。返回 (rows, total_count)。
+	cursor 不为 None 时为游标分页（scope 标识列表，见 bairun_erp.utils.keyset），下一页游标写入 frappe.response["next_cursor"]。
+	"""
+	values = dict(values)
+	where = ""
+	if search:
+		where = "WHERE t.project_no LIKE %(search)s"
+		values["search"] = "%{}%".format(escape_like(search))
+
+	total_count = frappe.db.sql(
+		"SELECT COUNT(*) FROM ({inner}) t {where}".format(inner=inner_sql, where=where),
+		values,
+	)[0][0] or 0
+
+	if cursor is not None:
+		keys = keyset.parse_order_by(
+			order_by, {c: c for c in _ORDER_COLUMNS}, "project_no asc, item_code asc", ("row_key", False)
+		)
+		seek_sql, seek_values = keyset.seek_condition(keys, keyset.decode_cursor(cursor, scope, keys), named=True)
+		values.update(seek_values)
+		limit = "LIMIT %(limit_page_length)s" if limit_page_length > 0 else ""
+		values["limit_page_length"] = limit_page_length + 1
+		rows = frappe.db.sql(
+			"SELECT t.*, {key_select} FROM ({inner}) t {where} {seek} ORDER BY {order_by} {limit}".format(
+				key_select=keyset.key_select_sql(keys),
+				inner=inner_sql,
+				where=where,
+				seek=("AND " if where else "WHERE ") + seek_sql,
+				order_by=keyset.order_sql(keys),
+				limit=limit,
+			),
+			values,
+			as_dict=True,
+		)
+		rows, frappe.response["next_cursor"] = keyset.paginate_rows(rows, limit_page_length, scope, keys)
+		return rows, int(total_count)
+
+	limit = ""
+	if limit_page_length > 0:
+		limit = "LIMIT %(limit_start)s, %(limit_page_length)s"
+	elif limit_start:
+		limit = "LIMIT %(limit_start)s, 18446744073709551615"
+	values.update(limit_start=limit_start, limit_page_length=limit_page_length)
+	rows = frappe.db.sql(
+		"SELECT t.* FROM ({inner}) t {where} ORDER BY {order_by} {limit}".format(
+			inner=inner_sql, where=where, order_by=order_by, limit=limit
+		),
+		values,
+		as_dict=True,
+	)
+	return rows, int(total_count)
 
 
-def _get_finished_outbound_rows(warehouse=FINISHED_WAREHOUSE):
-	"""已出库：从成品仓转出的 SE 行 + Delivery Note 行，按 (project_no, item_code, warehouse) 聚合。"""
+# ---------- 成品 ----------
+
+def _finished_in_stock_sql():
+	"""
+	已入库：Bin 中 actual_qty > 0 的 (item_code, warehouse)；projectNo 取最近一张入该仓 SE 的 custom_customer_order
+	（窗口函数一次取出每个物料的最新一条）。物料字段 join 带出。
+	"""
 	se_meta = frappe.get_meta("Stock Entry")
-	has_customer_order = bool(se_meta.get_field("custom_customer_order"))
-	select_se = [
-		"sed.item_code", "sed.s_warehouse AS warehouse", "sed.qty",
-		"se.posting_date", "se.name AS se_name",
-	]
-	if has_customer_order:
-		select_se.append("se.custom_customer_order AS project_no")
-	else:
-		select_se.append("'' AS project_no")
-
-	agg = {}
-	sql_se = """
-		SELECT {}
-		FROM `tabStock Entry Detail` sed
-		INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
-		WHERE sed.s_warehouse = %s AND sed.qty > 0
-	""".format(", ".join(select_se))
-	for r in frappe.db.sql(sql_se, (warehouse,), as_dict=True):
-		project_no = (r.get("project_no") or "").strip()
-		item_code = r.get("item_code") or ""
-		wh = r.get("warehouse") or warehouse
-		key = (project_no, item_code, wh)
-		if key not in agg:
-			agg[key] = {"qty": 0, "posting_date": r.get("posting_date")}
-		agg[key]["qty"] += _flt(r.get("qty"))
+	project_join = ""
+	project_col = "''"
+	if se_meta.get_field("custom_customer_order"):
+		project_col = "IFNULL(lp.project_no, '')"
+		project_join = """
+		LEFT JOIN (
+			SELECT x.item_code, x.project_no
+			FROM (
+				SELECT sed.item_code, se.custom_customer_order AS project_no,
+				       ROW_NUMBER() OVER (
+				           PARTITION BY sed.item_code
+				           ORDER BY se.posting_date DESC, se.posting_time DESC
+				       ) AS rn
+				FROM `tabStock Entry Detail` sed
+				INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
+				WHERE sed.t_warehouse = %(warehouse)s AND IFNULL(se.custom_customer_order, '') != ''
+			) x
+			WHERE x.rn = 1
+		) lp ON lp.item_code = b.item_code"""
+	return """
+		SELECT {project_col} AS project_no, b.item_code, b.warehouse, b.name AS row_key,
+		       b.actual_qty, b.reserved_qty, b.actual_qty AS received_qty,
+		       NULL AS posting_date, i.valuation_rate, i.standard_rate,
+		       {full_name} AS item_full_name
+		FROM `tabBin` b
+		LEFT JOIN `tabItem` i ON i.name = b.item_code
+		{project_join}
+		WHERE b.warehouse = %(warehouse)s AND b.actual_qty > 0
+	""".format(
+		project_col=project_col,
+		project_join=project_join,
+		full_name=_ITEM_FULL_NAME_SQL.format(code="b.item_code"),
+	)
+
+
+def _finished_outbound_sql():
+	"""已出库：从成品仓转出的 SE 行 + Delivery Note 行，按 (project_no, item_code, warehouse) 在 SQL 中聚合。"""
+	se_meta = frappe.get_meta("Stock Entry")
+	se_project = "TRIM(IFNULL(se.custom_customer_order, ''))" if se_meta.get_field("custom_customer_order") else "''"
+	union_parts = ["""
+				SELECT {se_project} AS project_no, sed.item_code, sed.s_warehouse AS warehouse,
+				       sed.qty, se.posting_date
+				FROM `tabStock Entry Detail` sed
+				INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
+				WHERE sed.s_warehouse = %(warehouse)s AND sed.qty > 0""".format(se_project=se_project)]
 
 	dn_meta = frappe.get_meta("Delivery Note Item")
 	if dn_meta.get_field("against_sales_order"):
-		dn_sql = """
-			SELECT dni.item_code, dni.warehouse, dni.qty, dni.against_sales_order AS project_no
-			FROM `tabDelivery Note Item` dni
-			INNER JOIN `tabDelivery Note` dn ON dn.name = dni.parent AND dn.docstatus = 1
-			WHERE dni.warehouse = %s AND dni.qty > 0
-		"""
-		for r in frappe.db.sql(dn_sql, (warehouse,), as_dict=True):
-			project_no = (r.get("project_no") or "").strip()
-			item_code = r.get("item_code") or ""
-			wh = r.get("warehouse") or warehouse
-			key = (project_no, item_code, wh)
-			if key not in agg:
-				agg[key] = {"qty": 0, "posting_date": None}
-			agg[key]["qty"] += _flt(r.get("qty"))
-
-	out = []
-	for key, v in agg.items():
-		if v["qty"] > 0:
-			out.append({"key": key, "qty": v["qty"], "posting_date": v["posting_date"]})
-	return out
-
+		union_parts.append("""
+				SELECT TRIM(IFNULL(dni.against_sales_order, '')) AS project_no, dni.item_code, dni.warehouse,
+				       dni.qty, NULL AS posting_date
+				FROM `tabDelivery Note Item` dni
+				INNER JOIN `tabDelivery Note` dn ON dn.name = dni.parent AND dn.docstatus = 1
+				WHERE dni.warehouse = %(warehouse)s AND dni.qty > 0""")
+
+	return """
+		SELECT g.project_no, g.item_code, g.warehouse, g.received_qty, g.posting_date,
+		       CONCAT_WS('|', g.project_no, g.item_code, g.warehouse) AS row_key,
+		       0 AS actual_qty, i.valuation_rate, i.standard_rate,
+		       {full_name} AS item_full_name
+		FROM (
+			SELECT u.project_no, u.item_code, u.warehouse,
+			       SUM(u.qty) AS received_qty, MAX(u.posting_date) AS posting_date
+			FROM ({union}
+			) u
+			GROUP BY u.project_no, u.item_code, u.warehouse
+			HAVING SUM(u.qty) > 0
+		) g
+		LEFT JOIN `tabItem` i ON i.name = g.item_code
+	""".format(
+		union="\n\t\t\t\tUNION ALL".join(union_parts),
+		full_name=_ITEM_FULL_NAME_SQL.format(code="g.item_code"),
+	)
+
+
+def _build_finished_row(record, status="已入库"):
+	"""组装成品行，字段与需求文档 §2.2 一致；物料字段来自列表查询的 join。"""
+	project_no = record.get("project_no") or ""
+	item_code = record.get("item_code") or ""
+	warehouse = record.get("warehouse") or FINISHED_WAREHOUSE
+	row_id = "|".join([str(project_no), str(item_code), str(warehouse)])
 
-def _build_finished_row(key, in_stock_data=None, outbound_data=None, status="已入库"):
-	"""组装成品行，字段与需求文档 §2.2 一致。"""
-	project_no, item_code, warehouse = key
-	row_id = "|".join([str(project_no or ""), str(item_code or ""), str(warehouse or "")])
-	item_name = frappe.db.get_value("Item", item_code, "item_name") if item_code else ""
-	item_name = (item_name or "").strip()
-	item_full_name = item_name or item_code
-	if item_name and item_name != item_code:
-		item_full_name = "{} - {}".format(item_code, item_name)
-
-	order_qty = 0
-	received_qty = 0
-	unreceived_qty = 0
-	packing_qty = None
-	box_config = None
-	volume = None
-	unit_price = 0
-	warehouse_location = ""
-	work_instruction_url = ""
-
-	if in_stock_data:
-		received_qty = _flt(in_stock_data.get("actual_qty"))
-	if outbound_data:
-		received_qty = _flt(outbound_data.get("qty"))
-
-	item_doc = frappe.db.get_value(
-		"Item", item_code,
-		["valuation_rate", "standard_rate", "stock_uom"],
-		as_dict=True
-	) if item_code else None
-	if item_doc:
-		unit_price = _flt(item_doc.get("valuation_rate"))
-		if unit_price == 0:
-			unit_price = _flt(item_doc.get("standard_rate"))
+	unit_price = _flt(record.get("valuation_rate"))
+	if unit_price == 0:
+		unit_price = _flt(record.get("standard_rate"))
 
 	return {
 		"id": row_id,
-		"date": _date_str(outbound_data.get("posting_date") if outbound_data else None) or _date_str(getdate()),
-		"projectNo": project_no or "",
-		"itemFullName": item_full_name,
-		"orderQty": order_qty,
-		"receivedQty": received_qty,
-		"unreceivedQty": unreceived_qty,
-		"warehouse": warehouse or FINISHED_WAREHOUSE,
-		"warehouseLocation": warehouse_location or "",
-		"packingQty": packing_qty,
-		"boxConfig": box_config,
-		"volume": volume,
+		"date": _date_str(record.get("posting_date")) or _date_str(getdate()),
+		"projectNo": project_no,
+		"itemFullName": record.get("item_full_name") or item_code,
+		"orderQty": 0,
+		"receivedQty": _flt(record.get("received_qty")),
+		"unreceivedQty": 0,
+		"warehouse": warehouse,
+		"warehouseLocation": "",
+		"packingQty": None,
+		"boxConfig": None,
+		"volume": None,
 		"unitPrice": unit_price,
-		"workInstructionUrl": work_instruction_url or "",
+		"workInstructionUrl": "",
 		"status": status,
 	}
 
@@ -253,8 +287,9 @@ def _build_finished_row(key, in_stock_data=None, outbound_data=None, status="已
 def get_finished_list(**kwargs):
 	"""
 	成品列表：按状态 已入库(in_stock) / 已出库(outbound)，支持销售订单号筛选与分页。
-	POST json_data: status, search_project_no, limit_start, limit_page_length, order_by
-	返回: message = [ 行对象 ], total_count
+	POST json_data: status, search_project_no, limit_start, limit_page_length, order_by,
+	  cursor（可选，传入即为游标分页，首页传 ""；忽略 limit_start）
+	返回: message = [ 行对象 ], total_count；游标模式另返回 next_cursor（无下一页为 null）
 	"""
 	if not frappe.has_permission("Warehouse", "read"):
 		frappe.throw(frappe._("No permission to read Warehouse"))
@@ -263,43 +298,26 @@ def get_finished_list(**kwargs):
 	search = (params.get("search_project_no") or "").strip()
 	limit_start = max(0, int(params["limit_start"]))
 	limit_page_length = int(params.get("limit_page_length") or 50)
-	use_limit = limit_page_length > 0
 
-	candidates = []
 	if status == STATUS_OUTBOUND:
-		rows = _get_finished_outbound_rows(FINISHED_WAREHOUSE)
-		for r in rows:
-			key = r["key"]
-			if search and search.lower() not in (key[0] or "").lower():
-				continue
-			candidates.append((key, None, r))
+		inner_sql = _finished_outbound_sql()
 		status_label = "已出库"
 	else:
-		rows = _get_finished_in_stock_rows(FINISHED_WAREHOUSE)
-		for r in rows:
-			key = r["key"]
-			if search and search.lower() not in (key[0] or "").lower():
-				continue
-			candidates.append((key, r, None))
+		inner_sql = _finished_in_stock_sql()
 		status_label = "已入库"
 
-	def sort_key(item):
-		k = item[0]
-		return (k[0] or "", k[1] or "", k[2] or "")
-	candidates.sort(key=sort_key)
-	total_count = len(candidates)
-
-	if use_limit:
-		page = candidates[limit_start: limit_start + limit_page_length]
-	else:
-		page = candidates[limit_start:]
-
-	out = []
-	for item in page:
-		key, in_data, out_data = item
-		out.append(_build_finished_row(key, in_stock_data=in_data, outbound_data=out_data, status=status_label))
-
-	frappe.response["message"] = out
+	rows, total_count = _run_paged_list_query(
+		inner_sql,
+		{"warehouse": FINISHED_WAREHOUSE},
+		_sanitize_order_by(params["order_by"]),
+		limit_start,
+		limit_page_length,
+		search=search,
+		cursor=params.get("cursor"),
+		scope="inventory:{}:{}".format(LIST_TYPE_FINISHED, status),
+	)
+
+	frappe.response["message"] = [_build_finished_row(r, status=status_label) for r in rows]
 	frappe.response["total_count"] = total_count
 
 
@@ -431,82 +449,128 @@ def transfer_finished_to_inventory(**kwargs):
 
 # ---------- 原材料 ----------
 
-def _get_raw_material_pending_inbound():
-	"""待入库：PO 行 warehouse=原材料仓-B 且 received_qty < qty。"""
-	sql = """
-		SELECT po.name AS purchase_order, poi.item_code, poi.stock_qty AS qty,
+def _pending_inbound_sql():
+	"""待入库：PO 行 warehouse=%(warehouse)s 且 received_qty < qty；供应商名称、物料字段 join 带出。"""
+	return """
+		SELECT po.name AS project_no, po.name AS purchase_order, poi.item_code, poi.name AS row_key,
+		       poi.stock_qty AS qty, poi.stock_qty AS order_qty,
 		       IFNULL(poi.received_qty, 0) AS received_qty,
-		       poi.rate, poi.warehouse, po.supplier, po.transaction_date
+		       poi.rate, poi.warehouse, po.supplier, sup.supplier_name,
+		       po.transaction_date AS posting_date, 0 AS actual_qty, 0 AS reserved_qty,
+		       i.valuation_rate, i.standard_rate, i.stock_uom,
+		       {full_name} AS item_full_name
 		FROM `tabPurchase Order` po
 		INNER JOIN `tabPurchase Order Item` poi ON poi.parent = po.name
-		WHERE po.docstatus = 1 AND poi.warehouse = %s
+		LEFT JOIN `tabSupplier` sup ON sup.name = po.supplier
+		LEFT JOIN `tabItem` i ON i.name = poi.item_code
+		WHERE po.docstatus = 1 AND poi.warehouse = %(warehouse)s
 		  AND (IFNULL(poi.received_qty, 0) < IFNULL(poi.stock_qty, poi.qty))
-	"""
-	return frappe.db.sql(sql, (RAW_MATERIAL_WAREHOUSE,), as_dict=True)
+	""".format(full_name=_ITEM_FULL_NAME_SQL.format(code="poi.item_code"))
 
 
-def _get_raw_material_in_stock():
-	"""已入库：Bin 原材料仓-B actual_qty > 0。"""
-	return frappe.db.sql("""
-		SELECT b.item_code, b.warehouse, b.actual_qty
+def _in_stock_with_latest_pr_sql():
+	"""
+	已入库：Bin %(warehouse)s actual_qty > 0；projectNo 为该 (item_code, warehouse) 最近一张已提交 PR，
+	由窗口函数一次取出，不再逐行查询。
+	"""
+	return """
+		SELECT IFNULL(lpr.pr_name, '') AS project_no, b.item_code, b.warehouse, b.name AS row_key,
+		       IFNULL(b.actual_qty, 0) AS actual_qty, b.reserved_qty,
+		       IFNULL(b.actual_qty, 0) AS order_qty, IFNULL(b.actual_qty, 0) AS received_qty,
+		       0 AS rate, NULL AS supplier, NULL AS supplier_name, NULL AS posting_date,
+		       i.valuation_rate, i.standard_rate, i.stock_uom,
+		       {full_name} AS item_full_name
 		FROM `tabBin` b
-		WHERE b.warehouse = %s AND (b.actual_qty IS NULL OR b.actual_qty > 0)
-	""", (RAW_MATERIAL_WAREHOUSE,), as_dict=True)
-
-
-def _get_raw_material_outbound():
-	"""已出库：从原材料仓发出的 SE 行汇总。"""
-	sql = """
-		SELECT sed.item_code, sed.s_warehouse AS warehouse, SUM(sed.qty) AS qty
-		FROM `tabStock Entry Detail` sed
-		INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
-		WHERE sed.s_warehouse = %s AND sed.qty > 0
-		GROUP BY sed.item_code, sed.s_warehouse
+		LEFT JOIN `tabItem` i ON i.name = b.item_code
+		LEFT JOIN (
+			SELECT x.item_code, x.warehouse, x.pr_name
+			FROM (
+				SELECT pri.item_code, pri.warehouse, pr.name AS pr_name,
+				       ROW_NUMBER() OVER (
+				           PARTITION BY pri.item_code, pri.warehouse
+				           ORDER BY pr.posting_date DESC, pr.posting_time DESC
+				       ) AS rn
+				FROM `tabPurchase Receipt Item` pri
+				INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent AND pr.docstatus = 1
+				WHERE pri.warehouse = %(warehouse)s
+			) x
+			WHERE x.rn = 1
+		) lpr ON lpr.item_code = b.item_code AND lpr.warehouse = b.warehouse
+		WHERE b.warehouse = %(warehouse)s AND (b.actual_qty IS NULL OR b.actual_qty > 0)
+	""".format(full_name=_ITEM_FULL_NAME_SQL.format(code="b.item_code"))
+
+
+def _se_outbound_sql():
+	"""已出库：从 %(warehouse)s 发出的 SE 行按 (item_code, warehouse) 汇总。"""
+	return """
+		SELECT '' AS project_no, g.item_code, g.warehouse, g.qty,
+		       CONCAT_WS('|', g.item_code, g.warehouse) AS row_key, 0 AS actual_qty, 0 AS reserved_qty, 0 AS order_qty, g.qty AS received_qty,
+		       0 AS rate, NULL AS supplier, NULL AS supplier_name, NULL AS posting_date,
+		       i.valuation_rate, i.standard_rate, i.stock_uom,
+		       {full_name} AS item_full_name
+		FROM (
+			SELECT sed.item_code, sed.s_warehouse AS warehouse, SUM(sed.qty) AS qty
+			FROM `tabStock Entry Detail` sed
+			INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
+			WHERE sed.s_warehouse = %(warehouse)s AND sed.qty > 0
+			GROUP BY sed.item_code, sed.s_warehouse
+		) g
+		LEFT JOIN `tabItem` i ON i.name = g.item_code
+	""".format(full_name=_ITEM_FULL_NAME_SQL.format(code="g.item_code"))
+
+
+def _query_warehouse_list(warehouse, status, params):
 	"""
-	return frappe.db.sql(sql, (RAW_MATERIAL_WAREHOUSE,), as_dict=True)
+	原材料 / 库存仓列表共用：按状态选择派生表，筛选、排序、分页在 SQL 中完成。
+	返回 (rows, status_label, total_count)。已出库行无 projectNo，不参与采购单号筛选。
+	"""
+	search = (params.get("search_project_no") or "").strip()
+	if status == STATUS_PENDING_INBOUND:
+		inner_sql, status_label = _pending_inbound_sql(), "待入库"
+	elif status == STATUS_OUTBOUND:
+		inner_sql, status_label, search = _se_outbound_sql(), "已出库", ""
+	else:
+		inner_sql, status_label = _in_stock_with_latest_pr_sql(), "已入库"
+	rows, total_count = _run_paged_list_query(
+		inner_sql,
+		{"warehouse": warehouse},
+		_sanitize_order_by(params["order_by"]),
+		max(0, int(params["limit_start"])),
+		int(params.get("limit_page_length") or 50),
+		search=search,
+		cursor=params.get("cursor"),
+		scope="inventory:{}:{}".format(warehouse, status),
+	)
+	return rows, status_label, total_count
 
 
 def _build_raw_material_row(record, status, warehouse=RAW_MATERIAL_WAREHOUSE):
-	"""组装原材料行，与 material/item.py _item_to_raw_material_row 字段一致 + status。"""
+	"""组装原材料行，与 material/item.py _item_to_raw_material_row 字段一致 + status；物料、供应商字段来自 join。"""
 	item_code = record.get("item_code") or ""
-	item = frappe.db.get_value(
-		"Item", item_code,
-		["item_name", "valuation_rate", "standard_rate", "stock_uom"],
-		as_dict=True
-	) if item_code else None
-	item_name = (item.get("item_name") or item_code) if item else item_code
-	item_full_name = item_name
-	if item and item.get("item_name") and item.get("item_name") != item_code:
-		item_full_name = "{} - {}".format(item_code, item.get("item_name"))
-	date_val = record.get("transaction_date") or record.get("posting_date") or getdate()
-	date_str = _date_str(date_val)
-	project_no = record.get("purchase_order") or record.get("projectNo") or ""
+	date_str = _date_str(record.get("posting_date") or getdate())
+	project_no = record.get("project_no") or ""
 	order_qty = _flt(record.get("order_qty") or record.get("qty"))
 	received_qty = _flt(record.get("received_qty"))
-	unreceived_qty = max(0, order_qty - received_qty)
-	in_stock_qty = _flt(record.get("actual_qty"))
-	unit_price = _flt(record.get("rate") or record.get("unit_price"))
 	supplier = record.get("supplier") or ""
-	supplier_name = (record.get("supplier_name") or "") or (frappe.db.get_value("Supplier", supplier, "supplier_name") if supplier else "") or ""
 	wh = record.get("warehouse") or warehouse
 	row_id = "|".join([str(project_no), str(item_code), str(wh)])
 	return {
 		"id": row_id,
 		"date": date_str or "",
 		"projectNo": project_no,
-		"itemFullName": item_full_name,
+		"itemFullName": record.get("item_full_name") or item_code,
 		"orderQty": order_qty,
-		"unitPrice": unit_price,
+		"unitPrice": _flt(record.get("rate")),
 		"receivedQty": received_qty,
-		"unreceivedQty": unreceived_qty,
-		"inStockQty": in_stock_qty,
-		"supplierId": supplier or "",
-		"supplier": supplier_name,
-		"inventoryCost": _flt(item.get("valuation_rate")) if item else 0,
-		"salesPrice": _flt(item.get("standard_rate")) if item else 0,
+		"unreceivedQty": max(0, order_qty - received_qty),
+		"inStockQty": _flt(record.get("actual_qty")),
+		"supplierId": supplier,
+		"supplier": record.get("supplier_name") or "",
+		"inventoryCost": _flt(record.get("valuation_rate")),
+		"salesPrice": _flt(record.get("standard_rate")),
 		"warehouse": wh,
 		"warehouseLocation": "",
-		"unit": (item.get("stock_uom") or "") if item else "",
+		"unit": record.get("stock_uom") or "",
 		"workInstructionUrl": "",
 		"status": status,
 	}
@@ -516,67 +580,18 @@ def _build_raw_material_row(record, status, warehouse=RAW_MATERIAL_WAREHOUSE):
 def get_raw_material_list(**kwargs):
 	"""
 	原材料列表：按状态 待入库/已入库/已出库，采购单号筛选，分页。返回字段与 get_raw_material_item 一致。
-	POST json_data: status, search_project_no, limit_start, limit_page_length
-	返回: message = [ 行对象 ], total_count
+	POST json_data: status, search_project_no, limit_start, limit_page_length, order_by,
+	  cursor（可选，传入即为游标分页，首页传 ""；忽略 limit_start）
+	返回: message = [ 行对象 ], total_count；游标模式另返回 next_cursor（无下一页为 null）
 	"""
 	if not frappe.has_permission("Warehouse", "read"):
 		frappe.throw(frappe._("No permission to read Warehouse"))
 	params = _parse_params_inventory(kwargs)
 	status = params.get("status") or STATUS_PENDING_INBOUND
-	search = (params.get("search_project_no") or "").strip()
-	limit_start = max(0, int(params["limit_start"]))
-	limit_page_length = int(params.get("limit_page_length") or 50)
-	use_limit = limit_page_length > 0
 
-	candidates = []
-	if status == STATUS_PENDING_INBOUND:
-		rows = _get_raw_material_pending_inbound()
-		for r in rows:
-			if search and search.lower() not in (r.get("purchase_order") or "").lower():
-				continue
-			r["order_qty"] = _flt(r.get("qty"))
-			r["received_qty"] = _flt(r.get("received_qty"))
-			candidates.append((r, "待入库"))
-	elif status == STATUS_OUTBOUND:
-		rows = _get_raw_material_outbound()
-		for r in rows:
-			r["actual_qty"] = 0
-			r["projectNo"] = ""
-			r["order_qty"] = 0
-			r["received_qty"] = _flt(r.get("qty"))
-			candidates.append((r, "已出库"))
-	else:
-		rows = _get_raw_material_in_stock()
-		# 关联 PR 取 projectNo（采购单号）
-		pr_map = {}
-		for r in rows:
-			ic, wh = r.get("item_code"), r.get("warehouse")
-			pr_row = frappe.db.sql("""
-				SELECT pri.parent AS pr_name, pr.name AS purchase_order
-				FROM `tabPurchase Receipt Item` pri
-				INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent AND pr.docstatus = 1
-				WHERE pri.item_code = %s AND pri.warehouse = %s
-				ORDER BY pr.posting_date DESC LIMIT 1
-			""", (ic, wh or RAW_MATERIAL_WAREHOUSE), as_dict=True)
-			if pr_row:
-				pr_map[ic] = pr_row[0].get("purchase_order") or ""
-		for r in rows:
-			r["projectNo"] = pr_map.get(r.get("item_code"), "")
-			r["order_qty"] = _flt(r.get("actual_qty"))
-			r["received_qty"] = _flt(r.get("actual_qty"))
-			if search and search.lower() not in (r.get("projectNo") or "").lower():
-				continue
-			candidates.append((r, "已入库"))
-
-	candidates.sort(key=lambda x: ((x[0].get("purchase_order") or x[0].get("projectNo") or ""), (x[0].get("item_code") or "")))
-	total_count = len(candidates)
-	if use_limit:
-		page = candidates[limit_start: limit_start + limit_page_length]
-	else:
-		page = candidates[limit_start:]
+	rows, status_label, total_count = _query_warehouse_list(RAW_MATERIAL_WAREHOUSE, status, params)
 
-	out = [_build_raw_material_row(rec, st) for rec, st in page]
-	frappe.response["message"] = out
+	frappe.response["message"] = [_build_raw_material_row(rec, status_label) for rec in rows]
 	frappe.response["total_count"] = total_count
 
 
@@ -701,92 +716,72 @@ def outbound_raw_material(**kwargs):
 
 # ---------- 库存仓 ----------
 
-def _get_inventory_pending_inbound():
-	sql = """
-		SELECT po.name AS purchase_order, poi.item_code, poi.stock_qty AS qty,
-		       IFNULL(poi.received_qty, 0) AS received_qty,
-		       poi.rate, poi.warehouse, po.supplier, po.transaction_date
-		FROM `tabPurchase Order` po
-		INNER JOIN `tabPurchase Order Item` poi ON poi.parent = po.name
-		WHERE po.docstatus = 1 AND poi.warehouse = %s
-		  AND (IFNULL(poi.received_qty, 0) < IFNULL(poi.stock_qty, poi.qty))
+def _get_reservation_details_map(pairs):
 	"""
-	return frappe.db.sql(sql, (INVENTORY_WAREHOUSE,), as_dict=True)
-
-
-def _get_inventory_in_stock():
-	return frappe.db.sql("""
-		SELECT b.item_code, b.warehouse, b.actual_qty, b.reserved_qty
-		FROM `tabBin` b
-		WHERE b.warehouse = %s AND (b.actual_qty IS NULL OR b.actual_qty > 0)
-	""", (INVENTORY_WAREHOUSE,), as_dict=True)
-
-
-def _get_inventory_outbound():
-	sql = """
-		SELECT sed.item_code, sed.s_warehouse AS warehouse, SUM(sed.qty) AS qty
-		FROM `tabStock Entry Detail` sed
-		INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND se.docstatus = 1
-		WHERE sed.s_warehouse = %s AND sed.qty > 0
-		GROUP BY sed.item_code, sed.s_warehouse
+	批量预留明细：pairs 为 [(item_code, warehouse)]，一次查询已提交的 Stock Reservation Entry，
+	客户由 Sales Order 在 SQL 中关联。返回 {(item_code, warehouse): [reservationDetails 行]}，无预留的 key 不出现。
 	"""
-	return frappe.db.sql(sql, (INVENTORY_WAREHOUSE,), as_dict=True)
+	pairs = {(ic, wh) for ic, wh in (pairs or []) if ic and wh}
+	if not pairs or not frappe.db.table_exists("Stock Reservation Entry"):
+		return {}
+	rows = frappe.db.sql("""
+		SELECT sre.item_code, sre.warehouse, sre.reserved_qty,
+		       IF(sre.voucher_type = 'Sales Order', sre.voucher_no, '') AS sales_order,
+		       IFNULL(so.customer, '') AS customer
+		FROM `tabStock Reservation Entry` sre
+		LEFT JOIN `tabSales Order` so
+		  ON so.name = sre.voucher_no AND sre.voucher_type = 'Sales Order'
+		WHERE sre.docstatus = 1
+		  AND sre.item_code IN %(item_codes)s
+		  AND sre.warehouse IN %(warehouses)s
+		ORDER BY sre.creation ASC, sre.name ASC
+	""", {
+		"item_codes": tuple({p[0] for p in pairs}),
+		"warehouses": tuple({p[1] for p in pairs}),
+	}, as_dict=True)
+	out = {}
+	for r in rows:
+		key = (r.item_code, r.warehouse)
+		if key not in pairs:
+			continue
+		out.setdefault(key, []).append({
+			"salesContract": r.sales_order or "",
+			"productName": r.item_code,
+			"reservedQty": _flt(r.reserved_qty),
+			"customer": r.customer or "",
+		})
+	return out
 
 
 def _get_reservation_details(item_code, warehouse):
-	"""预留明细：Bin.reserved_qty + 若有 Stock Reservation Entry 则组装；否则返回空数组。"""
-	out = []
-	try:
-		if frappe.db.table_exists("Stock Reservation Entry"):
-			rows = frappe.db.sql("""
-				SELECT sre.name, sre.reserved_qty, sre.voucher_type, sre.voucher_no
-				FROM `tabStock Reservation Entry` sre
-				WHERE sre.item_code = %s AND sre.warehouse = %s AND sre.docstatus = 1
-			""", (item_code, warehouse), as_dict=True)
-			for r in rows:
-				so_name = r.get("voucher_no") if r.get("voucher_type") == "Sales Order" else ""
-				customer = ""
-				if so_name:
-					customer = frappe.db.get_value("Sales Order", so_name, "customer") or ""
-				out.append({
-					"salesContract": so_name or "",
-					"productName": item_code,
-					"reservedQty": _flt(r.get("reserved_qty")),
-					"customer": customer or "",
-				})
-	except Exception:
-		pass
-	return out
+	"""预留明细：单个 item_code + warehouse 的 Stock Reservation Entry；无则返回空数组。"""
+	return _get_reservation_details_map([(item_code, warehouse)]).get((item_code, warehouse), [])
 
 
-def _build_inventory_row(record, status, include_reservation=False):
-	"""组装库存仓行，与需求文档 §4.2 一致；可选 reservationDetails。"""
+def _build_inventory_row(record, status, include_reservation=False, reservation_map=None):
+	"""
+	组装库存仓行，与需求文档 §4.2 一致；可选 reservationDetails。物料、供应商字段来自 join。
+	reservation_map：_get_reservation_details_map 的结果（整页一次查询）；未传时按行单独查询。
+	"""
 	item_code = record.get("item_code") or ""
-	item = frappe.db.get_value("Item", item_code, ["item_name", "valuation_rate", "stock_uom"], as_dict=True) if item_code else None
-	item_name = (item.get("item_name") or item_code) if item else item_code
-	item_full_name = "{} - {}".format(item_code, item_name) if (item and item.get("item_name") != item_code) else item_name
-	date_val = record.get("transaction_date") or record.get("posting_date") or getdate()
-	project_no = record.get("purchase_order") or record.get("projectNo") or ""
+	project_no = record.get("project_no") or ""
 	order_qty = _flt(record.get("order_qty") or record.get("qty"))
 	received_qty = _flt(record.get("received_qty"))
-	unreceived_qty = max(0, order_qty - received_qty)
-	in_stock_qty = _flt(record.get("actual_qty"))
-	reserved_qty = _flt(record.get("reserved_qty"))
 	wh = record.get("warehouse") or INVENTORY_WAREHOUSE
 	row_id = "|".join([str(project_no), str(item_code), str(wh)])
 	row = {
 		"id": row_id,
-		"date": _date_str(date_val) or "",
+		"date": _date_str(record.get("posting_date") or getdate()) or "",
 		"projectNo": project_no,
-		"itemFullName": item_full_name,
+		"itemFullName": record.get("item_full_name") or item_code,
 		"orderQty": order_qty,
 		"receivedQty": received_qty,
-		"unreceivedQty": unreceived_qty,
-		"inStockQty": in_stock_qty,
-		"reservedQty": reserved_qty,
-		"inventoryCost": _flt(item.get("valuation_rate")) if item else 0,
+		"unreceivedQty": max(0, order_qty - received_qty),
+		"inStockQty": _flt(record.get("actual_qty")),
+		"reservedQty": _flt(record.get("reserved_qty")),
+		"inventoryCost": _flt(record.get("valuation_rate")),
 		"supplierId": record.get("supplier") or "",
-		"supplier": (record.get("supplier_name") or "") or (frappe.db.get_value("Supplier", record.get("supplier"), "supplier_name") if record.get("supplier") else "") or "",
+		"supplier": record.get("supplier_name") or "",
 		"warehouse": wh,
 		"warehouseLocation": "",
 		"unitPrice": _flt(record.get("rate")),
@@ -794,7 +789,10 @@ def _build_inventory_row(record, status, include_reservation=False):
 		"status": status,
 	}
 	if include_reservation:
-		row["reservationDetails"] = _get_reservation_details(item_code, wh)
+		if reservation_map is None:
+			row["reservationDetails"] = _get_reservation_details(item_code, wh)
+		else:
+			row["reservationDetails"] = list(reservation_map.get((item_code, wh), []))
 	return row
 
 
@@ -802,63 +800,26 @@ def _build_inventory_row(record, status, include_reservation=False):
 def get_inventory_list(**kwargs):
 	"""
 	库存仓列表：按状态 待入库/已入库/已出库，采购订单号筛选；可选 include_reservation_details。
-	返回: message = [ 行对象 ], total_count
+	游标分页同 get_raw_material_list（cursor）。
+	返回: message = [ 行对象 ], total_count；游标模式另返回 next_cursor
 	"""
 	if not frappe.has_permission("Warehouse", "read"):
 		frappe.throw(frappe._("No permission to read Warehouse"))
 	params = _parse_params_inventory(kwargs)
 	status = params.get("status") or STATUS_PENDING_INBOUND
-	search = (params.get("search_project_no") or "").strip()
-	limit_start = max(0, int(params["limit_start"]))
-	limit_page_length = int(params.get("limit_page_length") or 50)
-	use_limit = limit_page_length > 0
 	include_res = params.get("include_reservation_details")
 
-	candidates = []
-	if status == STATUS_PENDING_INBOUND:
-		rows = _get_inventory_pending_inbound()
-		for r in rows:
-			if search and search.lower() not in (r.get("purchase_order") or "").lower():
-				continue
-			r["order_qty"] = _flt(r.get("qty"))
-			r["received_qty"] = _flt(r.get("received_qty"))
-			candidates.append((r, "待入库"))
-	elif status == STATUS_OUTBOUND:
-		rows = _get_inventory_outbound()
-		for r in rows:
-			r["actual_qty"] = 0
-			r["projectNo"] = ""
-			r["order_qty"] = 0
-			r["received_qty"] = _flt(r.get("qty"))
-			candidates.append((r, "已出库"))
-	else:
-		rows = _get_inventory_in_stock()
-		pr_map = {}
-		for r in rows:
-			pr_row = frappe.db.sql("""
-				SELECT pr.name AS purchase_order FROM `tabPurchase Receipt Item` pri
-				INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent AND pr.docstatus = 1
-				WHERE pri.item_code = %s AND pri.warehouse = %s
-				ORDER BY pr.posting_date DESC LIMIT 1
-			""", (r.get("item_code"), r.get("warehouse") or INVENTORY_WAREHOUSE), as_dict=True)
-			if pr_row:
-				pr_map[r.get("item_code")] = pr_row[0].get("purchase_order") or ""
-		for r in rows:
-			r["projectNo"] = pr_map.get(r.get("item_code"), "")
-			r["order_qty"] = _flt(r.get("actual_qty"))
-			r["received_qty"] = _flt(r.get("actual_qty"))
-			if search and search.lower() not in (r.get("projectNo") or "").lower():
-				continue
-			candidates.append((r, "已入库"))
-
-	candidates.sort(key=lambda x: ((x[0].get("purchase_order") or x[0].get("projectNo") or ""), (x[0].get("item_code") or "")))
-	total_count = len(candidates)
-	if use_limit:
-		page = candidates[limit_start: limit_start + limit_page_length]
-	else:
-		page = candidates[limit_start:]
+	rows, status_label, total_count = _query_warehouse_list(INVENTORY_WAREHOUSE, status, params)
 
-	out = [_build_inventory_row(rec, st, include_reservation=include_res) for rec, st in page]
+	reservation_map = None
+	if include_res:
+		reservation_map = _get_reservation_details_map(
+			[(rec.get("item_code"), rec.get("warehouse") or INVENTORY_WAREHOUSE) for rec in rows]
+		)
+	out = [
+		_build_inventory_row(rec, status_label, include_reservation=include_res, reservation_map=reservation_map)
+		for rec in rows
+	]
 	frappe.response["message"] = out
 	frappe.response["total_count"] = total_count
 
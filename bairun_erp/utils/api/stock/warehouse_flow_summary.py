@@ -0,0 +1,383 @@
+# Copyright (c) 2026, Bairun and contributors
+# 毛坯/半成品到库、委外预聚合维护：BR Warehouse Flow Entry（流水）+ BR Warehouse Flow Summary（汇总）。
+# 口径与 blank_list 原实时统计一致：
+# - 毛坯到库：入毛坯仓的 SE 行，销售订单号取关联 PR 的 customer_order / PR 行 sales_order，库位取 PR 行 warehouse_slot。
+# - 半成品到库：Material Transfer 毛坯→半成品，或 Material Receipt 入半成品仓；销售订单号取 SE.custom_customer_order。
+# - 毛坯委外：Material Transfer 毛坯→半成品，或 Material Issue 毛坯仓发料且明细关联 MR。
+# - 半成品委外：Material Transfer 半成品→成品。
+# 调拨单草稿(docstatus=0)与已提交(1)计入，已取消(2)/删除不计。
+# Stock Entry on_update（提交时也先触发）/ on_cancel / on_trash 触发增量更新（见 stock_entry_events）；
+# Purchase Receipt 修改后销售订单号 / 行库位变化时，刷新引用它的调拨单流水（见 purchase_receipt_events）；
+# 全量回填:
+#   bench --site site2.local execute bairun_erp.utils.api.stock.warehouse_flow_summary.rebuild_warehouse_flow_summary
+#   或 bench --site site2.local rebuild-warehouse-flow-summary
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.utils import flt, now
+
+from bairun_erp.utils.api.stock.blank_list import (
+	BLANK_WAREHOUSE,
+	FINISHED_WAREHOUSE,
+	FLOW_ENTRY_DOCTYPE,
+	FLOW_OUTSOURCED,
+	FLOW_RECEIVED,
+	FLOW_SUMMARY_DOCTYPE,
+	LIST_TYPE_BLANK,
+	LIST_TYPE_SEMI_FINISHED,
+	SEMI_FINISHED_WAREHOUSE,
+)
+
+# Stock Entry：草稿与已提交均参与到库/委外汇总（排除已取消）
+_STE_DOCSTATUS_FOR_LIST_SQL = "se.docstatus IN (0, 1)"
+
+_ENTRY_FIELDS = (
+	"name", "creation", "modified", "owner", "modified_by",
+	"list_type", "flow_type", "project_no", "item_code", "warehouse",
+	"stock_entry", "stock_entry_detail", "qty", "posting_date", "supplier_id", "warehouse_slot",
+)
+_SUMMARY_FIELDS = (
+	"name", "creation", "modified", "owner", "modified_by",
+	"list_type", "flow_type", "project_no", "item_code", "warehouse",
+	"qty", "last_posting_date", "supplier_id", "warehouse_location",
+)
+# 汇总行按唯一键 flow_key_unique 更新时改写的列
+_SUMMARY_UPDATE_FIELDS = ("modified", "modified_by", "qty", "last_posting_date", "supplier_id", "warehouse_location")
+_BULK_CHUNK = 1000
+
+
+def _entry_key(e):
+	return (e["list_type"], e["flow_type"], e["project_no"], e["item_code"], e["warehouse"])
+
+
+def _select_sql(has_customer_order, has_outsourcing_supplier, warehouse_col):
+	select = [
+		"sed.name AS sed_name",
+		"se.name AS se_name",
+		"sed.item_code",
+		"{} AS warehouse".format(warehouse_col),
+		"sed.qty",
+		"se.posting_date",
+		"sed.reference_purchase_receipt AS pr_name",
+	]
+	select.append("se.custom_customer_order AS project_no" if has_customer_order else "'' AS project_no")
+	select.append("se.custom_outsourcing_supplier AS supplier_id" if has_outsourcing_supplier else "NULL AS supplier_id")
+	return ", ".join(select)
+
+
+def _flow_sources():
+	"""
+	返回 [(list_type, flow_type, sql, default_wh)]；sql 含 {se_filter} 占位，
+	增量更新时限定单张 Stock Entry，全量回填时为空。
+	"""
+	se_meta = frappe.get_meta("Stock Entry")
+	sed_meta = frappe.get_meta("Stock Entry Detail")
+	has_customer_order = bool(se_meta.get_field("custom_customer_order"))
+	has_outsourcing_supplier = bool(se_meta.get_field("custom_outsourcing_supplier"))
+	has_sed_material_request = bool(sed_meta.get_field("material_request"))
+
+	t_select = _select_sql(has_customer_order, has_outsourcing_supplier, "sed.t_warehouse")
+	s_select = _select_sql(has_customer_order, has_outsourcing_supplier, "sed.s_warehouse")
+	base = """
+		SELECT {select}
+		FROM `tabStock Entry Detail` sed
+		INNER JOIN `tabStock Entry` se ON se.name = sed.parent AND {docstatus}
+		WHERE {where} {{se_filter}}
+	"""
+
+	def q(select, where):
+		return base.format(select=select, docstatus=_STE_DOCSTATUS_FOR_LIST_SQL, where=where)
+
+	sources = [
+		# 毛坯到库：入毛坯仓（销售订单号后续按 PR 批量解析）
+		(LIST_TYPE_BLANK, FLOW_RECEIVED, q(t_select, "sed.t_warehouse = %(blank)s"), BLANK_WAREHOUSE),
+		# 半成品到库：Material Transfer 毛坯→半成品
+		(LIST_TYPE_SEMI_FINISHED, FLOW_RECEIVED, q(
+			t_select,
+			"se.purpose = 'Material Transfer' AND sed.s_warehouse = %(blank)s AND sed.t_warehouse = %(semi)s",
+		), SEMI_FINISHED_WAREHOUSE),
+		# 半成品到库：Material Receipt 入半成品仓
+		(LIST_TYPE_SEMI_FINISHED, FLOW_RECEIVED, q(
+			t_select,
+			"se.purpose = 'Material Receipt' AND sed.t_warehouse = %(semi)s",
+		), SEMI_FINISHED_WAREHOUSE),
+		# 毛坯委外：Material Transfer 毛坯→半成品
+		(LIST_TYPE_BLANK, FLOW_OUTSOURCED, q(
+			s_select,
+			"se.purpose = 'Material Transfer' AND sed.s_warehouse = %(blank)s AND sed.t_warehouse = %(semi)s",
+		), BLANK_WAREHOUSE),
+		# 半成品委外：Material Transfer 半成品→成品
+		(LIST_TYPE_SEMI_FINISHED, FLOW_OUTSOURCED, q(
+			s_select,
+			"se.purpose = 'Material Transfer' AND sed.s_warehouse = %(semi)s AND sed.t_warehouse = %(finished)s",
+		), SEMI_FINISHED_WAREHOUSE),
+	]
+	if has_sed_material_request:
+		# 毛坯委外：MES 委外编排的 Material Issue（明细关联 MR）
+		sources.append((LIST_TYPE_BLANK, FLOW_OUTSOURCED, q(
+			s_select,
+			"se.purpose = 'Material Issue' AND IFNULL(sed.material_request, '') != '' AND sed.s_warehouse = %(blank)s",
+		), BLANK_WAREHOUSE))
+	return sources
+
+
+def _resolve_pr_info(pairs):
+	"""
+	批量解析 (pr_name, item_code) -> (project_no, warehouse_slot)：
+	销售订单号优先 PR.customer_order，否则同物料首行 PR Item.sales_order；库位取同物料首行 warehouse_slot。
+	"""
+	pr_names = list({p for p, _ic in pairs if p})
+	if not pr_names:
+		return {}
+	pr_meta = frappe.get_meta("Purchase Receipt")
+	pri_meta = frappe.get_meta("Purchase Receipt Item")
+	customer_order_by_pr = {}
+	if pr_meta.get_field("customer_order"):
+		for r in frappe.get_all(
+			"Purchase Receipt", filters={"name": ["in", pr_names]}, fields=["name", "customer_order"]
+		):
+			customer_order_by_pr[r.name] = r.customer_order
+	fields = ["parent", "item_code", "sales_order", "idx"]
+	if pri_meta.get_field("warehouse_slot"):
+		fields.append("warehouse_slot")
+	first_row = {}
+	for r in frappe.get_all(
+		"Purchase Receipt Item",
+		filters={"parent": ["in", pr_names]},
+		fields=fields,
+		order_by="parent asc, idx asc",
+	):
+		first_row.setdefault((r.parent, r.item_code), r)
+
+	out = {}
+	for pr_name, item_code in pairs:
+		if not pr_name:
+			continue
+		row = first_row.get((pr_name, item_code)) or {}
+		project_no = customer_order_by_pr.get(pr_name) or row.get("sales_order") or ""
+		out[(pr_name, item_code)] = (project_no, row.get("warehouse_slot") or "")
+	return out
+
+
+def _collect_flow_entries(stock_entry=None):
+	"""按口径收集流水行；stock_entry 不为空时仅收集该单据（增量更新）。"""
+	se_filter = "AND se.name = %(stock_entry)s" if stock_entry else ""
+	values = {
+		"blank": BLANK_WAREHOUSE,
+		"semi": SEMI_FINISHED_WAREHOUSE,
+		"finished": FINISHED_WAREHOUSE,
+		"stock_entry": stock_entry,
+	}
+	raw = []
+	for list_type, flow_type, sql, default_wh in _flow_sources():
+		for r in frappe.db.sql(sql.format(se_filter=se_filter), values, as_dict=True):
+			raw.append((list_type, flow_type, default_wh, r))
+
+	pr_info = _resolve_pr_info([
+		(r.get("pr_name"), r.get("item_code"))
+		for list_type, flow_type, _wh, r in raw
+		if list_type == LIST_TYPE_BLANK and flow_type == FLOW_RECEIVED
+	])
+
+	entries = []
+	for list_type, flow_type, default_wh, r in raw:
+		slot = ""
+		if list_type == LIST_TYPE_BLANK and flow_type == FLOW_RECEIVED:
+			project_no, slot = pr_info.get((r.get("pr_name"), r.get("item_code")), ("", ""))
+		else:
+			project_no = r.get("project_no")
+		supplier_id = r.get("supplier_id") if flow_type == FLOW_OUTSOURCED else None
+		entries.append({
+			"list_type": list_type,
+			"flow_type": flow_type,
+			"project_no": (project_no or "").strip(),
+			"item_code": r.get("item_code") or "",
+			"warehouse": r.get("warehouse") or default_wh,
+			"stock_entry": r.get("se_name"),
+			"stock_entry_detail": r.get("sed_name"),
+			"qty": flt(r.get("qty")),
+			"posting_date": r.get("posting_date"),
+			"supplier_id": (supplier_id or "").strip() or None,
+			"warehouse_slot": (slot or "").strip(),
+		})
+	return entries
+
+
+def _aggregate_entries(entries):
+	"""流水按 key 聚合：数量求和；库位、委外供应商取最近日期（同日取后者），与原实时统计一致。"""
+	agg = {}
+	for e in entries:
+		key = _entry_key(e)
+		cur = agg.get(key)
+		if cur is None:
+			cur = agg[key] = {
+				"qty": 0,
+				"last_posting_date": None,
+				"supplier_id": None,
+				"warehouse_location": "",
+				"_location_date": None,
+			}
+		cur["qty"] += flt(e.get("qty"))
+		posting_date = e.get("posting_date")
+		if posting_date and (cur["last_posting_date"] is None or posting_date >= cur["last_posting_date"]):
+			cur["last_posting_date"] = posting_date
+		if e.get("supplier_id"):
+			cur["supplier_id"] = e["supplier_id"]
+		slot = (e.get("warehouse_slot") or "").strip()
+		if slot and (cur["_location_date"] is None or (posting_date and posting_date >= cur["_location_date"])):
+			cur["warehouse_location"] = slot
+			cur["_location_date"] = posting_date
+	for v in agg.values():
+		v.pop("_location_date", None)
+	return agg
+
+
+def _row_values(fields, rows):
+	ts = now()
+	user = frappe.session.user
+	values = []
+	for row in rows:
+		row = dict(row, name=frappe.generate_hash(length=12), creation=ts, modified=ts, owner=user, modified_by=user)
+		values.append(tuple(row.get(f) for f in fields))
+	return values
+
+
+def _bulk_insert(doctype, fields, rows):
+	values = _row_values(fields, rows)
+	for i in range(0, len(values), _BULK_CHUNK):
+		frappe.db.bulk_insert(doctype, fields, values[i:i + _BULK_CHUNK])
+
+
+def _summary_rows(agg):
+	rows = []
+	for (list_type, flow_type, project_no, item_code, warehouse), v in agg.items():
+		rows.append({
+			"list_type": list_type,
+			"flow_type": flow_type,
+			"project_no": project_no,
+			"item_code": item_code,
+			"warehouse": warehouse,
+			"qty": v["qty"],
+			"last_posting_date": v["last_posting_date"],
+			"supplier_id": v["supplier_id"],
+			"warehouse_location": v["warehouse_location"],
+		})
+	return rows
+
+
+def _upsert_summaries(agg):
+	"""汇总行按唯一键 flow_key_unique 写入：INSERT ... ON DUPLICATE KEY UPDATE，并发重算同一 key 不会产生重复行。"""
+	values = _row_values(_SUMMARY_FIELDS, _summary_rows(agg))
+	columns = ", ".join("`{}`".format(f) for f in _SUMMARY_FIELDS)
+	row_sql = "(" + ", ".join(["%s"] * len(_SUMMARY_FIELDS)) + ")"
+	update_sql = ", ".join("`{0}` = VALUES(`{0}`)".format(f) for f in _SUMMARY_UPDATE_FIELDS)
+	for i in range(0, len(values), _BULK_CHUNK):
+		chunk = values[i:i + _BULK_CHUNK]
+		frappe.db.sql(
+			"INSERT INTO `tab{}` ({}) VALUES {} ON DUPLICATE KEY UPDATE {}".format(
+				FLOW_SUMMARY_DOCTYPE, columns, ", ".join([row_sql] * len(chunk)), update_sql
+			),
+			[v for row in chunk for v in row],
+		)
+
+
+def _key_filters(key):
+	list_type, flow_type, project_no, item_code, warehouse = key
+	return {
+		"list_type": list_type,
+		"flow_type": flow_type,
+		"project_no": project_no,
+		"item_code": item_code,
+		"warehouse": warehouse,
+	}
+
+
+def _recompute_summaries(keys):
+	"""
+	按 key 从流水重算汇总行（仅涉及本次变动的 key，走 flow_key_index）。
+	流水用加锁读（FOR UPDATE）：读到最新已提交流水，并阻塞同时改同一 key 的事务，避免按旧快照覆盖汇总；
+	汇总按唯一键写入，流水已清空的 key 删除汇总行。
+	"""
+	entries = []
+	for key in keys:
+		entries.extend(frappe.get_all(
+			FLOW_ENTRY_DOCTYPE,
+			filters=_key_filters(key),
+			fields=[
+				"list_type", "flow_type", "project_no", "item_code", "warehouse",
+				"qty", "posting_date", "supplier_id", "warehouse_slot",
+			],
+			order_by="posting_date asc, creation asc",
+			for_update=True,
+		))
+	agg = _aggregate_entries(entries)
+	for key in keys:
+		if key not in agg:
+			frappe.db.delete(FLOW_SUMMARY_DOCTYPE, _key_filters(key))
+	_upsert_summaries(agg)
+
+
+def update_for_stock_entry(stock_entry, removed=False):
+	"""
+	单张 Stock Entry 变动后的增量更新：删除该单据旧流水，按当前状态重新收集（removed=True 时不收集），
+	再重算新旧流水涉及的汇总 key。
+	"""
+	if not stock_entry:
+		return
+	old_keys = {
+		_entry_key(e)
+		for e in frappe.get_all(
+			FLOW_ENTRY_DOCTYPE,
+			filters={"stock_entry": stock_entry},
+			fields=["list_type", "flow_type", "project_no", "item_code", "warehouse"],
+		)
+	}
+	frappe.db.delete(FLOW_ENTRY_DOCTYPE, {"stock_entry": stock_entry})
+
+	new_entries = [] if removed else _collect_flow_entries(stock_entry)
+	_bulk_insert(FLOW_ENTRY_DOCTYPE, _ENTRY_FIELDS, new_entries)
+
+	keys = old_keys | {_entry_key(e) for e in new_entries}
+	if keys:
+		_recompute_summaries(keys)
+
+
+def _pr_flow_signature(doc):
+	"""采购接收单上影响毛坯到库流水的字段：表头 customer_order，行 item_code / sales_order / warehouse_slot。"""
+	rows = sorted(doc.get("items") or [], key=lambda r: r.get("idx") or 0)
+	return (
+		doc.get("customer_order") or "",
+		tuple((r.get("item_code"), r.get("sales_order") or "", r.get("warehouse_slot") or "") for r in rows),
+	)
+
+
+def update_for_purchase_receipt(doc):
+	"""
+	采购接收单修改后：毛坯到库流水的销售订单号、库位取自 PR，相关字段有变化时
+	对引用该 PR 的未取消调拨单逐张增量更新（新建的 PR 尚无调拨单引用，跳过）。
+	"""
+	before = doc.get_doc_before_save()
+	if before is None or _pr_flow_signature(before) == _pr_flow_signature(doc):
+		return
+	stock_entries = frappe.get_all(
+		"Stock Entry Detail",
+		filters={"reference_purchase_receipt": doc.name, "docstatus": ["<", 2]},
+		pluck="parent",
+		distinct=True,
+	)
+	for stock_entry in stock_entries:
+		update_for_stock_entry(stock_entry)
+
+
+def rebuild_warehouse_flow_summary():
+	"""全量重建流水与汇总（首次上线回填，或口径调整后重算）。返回 {entries, summaries}。"""
+	frappe.db.delete(FLOW_ENTRY_DOCTYPE)
+	frappe.db.delete(FLOW_SUMMARY_DOCTYPE)
+	entries = _collect_flow_entries()
+	entries.sort(key=lambda e: (str(e.get("posting_date") or ""), e.get("stock_entry") or ""))
+	_bulk_insert(FLOW_ENTRY_DOCTYPE, _ENTRY_FIELDS, entries)
+	agg = _aggregate_entries(entries)
+	_bulk_insert(FLOW_SUMMARY_DOCTYPE, _SUMMARY_FIELDS, _summary_rows(agg))
+	frappe.db.commit()
+	return {"entries": len(entries), "summaries": len(agg)}
@@ -0,0 +1,161 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+Bairun 自定义 DocType 热点查询列的复合索引，及按 EXPLAIN 检查白名单接口查询形态是否仍全表扫描。
+
+- HOT_LOOKUP_INDEXES：各 DocType 的复合索引；由各 DocType 的 on_doctype_update 与补丁 add_hot_lookup_indexes 创建。
+  复合索引的首列不再单独设 search_index（前缀即可命中）；其余单列索引见 DocType JSON 的 search_index。
+- QUERY_SHAPES：白名单接口的代表性查询（参数为占位值，只看执行计划）；bench explain-hot-queries 逐条 EXPLAIN，
+  报告 type=ALL（全表扫描）且未用索引的表。
+
+bench:
+	bench --site site2.local explain-hot-queries
+	bench --site site2.local explain-hot-queries --all    # 同时列出已走索引的查询
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+
+# doctype -> [(index_name, [列...]), ...]
+HOT_LOOKUP_INDEXES = {
+	"BR SO BOM List": [
+		# list_bom_material_report：order_no / customer_code 等值 + creation 区间
+		("order_no_creation_index", ["order_no", "creation"]),
+		("customer_code_creation_index", ["customer_code", "creation"]),
+		# 不带订单号 / 客户条件的默认查询只按 creation 区间过滤
+		("creation_index", ["creation"]),
+	],
+	"BR SO BOM List Details": [
+		# purchase_order_add._sync_br_so_bom_list_details_from_saved_po：parent + item_code + supplier_code (+ bom_code)
+		("parent_item_supplier_index", ["parent", "item_code", "supplier_code", "bom_code"]),
+	],
+	"BR Item Process Supplier": [
+		# purchase_price._get_category_item_names：br_process 等值后按 parent 关联 Item
+		("process_parent_index", ["br_process", "parent"]),
+	],
+	"BR Quotation": [
+		# get_quotation_versions_map：quotation_number IN (...) 按 version_id 排序
+		("quotation_version_index", ["quotation_number", "version_id"]),
+		# get_quotation_by_quotation_number：按 creation 取最新
+		("quotation_creation_index", ["quotation_number", "creation"]),
+	],
+}
+
+# 白名单接口 -> 代表性查询形态
+QUERY_SHAPES = (
+	{
+		"endpoint": "bairun_erp.utils.api.sales.sales_order_query_bom_details.list_bom_material_report",
+		"sql": """
+			SELECT name FROM `tabBR SO BOM List`
+			WHERE creation >= %(date_from)s AND creation <= %(date_to)s AND order_no = %(value)s
+			ORDER BY creation DESC LIMIT 20
+		""",
+	},
+	{
+		"endpoint": "bairun_erp.utils.api.sales.sales_order_query_bom_details.list_bom_material_report",
+		"sql": """
+			SELECT name FROM `tabBR SO BOM List`
+			WHERE creation >= %(date_from)s AND creation <= %(date_to)s AND customer_code = %(value)s
+			ORDER BY creation DESC LIMIT 20
+		""",
+	},
+	{
+		"endpoint": "bairun_erp.utils.api.sales.sales_order_query_bom_details.list_bom_material_report",
+		"sql": """
+			SELECT name FROM `tabBR SO BOM List`
+			WHERE creation >= %(date_from)s AND creation <= %(date_to)s
+			ORDER BY creation DESC LIMIT 20
+		""",
+	},
+	{
+		"endpoint": "bairun_erp.utils.api.buying.purchase_order_add.save_purchase_order",
+		"sql": """
+			SELECT name FROM `tabBR SO BOM List Details`
+			WHERE parent = %(value)s AND item_code = %(value)s AND supplier_code = %(value)s AND bom_code = %(value)s
+			ORDER BY idx ASC
+		""",
+	},
+	{
+		"endpoint": "bairun_erp.utils.api.buying.purchase_price.get_material_details_by_category",
+		"sql": """
+			SELECT DISTINCT item.name FROM `tabItem` item
+			INNER JOIN `tabBR Item Process Supplier` ps ON ps.parent = item.name
+			WHERE ps.br_process = %(value)s
+			ORDER BY item.name ASC LIMIT 50
+		""",
+	},
+	{
+		"endpoint": "bairun_erp.bairun_erp.doctype.br_quotation.br_quotation.get_quotation_list",
+		"sql": """
+			SELECT name FROM `tabBR Quotation`
+			WHERE quotation_number IN %(values)s
+			ORDER BY version_id, creation DESC
+		""",
+	},
+	{
+		"endpoint": "bairun_erp.bairun_erp.doctype.br_quotation.br_quotation.get_quotation_by_quotation_number",
+		"sql": """
+			SELECT name FROM `tabBR Quotation`
+			WHERE quotation_number = %(value)s
+			ORDER BY creation DESC LIMIT 1
+		""",
+	},
+)
+
+_EXPLAIN_VALUES = {
+	"value": "__explain__",
+	"values": ("__explain__", "__explain_2__"),
+	"date_from": "2026-01-01 00:00:00",
+	"date_to": "2026-12-31 23:59:59",
+}
+
+
+def add_hot_lookup_indexes(doctype=None):
+	"""创建 HOT_LOOKUP_INDEXES 中的复合索引（已存在则跳过）；doctype 为空时处理全部。"""
+	for dt, indexes in HOT_LOOKUP_INDEXES.items():
+		if doctype and dt != doctype:
+			continue
+		for index_name, fields in indexes:
+			frappe.db.add_index(dt, fields, index_name=index_name)
+
+
+def explain_hot_queries():
+	"""
+	对 QUERY_SHAPES 逐条 EXPLAIN。返回 [{endpoint, table, type, key, rows, full_scan}]，
+	full_scan 为真表示该表按 type=ALL 且未用任何索引读取。
+	"""
+	report = []
+	for shape in QUERY_SHAPES:
+		plan = frappe.db.sql("EXPLAIN " + shape["sql"], _EXPLAIN_VALUES, as_dict=True)
+		for row in plan:
+			access = (row.get("type") or "").upper()
+			report.append({
+				"endpoint": shape["endpoint"],
+				"table": row.get("table"),
+				"type": access,
+				"key": row.get("key"),
+				"rows": row.get("rows"),
+				"full_scan": access == "ALL" and not row.get("key"),
+			})
+	return report
+
+
+def format_explain_report(report, show_all=False):
+	"""文本表格（bench 命令输出）；默认只列全表扫描。"""
+	rows = [r for r in report if show_all or r["full_scan"]]
+	if not rows:
+		return "No full table scans in {} query shapes.".format(len(QUERY_SHAPES))
+	lines = ["{:<6}{:<28}{:<8}{:<32}{:>10}  {}".format("scan", "table", "type", "key", "rows", "endpoint")]
+	for r in rows:
+		lines.append(
+			"{:<6}{:<28}{:<8}{:<32}{:>10}  {}".format(
+				"FULL" if r["full_scan"] else "ok",
+				r["table"] or "-",
+				r["type"] or "-",
+				r["key"] or "-",
+				r["rows"] if r["rows"] is not None else "-",
+				r["endpoint"],
+			)
+		)
+	return "\n".join(lines)
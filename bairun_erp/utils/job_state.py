@@ -0,0 +1,75 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+后台任务状态（Redis）：批量 BOM 保存、供应商价格、批量外协下单、BR SO BOM List 同步共用。
+
+- 状态为 dict，按调用方的 key（前缀 + 任务标识）存放，带过期时间。
+- 读取不经 frappe.local 的请求级缓存：后台任务执行期间要能看到其他进程写入的状态（如 rerun 标记）。
+- update_state / transition_state 在同一 key 的 Redis 锁内读改写，并发更新不会互相覆盖；
+  需要「读出判断再写回」的状态转换（如结束时检查 rerun）用 transition_state。
+- 查询接口用 check_owner 校验（任务发起人或 System Manager），progress 计算完成百分比。
+
+用法:
+	from bairun_erp.utils import job_state
+
+	job_state.update_state(JOB_CACHE_PREFIX + job_id, status="running")
+	job = job_state.get_state(JOB_CACHE_PREFIX + job_id)
+	job_state.check_owner(job)
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe import _
+
+JOB_TTL_SEC = 24 * 60 * 60
+# 锁内只有一次读写，超时仅防进程异常退出后锁不释放
+LOCK_TIMEOUT_SEC = 10
+
+
+def _lock(key):
+	cache = frappe.cache()
+	return cache.lock(
+		cache.make_key(key + ":lock"),
+		timeout=LOCK_TIMEOUT_SEC,
+		blocking_timeout=LOCK_TIMEOUT_SEC,
+	)
+
+
+def get_state(key):
+	"""读取任务状态 dict；不存在返回 None。"""
+	state = frappe.cache().get_value(key, expires=True)
+	return state if isinstance(state, dict) else None
+
+
+def transition_state(key, fn, ttl=JOB_TTL_SEC):
+	"""
+	锁内读改写：fn(state) 就地修改状态 dict（不存在时为空 dict），返回 False 表示不写回。
+	返回 (state, fn 的返回值)。
+	"""
+	with _lock(key):
+		state = get_state(key) or {}
+		ret = fn(state)
+		if ret is not False:
+			frappe.cache().set_value(key, state, expires_in_sec=ttl)
+	return state, ret
+
+
+def update_state(key, ttl=JOB_TTL_SEC, **values):
+	"""锁内合并写入 values，返回更新后的状态。"""
+	return transition_state(key, lambda state: state.update(values), ttl=ttl)[0]
+
+
+def check_owner(job):
+	"""任务状态仅发起人（job["owner"]）或 System Manager 可查。"""
+	if job.get("owner") != frappe.session.user and "System Manager" not in frappe.get_roles():
+		frappe.throw(_("Not permitted"), frappe.PermissionError)
+
+
+def progress(job):
+	"""完成百分比（0-100）：按 done / total；无 total 时已完成为 100。"""
+	total = job.get("total") or 0
+	done = job.get("done") or 0
+	if total:
+		return round(done * 100.0 / total, 1)
+	return 100.0 if job.get("status") == "finished" else 0.0
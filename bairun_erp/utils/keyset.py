@@ -0,0 +1,207 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+列表接口的游标（keyset）分页：按上一页最后一行的排序键定位下一页，代替 LIMIT offset, n 的深翻页。
+
+- 请求体带 cursor 字段即进入游标模式（首页传 "" 或 null），此时忽略 limit_start；
+  不带 cursor 的请求仍按原 limit_start / page_number 分页。
+- 排序键 = 接口的 order_by 列 + 唯一列（行 name）兜底，保证次序稳定；
+  下一页条件为 (k1, k2, ..., name) 在上一页末行之后，升降序混排时展开为 OR 链，NULL 按 MySQL 排序规则（最小）处理。
+- 游标为不透明字符串（base64url JSON），含列表标识 + 排序键签名与末行键值；换了列表或排序的游标会被拒绝。
+- 响应：next_cursor 与接口的 total_count 同级返回（frappe.response 或返回的 dict 内）；为 None 表示已到最后一页。
+
+原生 SQL 列表:
+	keys = parse_order_by(order_by, {"posting_date": "pr.posting_date"}, default, ("pri.name", False))
+	cond, cond_values = seek_condition(keys, decode_cursor(cursor, SCOPE, keys))
+	... SELECT ..., key_select_sql(keys) ... WHERE ... AND cond ORDER BY order_sql(keys) LIMIT page_length + 1
+	rows, next_cursor = paginate_rows(rows, page_length, SCOPE, keys)
+
+frappe.get_list 列表见 get_list_seek / get_list_page。
+"""
+
+from __future__ import unicode_literals
+
+import base64
+import hashlib
+import json
+
+import frappe
+
+from bairun_erp.utils.list_count import count_list
+
+CURSOR_VERSION = 1
+
+# 排序键值在行中的别名前缀：_ks0, _ks1, ...
+KEY_ALIAS = "_ks"
+
+
+def read_cursor_param(jd):
+	"""请求参数中的 cursor：未传返回 None（偏移分页），传了返回字符串（"" 表示游标模式首页）。"""
+	if not isinstance(jd, dict) or "cursor" not in jd:
+		return None
+	return jd.get("cursor") or ""
+
+
+def parse_order_by(order_by, columns, default, unique):
+	"""
+	"col asc, col2 desc" -> [(SQL 表达式, 是否降序), ...]。
+	columns: 逻辑列名（小写）-> SQL 表达式，未知列忽略；全部无效时用 default（同格式字符串）。
+	unique: (唯一列 SQL 表达式, 是否降序)，order_by 未包含时追加到末尾。
+	"""
+	keys = _parse_segments(order_by, columns, unique[0])
+	if not keys:
+		keys = _parse_segments(default, columns, unique[0])
+	if unique[0] not in [expr for expr, _desc in keys]:
+		keys.append(tuple(unique))
+	return keys
+
+
+def _parse_segments(order_by, columns, unique_expr):
+	keys = []
+	for seg in str(order_by or "").split(","):
+		tokens = seg.split()
+		if not tokens:
+			continue
+		col = tokens[0].lower()
+		expr = columns.get(col) or (col if col == unique_expr.lower() else None)
+		if expr is None:
+			expr = next((e for e in columns.values() if e.lower() == col), None)
+		if not expr or expr in [e for e, _d in keys]:
+			continue
+		keys.append((expr, len(tokens) > 1 and tokens[1].lower() == "desc"))
+	return keys
+
+
+def order_sql(keys):
+	return ", ".join("{} {}".format(expr, "DESC" if desc else "ASC") for expr, desc in keys)
+
+
+def key_select_sql(keys):
+	"""SELECT 中附带的排序键列（别名 _ks0...），用于生成下一页游标。"""
+	return ", ".join("{} AS {}{}".format(expr, KEY_ALIAS, i) for i, (expr, _desc) in enumerate(keys))
+
+
+def seek_condition(keys, values, named=False):
+	"""
+	values 为上一页末行的键值（decode_cursor 的结果）；None 表示首页，返回 ("1=1", 空参数)。
+	named=False 返回 (sql, [参数...])，占位符 %s；named=True 返回 (sql, {参数...})，占位符 %(_ks_n)s。
+	"""
+	params = {} if named else []
+	if values is None:
+		return "1=1", params
+
+	def ph(value):
+		if named:
+			key = "{}_{}".format(KEY_ALIAS, len(params))
+			params[key] = value
+			return "%({})s".format(key)
+		params.append(value)
+		return "%s"
+
+	branches = []
+	for i, (expr, desc) in enumerate(keys):
+		value = values[i]
+		# NULL 最小：降序时其后没有更小的值，该分支为空
+		if value is None and desc:
+			continue
+		equals = ["{} <=> {}".format(e, ph(values[j])) for j, (e, _d) in enumerate(keys[:i])]
+		if value is None:
+			after = "{} IS NOT NULL".format(expr)
+		elif desc:
+			after = "({0} < {1} OR {0} IS NULL)".format(expr, ph(value))
+		else:
+			after = "{} > {}".format(expr, ph(value))
+		branches.append("(" + " AND ".join(equals + [after]) + ")")
+	if not branches:
+		return "1=0", params
+	return "(" + " OR ".join(branches) + ")", params
+
+
+def _signature(scope, keys):
+	raw = json.dumps([scope, [[expr, bool(desc)] for expr, desc in keys]])
+	return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def encode_cursor(scope, keys, values):
+	payload = json.dumps(
+		{"v": CURSOR_VERSION, "s": _signature(scope, keys), "k": list(values)},
+		default=str,
+		separators=(",", ":"),
+	)
+	return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, scope, keys):
+	"""cursor 为空返回 None（首页）；格式错误、版本或排序签名不符时抛 ValidationError。"""
+	if not cursor:
+		return None
+	try:
+		raw = base64.urlsafe_b64decode(str(cursor) + "=" * (-len(str(cursor)) % 4))
+		payload = json.loads(raw.decode("utf-8"))
+		values = payload["k"]
+		valid = (
+			payload.get("v") == CURSOR_VERSION
+			and payload.get("s") == _signature(scope, keys)
+			and isinstance(values, list)
+			and len(values) == len(keys)
+		)
+	except (TypeError, ValueError, KeyError, AttributeError):
+		valid = False
+	if not valid:
+		frappe.throw(frappe._("Invalid or expired cursor, please reload the list"), frappe.ValidationError)
+	return values
+
+
+def paginate_rows(rows, page_length, scope, keys):
+	"""
+	rows 按 page_length + 1 条取回；截成一页并返回 (rows, next_cursor)。
+	下一页游标取本页末行的 _ks 列（key_select_sql）；无更多数据时 next_cursor 为 None。
+	"""
+	if not page_length or page_length < 0 or len(rows) <= page_length:
+		return rows, None
+	rows = rows[:page_length]
+	last = rows[-1]
+	return rows, encode_cursor(scope, keys, [last.get("{}{}".format(KEY_ALIAS, i)) for i in range(len(keys))])
+
+
+def get_list_seek(doctype, filters, or_filters, keys, values):
+	"""
+	frappe.get_list 列表的游标定位：get_list 的 filters 只能 AND，无法表达 (k, name) < (v, n) 的 OR 条件，
+	改为 k 不越过 v 的区间条件 + 跳过与 v 相同且已返回的行数（只数并列行，走 k 的索引）。
+	keys 为 [(列, 是否降序), ("name", 是否降序)] 或 [("name", 是否降序)]，列须非空；values 为 decode_cursor 的结果。
+	返回 (filters, limit_start)。
+	"""
+	if isinstance(filters, dict):
+		filters = [[k] + list(v) if isinstance(v, (list, tuple)) else [k, "=", v] for k, v in filters.items()]
+	filters = list(filters or [])
+	if values is None:
+		return filters, 0
+	if len(keys) == 1:
+		return filters + [[keys[0][0], "<" if keys[0][1] else ">", values[0]]], 0
+	(field, desc), (_name, name_desc) = keys
+	value, name = values
+	ties = filters + [[field, "=", value], ["name", ">=" if name_desc else "<=", name]]
+	skip = count_list(doctype, filters=ties, or_filters=or_filters)
+	return filters + [[field, "<=" if desc else ">=", value]], skip
+
+
+def get_list_page(doctype, fields, page_length, scope, keys, **kwargs):
+	"""
+	游标模式的 frappe.get_list：按 page_length + 1 条取回并截成一页，返回 (rows, next_cursor)。
+	游标取末行的排序列与 name，调用方 fields 未包含时附带查询，返回前去掉；kwargs 原样传给 get_list。
+	"""
+	extra = [field for field, _desc in keys if field not in fields]
+	rows = frappe.get_list(
+		doctype,
+		fields=list(fields) + extra,
+		limit_page_length=page_length + 1 if page_length else page_length,
+		**kwargs
+	)
+	next_cursor = None
+	if page_length and page_length > 0 and len(rows) > page_length:
+		rows = rows[:page_length]
+		next_cursor = encode_cursor(scope, keys, [rows[-1].get(field) for field, _desc in keys])
+	for row in rows:
+		for field in extra:
+			row.pop(field, None)
+	return rows, next_cursor
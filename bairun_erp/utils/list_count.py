@@ -0,0 +1,31 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+列表接口取总数：按权限计数，不取回全部 name。
+
+- count_list：与 frappe.get_list 相同的 filters / or_filters 与权限条件（角色、User Permission、
+  permission_query_conditions），只执行一条 COUNT(DISTINCT name)，代替 len(get_list(fields=["name"], limit_page_length=0))。
+
+用法:
+	from bairun_erp.utils.list_count import count_list
+
+	total = count_list("Sales Order", filters=filters, or_filters=or_filters)
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+
+
+def count_list(doctype, filters=None, or_filters=None):
+	"""按当前用户权限统计 doctype 中满足 filters / or_filters 的记录数（与 frappe.get_list 条件一致），返回 int。"""
+	rows = frappe.get_list(
+		doctype,
+		fields=["count(distinct `tab{0}`.`name`) as total_count".format(doctype)],
+		filters=filters,
+		or_filters=or_filters or None,
+		order_by="",
+		limit_page_length=0,
+		ignore_permissions=False,
+	)
+	return int(rows[0].get("total_count") or 0) if rows else 0
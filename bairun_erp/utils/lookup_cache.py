@@ -0,0 +1,109 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+主数据小查询缓存：Item / Supplier / Customer / Warehouse 等按 name 取少量字段。
+
+- 请求级：结果记在 frappe.local 上，同一请求（或后台任务）内重复查询不再访问数据库；请求结束自动丢弃。
+- Redis（可选，use_redis=True）：跨请求短 TTL 缓存，适合名称类几乎不变的字段；允许 TTL 内的短暂不一致。
+
+用法:
+	from bairun_erp.utils.lookup_cache import bulk_get, get_value
+
+	names = bulk_get("Supplier", supplier_ids, ["supplier_name"])   # 先批量预取（一条 IN 查询）
+	get_value("Supplier", sid, "supplier_name")                      # 之后逐行取值走内存
+"""
+
+from __future__ import unicode_literals
+
+import frappe
+
+REDIS_KEY_PREFIX = "bairun_erp:lookup:"
+REDIS_TTL_SEC = 300
+
+_IN_CHUNK_SIZE = 1000
+
+
+def _local_store():
+	"""请求级缓存：{doctype: {name: dict 或 None（不存在）}}。"""
+	store = getattr(frappe.local, "bairun_lookup_cache", None)
+	if store is None:
+		store = frappe.local.bairun_lookup_cache = {}
+	return store
+
+
+def _redis_key(doctype, name):
+	return "{}{}:{}".format(REDIS_KEY_PREFIX, doctype, name)
+
+
+def _has_fields(row, fields):
+	return row is None or all(f in row for f in fields)
+
+
+def _merge(existing, row):
+	merged = dict(existing or {})
+	merged.update(row)
+	return merged
+
+
+def bulk_get(doctype, names, fields, use_redis=False, ttl=REDIS_TTL_SEC):
+	"""
+	批量按 name 取字段：返回 {name: frappe._dict(fields)}，不存在的 name 不出现在结果中。
+	未命中的 name 合并为一条 IN 查询（超过 1000 个分批），结果记入请求级缓存（及可选的 Redis）。
+	"""
+	if isinstance(fields, str):
+		fields = [fields]
+	fields = [f for f in fields if f and f != "name"]
+	names = list(dict.fromkeys(n for n in (names or []) if n))
+	if not names:
+		return {}
+
+	store = _local_store().setdefault(doctype, {})
+	missing = [n for n in names if n not in store or not _has_fields(store[n], fields)]
+
+	if missing and use_redis:
+		still_missing = []
+		for name in missing:
+			row = frappe.cache().get_value(_redis_key(doctype, name))
+			if isinstance(row, dict) and _has_fields(row, fields):
+				store[name] = _merge(store.get(name), row)
+			else:
+				still_missing.append(name)
+		missing = still_missing
+
+	if missing:
+		found = {}
+		for i in range(0, len(missing), _IN_CHUNK_SIZE):
+			chunk = missing[i:i + _IN_CHUNK_SIZE]
+			for r in frappe.get_all(doctype, filters={"name": ["in", chunk]}, fields=["name"] + fields):
+				found[r.name] = {f: r.get(f) for f in fields}
+		for name in missing:
+			row = found.get(name)
+			if row is None:
+				store[name] = None
+				continue
+			store[name] = _merge(store.get(name), row)
+			if use_redis:
+				frappe.cache().set_value(_redis_key(doctype, name), dict(store[name]), expires_in_sec=ttl)
+
+	return {
+		n: frappe._dict({f: store[n].get(f) for f in fields})
+		for n in names
+		if store.get(n) is not None
+	}
+
+
+def get_value(doctype, name, fieldname, use_redis=False, ttl=REDIS_TTL_SEC):
+	"""单条取值（走 bulk_get 的缓存）；name 为空或不存在时返回 None。"""
+	if not name:
+		return None
+	row = bulk_get(doctype, [name], [fieldname], use_redis=use_redis, ttl=ttl).get(name)
+	return row.get(fieldname) if row else None
+
+
+def clear(doctype=None):
+	"""清空请求级缓存（写入主数据后同一请求内需读到新值时调用）。"""
+	store = _local_store()
+	if doctype:
+		store.pop(doctype, None)
+	else:
+		store.clear()
@@ -0,0 +1,17 @@
+# Copyright (c) 2026, Bairun and contributors
+# For license information, see license.txt.
+"""
+列表接口拼接原生 SQL 时共用的小工具。
+
+用法:
+	from bairun_erp.utils.query_utils import escape_like
+
+	values["search"] = "%{}%".format(escape_like(search))
+"""
+
+from __future__ import unicode_literals
+
+
+def escape_like(text):
+	"""转义 LIKE 通配符（% _）与转义符本身，使用户输入按字面匹配。"""
+	return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
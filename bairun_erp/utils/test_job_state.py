@@ -0,0 +1,47 @@
+# Copyright (c) 2026, Bairun and contributors
+# 后台任务状态：锁内读改写、发起人校验、进度计算。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.test_job_state
+
+from __future__ import unicode_literals
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils import job_state
+
+KEY = "bairun_erp:test_job_state:job-1"
+
+
+class TestJobState(FrappeTestCase):
+	def setUp(self):
+		frappe.cache().delete_value(KEY)
+
+	def tearDown(self):
+		frappe.cache().delete_value(KEY)
+
+	def test_update_merges_into_existing_state(self):
+		job_state.update_state(KEY, status="queued", owner="a@example.com")
+		state = job_state.update_state(KEY, status="running", done=3)
+		self.assertEqual(state, {"status": "running", "owner": "a@example.com", "done": 3})
+		self.assertEqual(job_state.get_state(KEY), state)
+
+	def test_transition_can_skip_write(self):
+		job_state.update_state(KEY, status="running", rerun=True)
+
+		def _finish(state):
+			if state.get("rerun"):
+				return False
+			state["status"] = "finished"
+
+		_state, ret = job_state.transition_state(KEY, _finish)
+		self.assertIs(ret, False)
+		self.assertEqual(job_state.get_state(KEY)["status"], "running")
+
+	def test_check_owner_and_progress(self):
+		job = {"owner": "someone-else@example.com", "status": "running", "done": 1, "total": 4}
+		frappe.set_user("Administrator")
+		job_state.check_owner(job)  # System Manager 可查
+		self.assertEqual(job_state.progress(job), 25.0)
+		self.assertEqual(job_state.progress({"status": "finished"}), 100.0)
@@ -0,0 +1,142 @@
+# Copyright (c) 2026, Bairun and contributors
+# Keyset 分页：排序字段解析、混合升降序及 NULL 值的定位条件。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.test_keyset
+
+from __future__ import unicode_literals
+
+import datetime
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils import keyset
+
+COLUMNS = {"posting_date": "pr.posting_date", "idx": "pri.idx"}
+UNIQUE = ("pri.name", False)
+
+
+class TestKeyset(FrappeTestCase):
+	def test_parse_order_by_appends_unique_and_ignores_unknown(self):
+		keys = keyset.parse_order_by("posting_date desc, bogus asc, idx", COLUMNS, "idx asc", UNIQUE)
+		self.assertEqual(keys, [("pr.posting_date", True), ("pri.idx", False), ("pri.name", False)])
+		self.assertEqual(keyset.parse_order_by("bogus", COLUMNS, "idx desc", UNIQUE), [("pri.idx", True), UNIQUE])
+		self.assertEqual(keyset.parse_order_by("pri.name desc", COLUMNS, "idx", UNIQUE), [("pri.name", True)])
+
+	def test_seek_condition_mixed_directions_and_nulls(self):
+		keys = [("pr.posting_date", True), ("pri.idx", False), ("pri.name", False)]
+		sql, values = keyset.seek_condition(keys, ["2026-03-01", 2, "row-9"])
+		self.assertEqual(
+			sql,
+			"(((pr.posting_date < %s OR pr.posting_date IS NULL))"
+			" OR (pr.posting_date <=> %s AND pri.idx > %s)"
+			" OR (pr.posting_date <=> %s AND pri.idx <=> %s AND pri.name > %s))",
+		)
+		self.assertEqual(values, ["2026-03-01", "2026-03-01", 2, "2026-03-01", 2, "row-9"])
+
+		# 降序列末行为 NULL：其后只可能是同为 NULL 的行
+		sql, values = keyset.seek_condition(keys, [None, 1, "row-1"], named=True)
+		self.assertNotIn("pr.posting_date < %", sql)
+		self.assertIn("pri.idx > %(_ks_1)s", sql)
+		self.assertEqual(values["_ks_0"], None)
+
+		self.assertEqual(keyset.seek_condition(keys, None), ("1=1", []))
+
+	def test_cursor_round_trip_and_scope_check(self):
+		keys = [("pr.posting_date", True), ("pri.name", False)]
+		rows = [
+			{"_ks0": datetime.date(2026, 3, 2), "_ks1": "row-1"},
+			{"_ks0": datetime.date(2026, 3, 1), "_ks1": "row-2"},
+			{"_ks0": datetime.date(2026, 2, 1), "_ks1": "row-3"},
+		]
+		page, cursor = keyset.paginate_rows(rows, 2, "scope-a", keys)
+		self.assertEqual(len(page), 2)
+		self.assertEqual(keyset.decode_cursor(cursor, "scope-a", keys), ["2026-03-01", "row-2"])
+		self.assertIsNone(keyset.paginate_rows(rows, 3, "scope-a", keys)[1])
+		self.assertIsNone(keyset.decode_cursor("", "scope-a", keys))
+
+		self.assertRaises(frappe.ValidationError, keyset.decode_cursor, cursor, "scope-b", keys)
+		self.assertRaises(frappe.ValidationError, keyset.decode_cursor, cursor, "scope-a", keys[::-1])
+		self.assertRaises(frappe.ValidationError, keyset.decode_cursor, "not-a-cursor", "scope-a", keys)
+
+	def test_read_cursor_param(self):
+		self.assertIsNone(keyset.read_cursor_param({"limit_start": 20}))
+		self.assertEqual(keyset.read_cursor_param({"cursor": None}), "")
+		self.assertEqual(keyset.read_cursor_param({"cursor": "abc"}), "abc")
+
+	def test_get_list_seek_skips_only_ties(self):
+		keys = [("creation", True), ("name", True)]
+		with patch.object(keyset, "count_list", return_value=3) as count:
+			filters, skip = keyset.get_list_seek(
+				"BR SO BOM List", [["status", "=", "Draft"]], None, keys, ["2026-03-01 10:00:00", "BOM-9"]
+			)
+		self.assertEqual(skip, 3)
+		self.assertEqual(filters, [["status", "=", "Draft"], ["creation", "<=", "2026-03-01 10:00:00"]])
+		self.assertEqual(
+			count.call_args.kwargs["filters"],
+			[["status", "=", "Draft"], ["creation", "=", "2026-03-01 10:00:00"], ["name", ">=", "BOM-9"]],
+		)
+		self.assertEqual(keyset.get_list_seek("BR SO BOM List", {"status": "Draft"}, None, keys, None), ([["status", "=", "Draft"]], 0))
+
+	def test_get_list_page_fetches_sort_fields_the_caller_did_not_ask_for(self):
+		keys = [("creation", True), ("name", True)]
+		table = [
+			frappe._dict(name="PO-{}".format(i), title="t{}".format(i), creation="2026-03-0{}".format(i // 2))
+			for i in range(1, 8)
+		]
+		fetched = []
+
+		def get_list(doctype, fields, filters, limit_start, limit_page_length, **kwargs):
+			fetched.append(fields)
+			rows = [r for r in table if all(_match(r, f) for f in filters)]
+			rows.sort(key=lambda r: (r.creation, r.name), reverse=True)
+			return [frappe._dict({f: r[f] for f in fields}) for r in rows[limit_start:limit_start + limit_page_length]]
+
+		def count_list(doctype, filters, or_filters=None):
+			return len([r for r in table if all(_match(r, f) for f in filters)])
+
+		def page(cursor):
+			values = keyset.decode_cursor(cursor, "po", keys)
+			filters, start = keyset.get_list_seek("Purchase Order", [], None, keys, values)
+			return keyset.get_list_page("Purchase Order", ["title"], 3, "po", keys, filters=filters, limit_start=start)
+
+		with patch.object(keyset.frappe, "get_list", side_effect=get_list, create=True), patch.object(
+			keyset, "count_list", side_effect=count_list
+		):
+			first, cursor = page("")
+			second, cursor2 = page(cursor)
+			third, cursor3 = page(cursor2)
+
+		self.assertEqual(fetched[0], ["title", "creation", "name"])
+		self.assertEqual([r.title for r in first], ["t7", "t6", "t5"])
+		self.assertEqual([r.title for r in second], ["t4", "t3", "t2"])
+		self.assertEqual([r.title for r in third], ["t1"])
+		self.assertIsNone(cursor3)
+		self.assertEqual(set(first[0]), {"title"})
+
+
+	def test_get_list_pages_match_offset_listing(self):
+		keys = [("creation", True), ("name", True)]
+		order_by = "creation desc, name desc"
+		expected = frappe.get_list("UOM", fields=["name"], order_by=order_by, limit_page_length=0)
+		if len(expected) < 4:
+			self.skipTest("too few UOM rows")
+
+		names, cursor = [], ""
+		for _i in range(len(expected)):
+			values = keyset.decode_cursor(cursor, "uom", keys)
+			filters, start = keyset.get_list_seek("UOM", [], None, keys, values)
+			rows, cursor = keyset.get_list_page(
+				"UOM", ["name"], 3, "uom", keys, filters=filters, limit_start=start, order_by=order_by
+			)
+			names += [r.name for r in rows]
+			if not cursor:
+				break
+		self.assertEqual(names, [r.name for r in expected])
+
+
+def _match(row, flt):
+	field, op, value = flt
+	return {"=": row[field] == value, "<=": row[field] <= value, ">=": row[field] >= value}[op]
@@ -0,0 +1,29 @@
+# Copyright (c) 2026, Bairun and contributors
+# 列表计数：与 get_list 结果一致、单条 count 查询。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.test_list_count
+
+from __future__ import unicode_literals
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils import list_count
+
+
+class TestCountList(FrappeTestCase):
+	def test_matches_get_list_length(self):
+		filters = [["docstatus", "<", 2]]
+		or_filters = [["Sales Order", "customer", "like", "%a%"], ["Sales Order", "customer_name", "like", "%a%"]]
+		for f, of in ((filters, None), (filters, or_filters), (None, None)):
+			expected = len(frappe.get_list("Sales Order", fields=["name"], filters=f, or_filters=of, limit_page_length=0))
+			self.assertEqual(list_count.count_list("Sales Order", filters=f, or_filters=of), expected)
+
+	def test_single_count_query(self):
+		with patch.object(list_count.frappe, "get_list", return_value=[{"total_count": 42}]) as get_list:
+			self.assertEqual(list_count.count_list("Sales Order", filters=[["docstatus", "<", 2]]), 42)
+		get_list.assert_called_once()
+		self.assertIn("count(distinct", get_list.call_args.kwargs["fields"][0])
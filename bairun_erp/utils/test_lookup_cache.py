@@ -0,0 +1,64 @@
+# Copyright (c) 2026, Bairun and contributors
+# 主数据小查询缓存：批量预取只查一次、请求新字段时补查。
+#
+# 运行:
+#   bench --site <site> run-tests --module bairun_erp.utils.test_lookup_cache
+
+from __future__ import unicode_literals
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from bairun_erp.utils import lookup_cache
+
+
+class TestLookupCache(FrappeTestCase):
+	def setUp(self):
+		lookup_cache.clear()
+
+	def tearDown(self):
+		lookup_cache.clear()
+
+	def test_bulk_get_queries_missing_names_once(self):
+		rows = [
+			frappe._dict(name="SUP-1", supplier_name="供应商一"),
+			frappe._dict(name="SUP-2", supplier_name="供应商二"),
+		]
+		with patch.object(lookup_cache.frappe, "get_all", return_value=rows) as get_all:
+			out = lookup_cache.bulk_get("Supplier", ["SUP-1", "SUP-2", "SUP-X", "SUP-1", ""], ["supplier_name"])
+			self.assertEqual(get_all.call_count, 1)
+			self.assertEqual(out["SUP-1"].supplier_name, "供应商一")
+			self.assertNotIn("SUP-X", out)
+
+			# 同一请求内再次读取（含不存在的 name）不再查库
+			self.assertEqual(lookup_cache.get_value("Supplier", "SUP-2", "supplier_name"), "供应商二")
+			self.assertIsNone(lookup_cache.get_value("Supplier", "SUP-X", "supplier_name"))
+			self.assertEqual(get_all.call_count, 1)
+
+	def test_bulk_get_refetches_when_new_field_requested(self):
+		with patch.object(
+			lookup_cache.frappe,
+			"get_all",
+			side_effect=[
+				[frappe._dict(name="ITEM-1", item_name="物料一")],
+				[frappe._dict(name="ITEM-1", item_group="纸箱")],
+			],
+		) as get_all:
+			lookup_cache.bulk_get("Item", ["ITEM-1"], ["item_name"])
+			out = lookup_cache.bulk_get("Item", ["ITEM-1"], ["item_group"])
+			self.assertEqual(get_all.call_count, 2)
+			self.assertEqual(out["ITEM-1"].item_group, "纸箱")
+			self.assertEqual(lookup_cache.get_value("Item", "ITEM-1", "item_name"), "物料一")
+			self.assertEqual(get_all.call_count, 2)
+
+	def test_bulk_get_matches_database(self):
+		groups = frappe.get_all("Item Group", fields=["name", "parent_item_group", "is_group"], limit=5)
+		if not groups:
+			self.skipTest("no Item Group")
+		out = lookup_cache.bulk_get("Item Group", [g.name for g in groups] + ["_TEST-不存在"], ["parent_item_group", "is_group"])
+		self.assertEqual(
+			{name: (row.parent_item_group, row.is_group) for name, row in out.items()},
+			{g.name: (g.parent_item_group, g.is_group) for g in groups},
+		)
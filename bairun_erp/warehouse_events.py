@@ -0,0 +1,8 @@
+from __future__ import unicode_literals
+
+
+def clear_warehouse_alias_cache(doc, method=None, *args, **kwargs):
+	"""仓库新增 / 修改 / 重命名 / 删除后清除其公司的仓库别名表（重命名可能跨公司，清全部）。"""
+	from bairun_erp.utils.api.material.item_attrs_apply import clear_warehouse_alias_cache as _clear
+
+	_clear(None if method == "after_rename" else doc.get("company"))